@@ -0,0 +1,129 @@
+"""
+Pre-warmed FOP worker, started by runner.py.
+
+The worker imports `fops` (and debugpy when available) up front, reports "ready" and waits
+for ONE job on stdin. It runs that procedure in this process and exits: every procedure
+gets a fresh process, the pool replaces the worker with a new warm one.
+
+`fops` modules read their FOPS_* settings at import: when the job's env changes one of them,
+the warm `fops` modules are dropped before the procedure starts, so it imports them again
+under its own settings ("rewarm": true; its other warm imports are kept).
+
+Control messages are JSON lines on the original stdout; the procedure's own stdout is
+redirected to stderr, so prints can never corrupt the protocol.
+
+    -> {"event": "ready", "pid": 123, "warm": ["fops"], "import_s": 0.41}
+    <- {"procedure": "fop.py" | "pkg.mod:func", "instance_id": "...", "env": {...},
+        "debug": {"host": "0.0.0.0", "port": 5678, "wait": true} | null}
+    -> {"event": "started", "instance_id": "...", "rewarm": false}
+    -> {"event": "finished", "instance_id": "...", "ok": true, "error": null, "duration_s": 1.2}
+"""
+import importlib
+import json
+import os
+import runpy
+import sys
+import time
+import traceback
+
+# modules imported before the worker reports ready (comma separated)
+WARM_IMPORTS = os.environ.get("FOP_WARM_IMPORTS",
+                              "fops,fops.lang.send,fops.lang.verify_tm,fops.lang.prompt")
+WORKDIR = os.environ.get("FOP_WORKDIR", "/work")
+
+def _control_channel():
+    # keep the real stdout for the protocol; everything printed from now on goes to stderr
+    ctl = os.fdopen(os.dup(sys.stdout.fileno()), "w", buffering=1)
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    return ctl
+
+def _send(ctl, **msg) -> None:
+    ctl.write(json.dumps(msg) + "\n")
+    ctl.flush()
+
+def _warm() -> list[str]:
+    warm = []
+    for name in filter(None, (m.strip() for m in WARM_IMPORTS.split(","))):
+        try:
+            importlib.import_module(name)
+            warm.append(name)
+        except ImportError as e:
+            print(f">> warm import of {name} failed: {e}", file=sys.stderr, flush=True)
+    try:
+        import debugpy  # noqa: F401  (only so attaching does not pay for the import)
+        warm.append("debugpy")
+    except ImportError:
+        pass
+    return warm
+
+def _apply_env(env: dict) -> bool:
+    """Apply the job's env; True when it changes a FOPS_* setting the warm imports already read."""
+    env = {k: str(v) for k, v in env.items()}
+    changed = any(k.startswith("FOPS_") and os.environ.get(k) != v for k, v in env.items())
+    os.environ.update(env)
+    if not changed or "fops" not in sys.modules:
+        return False
+    for name in [m for m in sys.modules if m == "fops" or m.startswith("fops.")]:
+        del sys.modules[name]
+    return True
+
+def _start_debugger(debug: dict) -> None:
+    import debugpy
+
+    host, port = debug.get("host", "0.0.0.0"), int(debug.get("port", 5678))
+    debugpy.listen((host, port))
+    if debug.get("wait", True):
+        print(f">> waiting for IDE on {host}:{port}", file=sys.stderr, flush=True)
+        debugpy.wait_for_client()
+
+def _run(procedure: str) -> None:
+    # same forms as entrypoint.sh: "module:function" or a script path under the workdir
+    if ":" in procedure:
+        module, _, func = procedure.partition(":")
+        getattr(importlib.import_module(module), func)()
+        return
+    target = procedure if os.path.isabs(procedure) else os.path.join(WORKDIR, procedure)
+    if not os.path.isfile(target):
+        raise FileNotFoundError(f"Script not found: {target}")
+    sys.argv = [target]
+    sys.path.insert(0, os.path.dirname(target))
+    runpy.run_path(target, run_name="__main__")
+
+def main() -> int:
+    ctl = _control_channel()
+    t0 = time.perf_counter()
+    warm = _warm()
+    _send(ctl, event="ready", pid=os.getpid(), warm=warm,
+          import_s=round(time.perf_counter() - t0, 4))
+
+    line = sys.stdin.readline()
+    if not line:
+        return 0  # pool closed the worker while idle
+    job = json.loads(line)
+    instance_id = str(job.get("instance_id") or "")
+    rewarm = _apply_env(job.get("env") or {})
+    os.environ["INSTANCE_ID"] = instance_id
+    if WORKDIR and os.path.isdir(WORKDIR):
+        os.chdir(WORKDIR)
+        sys.path.insert(0, WORKDIR)
+
+    _send(ctl, event="started", instance_id=instance_id, rewarm=rewarm)
+    t0 = time.perf_counter()
+    ok, error = True, None
+    try:
+        if job.get("debug"):
+            _start_debugger(job["debug"])
+        _run(str(job["procedure"]))
+    except SystemExit as e:
+        ok = e.code in (None, 0)
+        error = None if ok else f"SystemExit({e.code!r})"
+    except BaseException as e:
+        ok, error = False, f"{type(e).__name__}: {e}"
+        traceback.print_exc()
+    _send(ctl, event="finished", instance_id=instance_id, ok=ok, error=error,
+          duration_s=round(time.perf_counter() - t0, 4))
+    sys.stderr.flush()
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,476 @@
+"""
+FOP runner service: a pool of pre-warmed worker processes (see fop_worker.py).
+
+Each procedure is assigned to an idle worker that already imported `fops`, runs in that
+worker process only, and the worker is replaced by a fresh warm one when it finishes.
+Idle workers are also recycled after `--max-idle` seconds.
+
+    python runner.py serve --backend local --size 4 --workdir .     # no Docker needed
+    python runner.py serve --backend docker --size 4 --image fop-runner
+    python runner.py submit fop.py --id <uuid> [--wait] [--env KEY=VALUE ...] [--forward-env]
+    curl localhost:8700/workers
+
+HTTP API:
+    POST /procedures        {"procedure": "...", "instance_id": "...", "env": {...}, "debug": {...}}
+    GET  /procedures[/<id>] status of one / all procedures (?wait=<s> blocks until finished)
+    GET  /workers           pool state
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+import uuid
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import IO, Optional
+from urllib.parse import parse_qs, urlparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+WORKER_SCRIPT = os.path.join(HERE, "fop_worker.py")
+
+RUNNER_PORT = int(os.environ.get("FOP_RUNNER_PORT", "8700"))
+RUNNER_URL = os.environ.get("FOP_RUNNER_URL", f"http://127.0.0.1:{RUNNER_PORT}")
+
+# -----------------------------------------------------------------------------
+# Backends: how a worker process is started
+# -----------------------------------------------------------------------------
+class LocalProcessBackend:
+    """Workers are plain child processes on this host (tests, development)."""
+
+    name = "local"
+
+    def __init__(self, *, workdir: str = ".", python: str = sys.executable,
+                 env: Optional[dict] = None):
+        self.workdir = os.path.abspath(workdir)
+        self.python = python
+        self.env = env
+
+    def spawn(self, slot: int) -> subprocess.Popen:
+        env = dict(os.environ if self.env is None else self.env)
+        env["FOP_WORKDIR"] = self.workdir
+        env.setdefault("PYTHONUNBUFFERED", "1")
+        return subprocess.Popen(
+            [self.python, "-u", WORKER_SCRIPT],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            cwd=self.workdir, env=env, text=True, bufsize=1,
+        )
+
+    def debug_host(self) -> str:
+        return "127.0.0.1"
+
+class DockerBackend:
+    """Workers are long-lived `docker run -i` containers of the runner image, one per slot."""
+
+    name = "docker"
+
+    def __init__(self, *, image: str = "fop-runner", workdir: str = ".",
+                 debug_port_base: int = 5678, extra_args: tuple[str, ...] = ()):
+        self.image = image
+        self.workdir = os.path.abspath(workdir)
+        self.debug_port_base = debug_port_base
+        self.extra_args = tuple(extra_args)
+
+    def spawn(self, slot: int) -> subprocess.Popen:
+        port = self.debug_port_base + slot
+        cmd = [
+            "docker", "run", "-i", "--rm",
+            "--name", f"fop-worker-{slot}-{uuid.uuid4().hex[:8]}",
+            "-v", f"{self.workdir}:/work:rw",
+            "-e", "FOP_WORKDIR=/work", "-e", "PYTHONUNBUFFERED=1",
+            "-p", f"{port}:{port}",
+            "--entrypoint", "python",
+            *self.extra_args,
+            self.image, "-u", "/usr/local/bin/fop_worker.py",
+        ]
+        return subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, text=True, bufsize=1)
+
+    def debug_host(self) -> str:
+        return "0.0.0.0"
+
+# -----------------------------------------------------------------------------
+# Pool
+# -----------------------------------------------------------------------------
+@dataclass
+class Run:
+    instance_id: str
+    procedure: str
+    env: dict = field(default_factory=dict)
+    debug: Optional[dict] = None
+    state: str = "queued"            # queued | running | finished | failed
+    worker_pid: Optional[int] = None
+    error: Optional[str] = None
+    submitted: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    duration_s: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+class Worker:
+    def __init__(self, slot: int, proc: subprocess.Popen):
+        self.slot = slot
+        self.proc = proc
+        self.state = "starting"          # starting | idle | busy | dead
+        self.ready_at: Optional[float] = None
+        self.warm: list[str] = []
+        self.import_s: Optional[float] = None
+        self.run: Optional[Run] = None
+
+    def info(self) -> dict:
+        idle = self.state == "idle" and self.ready_at
+        return {
+            "slot": self.slot, "pid": self.proc.pid, "state": self.state,
+            "warm": self.warm, "import_s": self.import_s,
+            "idle_s": round(time.monotonic() - self.ready_at, 1) if idle else None,
+            "instance_id": self.run.instance_id if self.run else None,
+        }
+
+class WorkerPool:
+    """
+    Keeps `size` warm workers. submit() hands a procedure to an idle worker (or queues it);
+    a worker runs exactly one procedure and is then replaced, so procedures never share a
+    process. Idle workers older than `max_idle` seconds are recycled as well.
+    """
+
+    def __init__(self, backend, *, size: int = 2, max_idle: float = 600.0,
+                 debug_port_base: int = 5678, log: IO[str] = sys.stderr):
+        self.backend = backend
+        self.size = size
+        self.max_idle = max_idle
+        self.debug_port_base = debug_port_base
+        self.log = log
+
+        self.workers: dict[int, Worker] = {}
+        self.runs: dict[str, Run] = {}
+        self._queue: deque[Run] = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._reaper: Optional[threading.Thread] = None
+
+        self.spawned = 0
+        self.recycled = 0
+
+    # --- lifecycle ----------------------------------------------------------------
+    def start(self) -> "WorkerPool":
+        for slot in range(self.size):
+            self._spawn(slot)
+        self._reaper = threading.Thread(target=self._reap, name="fop-pool-reaper", daemon=True)
+        self._reaper.start()
+        return self
+
+    def close(self, timeout: float = 5.0) -> None:
+        with self._cond:
+            self._closed = True
+            workers = list(self.workers.values())
+            self._cond.notify_all()
+        for w in workers:
+            if w.state in ("starting", "idle"):
+                self._stop(w)
+        for w in workers:
+            try:
+                w.proc.wait(timeout)
+            except subprocess.TimeoutExpired:
+                w.proc.kill()
+
+    def __enter__(self) -> "WorkerPool":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Block until every slot has a warm idle worker."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while sum(w.state == "idle" for w in self.workers.values()) < self.size:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    # --- workers ------------------------------------------------------------------
+    def _spawn(self, slot: int) -> None:
+        w = Worker(slot, self.backend.spawn(slot))
+        self.spawned += 1
+        with self._cond:
+            self.workers[slot] = w
+        threading.Thread(target=self._read_control, args=(w,), name=f"fop-worker-{slot}",
+                         daemon=True).start()
+        threading.Thread(target=self._pump_output, args=(w,), name=f"fop-worker-{slot}-log",
+                         daemon=True).start()
+
+    def _stop(self, w: Worker) -> None:
+        try:
+            w.proc.stdin.close()  # an idle worker exits on EOF
+        except OSError:
+            pass
+
+    def _replace(self, w: Worker) -> None:
+        with self._cond:
+            if self._closed or self.workers.get(w.slot) is not w:
+                return
+        self._spawn(w.slot)
+
+    def _read_control(self, w: Worker) -> None:
+        for line in w.proc.stdout:
+            try:
+                msg = json.loads(line)
+            except ValueError:
+                continue
+            event = msg.get("event")
+            with self._cond:
+                if event == "ready":
+                    w.state, w.ready_at = "idle", time.monotonic()
+                    w.warm, w.import_s = msg.get("warm", []), msg.get("import_s")
+                    self._dispatch()
+                elif event == "started" and w.run is not None:
+                    w.run.state, w.run.started = "running", time.time()
+                elif event == "finished" and w.run is not None:
+                    run = w.run
+                    run.state = "finished" if msg.get("ok") else "failed"
+                    run.error = msg.get("error")
+                    run.duration_s = msg.get("duration_s")
+                    run.finished = time.time()
+                self._cond.notify_all()
+        w.proc.wait()
+        with self._cond:
+            run = w.run
+            if run is not None and run.state in ("queued", "running"):
+                run.state, run.finished = "failed", time.time()
+                run.error = run.error or f"worker exited with code {w.proc.returncode}"
+            w.state = "dead"
+            self._cond.notify_all()
+        self._replace(w)
+
+    def _pump_output(self, w: Worker) -> None:
+        for line in w.proc.stderr:
+            tag = w.run.instance_id[:8] if w.run else f"worker-{w.slot}"
+            self.log.write(f"[{tag}] {line}")
+            self.log.flush()
+
+    def _reap(self) -> None:
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                self._cond.wait(min(5.0, self.max_idle))
+                if self._closed:
+                    return
+                now = time.monotonic()
+                stale = [w for w in self.workers.values()
+                         if w.state == "idle" and w.ready_at is not None
+                         and now - w.ready_at > self.max_idle]
+                for w in stale:
+                    w.state = "recycling"
+                    self.recycled += 1
+            for w in stale:
+                self._stop(w)   # _read_control sees EOF and spawns the replacement
+
+    # --- procedures ---------------------------------------------------------------
+    def submit(self, procedure: str, *, instance_id: Optional[str] = None,
+               env: Optional[dict] = None, debug: Optional[dict] = None) -> Run:
+        run = Run(instance_id or str(uuid.uuid4()), procedure, dict(env or {}), debug)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Runner pool is closed")
+            prev = self.runs.get(run.instance_id)
+            if prev is not None and prev.state in ("queued", "running"):
+                raise ValueError(f"Instance {run.instance_id} is already active")
+            self.runs[run.instance_id] = run
+            self._queue.append(run)
+            self._dispatch()
+        return run
+
+    def _dispatch(self) -> None:
+        # caller holds the lock
+        while self._queue:
+            idle = next((w for w in self.workers.values() if w.state == "idle"), None)
+            if idle is None:
+                return
+            run = self._queue.popleft()
+            debug = run.debug
+            if debug is not None:
+                debug = {"host": self.backend.debug_host(),
+                         "port": self.debug_port_base + idle.slot, "wait": True, **debug}
+                run.debug = debug
+            job = {"procedure": run.procedure, "instance_id": run.instance_id, "env": run.env,
+                   "debug": debug}
+            idle.state, idle.run = "busy", run
+            run.worker_pid = idle.proc.pid
+            try:
+                idle.proc.stdin.write(json.dumps(job) + "\n")
+                idle.proc.stdin.flush()
+                idle.proc.stdin.close()
+            except OSError as e:
+                run.state, run.error = "failed", f"worker unavailable: {e}"
+
+    def wait(self, instance_id: str, timeout: Optional[float] = None) -> Run:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            run = self.runs[instance_id]
+            while run.state in ("queued", "running"):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return run
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "backend": self.backend.name,
+                "size": self.size,
+                "queued": len(self._queue),
+                "spawned": self.spawned,
+                "recycled": self.recycled,
+                "workers": [w.info() for w in sorted(self.workers.values(), key=lambda w: w.slot)],
+            }
+
+# -----------------------------------------------------------------------------
+# HTTP service
+# -----------------------------------------------------------------------------
+def make_server(pool: WorkerPool, host: str = "127.0.0.1",
+                port: int = RUNNER_PORT) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def _json(self, obj, status: int = 200) -> None:
+            data = json.dumps(obj).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self) -> None:
+            if urlparse(self.path).path != "/procedures":
+                return self._json({"error": "Not found"}, 404)
+            n = int(self.headers.get("Content-Length") or 0)
+            try:
+                body = json.loads(self.rfile.read(n) or b"{}")
+                run = pool.submit(str(body["procedure"]), instance_id=body.get("instance_id"),
+                                  env=body.get("env"), debug=body.get("debug"))
+            except (KeyError, ValueError) as e:
+                return self._json({"error": str(e)}, 400)
+            except RuntimeError as e:
+                return self._json({"error": str(e)}, 503)
+            self._json(run.to_dict(), 201)
+
+        def do_GET(self) -> None:
+            url = urlparse(self.path)
+            qs = parse_qs(url.query)
+            if url.path == "/workers":
+                return self._json(pool.stats())
+            if url.path == "/procedures":
+                return self._json([r.to_dict() for r in pool.runs.values()])
+            if url.path.startswith("/procedures/"):
+                instance_id = url.path[len("/procedures/"):]
+                if instance_id not in pool.runs:
+                    return self._json({"error": "Unknown instance"}, 404)
+                wait = float(qs.get("wait", ["0"])[0])
+                return self._json(pool.wait(instance_id, wait).to_dict())
+            self._json({"error": "Not found"}, 404)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+# -----------------------------------------------------------------------------
+# CLI
+# -----------------------------------------------------------------------------
+def _serve(args: argparse.Namespace) -> None:
+    if args.backend == "docker":
+        backend = DockerBackend(image=args.image, workdir=args.workdir,
+                                debug_port_base=args.debug_port_base)
+    else:
+        backend = LocalProcessBackend(workdir=args.workdir)
+    pool = WorkerPool(backend, size=args.size, max_idle=args.max_idle,
+                      debug_port_base=args.debug_port_base)
+    server = make_server(pool, args.host, args.port)
+    pool.start()
+    print(f"[fop-runner] {args.size} {backend.name} workers, "
+          f"listening on http://{args.host}:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.close()
+
+def _submit(args: argparse.Namespace) -> int:
+    env = {}
+    if args.forward_env:
+        env.update((k, v) for k, v in os.environ.items()
+                   if k not in ("PROCEDURE", "INSTANCE_ID", "_") and not k.startswith("BASH_FUNC_"))
+    for item in args.env:
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise SystemExit(f"--env expects KEY=VALUE, got {item!r}")
+        env[key] = value
+    body = {"procedure": args.procedure, "instance_id": args.id, "env": env}
+    if args.debug:
+        body["debug"] = {"wait": True}
+    req = urllib.request.Request(f"{args.url}/procedures", data=json.dumps(body).encode(),
+                                 headers={"Content-Type": "application/json"}, method="POST")
+    with urllib.request.urlopen(req, timeout=10) as resp:
+        run = json.loads(resp.read())
+    print(json.dumps(run, indent=2))
+    if not args.wait:
+        return 0
+    while run["state"] in ("queued", "running"):
+        url = f"{args.url}/procedures/{run['instance_id']}?wait=30"
+        with urllib.request.urlopen(url, timeout=60) as resp:
+            run = json.loads(resp.read())
+    print(json.dumps(run, indent=2))
+    return 0 if run["state"] == "finished" else 1
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    s = sub.add_parser("serve", help="run the pool and its HTTP API")
+    s.add_argument("--backend", choices=("local", "docker"), default="local")
+    s.add_argument("--size", type=int, default=2, help="number of warm workers")
+    s.add_argument("--max-idle", type=float, default=600.0,
+                   help="recycle idle workers after this many seconds")
+    s.add_argument("--workdir", default=".", help="folder holding the procedures")
+    s.add_argument("--image", default="fop-runner", help="image for the docker backend")
+    s.add_argument("--debug-port-base", type=int, default=5678,
+                   help="worker slot N listens on base+N")
+    s.add_argument("--host", default="127.0.0.1")
+    s.add_argument("--port", type=int, default=RUNNER_PORT)
+
+    c = sub.add_parser("submit", help="hand a procedure to a running pool")
+    c.add_argument("procedure", help="script path (relative to the workdir) or module:function")
+    c.add_argument("--id", default=None, help="instance id (default: new uuid)")
+    c.add_argument("--debug", action="store_true",
+                   help="start debugpy in the worker and wait for the IDE")
+    c.add_argument("--wait", action="store_true", help="block until the procedure ends")
+    c.add_argument("-e", "--env", action="append", default=[], metavar="KEY=VALUE",
+                   help="environment variable for the procedure (repeatable)")
+    c.add_argument("--forward-env", action="store_true",
+                   help="pass this shell's environment to the procedure "
+                        "(except PROCEDURE / INSTANCE_ID)")
+    c.add_argument("--url", default=RUNNER_URL)
+
+    args = ap.parse_args()
+    if args.cmd == "serve":
+        _serve(args)
+        return 0
+    return _submit(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,6 +11,7 @@ Examples:
   start_fop.sh tools/myfop.py --no-build
   start_fop.sh --id 123e4567-e89b-12d3-a456-426614174000 mypkg.worker:main --background --external-port 0 --no-build
   start_fop.sh mypkg.worker:main --external-port 5679
+  start_fop.sh --pool fop.py
 
 Flags:
   --external-port N
@@ -19,6 +20,12 @@ Flags:
       (omit) -> do not expose the debug port
   --background | --blocking
       Run detached (background) or attached (blocking). Default: blocking.
+  --pool
+      Hand the procedure to a running warm worker pool (runner.py serve, or the compose
+      "runner" service) at $FOP_RUNNER_URL (default http://127.0.0.1:8700) instead of
+      building and starting a container. The current env vars are forwarded as for a
+      container; --external-port 0 starts debugpy on the worker slot's port (reported by the
+      pool). docker compose options and a fixed --external-port N are rejected.
 
 Notes:
   - Internal debug port defaults to 5678. Override by exporting DEBUGPY_PORT, e.g.:
@@ -35,6 +42,7 @@ EXTRA_ARGS=()
 ENV_ARGS=()
 BACKGROUND=false              # default attached
 EXTERNAL_PORT_SPEC=""         # "", "0", or a positive integer
+USE_POOL=false
 DEBUGPY_PORT_DEFAULT=5678
 
 # Args handling
@@ -49,6 +57,8 @@ while [[ $# -gt 0 ]]; do
       BACKGROUND=true; shift ;;
     --blocking)
       BACKGROUND=false; shift ;;
+    --pool)
+      USE_POOL=true; shift ;;
     --external-port)
       [[ $# -ge 2 ]] || { echo "Error: --external-port requires a value" >&2; exit 1; }
       EXTERNAL_PORT_SPEC="$2"; shift 2 ;;
@@ -91,6 +101,22 @@ PY
   fi
 fi
 
+# ---- warm pool: no build, no container start ----
+if $USE_POOL; then
+  if [[ ${#EXTRA_ARGS[@]} -gt 0 ]]; then
+    echo "Error: docker compose options cannot be used with --pool: ${EXTRA_ARGS[*]}" >&2
+    exit 1
+  fi
+  if [[ -n "${EXTERNAL_PORT_SPEC}" && "${EXTERNAL_PORT_SPEC}" != "0" ]]; then
+    echo "Error: --pool workers listen on the pool's debug port of their slot; use --external-port 0" >&2
+    exit 1
+  fi
+  SUBMIT_ARGS=(submit "${PROCEDURE}" --id "${INSTANCE_ID}" --forward-env)
+  $BACKGROUND || SUBMIT_ARGS+=(--wait)
+  [[ -n "${EXTERNAL_PORT_SPEC}" ]] && SUBMIT_ARGS+=(--debug)
+  exec python3 "$(dirname "$0")/runner.py" "${SUBMIT_ARGS[@]}"
+fi
+
 CONTAINER_NAME="fop-runner-${INSTANCE_ID}"
 
 # ---- pass-through env (exclude PROCEDURE / INSTANCE_ID) ----
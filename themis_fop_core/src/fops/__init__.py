@@ -1,10 +1,163 @@
-from .internal.retry import retry_decorator
-from .internal.sinks import send_trace_data_http, send_trace_data_local
-from .internal.trace import attempt_var, corr_id_var, safe_repr, trace
-from .lang.prompt import Prompt
-from .lang.send import Send
-from .lang.verify_tm import VerifyTM
-from .integrations.vscode.prompt_client import ask_vscode
+"""
+Names are imported on first access (`fops.Send`, `from fops import Send`), so `import fops`
+stays cheap for tools and procedures that only use part of the package. User primitives
+declared to the registry (fops.internal.registry) are reachable the same way.
+"""
+import os
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
+
+# public name -> (module, attribute)
+_LAZY: dict[str, tuple[str, str]] = {
+    "CollectorServer": (".internal.collector", "CollectorServer"),
+    "TraceStore": (".internal.collector", "TraceStore"),
+    "serve_collector": (".internal.collector", "serve_collector"),
+    "VerificationFailed": (".internal.conditions", "VerificationFailed"),
+    "averify": (".internal.conditions", "averify"),
+    "compile_conditions": (".internal.conditions", "compile_conditions"),
+    "set_tm_source": (".internal.conditions", "set_tm_source"),
+    "verify": (".internal.conditions", "verify"),
+    "Journal": (".internal.journal", "Journal"),
+    "checkpoint": (".internal.journal", "checkpoint"),
+    "open_journal": (".internal.journal", "open_journal"),
+    "read_journal": (".internal.journal", "read_journal"),
+    "MetricsRegistry": (".internal.metrics", "MetricsRegistry"),
+    "dump_metrics": (".internal.metrics", "dump_metrics"),
+    "metrics": (".internal.metrics", "metrics"),
+    "serve_metrics": (".internal.metrics", "serve_metrics"),
+    "load_preflight_cache": (".internal.preflight", "load_preflight_cache"),
+    "preflight": (".internal.preflight", "preflight"),
+    "Profiler": (".internal.profiler", "Profiler"),
+    "profile": (".internal.profiler", "profile"),
+    "TraceLevel": (".internal.policy", "Level"),
+    "TracePolicy": (".internal.policy", "TracePolicy"),
+    "trace_policy": (".internal.policy", "policy"),
+    "primitive": (".internal.registry", "primitive"),
+    "registry": (".internal.registry", "registry"),
+    "CircuitOpen": (".internal.retry", "CircuitOpen"),
+    "get_breaker": (".internal.retry", "get_breaker"),
+    "is_transient": (".internal.retry", "is_transient"),
+    "register_transient": (".internal.retry", "register_transient"),
+    "retry_decorator": (".internal.retry", "retry_decorator"),
+    "FlightRecorder": (".internal.sinks", "FlightRecorder"),
+    "OverflowPolicy": (".internal.sinks", "OverflowPolicy"),
+    "QueuedSink": (".internal.sinks", "QueuedSink"),
+    "TeeSink": (".internal.sinks", "TeeSink"),
+    "close_sinks": (".internal.sinks", "close_sinks"),
+    "flush_sinks": (".internal.sinks", "flush_sinks"),
+    "make_async_http_sink": (".internal.sinks", "make_async_http_sink"),
+    "make_async_local_sink": (".internal.sinks", "make_async_local_sink"),
+    "send_trace_data_http": (".internal.sinks", "send_trace_data_http"),
+    "send_trace_data_local": (".internal.sinks", "send_trace_data_local"),
+    "EventHub": (".internal.stream", "EventHub"),
+    "StreamOverflow": (".internal.stream", "StreamOverflow"),
+    "StreamServer": (".internal.stream", "StreamServer"),
+    "publish": (".internal.stream", "publish"),
+    "start_stream": (".internal.stream", "start_stream"),
+    "attempt_var": (".internal.trace", "attempt_var"),
+    "corr_id_var": (".internal.trace", "corr_id_var"),
+    "safe_repr": (".internal.trace", "safe_repr"),
+    "step_var": (".internal.trace", "step_var"),
+    "trace": (".internal.trace", "trace"),
+    "gather": (".lang.aio", "gather"),
+    "run": (".lang.aio", "run"),
+    "JoinPolicy": (".lang.parallel", "JoinPolicy"),
+    "Parallel": (".lang.parallel", "Parallel"),
+    "Step": (".lang.parallel", "Step"),
+    "StepCancelled": (".lang.parallel", "StepCancelled"),
+    "StepGroup": (".lang.parallel", "StepGroup"),
+    "step_group": (".lang.parallel", "step_group"),
+    "PendingSend": (".lang.pipeline", "PendingSend"),
+    "Pipeline": (".lang.pipeline", "Pipeline"),
+    "pipeline": (".lang.pipeline", "pipeline"),
+    "Prompt": (".lang.prompt", "Prompt"),
+    "PromptAsync": (".lang.prompt", "PromptAsync"),
+    "Send": (".lang.send", "Send"),
+    "SendAsync": (".lang.send", "SendAsync"),
+    "VerifyTM": (".lang.verify_tm", "VerifyTM"),
+    "VerifyTMAsync": (".lang.verify_tm", "VerifyTMAsync"),
+    "aask_vscode": (".integrations.vscode.prompt_client", "aask_vscode"),
+    "ask_vscode": (".integrations.vscode.prompt_client", "ask_vscode"),
+}
+
+_SUBPACKAGES = ("driver", "internal", "lang", "integrations")
+
+def __getattr__(name: str) -> Any:
+    target = _LAZY.get(name)
+    if target is not None:
+        value = getattr(import_module(target[0], __name__), target[1])
+    elif name in _SUBPACKAGES:
+        value = import_module(f".{name}", __name__)
+    elif not name.startswith("_") and name in (
+        registry := import_module(".internal.registry", __name__).registry
+    ):
+        value = registry.get(name)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+def __dir__() -> list[str]:
+    return sorted({*globals(), *_LAZY, *_SUBPACKAGES})
+
+# modules configured from the environment act at import (start a server, load a cache, ...):
+# import them now when configured, as an eager `import fops` did
+for _env, _module in (
+    ("FOPS_PREFLIGHT_CACHE", ".internal.preflight"),
+    ("FOPS_PROFILE", ".internal.profiler"),
+    ("FOPS_STREAM", ".internal.stream"),
+    ("FOPS_METRICS", ".internal.metrics"),
+    ("FOPS_METRICS_DUMP", ".internal.metrics"),
+    ("FOPS_TRACE_POLICY", ".internal.policy"),
+    ("FOPS_TRACE_CONTROL", ".internal.policy"),
+):
+    if os.environ.get(_env):
+        import_module(_module, __name__)
+del _env, _module
+
+if TYPE_CHECKING:
+    from .internal.collector import CollectorServer, TraceStore, serve_collector
+    from .internal.conditions import (
+        VerificationFailed,
+        averify,
+        compile_conditions,
+        set_tm_source,
+        verify,
+    )
+    from .internal.journal import Journal, checkpoint, open_journal, read_journal
+    from .internal.metrics import MetricsRegistry, dump_metrics, metrics, serve_metrics
+    from .internal.preflight import load_preflight_cache, preflight
+    from .internal.profiler import Profiler, profile
+    from .internal.policy import Level as TraceLevel, TracePolicy, policy as trace_policy
+    from .internal.registry import primitive, registry
+    from .internal.retry import (
+        CircuitOpen,
+        get_breaker,
+        is_transient,
+        register_transient,
+        retry_decorator,
+    )
+    from .internal.sinks import (
+        FlightRecorder,
+        OverflowPolicy,
+        QueuedSink,
+        TeeSink,
+        close_sinks,
+        flush_sinks,
+        make_async_http_sink,
+        make_async_local_sink,
+        send_trace_data_http,
+        send_trace_data_local,
+    )
+    from .internal.stream import EventHub, StreamOverflow, StreamServer, publish, start_stream
+    from .internal.trace import attempt_var, corr_id_var, safe_repr, step_var, trace
+    from .lang.aio import gather, run
+    from .lang.parallel import JoinPolicy, Parallel, Step, StepCancelled, StepGroup, step_group
+    from .lang.pipeline import PendingSend, Pipeline, pipeline
+    from .lang.prompt import Prompt, PromptAsync
+    from .lang.send import Send, SendAsync
+    from .lang.verify_tm import VerifyTM, VerifyTMAsync
+    from .integrations.vscode.prompt_client import aask_vscode, ask_vscode
 
 __all__ = [
     # traces
@@ -12,18 +165,60 @@ __all__ = [
     "safe_repr",
     "corr_id_var",
     "attempt_var",
+    "step_var",
 
     # sinks
     "send_trace_data_local",
     "send_trace_data_http",
+    "QueuedSink", "OverflowPolicy",
+    "make_async_local_sink", "make_async_http_sink",
+    "flush_sinks", "close_sinks",
+    "FlightRecorder", "TeeSink",
+
+    # live event stream
+    "start_stream", "publish", "EventHub", "StreamServer", "StreamOverflow",
+
+    # trace collector
+    "serve_collector", "TraceStore", "CollectorServer",
+
+    # metrics
+    "metrics", "MetricsRegistry", "serve_metrics", "dump_metrics",
+
+    # profiler
+    "profile", "Profiler",
+
+    # tracing policy
+    "trace_policy", "TracePolicy", "TraceLevel",
+
+    # conditions
+    "compile_conditions", "verify", "averify", "set_tm_source", "VerificationFailed",
+
+    # preflight
+    "preflight", "load_preflight_cache",
 
     # retry
-    "retry_decorator",
+    "retry_decorator", "is_transient", "register_transient", "CircuitOpen", "get_breaker",
+
+    # checkpoint journal
+    "Journal", "checkpoint", "open_journal", "read_journal",
+
+    # primitive registry
+    "primitive", "registry",
 
     # Integrations
-    "ask_vscode",
-    
+    "ask_vscode", "aask_vscode",
+
     # Lang
-    "Send", "VerifyTM", "Prompt"
+    "Send", "VerifyTM", "Prompt",
+    "SendAsync", "VerifyTMAsync", "PromptAsync",
+
+    # Async scheduler
+    "run", "gather",
+
+    # Pipelined dispatch
+    "pipeline", "Pipeline", "PendingSend",
+
+    # Parallel steps
+    "Parallel", "Step", "step_group", "StepGroup", "JoinPolicy", "StepCancelled",
 
 ]
@@ -0,0 +1,137 @@
+import threading
+from typing import Optional
+
+import typer
+
+from .driver import DEFAULT_SEGMENT, TM_SHM_PATH, MeteredDriver, TMFeedPublisher, create_backend
+from .internal.collector import COLLECTOR_ADDRESS, COLLECTOR_DIR, SEGMENT_SECONDS, serve_collector
+from .internal.preflight import preflight as run_preflight
+from .internal.preflight import write_cache
+from .internal.registry import registry
+
+app = typer.Typer(help="Themis FOP tools.", no_args_is_help=True)
+
+@app.callback()
+def main() -> None:
+    """Themis FOP tools."""
+
+@app.command()
+def preflight(
+    paths: list[str] = typer.Argument(..., help="FOP files or directories."),
+    cache: Optional[str] = typer.Option(
+        None, "--cache", "-o", help="Write the call-site cache (load it with FOPS_PREFLIGHT_CACHE)."
+    ),
+    jobs: Optional[int] = typer.Option(
+        None, "--jobs", "-j", help="Worker processes (default: CPUs)."
+    ),
+    quiet: bool = typer.Option(False, "--quiet", "-q", help="Only print errors and the summary."),
+) -> None:
+    """Validate the primitive calls of FOPs ahead of time (modifiers, conditions)."""
+    reports = run_preflight(paths, jobs=jobs)
+    for r in reports:
+        for issue in r.issues:
+            if not (quiet and issue.severity != "error"):
+                typer.echo(str(issue))
+    errors = sum(r.errors for r in reports)
+    warnings = sum(len(r.issues) for r in reports) - errors
+    calls = sum(r.calls for r in reports)
+    cached = sum(r.cached for r in reports)
+    typer.echo(f"{len(reports)} file(s), {calls} primitive call(s), {cached} resolved statically, "
+               f"{errors} error(s), {warnings} warning(s)")
+    if cache:
+        typer.echo(f"wrote {write_cache(reports, cache)} call site(s) to {cache}")
+    raise typer.Exit(1 if errors else 0)
+
+@app.command()
+def collect(
+    directory: str = typer.Option(
+        COLLECTOR_DIR, "--dir", "-d", help="Directory of the segment files."
+    ),
+    address: str = typer.Option(
+        COLLECTOR_ADDRESS, "--address", "-a", help="[host:]port to listen on."
+    ),
+    segment: int = typer.Option(
+        SEGMENT_SECONDS, "--segment", help="Seconds of traces per segment file."
+    ),
+) -> None:
+    """Run the trace collector: store the trace batches of procedures, serve queries on them."""
+    server = serve_collector(address, directory, segment_seconds=segment)
+    host, port = server.address
+    stats = server.store.stats()
+    typer.echo(f"collecting into {directory} ({stats['events']} events stored) "
+               f"on http://{host}:{port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+@app.command("tm-feed")
+def tm_feed(
+    params: Optional[list[str]] = typer.Argument(None, help="TM parameters to publish."),
+    params_file: Optional[str] = typer.Option(
+        None, "--params-file", "-f", help="File with one parameter per line."
+    ),
+    segment: str = typer.Option(
+        TM_SHM_PATH or DEFAULT_SEGMENT, "--segment", "-s",
+        help="Shared segment (FOPS_TM_SHM of the procedures).",
+    ),
+    depth: int = typer.Option(256, "--depth", help="Recent samples kept per parameter."),
+    poll: float = typer.Option(
+        0.1, "--poll", help="Seconds between reads when the driver cannot push."
+    ),
+) -> None:
+    """Publish telemetry to the procedures of this host through a shared-memory segment."""
+    names = list(params or [])
+    if params_file:
+        with open(params_file, encoding="utf-8") as f:
+            names += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    if not names:
+        raise typer.BadParameter("no TM parameters to publish")
+    driver = MeteredDriver(create_backend())
+    publisher = TMFeedPublisher(driver, names, path=segment, capacity=max(len(names), 64),
+                                depth=depth, poll=poll)
+    publisher.start()
+    stats = publisher.stats()
+    typer.echo(f"publishing {stats['params']} parameter(s) ({stats['polled']} polled) "
+               f"into {segment} ({stats['bytes'] / 2 ** 20:.1f} MiB)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        publisher.close()
+        driver.close()
+
+@app.command()
+def primitives(
+    refresh: bool = typer.Option(
+        False, "--refresh", "-r", help="Discover again, ignoring the registry cache."
+    ),
+    check: bool = typer.Option(
+        False, "--check", help="Import every primitive to check that it resolves."
+    ),
+) -> None:
+    """
+    List the primitives: built-in ones and those of user libraries (entry points,
+    FOPS_PRIMITIVES).
+    """
+    entries = registry.refresh() if refresh else registry.entries()
+    failed = 0
+    for name, entry in sorted(entries.items()):
+        line = f"{name:<24} {entry.target:<40} {entry.source}"
+        if check:
+            try:
+                registry.get(name)
+            except Exception as e:
+                failed += 1
+                line += f"  ERROR {e!r}"
+        typer.echo(line)
+    cache = "off" if registry.cache_path in ("", "0") else registry.cache_path
+    cached = " (cached)" if registry.from_cache else ""
+    typer.echo(f"{len(entries)} primitive(s){cached}; cache: {cache}")
+    raise typer.Exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    app()
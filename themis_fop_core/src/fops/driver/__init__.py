@@ -0,0 +1,71 @@
+import importlib
+import os
+import threading
+from typing import Optional
+
+from fops.internal.metrics import metrics
+
+from .base import CommandRejected, Driver, TCRequest, TCResult
+from .cache import DEFAULT_MAX_AGE, TMCache
+from .metered import MeteredDriver
+from .shm import DEFAULT_SEGMENT, TM_SHM_PATH, SharedTMDriver, TMFeedPublisher, TMFeedReader
+from .simulator import SimParam, SimulatorDriver, constant, noise, ramp, sine
+
+# "sim" (default) or "package.module:factory" returning a Driver
+DRIVER_SPEC = os.environ.get("FOPS_DRIVER", "sim")
+# wrap the configured driver in a TMCache ("0" to disable)
+TM_CACHE = os.environ.get("FOPS_TM_CACHE", "1") not in ("0", "false", "no")
+
+_driver: Optional[Driver] = None
+_driver_lock = threading.Lock()   # concurrent steps may ask for the driver together
+
+def create_backend(spec: str = DRIVER_SPEC) -> Driver:
+    """
+    The driver named by `spec` (FOPS_DRIVER syntax), without the metering / feed / cache layers.
+    """
+    if spec == "sim":
+        return SimulatorDriver()
+    module, _, attr = spec.partition(":")
+    if not attr:
+        raise ValueError(f"FOPS_DRIVER must be 'sim' or 'module:factory', got {spec!r}")
+    return getattr(importlib.import_module(module), attr)()
+
+def _create_driver(spec: str) -> Driver:
+    driver: Driver = MeteredDriver(create_backend(spec))
+    if TM_SHM_PATH:
+        driver = SharedTMDriver(driver, TM_SHM_PATH)
+    return TMCache(driver) if TM_CACHE else driver
+
+def get_driver() -> Driver:
+    """Driver used by the Themis Lang primitives (created from FOPS_DRIVER on first use)."""
+    global _driver
+    if _driver is None:
+        with _driver_lock:
+            if _driver is None:
+                _driver = _create_driver(DRIVER_SPEC)
+    return _driver
+
+def set_driver(driver: Optional[Driver]) -> Optional[Driver]:
+    """
+    Install `driver` (None -> recreate from FOPS_DRIVER on next use). Returns the previous one.
+    """
+    global _driver
+    prev, _driver = _driver, driver
+    return prev
+
+def _tm_cache_stats() -> dict[tuple[str, ...], float]:
+    driver = _driver
+    if not isinstance(driver, TMCache):
+        return {}
+    return {(k,): getattr(driver, k) for k in ("hits", "misses", "stale", "evictions", "pushes")}
+
+metrics.gauge("fops_tm_cache_total", "TM cache lookups and updates by result.", ("result",),
+              fn=_tm_cache_stats, kind="counter")
+
+__all__ = [
+    "Driver", "TCRequest", "TCResult", "CommandRejected",
+    "TMCache", "DEFAULT_MAX_AGE", "MeteredDriver",
+    "SimulatorDriver", "SimParam", "constant", "sine", "ramp", "noise",
+    "SharedTMDriver", "TMFeedPublisher", "TMFeedReader", "TM_SHM_PATH", "DEFAULT_SEGMENT",
+    "get_driver", "set_driver", "create_backend",
+]
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from fops.internal.args import ValueFmt
+
+
+class CommandRejected(Exception):
+    def __init__(self, message: str, result: "TCResult"):
+        super().__init__(message)
+        self.result = result
+
+@dataclass(frozen=True)
+class TCRequest:
+    command: str
+    args: Any = None
+    params: dict[str, Any] = field(default_factory=dict)
+
+@dataclass(frozen=True)
+class TCResult:
+    command: str
+    accepted: bool
+    error: Optional[str] = None
+    ack_time: Optional[float] = None   # time.monotonic() of the acknowledgement
+
+class Driver:
+    """
+    Maps Themis Lang concepts onto the target control system.
+    Backends implement the batch methods; single-item helpers are derived from them.
+    The `a*` variants are used by the async primitives; by default they run the blocking
+    method in a worker thread, backends with a native async path override them.
+    """
+
+    name = "base"
+
+    # --- telecommands -------------------------------------------------------------
+    def send_tcs(self, requests: Sequence[TCRequest]) -> list[TCResult]:
+        raise NotImplementedError
+
+    def send_tc(self, command: str, args: Any = None, **params: Any) -> TCResult:
+        return self.send_tcs([TCRequest(command, args, params)])[0]
+
+    async def asend_tcs(self, requests: Sequence[TCRequest]) -> list[TCResult]:
+        import asyncio   # imported by the awaitable API only: `from fops import Send` stays light
+        return await asyncio.to_thread(self.send_tcs, requests)
+
+    async def asend_tc(self, command: str, args: Any = None, **params: Any) -> TCResult:
+        return (await self.asend_tcs([TCRequest(command, args, params)]))[0]
+
+    # --- telemetry ----------------------------------------------------------------
+    def read_tm(self, names: Sequence[str], fmt: ValueFmt = ValueFmt.ENG) -> dict[str, Any]:
+        """Batched read of the current value of every parameter in `names`."""
+        raise NotImplementedError
+
+    async def aread_tm(self, names: Sequence[str], fmt: ValueFmt = ValueFmt.ENG) -> dict[str, Any]:
+        import asyncio
+        return await asyncio.to_thread(self.read_tm, names, fmt)
+
+    def subscribe(
+        self,
+        names: Sequence[str],
+        fmt: ValueFmt,
+        callback: Callable[[str, Any, float], None],
+    ) -> bool:
+        """
+        Ask for `callback(name, value, monotonic_ts)` on every new sample of `names`.
+        Returns False when the backend cannot push updates (the default).
+        """
+        return False
+
+    # --- operator -----------------------------------------------------------------
+    def prompt(self, message: str, options: Sequence[str]) -> str:
+        from fops.integrations.vscode.prompt_client import ask_vscode
+
+        return ask_vscode(message, list(options))
+
+    async def aprompt(self, message: str, options: Sequence[str]) -> str:
+        from fops.integrations.vscode.prompt_client import aask_vscode
+
+        return await aask_vscode(message, list(options))
+
+    def close(self) -> None:
+        pass
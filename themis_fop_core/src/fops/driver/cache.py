@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Mapping, Sequence
+from typing import Any, Optional
+
+from fops.internal.args import ValueFmt
+
+from .base import Driver, TCRequest, TCResult
+
+# seconds a cached TM value is considered fresh unless overridden per parameter
+DEFAULT_MAX_AGE = 0.5
+
+class TMCache(Driver):
+    """
+    Telemetry snapshot cache in front of another driver.
+
+    * Entries are keyed by (parameter, ValueFormat) and served while younger than the
+      parameter's max age (`max_age[name]`, else `default_max_age`).
+    * Misses and stale entries of one read are fetched from the backend in a single batch.
+    * When the backend supports `subscribe`, every fetched parameter is subscribed so new
+      samples are pushed into the cache and reads stay in memory.
+    * At most `maxsize` entries are kept (least recently used evicted first).
+    TCs and prompts pass straight through; other attributes are delegated to the backend.
+    """
+
+    def __init__(
+        self,
+        backend: Driver,
+        *,
+        default_max_age: float = DEFAULT_MAX_AGE,
+        max_age: Optional[Mapping[str, float]] = None,
+        maxsize: int = 10_000,
+        subscribe: bool = True,
+    ):
+        self.backend = backend
+        self.name = f"cached-{backend.name}"
+        self.default_max_age = default_max_age
+        self.max_age: dict[str, float] = dict(max_age or {})
+        self.maxsize = maxsize
+        self.use_subscriptions = subscribe
+
+        self._entries: OrderedDict[tuple[str, ValueFmt], tuple[Any, float]] = OrderedDict()
+        self._subscribed: set[tuple[str, ValueFmt]] = set()  # subscribed at the backend
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self.pushes = 0
+
+    def __getattr__(self, attr: str) -> Any:
+        # only called for attributes not found on the cache (e.g. SimulatorDriver.set_tm)
+        return getattr(self.backend, attr)
+
+    # --- cache --------------------------------------------------------------------
+    def _put(self, key: tuple[str, ValueFmt], value: Any, ts: float) -> None:
+        entries = self._entries
+        entries[key] = (value, ts)
+        entries.move_to_end(key)
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def _on_push(self, fmt: ValueFmt):
+        def push(name: str, value: Any, ts: float) -> None:
+            key = (name, fmt)
+            with self._lock:
+                if key in self._entries:  # evicted entries come back on their next read
+                    self._put(key, value, ts)
+                    self.pushes += 1
+        return push
+
+    def invalidate(self, names: Optional[Sequence[str]] = None) -> None:
+        with self._lock:
+            if names is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k[0] in names]:
+                    del self._entries[key]
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses + self.stale
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "pushes": self.pushes,
+            "entries": len(self._entries),
+            "subscribed": len(self._subscribed),
+        }
+
+    def _lookup(self, names: Sequence[str], fmt: ValueFmt) -> tuple[dict[str, Any], list[str]]:
+        now = time.monotonic()
+        out: dict[str, Any] = {}
+        missing: list[str] = []
+        with self._lock:
+            entries = self._entries
+            for name in names:
+                entry = entries.get((name, fmt))
+                if entry is None:
+                    self.misses += 1
+                    missing.append(name)
+                elif now - entry[1] > self.max_age.get(name, self.default_max_age):
+                    self.stale += 1
+                    missing.append(name)
+                else:
+                    self.hits += 1
+                    entries.move_to_end((name, fmt))
+                    out[name] = entry[0]
+        return out, missing
+
+    def _store(self, missing: list[str], fmt: ValueFmt, fetched: Mapping[str, Any]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for name in missing:
+                self._put((name, fmt), fetched[name], now)
+            new_subs = ([n for n in missing if (n, fmt) not in self._subscribed]
+                        if self.use_subscriptions else [])
+            self._subscribed.update((n, fmt) for n in new_subs)
+        if new_subs and not self.backend.subscribe(new_subs, fmt, self._on_push(fmt)):
+            self.use_subscriptions = False  # backend cannot push: rely on max age only
+
+    # --- Driver API ---------------------------------------------------------------
+    def read_tm(self, names: Sequence[str], fmt: ValueFmt = ValueFmt.ENG) -> dict[str, Any]:
+        out, missing = self._lookup(names, fmt)
+        if not missing:
+            return out
+        fetched = self.backend.read_tm(missing, fmt)
+        self._store(missing, fmt, fetched)
+        out.update(fetched)
+        return out
+
+    async def aread_tm(self, names: Sequence[str], fmt: ValueFmt = ValueFmt.ENG) -> dict[str, Any]:
+        # hits are served without leaving the event loop
+        out, missing = self._lookup(names, fmt)
+        if not missing:
+            return out
+        fetched = await self.backend.aread_tm(missing, fmt)
+        self._store(missing, fmt, fetched)
+        out.update(fetched)
+        return out
+
+    def send_tcs(self, requests: Sequence[TCRequest]) -> list[TCResult]:
+        return self.backend.send_tcs(requests)
+
+    async def asend_tcs(self, requests: Sequence[TCRequest]) -> list[TCResult]:
+        return await self.backend.asend_tcs(requests)
+
+    def subscribe(self, names: Sequence[str], fmt: ValueFmt,
+                  callback: Callable[[str, Any, float], None]) -> bool:
+        return self.backend.subscribe(names, fmt, callback)
+
+    def prompt(self, message: str, options: Sequence[str]) -> str:
+        return self.backend.prompt(message, options)
+
+    async def aprompt(self, message: str, options: Sequence[str]) -> str:
+        return await self.backend.aprompt(message, options)
+
+    def close(self) -> None:
+        self.backend.close()
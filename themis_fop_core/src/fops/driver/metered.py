@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import time
+from collections.abc import Callable, Sequence
+from typing import Any
+
+from fops.internal.args import ValueFmt
+from fops.internal.metrics import DRIVER_SECONDS, metrics
+from fops.internal.profiler import span
+
+from .base import Driver, TCRequest, TCResult
+
+TC_REJECTED = metrics.counter("fops_tc_rejected_total", "Telecommands rejected by the driver.")
+
+class MeteredDriver(Driver):
+    """
+    Times every call into another driver (`fops_driver_seconds{op}`, and the tc / tm / prompt
+    time of the profiler) and counts rejected TCs. Placed under the TMCache, so TM reads served
+    from the cache are not counted.
+    Other attributes are delegated to the backend.
+    """
+
+    def __init__(self, backend: Driver):
+        self.backend = backend
+        self.name = backend.name
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.backend, attr)
+
+    def send_tcs(self, requests: Sequence[TCRequest]) -> list[TCResult]:
+        t0 = time.perf_counter()
+        try:
+            with span("tc"):
+                results = self.backend.send_tcs(requests)
+        finally:
+            DRIVER_SECONDS.observe(time.perf_counter() - t0, "send_tcs")
+        self._count_rejected(results)
+        return results
+
+    async def asend_tcs(self, requests: Sequence[TCRequest]) -> list[TCResult]:
+        t0 = time.perf_counter()
+        try:
+            with span("tc"):
+                results = await self.backend.asend_tcs(requests)
+        finally:
+            DRIVER_SECONDS.observe(time.perf_counter() - t0, "send_tcs")
+        self._count_rejected(results)
+        return results
+
+    def read_tm(self, names: Sequence[str], fmt: ValueFmt = ValueFmt.ENG) -> dict[str, Any]:
+        t0 = time.perf_counter()
+        try:
+            with span("tm"):
+                return self.backend.read_tm(names, fmt)
+        finally:
+            DRIVER_SECONDS.observe(time.perf_counter() - t0, "read_tm")
+
+    async def aread_tm(self, names: Sequence[str], fmt: ValueFmt = ValueFmt.ENG) -> dict[str, Any]:
+        t0 = time.perf_counter()
+        try:
+            with span("tm"):
+                return await self.backend.aread_tm(names, fmt)
+        finally:
+            DRIVER_SECONDS.observe(time.perf_counter() - t0, "read_tm")
+
+    def subscribe(self, names: Sequence[str], fmt: ValueFmt,
+                  callback: Callable[[str, Any, float], None]) -> bool:
+        return self.backend.subscribe(names, fmt, callback)
+
+    def prompt(self, message: str, options: Sequence[str]) -> str:
+        with span("prompt"):
+            return self.backend.prompt(message, options)
+
+    async def aprompt(self, message: str, options: Sequence[str]) -> str:
+        with span("prompt"):
+            return await self.backend.aprompt(message, options)
+
+    def close(self) -> None:
+        self.backend.close()
+
+    @staticmethod
+    def _count_rejected(results: Sequence[TCResult]) -> None:
+        for r in results:   # nothing counted (or allocated) while every TC is accepted
+            if not r.accepted:
+                TC_REJECTED.inc(n=sum(1 for r in results if not r.accepted))
+                return
@@ -0,0 +1,709 @@
+"""
+Host-local shared-memory telemetry feed.
+
+One publisher (`fops tm-feed`, or `TMFeedPublisher`) reads the telemetry of the configured
+parameters from the real driver once, and writes their current ENG / RAW values and last
+`depth` samples into a memory-mapped segment (FOPS_TM_SHM, e.g. /dev/shm/fops-tm). Every
+procedure on the host reads it through `SharedTMDriver`: a lookup is a few loads from the
+mapping, with no connection, decoding or lock, so adding procedures costs the publisher nothing.
+
+Layout (native 8-byte words):
+    header   magic, version, capacity, depth, count, generation, heartbeat, -
+    names    capacity x 64 bytes: parameter name of each slot (UTF-8, NUL padded)
+    slots    capacity x (16 + 3 * depth) words: seq, samples, ts, eng, raw, kinds,
+             eng text (4 words), raw text (4 words), -, -, then a ring of `depth` (ts, eng, raw)
+Each slot is a seqlock: the publisher makes `seq` odd, writes, and makes it even again; readers
+retry while `seq` is odd or changed during their copy. The publisher is the only writer, so
+readers take no lock and never block it.
+
+Values are floats, ints, bools or text of up to 32 bytes (the ring keeps them as floats, NaN
+for text). Other values, parameters the feed does not publish, polled parameters whose last
+read failed (their slot is cleared until the next sample), and every parameter once the
+publisher stopped (no heartbeat for FOPS_TM_SHM_STALE seconds) are read from the procedure's
+own driver.
+"""
+from __future__ import annotations
+
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections.abc import Callable, Iterable, Sequence
+from numbers import Integral, Real
+from typing import Any, Optional
+
+from fops.internal.args import ValueFmt
+
+from .base import Driver, TCRequest, TCResult
+
+# segment of the shared telemetry feed, written by `fops tm-feed` (unset: every procedure reads
+# its telemetry from its own driver)
+TM_SHM_PATH = os.environ.get("FOPS_TM_SHM", "")
+# seconds without a publisher heartbeat before readers fall back to their own driver
+TM_SHM_STALE = float(os.environ.get("FOPS_TM_SHM_STALE", "2"))
+
+DEFAULT_SEGMENT = os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(),
+                               "fops-tm")
+
+_MAGIC = int.from_bytes(b"FOPSTM\x00\x01", "little")
+_VERSION = 1
+_HEADER_WORDS = 8
+_NAME_BYTES = 64
+_TEXT_BYTES = 32
+_SLOT_HEAD = 16
+_H_MAGIC, _H_VERSION, _H_CAPACITY, _H_DEPTH, _H_COUNT, _H_GENERATION, _H_HEARTBEAT = range(7)
+_S_SEQ, _S_SAMPLES, _S_TS, _S_ENG, _S_RAW, _S_KINDS = range(6)
+_S_ENG_TEXT, _S_RAW_TEXT = 6, 10
+# kinds of the current values
+_NONE, _FLOAT, _INT, _BOOL, _TEXT, _OTHER = range(6)
+
+_HEARTBEAT = 0.25      # seconds between publisher heartbeats
+_REPORT_EVERY = 10.0   # seconds between reports of polls that keep failing
+_WATCH_POLL = 0.02     # seconds between checks of the watched slots (reader pushes)
+_SPINS = 64            # seqlock retries before a reader yields the CPU (publisher preempted)
+_READ_TIMEOUT = 0.1    # seconds of retries before a read gives up (falls back to the driver)
+_MISSING = object()
+
+class _Segment:
+    """Mapping of a segment, with word views on it (no copies)."""
+
+    def __init__(self, mm: mmap.mmap, capacity: int, depth: int):
+        self.mm = mm
+        self.buf = memoryview(mm)
+        self.q = self.buf.cast("Q")
+        self.i = self.buf.cast("q")
+        self.d = self.buf.cast("d")
+        self.capacity = capacity
+        self.depth = depth
+        self.slot_words = _SLOT_HEAD + 3 * depth
+        self.slots_at = _HEADER_WORDS + capacity * _NAME_BYTES // 8
+        self.slots: dict[str, int] = {}   # name -> slot, as far as a reader loaded the names
+        self.count = 0
+
+    @staticmethod
+    def size(capacity: int, depth: int) -> int:
+        slots = capacity * (_SLOT_HEAD + 3 * depth)
+        return 8 * (_HEADER_WORDS + capacity * _NAME_BYTES // 8 + slots)
+
+    def base(self, slot: int) -> int:
+        return self.slots_at + slot * self.slot_words
+
+    def name(self, slot: int) -> str:
+        at = _HEADER_WORDS * 8 + slot * _NAME_BYTES
+        return bytes(self.buf[at:at + _NAME_BYTES]).rstrip(b"\0").decode()
+
+    def load_names(self) -> None:
+        count = self.q[_H_COUNT]
+        for slot in range(self.count, count):
+            self.slots[self.name(slot)] = slot
+        self.count = count
+
+    def close(self) -> None:
+        for view in (self.q, self.i, self.d, self.buf):
+            view.release()
+        self.mm.close()
+
+def _encode(value: Any) -> tuple[int, Any, float, bytes]:
+    """(kind, word value, ring value, text) of a TM value."""
+    if isinstance(value, bool):
+        return _BOOL, int(value), float(value), b""
+    if isinstance(value, float):
+        return _FLOAT, value, value, b""
+    if isinstance(value, Integral):
+        v = int(value)
+        if -2 ** 63 <= v < 2 ** 63:
+            return _INT, v, float(v), b""
+        return _OTHER, 0, float(v), b""
+    if isinstance(value, Real):
+        return _FLOAT, float(value), float(value), b""
+    if isinstance(value, str):
+        data = value.encode()
+        if len(data) <= _TEXT_BYTES:
+            return _TEXT, 0, math.nan, data
+    return _OTHER, 0, math.nan, b""
+
+# seq, samples, ts, eng, raw, kinds: the head of a slot, read in one go
+_HEAD = struct.Struct("=QQdddQ")
+_ENG_COLUMNS = (_S_ENG, _S_ENG_TEXT, 0, 1)
+_RAW_COLUMNS = (_S_RAW, _S_RAW_TEXT, 8, 2)
+
+def _columns(fmt: ValueFmt) -> tuple[int, int, int, int]:
+    """(value word, text word, kinds shift, ring column) of a format."""
+    return _RAW_COLUMNS if fmt is ValueFmt.RAW else _ENG_COLUMNS
+
+class _Retry:
+    """Seqlock retries of one read: spin, then yield the CPU, then give up."""
+
+    __slots__ = ("spins", "since")
+
+    def __init__(self) -> None:
+        self.spins = 0
+        self.since = 0.0
+
+    def again(self) -> bool:
+        self.spins += 1
+        if self.spins < _SPINS:
+            return True
+        if self.spins == _SPINS:
+            self.since = time.monotonic()
+        elif time.monotonic() - self.since > _READ_TIMEOUT:
+            return False
+        time.sleep(0)
+        return True
+
+# -----------------------------------------------------------------------------
+# Publisher
+# -----------------------------------------------------------------------------
+class TMFeedPublisher:
+    """
+    Writes the telemetry of `names` read from `driver` into the segment at `path`.
+    Samples are pushed by the driver when it supports `subscribe`, otherwise read every `poll`
+    seconds. `add()` publishes more parameters while running.
+    """
+
+    def __init__(
+        self,
+        driver: Driver,
+        names: Iterable[str] = (),
+        *,
+        path: Optional[str] = None,
+        capacity: int = 4096,
+        depth: int = 256,
+        poll: float = 0.1,
+    ):
+        self.driver = driver
+        self.path = path or TM_SHM_PATH or DEFAULT_SEGMENT
+        self.capacity = capacity
+        self.depth = max(1, depth)
+        self.poll = poll
+        self.samples = 0
+        self.failures = 0   # polls that failed (their parameters were cleared)
+        self._pending = list(dict.fromkeys(names))
+        self._slots: dict[str, int] = {}
+        self._polled: list[str] = []   # parameters the driver does not push
+        self._seg: Optional[_Segment] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "TMFeedPublisher":
+        size = _Segment.size(self.capacity, self.depth)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w+b") as f:
+            f.truncate(size)
+            mm = mmap.mmap(f.fileno(), size)
+        seg = _Segment(mm, self.capacity, self.depth)
+        q = seg.q
+        q[_H_VERSION] = _VERSION
+        q[_H_CAPACITY] = self.capacity
+        q[_H_DEPTH] = self.depth
+        q[_H_GENERATION] = time.time_ns()
+        seg.d[_H_HEARTBEAT] = time.monotonic()
+        q[_H_MAGIC] = _MAGIC
+        # readers of a previous segment keep their (stale) mapping and re-open this one
+        os.replace(tmp, self.path)
+        self._seg = seg
+        pending, self._pending = self._pending, []
+        self.add(pending)
+        self._thread = threading.Thread(target=self._run, name="fops-tm-feed", daemon=True)
+        self._thread.start()
+        return self
+
+    def add(self, names: Iterable[str]) -> None:
+        new = [n for n in dict.fromkeys(names) if n not in self._slots]
+        if self._seg is None:
+            self._pending.extend(n for n in new if n not in self._pending)
+            return
+        if not new:
+            return
+        seg = self._seg
+        with self._lock:
+            for name in new:
+                data = name.encode()
+                if len(data) >= _NAME_BYTES:
+                    raise ValueError(f"TM parameter name too long for the feed: {name!r}")
+                slot = len(self._slots)
+                if slot >= self.capacity:
+                    raise ValueError(f"TM feed segment full ({self.capacity} parameters)")
+                at = _HEADER_WORDS * 8 + slot * _NAME_BYTES
+                seg.buf[at:at + len(data)] = data
+                self._slots[name] = slot
+            seg.q[_H_COUNT] = len(self._slots)   # names are visible to readers from here on
+        self._read(new)
+        if not all(self.driver.subscribe(new, fmt, self._on_push(fmt)) for fmt in ValueFmt):
+            with self._lock:
+                self._polled.extend(new)
+
+    def _on_push(self, fmt: ValueFmt) -> Callable[[str, Any, float], None]:
+        def push(name: str, value: Any, ts: float) -> None:
+            self.write(name, fmt, value, ts)
+        return push
+
+    def _read(self, names: Sequence[str]) -> None:
+        for fmt in ValueFmt:
+            values = self.driver.read_tm(names, fmt)
+            now = time.monotonic()
+            for name in names:
+                self.write(name, fmt, values[name], now)
+
+    def write(self, name: str, fmt: ValueFmt, value: Any, ts: float) -> None:
+        """Write one sample (the ENG and RAW value of a sample share its timestamp)."""
+        slot = self._slots.get(name)
+        if slot is None:
+            return
+        kind, word, ring_value, text = _encode(value)
+        value_at, text_at, shift, col = _columns(fmt)
+        with self._lock:
+            seg = self._seg
+            if seg is None:
+                return
+            q, d = seg.q, seg.d
+            b = seg.base(slot)
+            seq = q[b]
+            q[b] = seq + 1
+            samples = q[b + _S_SAMPLES]
+            if samples and d[b + _S_TS] == ts:
+                r = b + _SLOT_HEAD + 3 * ((samples - 1) % self.depth)
+            else:
+                r = b + _SLOT_HEAD + 3 * (samples % self.depth)
+                d[r] = ts
+                d[r + 1] = d[r + 2] = math.nan
+                d[b + _S_TS] = ts
+                q[b + _S_SAMPLES] = samples + 1
+            d[r + col] = ring_value
+            if kind in (_INT, _BOOL):
+                seg.i[b + value_at] = word
+            elif kind == _FLOAT:
+                d[b + value_at] = word
+            elif kind == _TEXT:
+                at = (b + text_at) * 8
+                seg.buf[at:at + _TEXT_BYTES] = text.ljust(_TEXT_BYTES, b"\0")
+            kinds = q[b + _S_KINDS] & ~((0xFF << shift) | (0xFF << (16 + shift)))
+            q[b + _S_KINDS] = kinds | (kind << shift) | (len(text) << (16 + shift))
+            q[b] = seq + 2
+            self.samples += 1
+
+    def clear(self, names: Iterable[str]) -> None:
+        """Withdraw the values of `names`: readers use their own driver until the next sample."""
+        with self._lock:
+            seg = self._seg
+            if seg is None:
+                return
+            q = seg.q
+            for name in names:
+                slot = self._slots.get(name)
+                if slot is None:
+                    continue
+                b = seg.base(slot)
+                seq = q[b]
+                q[b] = seq + 1
+                q[b + _S_KINDS] = _NONE
+                q[b] = seq + 2
+
+    def _run(self) -> None:
+        reported, quiet = -math.inf, 0   # last report, failures not reported since
+        while not self._stop.wait(self.poll if self._polled else _HEARTBEAT):
+            polled = list(self._polled)
+            if polled:
+                try:
+                    self._read(polled)
+                except Exception as e:   # keep the heartbeat: readers fall back per parameter
+                    self.clear(polled)
+                    self.failures += 1
+                    now = time.monotonic()
+                    if now - reported < _REPORT_EVERY:
+                        quiet += 1
+                    else:
+                        more = f" ({quiet} more failed polls since the last report)" * bool(quiet)
+                        print(f"TM feed: reading {len(polled)} parameter(s) failed{more}: {e!r}")
+                        reported, quiet = now, 0
+            seg = self._seg
+            if seg is not None:
+                seg.d[_H_HEARTBEAT] = time.monotonic()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "path": self.path,
+            "params": len(self._slots),
+            "polled": len(self._polled),
+            "samples": self.samples,
+            "failures": self.failures,
+            "bytes": _Segment.size(self.capacity, self.depth),
+        }
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(2.0)
+            self._thread = None
+        with self._lock:
+            seg, self._seg = self._seg, None
+        if seg is not None:
+            seg.d[_H_HEARTBEAT] = 0.0   # readers fall back right away
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+            seg.close()
+
+    def __enter__(self) -> "TMFeedPublisher":
+        return self.start() if self._seg is None else self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+# -----------------------------------------------------------------------------
+# Reader
+# -----------------------------------------------------------------------------
+# fallback(name, fmt, callback) -> pushes supported: subscribes a watch the feed cannot serve
+Fallback = Callable[[str, ValueFmt, Callable[[str, Any, float], None]], bool]
+
+class _Watch:
+    """One subscriber of a parameter. Samples not newer than the last pushed one are dropped:
+    the feed and the fallback driver may both deliver, and a new segment replays its ring."""
+
+    __slots__ = ("fmt", "callback", "last", "handed")
+
+    def __init__(self, fmt: ValueFmt, callback: Callable[[str, Any, float], None]):
+        self.fmt = fmt
+        self.callback = callback
+        self.last = time.monotonic()   # only samples taken after subscribing
+        self.handed = False            # subscribed to the fallback driver too
+
+    def push(self, name: str, value: Any, ts: float) -> None:
+        if ts > self.last:
+            self.last = ts
+            self.callback(name, value, ts)
+
+class TMFeedReader:
+    """
+    Lock-free reads of the segment at `path` (mapped on first use, re-mapped when the publisher
+    restarts). Watches are kept by parameter name and re-resolved against every new mapping;
+    those the feed cannot serve (not published, publisher stopped) are handed to `fallback`.
+    """
+
+    def __init__(self, path: Optional[str] = None, *, stale: float = TM_SHM_STALE,
+                 fallback: Optional[Fallback] = None):
+        self.path = path or TM_SHM_PATH or DEFAULT_SEGMENT
+        self.stale = stale
+        self.fallback = fallback
+        self.retries = 0      # seqlock reads repeated because the publisher was writing the slot
+        self._seg: Optional[_Segment] = None
+        self._ino: Optional[int] = None
+        self._checked = -math.inf
+        self._lock = threading.Lock()
+        self._watched: dict[str, list[_Watch]] = {}
+        self._seen: dict[str, int] = {}   # samples of each watched parameter checked in `_seen_seg`
+        self._seen_seg: Optional[_Segment] = None
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # --- segment ------------------------------------------------------------------
+    def _segment(self) -> Optional[_Segment]:
+        seg = self._seg
+        now = time.monotonic()
+        if seg is not None and now - seg.d[_H_HEARTBEAT] <= self.stale:
+            if seg.q[_H_COUNT] != seg.count:
+                seg.load_names()
+            return seg
+        if now - self._checked < 1.0:   # look for a (new) segment at most every second
+            return None
+        with self._lock:
+            self._checked = now
+            try:
+                f = open(self.path, "rb")
+            except OSError:
+                return None
+            with f:
+                st = os.fstat(f.fileno())
+                if seg is not None and st.st_ino == self._ino:
+                    return None   # same segment, publisher stopped
+                if st.st_size < _HEADER_WORDS * 8:
+                    return None
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            q = memoryview(mm).cast("Q")
+            try:
+                valid = q[_H_MAGIC] == _MAGIC and q[_H_VERSION] == _VERSION
+                capacity, depth = q[_H_CAPACITY], q[_H_DEPTH]
+            finally:
+                q.release()
+            if not valid or len(mm) < _Segment.size(capacity, depth):
+                mm.close()
+                return None
+            # the old mapping is left to the garbage collector: other threads may still read it
+            self._seg = seg = _Segment(mm, capacity, depth)
+            self._ino = st.st_ino
+            seg.load_names()
+        return seg if now - seg.d[_H_HEARTBEAT] <= self.stale else None
+
+    def alive(self) -> bool:
+        return self._segment() is not None
+
+    def names(self) -> list[str]:
+        self._segment()
+        seg = self._seg
+        return list(seg.slots) if seg is not None else []
+
+    def serving(self, name: str) -> bool:
+        """Whether the feed is live and has a current value of `name`."""
+        seg = self._segment()
+        slot = seg.slots.get(name) if seg is not None else None
+        return slot is not None and seg.q[seg.base(slot) + _S_KINDS] != _NONE
+
+    # --- reads --------------------------------------------------------------------
+    def _value(self, seg: _Segment, slot: int,
+               columns: tuple[int, int, int, int]) -> tuple[Any, float]:
+        value_at, text_at, shift, _col = columns
+        q, buf = seg.q, seg.buf
+        b = seg.slots_at + slot * seg.slot_words
+        retry = None
+        while True:
+            head = _HEAD.unpack_from(buf, b * 8)
+            seq = head[_S_SEQ]
+            if not seq & 1:
+                kinds = head[_S_KINDS]
+                kind = (kinds >> shift) & 0xFF
+                if kind == _FLOAT:
+                    value: Any = head[value_at]
+                elif kind == _INT:
+                    value = seg.i[b + value_at]
+                elif kind == _BOOL:
+                    value = seg.i[b + value_at] != 0
+                elif kind == _TEXT:
+                    at = (b + text_at) * 8
+                    length = (kinds >> (16 + shift)) & 0xFF
+                    value = bytes(buf[at:at + length]).decode(errors="replace")
+                else:
+                    value = _MISSING
+                if q[b] == seq:
+                    return value, head[_S_TS]
+            self.retries += 1
+            retry = retry or _Retry()
+            if not retry.again():
+                return _MISSING, 0.0
+
+    def read(self, names: Sequence[str],
+             fmt: ValueFmt = ValueFmt.ENG) -> tuple[dict[str, Any], list[str]]:
+        """Values of the published `names`, and the names left to the driver."""
+        seg = self._segment()
+        if seg is None:
+            return {}, list(names)
+        out: dict[str, Any] = {}
+        missing: list[str] = []
+        slots = seg.slots
+        columns = _columns(fmt)
+        for name in names:
+            slot = slots.get(name)
+            value = _MISSING if slot is None else self._value(seg, slot, columns)[0]
+            if value is _MISSING:
+                missing.append(name)
+            else:
+                out[name] = value
+        return out, missing
+
+    def get(self, name: str, fmt: ValueFmt = ValueFmt.ENG) -> Optional[tuple[Any, float]]:
+        """(value, monotonic timestamp) of a published parameter, None when not available."""
+        seg = self._segment()
+        slot = seg.slots.get(name) if seg is not None else None
+        if seg is None or slot is None:
+            return None
+        value, ts = self._value(seg, slot, _columns(fmt))
+        return None if value is _MISSING else (value, ts)
+
+    def _ring(self, seg: _Segment, slot: int, col: int,
+              after: int) -> tuple[int, list[tuple[float, float]]]:
+        # ring samples past the first `after` ones, oldest first
+        q, d = seg.q, seg.d
+        b = seg.base(slot)
+        depth = seg.depth
+        retry = _Retry()
+        while True:
+            seq = q[b]
+            if not seq & 1:
+                count = q[b + _S_SAMPLES]
+                start = max(after if after <= count else 0, count - depth)
+                out = []
+                for k in range(start, count):
+                    r = b + _SLOT_HEAD + 3 * (k % depth)
+                    out.append((d[r], d[r + col]))
+                if q[b] == seq:
+                    return count, out
+            self.retries += 1
+            if not retry.again():
+                return after, []
+
+    def recent(self, name: str, fmt: ValueFmt = ValueFmt.ENG, *, samples: Optional[int] = None,
+               seconds: Optional[float] = None) -> list[tuple[float, float]]:
+        """
+        Last samples of a published parameter as (monotonic timestamp, float value), oldest
+        first.
+        """
+        seg = self._segment()
+        slot = seg.slots.get(name) if seg is not None else None
+        if seg is None or slot is None:
+            return []
+        out = self._ring(seg, slot, _columns(fmt)[3], 0)[1]
+        if seconds is not None:
+            since = time.monotonic() - seconds
+            out = [s for s in out if s[0] >= since]
+        if samples is not None:
+            out = out[-samples:] if samples else []
+        return out
+
+    # --- pushes -------------------------------------------------------------------
+    def watch(self, names: Sequence[str], fmt: ValueFmt,
+              callback: Callable[[str, Any, float], None]) -> list[str]:
+        """
+        Call `callback(name, value, ts)` on every new sample of `names` (checked every 20 ms by
+        one thread per process). Names the feed does not serve now go to the fallback; returns
+        those nothing pushes (no fallback, or it cannot subscribe).
+        """
+        seg = self._segment()
+        rest = []
+        with self._lock:
+            added = []
+            for name in names:
+                w = _Watch(fmt, callback)
+                self._watched.setdefault(name, []).append(w)
+                added.append((name, w))
+            if self._watched and self._watcher is None:
+                self._watcher = threading.Thread(target=self._watch, name="fops-tm-feed-watch",
+                                                 daemon=True)
+                self._watcher.start()
+        for name, w in added:
+            if (seg is None or name not in seg.slots) and not self._handoff(name, w):
+                rest.append(name)
+        return rest
+
+    def _handoff(self, name: str, w: _Watch) -> bool:
+        # subscribe to the fallback once; its samples are dropped while the feed serves the name
+        if w.handed:
+            return True
+        if self.fallback is None:
+            return False
+        w.handed = True
+
+        def gated(n: str, value: Any, ts: float) -> None:
+            if not self.serving(n):
+                w.push(n, value, ts)
+
+        return self.fallback(name, w.fmt, gated)
+
+    def _watch(self) -> None:
+        while not self._stop.wait(_WATCH_POLL):
+            seg = self._segment()
+            with self._lock:
+                watched = [(name, list(ws)) for name, ws in self._watched.items()]
+            if seg is not self._seen_seg:
+                # a new mapping: slots are resolved again, sample counts start over
+                self._seen, self._seen_seg = {}, seg
+            for name, watches in watched:
+                slot = seg.slots.get(name) if seg is not None else None
+                # not published, or cleared after a failed read
+                if slot is None or seg.q[seg.base(slot) + _S_KINDS] == _NONE:
+                    for w in watches:
+                        self._handoff(name, w)
+                    continue
+                seen = self._seen.get(name, 0)
+                count = seg.q[seg.base(slot) + _S_SAMPLES]
+                if count == seen:
+                    continue
+                for w in watches:
+                    columns = _columns(w.fmt)
+                    _count, new = self._ring(seg, slot, columns[3], seen)
+                    # earlier samples from the ring (floats), the newest with its own type
+                    for ts, value in new[:-1]:
+                        if value == value:
+                            w.push(name, value, ts)
+                    value, ts = self._value(seg, slot, columns)
+                    if value is not _MISSING:
+                        w.push(name, value, ts)
+                self._seen[name] = count
+
+    def stats(self) -> dict[str, Any]:
+        seg = self._segment()
+        return {
+            "path": self.path,
+            "alive": seg is not None,
+            "params": len(seg.slots) if seg is not None else 0,
+            "watched": len(self._watched),
+            "retries": self.retries,
+        }
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(1.0)
+            self._watcher = None
+        with self._lock:
+            if self._seg is not None:
+                self._seg.close()
+                self._seg = None
+
+# -----------------------------------------------------------------------------
+# Driver
+# -----------------------------------------------------------------------------
+class SharedTMDriver(Driver):
+    """
+    Telemetry from the host's shared feed in front of another driver.
+
+    Published parameters are read from the segment (and pushed from it to `subscribe`rs); the
+    others, and all of them while the publisher is down, are read from the backend. TCs and
+    prompts pass straight through; other attributes are delegated to the backend.
+    """
+
+    def __init__(self, backend: Driver, path: Optional[str] = None, *, stale: float = TM_SHM_STALE):
+        self.backend = backend
+        self.name = f"shm-{backend.name}"
+        self.feed = TMFeedReader(
+            path, stale=stale,
+            fallback=lambda name, fmt, callback: backend.subscribe([name], fmt, callback),
+        )
+        self.hits = 0
+        self.fallbacks = 0
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.backend, attr)
+
+    def read_tm(self, names: Sequence[str], fmt: ValueFmt = ValueFmt.ENG) -> dict[str, Any]:
+        out, missing = self.feed.read(names, fmt)
+        self.hits += len(out)
+        if missing:
+            self.fallbacks += len(missing)
+            out.update(self.backend.read_tm(missing, fmt))
+        return out
+
+    async def aread_tm(self, names: Sequence[str], fmt: ValueFmt = ValueFmt.ENG) -> dict[str, Any]:
+        out, missing = self.feed.read(names, fmt)
+        self.hits += len(out)
+        if missing:
+            self.fallbacks += len(missing)
+            out.update(await self.backend.aread_tm(missing, fmt))
+        return out
+
+    def subscribe(self, names: Sequence[str], fmt: ValueFmt,
+                  callback: Callable[[str, Any, float], None]) -> bool:
+        # names not published, and all of them while the publisher is down, come from the backend
+        return not self.feed.watch(names, fmt, callback)
+
+    def send_tcs(self, requests: Sequence[TCRequest]) -> list[TCResult]:
+        return self.backend.send_tcs(requests)
+
+    async def asend_tcs(self, requests: Sequence[TCRequest]) -> list[TCResult]:
+        return await self.backend.asend_tcs(requests)
+
+    def prompt(self, message: str, options: Sequence[str]) -> str:
+        return self.backend.prompt(message, options)
+
+    async def aprompt(self, message: str, options: Sequence[str]) -> str:
+        return await self.backend.aprompt(message, options)
+
+    def stats(self) -> dict[str, Any]:
+        return {**self.feed.stats(), "hits": self.hits, "fallbacks": self.fallbacks}
+
+    def close(self) -> None:
+        self.feed.close()
+        self.backend.close()
@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import heapq
+import math
+import random
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterable, Sequence
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from fops.internal.args import ValueFmt
+
+from .base import Driver, TCRequest, TCResult
+
+
+# -----------------------------------------------------------------------------
+# Telemetry generators: t (seconds since start) -> engineering value
+# -----------------------------------------------------------------------------
+def constant(value: Any) -> Callable[[float], Any]:
+    return lambda t: value
+
+def sine(amplitude: float = 1.0, period: float = 60.0,
+         offset: float = 0.0) -> Callable[[float], float]:
+    w = 2 * math.pi / period
+    return lambda t: offset + amplitude * math.sin(w * t)
+
+def ramp(start: float = 0.0, slope: float = 1.0) -> Callable[[float], float]:
+    return lambda t: start + slope * t
+
+def noise(mean: float = 0.0, stddev: float = 1.0, *,
+          seed: Optional[int] = None) -> Callable[[float], float]:
+    rng = random.Random(seed)
+    return lambda t: rng.gauss(mean, stddev)
+
+@dataclass
+class SimParam:
+    name: str
+    gen: Callable[[float], Any]
+    rate_hz: float = 1.0
+    # ENG -> RAW calibration (identity by default)
+    to_raw: Optional[Callable[[Any], Any]] = None
+
+# -----------------------------------------------------------------------------
+# Simulator
+# -----------------------------------------------------------------------------
+class SimulatorDriver(Driver):
+    """
+    In-process TM/TC simulator for rehearsals and load tests.
+
+    * Every parameter is sampled from its generator at its own `rate_hz` by a background
+      ticker thread (started on first use); reads return the latest sample.
+    * TCs are acknowledged after `tc_latency` seconds; commands in `fail_commands` are rejected.
+      The last `tc_history` requests are kept in `tc_sent`.
+    * `auto_answer` answers operator prompts without a UI (None -> ask the VS Code prompter).
+    """
+
+    name = "sim"
+
+    def __init__(
+        self,
+        params: Iterable[SimParam] = (),
+        *,
+        tc_latency: float = 0.0,
+        fail_commands: Iterable[str] = ("COMMAND_EX",),
+        auto_answer: Optional[str] = None,
+        tick: float = 0.01,
+        tc_history: int = 1000,
+    ):
+        self.tc_latency = tc_latency
+        self.fail_commands = set(fail_commands)
+        self.auto_answer = auto_answer
+        self.tick = tick
+
+        self.params: dict[str, SimParam] = {}
+        self._eng: dict[str, Any] = {}
+        self._raw: dict[str, Any] = {}
+        self._next_due: dict[str, float] = {}
+        self._due_heap: list[tuple[float, str]] = []
+        self._t0 = time.monotonic()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._ticker: Optional[threading.Thread] = None
+
+        self._subs: dict[tuple[str, ValueFmt], list[Callable[[str, Any, float], None]]] = {}
+
+        self.tc_sent: deque[TCRequest] = deque(maxlen=tc_history)
+        self.tm_reads = 0
+        self.tm_samples = 0
+
+        for p in params:
+            self.define(p)
+
+    @classmethod
+    def synthetic(cls, n_params: int, rate_hz: float = 10.0, *, prefix: str = "SIM_",
+                  **kwargs: Any) -> "SimulatorDriver":
+        """Simulator with `n_params` sine parameters, for load testing."""
+        params = [SimParam(f"{prefix}{i}", sine(10.0, 30.0 + i % 17, i), rate_hz)
+                  for i in range(n_params)]
+        return cls(params, **kwargs)
+
+    # --- configuration ------------------------------------------------------------
+    def define(self, param: SimParam) -> None:
+        with self._lock:
+            self.params[param.name] = param
+            self._sample(param, time.monotonic())
+
+    def set_tm(self, name: str, value: Any, *, rate_hz: float = 1.0) -> None:
+        """Pin a parameter to a constant value (defines it if needed)."""
+        self.define(SimParam(name, constant(value), rate_hz))
+
+    # --- generation ---------------------------------------------------------------
+    def _sample(self, p: SimParam, now: float) -> None:
+        eng = p.gen(now - self._t0)
+        raw = p.to_raw(eng) if p.to_raw else eng
+        self._eng[p.name] = eng
+        self._raw[p.name] = raw
+        self.tm_samples += 1
+        if self._subs:
+            for cb in self._subs.get((p.name, ValueFmt.ENG), ()):
+                cb(p.name, eng, now)
+            for cb in self._subs.get((p.name, ValueFmt.RAW), ()):
+                cb(p.name, raw, now)
+        if p.rate_hz > 0:
+            due = now + 1.0 / p.rate_hz
+            self._next_due[p.name] = due
+            heapq.heappush(self._due_heap, (due, p.name))
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.tick):
+            now = time.monotonic()
+            heap = self._due_heap
+            with self._lock:
+                while heap and heap[0][0] <= now:
+                    due, name = heapq.heappop(heap)
+                    if self._next_due.get(name) == due:  # skip entries of redefined params
+                        self._sample(self.params[name], now)
+
+    def start(self) -> None:
+        if self._ticker is None:
+            self._ticker = threading.Thread(target=self._run, name="fops-sim-tm", daemon=True)
+            self._ticker.start()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._ticker is not None:
+            self._ticker.join(1.0)
+            self._ticker = None
+
+    # --- Driver API ---------------------------------------------------------------
+    def read_tm(self, names: Sequence[str], fmt: ValueFmt = ValueFmt.ENG) -> dict[str, Any]:
+        self.start()
+        table = self._raw if fmt is ValueFmt.RAW else self._eng
+        self.tm_reads += 1
+        try:
+            return {n: table[n] for n in names}
+        except KeyError as e:
+            raise KeyError(f"Unknown TM parameter: {e.args[0]}") from None
+
+    async def aread_tm(self, names: Sequence[str], fmt: ValueFmt = ValueFmt.ENG) -> dict[str, Any]:
+        return self.read_tm(names, fmt)  # in-memory, no need for a thread
+
+    def subscribe(self, names: Sequence[str], fmt: ValueFmt,
+                  callback: Callable[[str, Any, float], None]) -> bool:
+        self.start()
+        with self._lock:
+            for n in names:
+                self._subs.setdefault((n, fmt), []).append(callback)
+        return True
+
+    def send_tcs(self, requests: Sequence[TCRequest]) -> list[TCResult]:
+        if self.tc_latency:
+            time.sleep(self.tc_latency)
+        return self._ack(requests)
+
+    async def asend_tcs(self, requests: Sequence[TCRequest]) -> list[TCResult]:
+        if self.tc_latency:
+            import asyncio
+            await asyncio.sleep(self.tc_latency)
+        return self._ack(requests)
+
+    def _ack(self, requests: Sequence[TCRequest]) -> list[TCResult]:
+        ack = time.monotonic()
+        out = []
+        for req in requests:
+            self.tc_sent.append(req)
+            if req.command in self.fail_commands:
+                error = f"Simulated rejection of {req.command}"
+                out.append(TCResult(req.command, False, error, ack))
+            else:
+                out.append(TCResult(req.command, True, None, ack))
+        return out
+
+    def prompt(self, message: str, options: Sequence[str]) -> str:
+        if self.auto_answer is not None:
+            return self.auto_answer
+        return super().prompt(message, options)
+
+    async def aprompt(self, message: str, options: Sequence[str]) -> str:
+        if self.auto_answer is not None:
+            return self.auto_answer
+        return await super().aprompt(message, options)
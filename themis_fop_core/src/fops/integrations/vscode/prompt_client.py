@@ -1,20 +1,387 @@
-import time
+import asyncio
+import http.client
 import json
+import os
+import socket
+import threading
+import time
 import urllib.request
-import urllib.error
+import uuid
+from typing import NamedTuple, Optional
 
 EXT_PORT = 5533  # keep in sync with VS Code extension setting
+EXT_HOST = "127.0.0.1"
 
-def ask_vscode(message: str, options=None, *, timeout=3600):
-    """Send a prompt to the VS Code extension and wait for the answer.
-    Raises URLError if the extension is not reachable.
+# seconds to connect to the extension; loopback is refused immediately when it is not running
+CONNECT_TIMEOUT = 0.5
+# once the extension is found unreachable, fail fast for this long before trying again
+RECONNECT_AFTER = 5.0
+# seconds a prompter that went away while prompts were open has to come back before they fail
+RESUME_WITHIN = 30.0
+
+class PromptExpired(RuntimeError):
+    """The prompter dropped an unanswered prompt (evicted, or its procedure looked gone)."""
+
+class EventsUnsupported(ConnectionError):
+    """The prompter has no event stream (an older extension): prompts go through /wait."""
+
+class _FutureSignal:
+    # Event-like stand-in for an awaiting coroutine; set() may be called from the reader thread
+    def __init__(self, loop: asyncio.AbstractEventLoop, fut: asyncio.Future):
+        self._loop = loop
+        self._fut = fut
+
+    def set(self) -> None:
+        self._loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self) -> None:
+        if not self._fut.done():
+            self._fut.set_result(None)
+
+class _Pending(NamedTuple):
+    signal: "threading.Event | _FutureSignal"
+    body: bytes                    # POSTed again if the prompter restarts
+    instance: Optional[str]        # the prompter run that holds the prompt
+
+class PromptChannel:
     """
-    options = options or ['r','s','c']
+    One persistent connection pair per procedure to the VS Code prompter:
+      - a keep-alive HTTP connection for `POST /prompt`
+      - a Server-Sent Events stream (`GET /events?client=<id>`) on which every answer arrives
+    Any number of prompts (from any thread) can be outstanding at once; answers are routed by
+    prompt id. Dropped streams are re-opened transparently and the extension replays answers
+    given while disconnected. The stream opens with the prompter's run id: when it changed
+    (VS Code restarted), the open prompts are POSTed again, and those that cannot be, or
+    whose prompter stays away RESUME_WITHIN seconds, fail with ConnectionError.
+    """
+
+    def __init__(self, host: str = EXT_HOST, port: int = EXT_PORT, *,
+                 client_id: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.client_id = client_id or os.environ.get("INSTANCE_ID") or str(uuid.uuid4())
+        self.events_supported: Optional[bool] = None   # None: not probed yet
+
+        self._lock = threading.Lock()       # pending prompts / answers
+        self._conn_lock = threading.Lock()  # opening the event stream
+        self._post_lock = threading.Lock()  # the keep-alive POST connection
+        self._post: Optional[http.client.HTTPConnection] = None
+        self._stream: Optional[socket.socket] = None   # the event stream's socket
+        self._reader: Optional[threading.Thread] = None
+        self._connected = threading.Event()
+        self._down_until = 0.0
+        self._closed = False
+        self._instance: Optional[str] = None
+
+        self._pending: dict[str, _Pending] = {}
+        self._answers: dict[str, "str | BaseException"] = {}
+        self._alias: dict[str, str] = {}    # id of a re-sent prompt -> its original id
+        self._posting = 0                   # prompts POSTed but not registered yet
+
+    # --- connection management ----------------------------------------------------
+    def _fail_fast(self) -> None:
+        if time.monotonic() < self._down_until:
+            raise ConnectionRefusedError(f"VS Code prompter unreachable on {self.host}:{self.port}")
+
+    def _mark_down(self) -> None:
+        self._down_until = time.monotonic() + RECONNECT_AFTER
+
+    def _open_stream(self) -> None:
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=CONNECT_TIMEOUT)
+        try:
+            conn.connect()
+            sock = conn.sock
+            conn.request("GET", f"/events?client={self.client_id}",
+                         headers={"Accept": "text/event-stream"})
+            resp = conn.getresponse()
+        except OSError:
+            conn.close()
+            self._mark_down()
+            raise
+        if resp.status != 200:
+            resp.close()
+            conn.close()
+            self.events_supported = False
+            raise EventsUnsupported(f"Prompter does not support event streams (HTTP {resp.status})")
+        self.events_supported = True
+        try:
+            event, data = self._next_event(resp)
+            instance = json.loads(data).get("instance") if event == "hello" else None
+        except (OSError, ValueError, EOFError, http.client.HTTPException):
+            resp.close()
+            conn.close()
+            raise ConnectionError("Prompter closed its event stream") from None
+        self._resume(instance)
+        sock.settimeout(None)  # answers may take hours
+        self._stream = sock
+        self._connected.set()
+        self._reader = threading.Thread(target=self._read_events, args=(resp,),
+                                        name="fops-prompt-sse", daemon=True)
+        self._reader.start()
+
+    def _ensure_stream(self) -> None:
+        with self._conn_lock:
+            if self._connected.is_set():
+                return
+            self._fail_fast()
+            self._open_stream()
+
+    @staticmethod
+    def _next_event(resp: http.client.HTTPResponse) -> tuple[str, str]:
+        # the next event, keep-alive comments skipped; raises EOFError when the stream ends
+        event, data = "message", []
+        while True:
+            raw = resp.readline()
+            if not raw:
+                raise EOFError
+            line = raw.decode("utf-8").rstrip("\r\n")
+            if not line:
+                if data:
+                    return event, "\n".join(data)
+                event = "message"
+            elif line.startswith(":"):
+                continue
+            elif line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                data.append(line[5:].lstrip())
+
+    def _read_events(self, resp: http.client.HTTPResponse) -> None:
+        try:
+            while True:
+                event, data = self._next_event(resp)
+                if event == "answer":
+                    self._deliver(json.loads(data))
+                elif event == "expired":
+                    self._deliver(json.loads(data), expired=True)
+        except (OSError, ValueError, EOFError, http.client.HTTPException):
+            pass
+        finally:
+            self._connected.clear()
+            resp.close()
+        self._reconnect()
+
+    def _reconnect(self) -> None:
+        # only needed while prompts are waiting; otherwise the next ask() reconnects
+        delay = 0.1
+        give_up = time.monotonic() + RESUME_WITHIN
+        while not self._closed and self._pending:
+            try:
+                with self._conn_lock:
+                    if self._connected.is_set():
+                        return
+                    self._open_stream()
+                return
+            except EventsUnsupported:
+                break
+            except OSError:
+                if time.monotonic() >= give_up:
+                    break
+                time.sleep(delay)
+                delay = min(delay * 2, RECONNECT_AFTER)
+        with self._lock:
+            for pid in list(self._pending):
+                self._fail(pid, ConnectionError(f"VS Code prompter went away; prompt {pid} lost"))
+
+    def _resume(self, instance: Optional[str]) -> None:
+        # called with the new stream's run id before its reader starts, so no answer to a
+        # re-sent prompt can arrive before it is registered
+        previous, self._instance = self._instance, instance
+        if instance is None or previous in (None, instance):
+            return
+        with self._lock:
+            lost = [(pid, p) for pid, p in self._pending.items() if p.instance != instance]
+        for pid, p in lost:
+            try:
+                reply = self._post_prompt(p.body)
+            except OSError as e:
+                with self._lock:
+                    self._fail(pid, ConnectionError(f"VS Code prompter restarted; prompt {pid} "
+                                                    f"could not be re-sent: {e}"))
+                continue
+            with self._lock:
+                if pid in self._pending:
+                    self._alias[str(reply["id"])] = pid
+                    self._pending[pid] = p._replace(instance=reply.get("instance", instance))
+
+    def _fail(self, pid: str, error: BaseException) -> None:
+        # with self._lock held
+        p = self._pending.get(pid)
+        if p is not None and pid not in self._answers:
+            self._answers[pid] = error
+            p.signal.set()
+
+    def _deliver(self, payload: dict, expired: bool = False) -> None:
+        pid = str(payload.get("id", ""))
+        with self._lock:
+            pid = self._alias.get(pid, pid)
+            p = self._pending.get(pid)
+            # replays and late answers to prompts nobody waits for are dropped, unless a POST
+            # in flight may not have registered its prompt yet
+            if p is None and not self._posting:
+                return
+            if expired:
+                self._answers[pid] = PromptExpired(f"Prompt {pid} expired on the prompter")
+            else:
+                self._answers[pid] = str(payload.get("answer", ""))
+        if p is not None:
+            p.signal.set()
+
+    def _post_prompt(self, body: bytes) -> dict:
+        headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+        for attempt in (1, 2):  # a kept-alive socket may have been closed by the server
+            with self._post_lock:
+                if self._post is None:
+                    self._post = http.client.HTTPConnection(self.host, self.port,
+                                                            timeout=CONNECT_TIMEOUT)
+                conn = self._post
+                try:
+                    conn.request("POST", "/prompt", body=body, headers=headers)
+                    resp = conn.getresponse()
+                    payload = resp.read()
+                except (http.client.HTTPException, OSError):
+                    conn.close()
+                    self._post = None
+                    if attempt == 2:
+                        self._mark_down()
+                        raise
+                    continue
+            if resp.status != 200:
+                raise ConnectionError(f"Prompter rejected prompt (HTTP {resp.status})")
+            return json.loads(payload.decode("utf-8"))
+        raise AssertionError("unreachable")
+
+    def _submit(self, body: bytes, signal: "threading.Event | _FutureSignal") -> str:
+        # POST the prompt and register it for its answer
+        with self._lock:
+            self._posting += 1
+        reply = None
+        try:
+            reply = self._post_prompt(body)
+        finally:
+            with self._lock:
+                self._posting -= 1
+                if reply is not None:
+                    pid = str(reply["id"])
+                    instance = reply.get("instance", self._instance)
+                    self._pending[pid] = _Pending(signal, body, instance)
+                    if pid in self._answers:  # answered before we started waiting
+                        signal.set()
+                if not self._posting:
+                    for stray in [k for k in self._answers if k not in self._pending]:
+                        del self._answers[stray]
+        return pid
+
+    def _forget(self, prompt_id: str) -> None:
+        with self._lock:
+            self._pending.pop(prompt_id, None)
+            self._answers.pop(prompt_id, None)
+            for alias in [a for a, pid in self._alias.items() if pid == prompt_id]:
+                del self._alias[alias]
+
+    def _collect(self, prompt_id: str) -> str:
+        with self._lock:
+            answer = self._answers.pop(prompt_id)
+        if isinstance(answer, BaseException):
+            raise answer
+        return answer
+
+    def _body(self, message: str, options) -> bytes:
+        return json.dumps({
+            "message": message,
+            "options": options or ['r', 's', 'c'],
+            "client": self.client_id,
+        }).encode("utf-8")
+
+    # --- API ----------------------------------------------------------------------
+    def ask(self, message: str, options=None, *, timeout: Optional[float] = 3600) -> str:
+        """
+        Raise ConnectionError/OSError if the extension is not reachable, TimeoutError on timeout.
+        """
+        self._ensure_stream()
+        ev = threading.Event()
+        prompt_id = self._submit(self._body(message, options), ev)
+        try:
+            if not ev.wait(timeout):
+                raise TimeoutError(f"No answer to prompt {prompt_id} within {timeout}s")
+            return self._collect(prompt_id)
+        finally:
+            self._forget(prompt_id)
+
+    async def aask(self, message: str, options=None, *, timeout: Optional[float] = 3600) -> str:
+        """Awaitable ask(); the event loop keeps running other tasks while the operator answers."""
+        await asyncio.to_thread(self._ensure_stream)
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        signal = _FutureSignal(loop, fut)
+        prompt_id = await asyncio.to_thread(self._submit, self._body(message, options), signal)
+        try:
+            try:
+                await asyncio.wait_for(fut, timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"No answer to prompt {prompt_id} within {timeout}s") from None
+            return self._collect(prompt_id)
+        finally:
+            self._forget(prompt_id)
+
+    def close(self) -> None:
+        self._closed = True
+        with self._conn_lock, self._post_lock:
+            if self._post is not None:
+                self._post.close()
+            if self._stream is not None:
+                try:   # the reader sees the stream end and closes it
+                    self._stream.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            self._post = self._stream = None
+            self._connected.clear()
+
+_channel: Optional[PromptChannel] = None
+_channel_lock = threading.Lock()
+
+def get_channel() -> PromptChannel:
+    global _channel
+    with _channel_lock:
+        if _channel is None or (_channel.host, _channel.port) != (EXT_HOST, EXT_PORT):
+            _channel = PromptChannel(EXT_HOST, EXT_PORT)
+        return _channel
+
+def _ask_vscode_longpoll(message: str, options, *, timeout) -> str:
+    # legacy transport for prompters without /events
     data = json.dumps({'message': message, 'options': options}).encode('utf-8')
-    req = urllib.request.Request(f'http://127.0.0.1:{EXT_PORT}/prompt', data=data, headers={'Content-Type':'application/json'}, method='POST')
+    req = urllib.request.Request(f'http://{EXT_HOST}:{EXT_PORT}/prompt', data=data,
+                                 headers={'Content-Type':'application/json'}, method='POST')
     with urllib.request.urlopen(req, timeout=2) as resp:
         payload = json.loads(resp.read().decode('utf-8'))
     prompt_id = payload['id']
-    with urllib.request.urlopen(f'http://127.0.0.1:{EXT_PORT}/wait?id={prompt_id}', timeout=timeout) as resp:
+    wait_url = f'http://{EXT_HOST}:{EXT_PORT}/wait?id={prompt_id}'
+    with urllib.request.urlopen(wait_url, timeout=timeout) as resp:
         ans_payload = json.loads(resp.read().decode('utf-8'))
         return ans_payload['answer']
+
+def ask_vscode(message: str, options=None, *, timeout=3600):
+    """Send a prompt to the VS Code extension and wait for the answer.
+    Raises ConnectionError/OSError if the extension is not reachable (fails fast for
+    RECONNECT_AFTER seconds after a failed attempt).
+    """
+    options = options or ['r','s','c']
+    channel = get_channel()
+    if channel.events_supported is not False:   # probed once per channel
+        try:
+            return channel.ask(message, options, timeout=timeout)
+        except EventsUnsupported:
+            pass
+    # reachable, but an older prompter without event streams
+    return _ask_vscode_longpoll(message, options, timeout=timeout)
+
+async def aask_vscode(message: str, options=None, *, timeout=3600):
+    """Awaitable ask_vscode(); same errors and fallbacks."""
+    options = options or ['r','s','c']
+    channel = get_channel()
+    if channel.events_supported is not False:
+        try:
+            return await channel.aask(message, options, timeout=timeout)
+        except EventsUnsupported:
+            pass
+    return await asyncio.to_thread(_ask_vscode_longpoll, message, options, timeout=timeout)
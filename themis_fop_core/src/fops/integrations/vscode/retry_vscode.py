@@ -1,29 +1,42 @@
 import functools
-from .prompt_client import ask_vscode
-
-def retry_decorator_with_vscode_fallback(func):
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        while True:
-            try:
-                return func(*args, **kwargs)
-            except Exception as e:
-                # Try VS Code prompt first
-                try:
-                    choice = ask_vscode(f"Exception: {e}\nOptions: retry (r), skip (s), cancel (c)?", ['r','s','c'])
-                except Exception:
-                    # Fallback to console if VS Code extension not available
-                    print(f"Exception occurred: {e}")
-                    choice = input("Options: [r]etry, [s]kip, [c]ancel: ").lower()
-
-                choice = (choice or '').strip().lower()
-                if choice in ('r','retry'):
-                    continue
-                elif choice in ('s','skip'):
-                    return None
-                elif choice in ('c','cancel'):
-                    raise
-                else:
-                    # any custom text -> treat as 'retry'
-                    continue
-    return wrapper
+import threading
+
+from fops.internal.retry import console_options, retry_engine
+from fops.internal.trace import step_var
+
+# one console prompt at a time when several tasks/threads fail together
+_console_lock = threading.Lock()
+
+def _console_choice(e: BaseException, opts: list[str]) -> str:
+    step = step_var.get()
+    with _console_lock:
+        print(f"Exception occurred in step {step}: {e}" if step else f"Exception occurred: {e}")
+        return input(f"Options: {console_options(opts)}: ")
+
+def _ask(e: BaseException, message: str, opts: list[str]) -> tuple[str, str]:
+    from .prompt_client import ask_vscode   # the HTTP client is loaded by the first prompt
+
+    # Try VS Code prompt first
+    try:
+        return ask_vscode(message, opts), "vscode"
+    except Exception:
+        # Fallback to console if VS Code extension not available
+        return _console_choice(e, opts), "console"
+
+async def _aask(e: BaseException, message: str, opts: list[str]) -> tuple[str, str]:
+    import asyncio
+
+    from .prompt_client import aask_vscode
+
+    try:
+        return await aask_vscode(message, opts), "vscode"
+    except Exception:
+        return await asyncio.to_thread(_console_choice, e, opts), "console"
+
+def retry_decorator_with_vscode_fallback(func=None, *, auto_retry: str = "always"):
+    """
+    Retry engine (see fops.internal.retry) asking the operator through VS Code, else the console.
+    """
+    if func is None:
+        return functools.partial(retry_decorator_with_vscode_fallback, auto_retry=auto_retry)
+    return retry_engine(func, _ask, _aask, auto_retry=auto_retry)
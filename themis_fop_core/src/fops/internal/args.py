@@ -1,7 +1,13 @@
 from __future__ import annotations
 
+import functools
+import hashlib
+import inspect
+import os
+import sys
+import threading
 from collections.abc import Callable, Iterable, Mapping, Sequence
-from dataclasses import asdict, dataclass, replace
+from dataclasses import dataclass, fields, replace
 from enum import Enum, auto
 from typing import Any, Optional, Union, cast
 
@@ -97,12 +103,56 @@ class Condition:
     op: "Operator"
     right: Any
     overrides: Optional[Modifiers] = None
+    # modifier keys given in the per-condition dict (None: fields of `overrides` that differ from
+    # the defaults)
+    explicit: Optional[frozenset[str]] = None
 
 @dataclass(frozen=True)
 class BooleanExpr:
     kind: str  # "AND" | "OR"
     children: list[Union["BooleanExpr", Condition]]
 
+WINDOW_AGGREGATES = frozenset({"all", "any", "mean", "min", "max", "std"})
+
+@dataclass(frozen=True)
+class Window:
+    """
+    Left side of a windowed condition: the samples of one or more TM parameters over the last
+    `seconds` (plus the sample in force when the window opened) or the last `samples` samples.
+    `agg` "all" / "any": the operator must hold for every / some sample; "mean", "min", "max",
+    "std": it is applied to that statistic. With several parameters it must hold for each.
+
+        ["TM1", "bw", [X, Y]]                                   # now
+        [Window("TM1", seconds=30), "bw", [X, Y]]               # for the last 30 s
+        [Window("TM2", samples=10, agg="mean"), "gt", 5]        # mean of the last 10 samples
+    """
+    params: Union[str, tuple[str, ...]]
+    seconds: Optional[float] = None
+    samples: Optional[int] = None
+    agg: str = "all"
+
+    def __post_init__(self) -> None:
+        if not isinstance(self.params, str):
+            object.__setattr__(self, "params", tuple(self.params))
+        if (self.seconds is None) == (self.samples is None):
+            raise TypeError("Window needs exactly one of seconds= or samples=")
+        if self.seconds is not None and not self.seconds > 0:
+            raise TypeError(f"Window seconds must be > 0, got {self.seconds!r}")
+        if self.samples is not None and not (isinstance(self.samples, int) and self.samples > 0):
+            raise TypeError(f"Window samples must be a positive int, got {self.samples!r}")
+        if self.agg not in WINDOW_AGGREGATES:
+            raise TypeError(f"Unknown window aggregate {self.agg!r} "
+                            f"(expected one of {sorted(WINDOW_AGGREGATES)})")
+
+    @property
+    def names(self) -> tuple[str, ...]:
+        return (self.params,) if isinstance(self.params, str) else self.params
+
+    def __str__(self) -> str:
+        span = f"{self.seconds:g}s" if self.seconds is not None else f"{self.samples} samples"
+        names = ",".join(self.names)
+        return f"{names}[{span}]" if self.agg == "all" else f"{self.agg}({names})[{span}]"
+
 KNOWN_OPS: dict[str, Operator] = {o.value: o for o in Operator}
 
 def _coerce_operator(x: Any) -> Operator:
@@ -121,12 +171,115 @@ def _coerce_valuefmt(x: Any) -> ValueFmt:
             return ValueFmt[u]
     raise TypeError(f"Unknown ValueFormat: {x!r}")
 
-def _to_action_set(val: Union[Action, Sequence[Action]]) -> frozenset[Action]:
-    if isinstance(val, Action):
-        return frozenset({val})
-    if isinstance(val, (str, bytes)):
-        raise TypeError("Action sets must be Action or Iterable[Action], not str/bytes")
-    return frozenset(cast(Sequence[Action], val))
+def _coerce_action(x: Any) -> Action:
+    if isinstance(x, Action):
+        return x
+    if isinstance(x, str) and x.upper() in Action.__members__:
+        return Action[x.upper()]
+    raise TypeError(f"Unknown action: {x!r}")
+
+def _to_action_set(val: Union[Action, str, Sequence[Union[Action, str]]]) -> frozenset[Action]:
+    # an Action or its name ("SKIP"), or an iterable of them
+    if isinstance(val, (Action, str)):
+        return frozenset({_coerce_action(val)})
+    if isinstance(val, bytes):
+        raise TypeError("Action sets must be Action or Iterable[Action], not bytes")
+    return frozenset(_coerce_action(x) for x in cast(Sequence[Any], val))
+
+_MODIFIER_FIELDS: frozenset[str] = frozenset(f.name for f in fields(Modifiers))
+_ACTION_SET_FIELDS: frozenset[str] = frozenset({"OnFalse", "OnTrue", "OnFailure"})
+_DEFAULT_MODS = Modifiers()
+
+def _coerce_modifier(k: str, raw: object) -> Any:
+    if k == "ValueFormat":
+        return _coerce_valuefmt(raw)
+    if k in _ACTION_SET_FIELDS:
+        return _to_action_set(cast(Union[Action, Sequence[Action]], raw))
+    return raw
+
+def _freeze(v: Any) -> Any:
+    """Hashable cache key for a raw modifier value (type-tagged: Delay=1 and Delay=True differ)."""
+    if isinstance(v, (set, frozenset)):
+        return (type(v), frozenset(_freeze(x) for x in v))
+    if isinstance(v, (list, tuple)):
+        return (type(v), tuple(_freeze(x) for x in v))
+    hash(v)  # TypeError -> not cacheable
+    return (type(v), v)
+
+class ModifierParser:
+    """
+    Precompiled modifier parser for one primitive (allowlist + base Modifiers).
+    Validates and coerces all PascalCase kwargs in one pass and builds the Modifiers once.
+    Results are memoized by the (frozen) modifier kwargs, so repeated combinations such as
+    `Delay=2, Tolerance=0.1` resolve to the same interned Modifiers instance.
+    """
+
+    __slots__ = ("allowed", "base", "cache_size", "_cache", "_lock")
+
+    def __init__(
+        self,
+        allowed: Optional[Iterable[str]] = None,
+        base: Optional[Modifiers] = None,
+        *,
+        cache_size: int = 1024,
+    ):
+        self.allowed: Optional[frozenset[str]] = frozenset(allowed) if allowed is not None else None
+        self.base: Modifiers = base if base is not None else _DEFAULT_MODS
+        self.cache_size = cache_size
+        self._cache: dict[Any, Modifiers] = {}
+        self._lock = threading.Lock()   # inserts/evictions; lookups go without it
+
+    def __call__(self, kwargs: Mapping[str, object]) -> Modifiers:
+        """Parse ONLY PascalCase keys of `kwargs`; other keys are ignored."""
+        mod_kwargs = {k: v for k, v in kwargs.items() if k[:1].isupper()}
+        return self.parse(mod_kwargs) if mod_kwargs else self.base
+
+    def split(self, kwargs: Mapping[str, object]) -> tuple[Modifiers, dict[str, Any]]:
+        """Route PascalCase kwargs to Modifiers and the rest to params, in one pass."""
+        mod_kwargs: dict[str, object] = {}
+        params: dict[str, Any] = {}
+        for k, v in kwargs.items():
+            if k[:1].isupper():
+                mod_kwargs[k] = v
+            else:
+                params[k] = v
+        return (self.parse(mod_kwargs) if mod_kwargs else self.base), params
+
+    def parse(self, mod_kwargs: Mapping[str, object]) -> Modifiers:
+        """`mod_kwargs` must only hold PascalCase keys."""
+        try:
+            key: Any = tuple([(k, type(v), v) for k, v in mod_kwargs.items()])
+            hit = self._cache.get(key)
+        except TypeError:  # set/list values: retry with a frozen key
+            try:
+                key = tuple([(k, _freeze(v)) for k, v in mod_kwargs.items()])
+                hit = self._cache.get(key)
+            except TypeError:
+                key, hit = None, None
+        if hit is not None:
+            return hit
+
+        if self.allowed is not None:
+            bad = [k for k in mod_kwargs if k not in self.allowed]
+            if bad:
+                raise TypeError(f"Unsupported modifier(s) for this primitive: {sorted(bad)}")
+        changes: dict[str, Any] = {}
+        for k, raw in mod_kwargs.items():
+            if k not in _MODIFIER_FIELDS:
+                raise TypeError(f"Unknown modifier '{k}'")  # not a field in Modifiers
+            changes[k] = _coerce_modifier(k, raw)
+        mods = replace(self.base, **changes)
+
+        if key is not None:
+            with self._lock:
+                if len(self._cache) >= self.cache_size:
+                    self._cache.pop(next(iter(self._cache)))
+                self._cache[key] = mods
+        return mods
+
+_parsers: dict[tuple[Optional[Modifiers], Optional[frozenset[str]]], ModifierParser] = {}
+_parsers_lock = threading.Lock()
+_PARSERS_MAX = 256   # (base, allowed) pairs with a shared parser; the oldest goes first
 
 def parse_modifiers(
     kwargs: Mapping[str, object],
@@ -136,33 +289,21 @@ def parse_modifiers(
     """
     Parse ONLY PascalCase keys into a Modifiers object.
     If `allowed` is provided, any PascalCase key not in it triggers a TypeError.
+    Uses a shared ModifierParser per (base, allowed) pair (the last _PARSERS_MAX pairs).
     """
-    mods: Modifiers = base if base is not None else Modifiers()
-
-    # Enforce allowlist if provided
-    if allowed is not None:
-        allowed_set = set(allowed)
-        bad = [k for k in kwargs.keys() if k[:1].isupper() and k not in allowed_set]
-        if bad:
-            raise TypeError(f"Unsupported modifier(s) for this primitive: {sorted(bad)}")
-
-    for k, raw in kwargs.items():
-        if not k[:1].isupper():
-            # not a modifier key; ignore here (decorator routes non-PascalCase to params)
-            continue
-        if not hasattr(mods, k):
-            raise TypeError(f"Unknown modifier '{k}'")  # not a field in Modifiers
-
-        if k == "ValueFormat":
-            v = _coerce_valuefmt(raw)
-            mods = replace(mods, ValueFormat=v)
-        elif k in {"OnFalse", "OnTrue", "OnFailure"}:
-            vset = _to_action_set(cast(Union[Action, Sequence[Action]], raw))
-            mods = replace(mods, **{k: vset})
-        else:
-            mods = replace(mods, **{k: cast(Any, raw)})
-
-    return mods
+    allowed_set = frozenset(allowed) if allowed is not None else None
+    key = (base, allowed_set)
+    try:
+        parser = _parsers.get(key)
+    except TypeError:  # a base with an unhashable modifier value: parse without sharing
+        return ModifierParser(allowed_set, base)(kwargs)
+    if parser is None:
+        parser = ModifierParser(allowed_set, base)
+        with _parsers_lock:
+            if len(_parsers) >= _PARSERS_MAX:
+                _parsers.pop(next(iter(_parsers)))
+            _parsers[key] = parser
+    return parser(kwargs)
 
 def parse_condition(raw: Sequence[Any]) -> Condition:
     """Accepts: ['TM', 'eq', value]  or  ['TM', 'eq', value, {Modifier: ...}]"""
@@ -175,7 +316,9 @@ def parse_condition(raw: Sequence[Any]) -> Condition:
         if not isinstance(maybe_dict, dict):
             raise TypeError("Per-condition overrides must be a dict as 4th element")
         overrides = parse_modifiers(cast(Mapping[str, object], maybe_dict))
-    return Condition(left=left, op=_coerce_operator(op), right=right, overrides=overrides)
+        return Condition(left=left, op=_coerce_operator(op), right=right, overrides=overrides,
+                         explicit=frozenset(maybe_dict))
+    return Condition(left=left, op=_coerce_operator(op), right=right)
 
 def _to_node(x: Any) -> Union[BooleanExpr, Condition]:
     if isinstance(x, (BooleanExpr, Condition)):
@@ -199,13 +342,109 @@ def normalize_conditions(arg: Any) -> Union[list[Condition], BooleanExpr]:
         return [parse_condition(cast(Sequence[Any], arg))]
     raise TypeError("Expected a condition, list of conditions, or AND/OR expression")
 
-def merge_mods(base: Modifiers, overrides: Optional[Modifiers]) -> Modifiers:
-    if overrides is None:
+_merged: dict[tuple[Modifiers, Modifiers, Optional[frozenset[str]]], Modifiers] = {}
+_merged_lock = threading.Lock()
+
+def merge_mods(base: Modifiers, overrides: Optional[Modifiers],
+               explicit: Optional[frozenset[str]] = None) -> Modifiers:
+    """
+    Apply per-condition `overrides` on top of `base`: the fields named in `explicit` win, even
+    when set back to their default (`{'Tolerance': 0.0}` over a base Tolerance of 0.5 gives 0.0).
+    Without `explicit`, every field of `overrides` that differs from the defaults wins.
+    Memoized per (base, overrides, explicit).
+    """
+    if overrides is None or (overrides == _DEFAULT_MODS if explicit is None else not explicit):
         return base
-    merged: dict[str, Any] = asdict(base)
-    for k, v in asdict(overrides).items():
-        merged[k] = v
-    return Modifiers(**merged)
+    try:
+        key: Optional[tuple[Modifiers, Modifiers, Optional[frozenset[str]]]]
+        key = (base, overrides, explicit)
+        merged = _merged.get(key)  # type: ignore[arg-type]
+    except TypeError:  # unhashable modifier value
+        key, merged = None, None
+    if merged is None:
+        if explicit is None:
+            explicit = frozenset(k for k in _MODIFIER_FIELDS
+                                 if getattr(overrides, k) != getattr(_DEFAULT_MODS, k))
+        merged = replace(base, **{k: getattr(overrides, k) for k in explicit})
+        if key is not None:
+            with _merged_lock:
+                if len(_merged) >= 1024:
+                    _merged.pop(next(iter(_merged)))
+                _merged[key] = merged
+    return merged
+
+# -----------------------------------------------------------------------------
+# Preflight call sites
+# -----------------------------------------------------------------------------
+@dataclass(frozen=True)
+class CallSite:
+    """
+    A primitive call validated ahead of time (see preflight.py): its spec and modifiers are
+    literals, so they are parsed once and reused on every execution of that source line.
+    `spec` is the compiled condition plan for VerifyTM, None when the raw spec is kept.
+    """
+    primitive: str
+    mods: Modifiers
+    spec: Any = None
+
+# filename -> {line: CallSite}, for files whose digest matched the preflight cache
+_call_sites: dict[str, dict[int, CallSite]] = {}
+# filename -> (digest, sites) installed but not checked against the file on disk yet
+_unverified_sites: dict[str, tuple[str, dict[int, CallSite]]] = {}
+# frames searched above a primitive's wrapper for the FOP line that called it
+_SITE_DEPTH = 8
+
+def source_digest(source: bytes) -> str:
+    return hashlib.blake2b(source, digest_size=16).hexdigest()
+
+def install_call_sites(files: Mapping[str, tuple[str, dict[int, CallSite]]]) -> None:
+    """Register preflight call sites per file; a file is used only while its digest matches."""
+    for filename, entry in files.items():
+        _call_sites.pop(filename, None)
+        _unverified_sites[filename] = entry
+
+def clear_call_sites() -> None:
+    _call_sites.clear()
+    _unverified_sites.clear()
+
+def _verify_sites(filename: str) -> Optional[dict[int, CallSite]]:
+    digest, sites = _unverified_sites.pop(filename)
+    try:
+        with open(filename, "rb") as f:
+            current = source_digest(f.read())
+    except OSError:
+        current = None
+    if current != digest:  # edited since the preflight: parse at runtime as usual
+        sites = {}
+    _call_sites[filename] = sites
+    return sites
+
+def _call_site(primitive: str) -> Optional[CallSite]:
+    f = sys._getframe(2)
+    for _ in range(_SITE_DEPTH):
+        if f is None:
+            return None
+        filename = f.f_code.co_filename
+        sites = _call_sites.get(filename)
+        if sites is None:
+            if filename in _unverified_sites:
+                sites = _verify_sites(filename)
+            elif not os.path.isabs(filename):
+                # e.g. runpy.run_path("fop.py"): alias the absolute path
+                absname = os.path.abspath(filename)
+                if absname in _call_sites or absname in _unverified_sites:
+                    sites = _call_sites.get(absname)
+                    if sites is None:
+                        sites = _verify_sites(absname)
+                    _call_sites[filename] = sites
+        if sites is not None:
+            site = sites.get(f.f_lineno)
+            return site if site is not None and site.primitive == primitive else None
+        f = f.f_back
+    return None
+
+def _params(kwargs: Mapping[str, object]) -> dict[str, Any]:
+    return {k: v for k, v in kwargs.items() if not k[:1].isupper()}
 
 # -----------------------------------------------------------------------------
 # Normalized call & decorator
@@ -226,31 +465,48 @@ def with_args(
       - routes PascalCase kwargs to Modifiers (validated against `allowed_modifiers` if provided)
       - routes others to params
       - uses first positional as spec
-      - calls fn(PrimitiveCall)
+      - calls fn(PrimitiveCall) (awaited when fn is a coroutine function)
+    Calls made from a line validated by the preflight reuse its parsed modifiers (and plan).
     """
+    # compiled once per primitive: allowlist, base and memo live in the parser
+    parser = ModifierParser(allowed_modifiers, base_mods)
+
     def deco(fn: Callable[[PrimitiveCall], Any]):
-        def wrapper(*args: Any, **kwargs: object):
-            # split kwargs
-            mod_kwargs: dict[str, object] = {k: v for k, v in kwargs.items() if k[:1].isupper()}
-            verb_kwargs: dict[str, object] = {k: v for k, v in kwargs.items() if not k[:1].isupper()}
-
-            mods = parse_modifiers(
-                mod_kwargs,
-                base=base_mods,
-                allowed=allowed_modifiers,   # <-- enforce per-primitive allowlist
-            )
+        name = fn.__name__
+
+        def _call(args: tuple[Any, ...], kwargs: Mapping[str, object]) -> PrimitiveCall:
+            site = _call_site(name) if (_call_sites or _unverified_sites) else None
+            if site is not None:
+                spec = site.spec if site.spec is not None else (args[0] if args else None)
+                return PrimitiveCall(spec=spec, mods=site.mods, params=_params(kwargs))
+            mods, params = parser.split(kwargs)
             spec = args[0] if args else None
+            return PrimitiveCall(spec=spec, mods=mods, params=params)
 
-            call = PrimitiveCall(spec=spec, mods=mods, params=dict(verb_kwargs))
+        if inspect.iscoroutinefunction(fn):
+            async def awrapper(*args: Any, **kwargs: object):
+                call = _call(args, kwargs)
+                return await fn(call)
+            # update_wrapper (not @wraps) keeps the traced "call" line on the def line
+            functools.update_wrapper(awrapper, fn)
+            awrapper.modifier_parser = parser  # type: ignore[attr-defined]
+            return awrapper
+
+        def wrapper(*args: Any, **kwargs: object):
+            call = _call(args, kwargs)
             return fn(call)
+        functools.update_wrapper(wrapper, fn)
+        wrapper.modifier_parser = parser  # type: ignore[attr-defined]
         return wrapper
     return deco
 
 __all__ = [
     "Operator", "ValueFmt", "Action",
     "Modifiers", "Condition", "BooleanExpr",
-    "AND", "OR",
+    "AND", "OR", "Window",
+    "ModifierParser", "parse_modifiers",
     "parse_condition", "normalize_conditions", "merge_mods",
     "PrimitiveCall", "with_args",
+    "CallSite", "install_call_sites", "clear_call_sites", "source_digest",
 
 ]
@@ -0,0 +1,563 @@
+"""
+Trace collector: a standalone local service keeping the trace events of many procedures.
+
+    fops collect --dir traces --address 8766
+    FOPS_TRACE_URL=http://127.0.0.1:8766/ingest   # procedures, with make_async_http_sink()
+
+Procedures POST batches of trace events (the JSON list of HttpBatchWriter, tagged with their
+INSTANCE_ID in the X-Fops-Instance header). Batches are stored as received, in compressed
+blocks appended to time-partitioned segment files. A sidecar index next to each segment lists,
+per block, its time range and the instance ids, correlation ids, primitives and event types
+it holds: a query ("all attempts of corr_id X", "exceptions of instance Y") decompresses only
+the blocks the index points to.
+"""
+from __future__ import annotations
+
+import glob
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, NamedTuple, Optional
+from urllib.parse import parse_qs, urlparse
+
+# directory of the segment files
+COLLECTOR_DIR = os.environ.get("FOPS_COLLECTOR_DIR", "fops-traces")
+# "[host:]port" the collector listens on
+COLLECTOR_ADDRESS = os.environ.get("FOPS_COLLECTOR", "127.0.0.1:8766")
+# seconds of traces per segment file
+SEGMENT_SECONDS = int(os.environ.get("FOPS_COLLECTOR_SEGMENT", "3600"))
+# a segment is also closed at this size (compressed bytes)
+SEGMENT_BYTES = 256 * 1024 * 1024
+# uncompressed bytes per block: the unit a query reads and decompresses
+BLOCK_BYTES = 256 * 1024
+# seconds a partial block waits for more batches before it is written
+BLOCK_INTERVAL = 0.5
+# bytes received but not written yet before ingest requests are held back
+MAX_PENDING = 64 * 1024 * 1024
+# events returned by a query unless it sets a limit
+QUERY_LIMIT = 10_000
+
+# indexed fields: the block's instance ids, and the meta.corr_id, function and event of its events
+FIELDS = ("instance", "corr_id", "primitive", "event")
+
+_encode_json = json.JSONEncoder(default=str, separators=(",", ":")).encode
+
+# -----------------------------------------------------------------------------
+# Storage format
+# -----------------------------------------------------------------------------
+# <name>.seg: blocks of <u32 length> <u32 crc32> <zlib(lines)>, one line per received batch:
+#   <instance> TAB <receipt time> TAB <JSON list of events, as posted> LF
+# <name>.idx: one JSON object per block, written after the block:
+#   {"off", "len", "n", "t0", "t1",
+#    "instance": [...], "corr_id": [...], "primitive": [...], "event": [...]}
+# <name> is "<first second of the segment's period>-<sequence>": names sort in time order.
+# A block whose index line is missing or torn (crash mid-write) is not part of the store.
+_HEADER = struct.Struct("<II")
+
+class BlockRef(NamedTuple):
+    segment: str
+    offset: int
+    length: int
+    events: int
+    t0: float
+    t1: float
+
+class _Segment:
+    __slots__ = ("name", "period", "fd", "idx_fd", "size")
+
+    def __init__(self, root: str, name: str, period: int):
+        self.name = name
+        self.period = period
+        flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND
+        self.fd = os.open(os.path.join(root, name + ".seg"), flags, 0o644)
+        self.idx_fd = os.open(os.path.join(root, name + ".idx"), flags, 0o644)
+        self.size = 0
+
+    def close(self) -> None:
+        os.close(self.fd)
+        os.close(self.idx_fd)
+
+def _keys(events: list[Any]) -> tuple[set[str], set[str], set[str]]:
+    corr: set[str] = set()
+    prims: set[str] = set()
+    kinds: set[str] = set()
+    for ev in events:
+        if not isinstance(ev, dict):
+            continue
+        meta = ev.get("meta")
+        if isinstance(meta, dict) and meta.get("corr_id"):
+            corr.add(str(meta["corr_id"]))
+        if ev.get("function"):
+            prims.add(str(ev["function"]))
+        if ev.get("event"):
+            kinds.add(str(ev["event"]))
+    return corr, prims, kinds
+
+def _field(ev: dict[str, Any], name: str) -> Optional[str]:
+    if name == "corr_id":
+        meta = ev.get("meta")
+        v = meta.get("corr_id") if isinstance(meta, dict) else None
+    else:
+        v = ev.get("function" if name == "primitive" else name)
+    return None if v is None else str(v)
+
+def _needle(value: str) -> Optional[bytes]:
+    # the value as it appears in the posted JSON, when it cannot have been escaped differently
+    encoded = json.dumps(value)
+    return encoded.encode() if encoded[1:-1] == value else None
+
+# -----------------------------------------------------------------------------
+# Store
+# -----------------------------------------------------------------------------
+class TraceStore:
+    """
+    Segmented, indexed trace storage (see the storage format above). `append()` only queues the
+    batch: a writer thread packs queued batches into blocks of about `block_bytes`, at least
+    every `block_interval` seconds, and indexes them once written. Events become visible to
+    `query()` with their block. Opening a store loads the sidecar indexes, not the segments.
+    """
+
+    def __init__(
+        self,
+        directory: str = COLLECTOR_DIR,
+        *,
+        segment_seconds: int = SEGMENT_SECONDS,
+        segment_bytes: int = SEGMENT_BYTES,
+        block_bytes: int = BLOCK_BYTES,
+        block_interval: float = BLOCK_INTERVAL,
+        max_pending: int = MAX_PENDING,
+        level: int = 3,
+    ):
+        self.directory = directory
+        self.segment_seconds = max(1, segment_seconds)
+        self.segment_bytes = segment_bytes
+        self.block_bytes = block_bytes
+        self.block_interval = block_interval
+        self.max_pending = max_pending
+        self.level = level
+        os.makedirs(directory, exist_ok=True)
+
+        self.received = 0
+        self.written = 0
+        self.rejected = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+
+        self._blocks: list[BlockRef] = []
+        self._index: dict[str, dict[str, list[int]]] = {f: {} for f in FIELDS}
+        self._lock = threading.Lock()            # blocks, index, readers
+        self._readers: dict[str, int] = {}
+        self._segment: Optional[_Segment] = None
+        self._seq = 0
+        self._load()
+
+        # ingest side
+        self._pending: deque[tuple[bytes, float, str, set[str], set[str], set[str], int]] = deque()
+        self._pending_bytes = 0
+        self._in_flight = False
+        self._flushing = 0
+        self._closed = False
+        self._cv = threading.Condition()
+        self._writer = threading.Thread(target=self._run, name="fops-collector", daemon=True)
+        self._writer.start()
+
+    # --- opening ------------------------------------------------------------------
+    def _load(self) -> None:
+        for idx in sorted(glob.glob(os.path.join(self.directory, "*.idx"))):
+            name = os.path.basename(idx)[:-4]
+            try:
+                self._seq = max(self._seq, int(name.rsplit("-", 1)[1]) + 1)
+            except (IndexError, ValueError):
+                continue
+            seg = os.path.join(self.directory, name + ".seg")
+            size = os.path.getsize(seg) if os.path.exists(seg) else 0
+            with open(idx, "rb") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break   # torn tail
+                    if entry["off"] + entry["len"] > size:
+                        break   # block lost with a crash
+                    self._register(name, entry)
+
+    def _register(self, name: str, entry: dict[str, Any]) -> None:
+        ref = BlockRef(name, entry["off"], entry["len"], entry["n"], entry["t0"], entry["t1"])
+        with self._lock:
+            bid = len(self._blocks)
+            self._blocks.append(ref)
+            for f in FIELDS:
+                postings = self._index[f]
+                for v in entry.get(f, ()):
+                    ids = postings.get(v)
+                    if ids is None:
+                        postings[v] = [bid]
+                    else:
+                        ids.append(bid)
+
+    # --- ingest -------------------------------------------------------------------
+    def append(self, instance: str, events: list[Any], raw: Optional[bytes] = None, *,
+               t: Optional[float] = None, timeout: Optional[float] = 30.0) -> bool:
+        """
+        Queue one batch of events of `instance` (`raw`: its JSON encoding, if at hand). Waits
+        while more than `max_pending` bytes are queued; False if still full after `timeout`.
+        """
+        if not events:
+            return True
+        t = time.time() if t is None else t
+        if raw is None or b"\n" in raw or b"\r" in raw:   # one stored line per batch
+            raw = _encode_json(events).encode()
+        instance = instance.replace("\t", " ").replace("\n", " ")
+        corr, prims, kinds = _keys(events)
+        line = b"%s\t%.6f\t%s\n" % (instance.encode(), t, raw)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cv:
+            while self._pending_bytes >= self.max_pending and not self._closed:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self.rejected += len(events)
+                    return False
+                self._cv.wait(remaining)
+            if self._closed:
+                self.rejected += len(events)
+                return False
+            self._pending.append((line, t, instance, corr, prims, kinds, len(events)))
+            self._pending_bytes += len(line)
+            self.received += len(events)
+            if self._pending_bytes >= self.block_bytes:
+                self._cv.notify_all()
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Write the queued batches now. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cv:
+            self._flushing += 1
+            self._cv.notify_all()
+            try:
+                while self._pending or self._in_flight:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._cv.wait(remaining)
+            finally:
+                self._flushing -= 1
+        return True
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        self.flush(timeout)
+        with self._cv:
+            self._closed = True
+            self._cv.notify_all()
+        self._writer.join(timeout)
+        with self._lock:
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+            for fd in self._readers.values():
+                os.close(fd)
+            self._readers.clear()
+
+    def __enter__(self) -> "TraceStore":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    # --- writer thread ------------------------------------------------------------
+    def _run(self) -> None:
+        pending = self._pending
+        while True:
+            with self._cv:
+                if self._pending_bytes < self.block_bytes and not (self._closed or self._flushing):
+                    self._cv.wait(self.block_interval)
+                if not pending:
+                    self._cv.notify_all()
+                    if self._closed:
+                        return
+                    continue
+                items, size = [], 0
+                while pending and size < self.block_bytes:
+                    item = pending.popleft()
+                    items.append(item)
+                    size += len(item[0])
+                self._pending_bytes -= size
+                self._in_flight = True
+                self._cv.notify_all()   # room for held-back ingests
+            try:
+                self._write_block(items)
+            except OSError as e:
+                print(f"Trace collector could not write a block "
+                      f"({sum(i[6] for i in items)} events): {e}")
+            with self._cv:
+                self._in_flight = False
+                self._cv.notify_all()
+
+    def _segment_for(self, t: float) -> _Segment:
+        period = int(t // self.segment_seconds * self.segment_seconds)
+        seg = self._segment
+        if seg is None or seg.period != period or seg.size >= self.segment_bytes:
+            if seg is not None:
+                seg.close()
+            seg = self._segment = _Segment(self.directory, f"{period:010d}-{self._seq:06d}", period)
+            self._seq += 1
+        return seg
+
+    def _write_block(
+        self, items: list[tuple[bytes, float, str, set[str], set[str], set[str], int]],
+    ) -> None:
+        data = b"".join(i[0] for i in items)
+        payload = zlib.compress(data, self.level)
+        frame = _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        t0 = min(i[1] for i in items)
+        seg = self._segment_for(t0)
+        entry = {
+            "off": seg.size, "len": len(frame), "n": sum(i[6] for i in items),
+            "t0": t0, "t1": max(i[1] for i in items),
+            "instance": sorted({i[2] for i in items}),
+            "corr_id": sorted(set().union(*(i[3] for i in items))),
+            "primitive": sorted(set().union(*(i[4] for i in items))),
+            "event": sorted(set().union(*(i[5] for i in items))),
+        }
+        os.write(seg.fd, frame)
+        seg.size += len(frame)
+        os.write(seg.idx_fd, (_encode_json(entry) + "\n").encode())
+        self._register(seg.name, entry)
+        self.written += entry["n"]
+        self.raw_bytes += len(data)
+        self.stored_bytes += len(frame)
+
+    # --- queries ------------------------------------------------------------------
+    def blocks(self, *, instance: Optional[str] = None, corr_id: Optional[str] = None,
+               primitive: Optional[str] = None, event: Optional[str] = None,
+               since: Optional[float] = None, until: Optional[float] = None) -> list[BlockRef]:
+        """Blocks that may hold matching events, in write order (from the index only)."""
+        filters = [(f, v) for f, v in zip(FIELDS, (instance, corr_id, primitive, event))
+                   if v is not None]
+        with self._lock:
+            if filters:
+                lists = []
+                for f, v in filters:
+                    ids = self._index[f].get(v)
+                    if not ids:
+                        return []
+                    lists.append(ids)
+                lists.sort(key=len)
+                selected: Any = lists[0]
+                for other in lists[1:]:
+                    keep = set(other)
+                    selected = [i for i in selected if i in keep]
+                refs = [self._blocks[i] for i in selected]
+            else:
+                refs = list(self._blocks)
+        return [r for r in refs
+                if (since is None or r.t1 >= since) and (until is None or r.t0 <= until)]
+
+    def query(self, *, instance: Optional[str] = None, corr_id: Optional[str] = None,
+              primitive: Optional[str] = None, event: Optional[str] = None,
+              since: Optional[float] = None, until: Optional[float] = None,
+              limit: Optional[int] = None) -> Iterator[dict[str, Any]]:
+        """
+        Stored events matching every given field, oldest block first, each with its "instance"
+        and receipt time "t" added. `since` / `until` bound the receipt time (time.time()).
+        """
+        refs = self.blocks(instance=instance, corr_id=corr_id, primitive=primitive, event=event,
+                           since=since, until=until)
+        wanted = [(f, v) for f, v in zip(FIELDS[1:], (corr_id, primitive, event)) if v is not None]
+        needles = [n for n in (_needle(v) for _f, v in wanted) if n is not None]
+        inst = None if instance is None else instance.encode()
+        count = 0
+        for ref in refs:
+            for line in self._read(ref):
+                line_inst, ts, raw = line.split(b"\t", 2)
+                if inst is not None and line_inst != inst:
+                    continue
+                t = float(ts)
+                if (since is not None and t < since) or (until is not None and t > until):
+                    continue
+                if any(n not in raw for n in needles):
+                    continue
+                events = json.loads(raw)
+                if isinstance(events, dict):
+                    events = [events]
+                name = line_inst.decode()
+                for ev in events:
+                    if not isinstance(ev, dict) or any(_field(ev, f) != v for f, v in wanted):
+                        continue
+                    yield {"instance": name, "t": t, **ev}
+                    count += 1
+                    if limit is not None and count >= limit:
+                        return
+
+    def _read(self, ref: BlockRef) -> list[bytes]:
+        with self._lock:
+            fd = self._readers.get(ref.segment)
+            if fd is None:
+                fd = self._readers[ref.segment] = os.open(
+                    os.path.join(self.directory, ref.segment + ".seg"), os.O_RDONLY)
+        frame = os.pread(fd, ref.length, ref.offset)
+        size, crc = _HEADER.unpack_from(frame)
+        payload = frame[_HEADER.size:]
+        if len(payload) != size or zlib.crc32(payload) != crc:
+            print(f"Trace collector: corrupt block at {ref.segment}.seg:{ref.offset}, skipped")
+            return []
+        # lines end with b"\n" only (splitlines() would also split on b"\r" and other breaks)
+        return zlib.decompress(payload).split(b"\n")[:-1]
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            blocks = list(self._blocks)
+            keys = {f: len(self._index[f]) for f in FIELDS}
+        return {
+            "directory": self.directory,
+            "segments": len({b.segment for b in blocks}),
+            "blocks": len(blocks),
+            "events": sum(b.events for b in blocks),
+            "bytes": sum(b.length for b in blocks),
+            "keys": keys,
+            "received": self.received,
+            "written": self.written,
+            "rejected": self.rejected,
+            "pending_bytes": self._pending_bytes,
+            "compression": (round(self.raw_bytes / self.stored_bytes, 2)
+                            if self.stored_bytes else None),
+        }
+
+# -----------------------------------------------------------------------------
+# HTTP service
+# -----------------------------------------------------------------------------
+class CollectorServer:
+    """
+    Collector endpoints (stdlib HTTP, keep-alive, one thread per connection):
+        POST /ingest   a JSON list of trace events, or one event (X-Fops-Instance: the procedure's
+                       INSTANCE_ID, or ?instance=); 204 once queued, 503 while the store is full
+        GET  /query    matching events as JSON lines (?instance=, corr_id=, primitive=, event=,
+                       since=, until= (epoch seconds), limit=)
+        GET  /stats    store counters
+    """
+
+    def __init__(self, store: TraceStore, host: str = "127.0.0.1", port: int = 0, *,
+                 ingest_timeout: float = 30.0):
+        self.store = store
+        self.ingest_timeout = ingest_timeout
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> tuple[str, int]:
+        host, port = self._httpd.server_address[:2]
+        return str(host), int(port)
+
+    @property
+    def url(self) -> str:
+        host, port = self.address
+        return f"http://{host}:{port}/ingest"
+
+    def start(self) -> "CollectorServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever,
+                                        name="fops-collector-http", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self.store.close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"   # procedures keep their connection between batches
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def _json(self, obj, status: int = 200) -> None:
+                data = json.dumps(obj, default=str).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self) -> None:
+                url = urlparse(self.path)
+                raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if url.path not in ("/", "/ingest"):
+                    return self._json({"error": "not found"}, 404)
+                try:
+                    events = json.loads(raw)
+                except ValueError:
+                    return self._json({"error": "invalid JSON"}, 400)
+                if isinstance(events, dict):
+                    events = [events]
+                elif not isinstance(events, list):
+                    return self._json({"error": "expected a list of events"}, 400)
+                instance = (self.headers.get("X-Fops-Instance")
+                            or parse_qs(url.query).get("instance", [""])[0])
+                ok = server.store.append(instance, events, raw, timeout=server.ingest_timeout)
+                self.send_response(204 if ok else 503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_GET(self) -> None:
+                url = urlparse(self.path)
+                qs = parse_qs(url.query)
+                if url.path == "/query":
+                    self._query(qs)
+                elif url.path in ("/", "/stats"):
+                    self._json(server.store.stats())
+                else:
+                    self._json({"error": "not found"}, 404)
+
+            def _query(self, qs: dict[str, list[str]]) -> None:
+                try:
+                    kwargs: dict[str, Any] = {f: qs[f][0] for f in FIELDS if f in qs}
+                    for f in ("since", "until"):
+                        if f in qs:
+                            kwargs[f] = float(qs[f][0])
+                    kwargs["limit"] = int(qs.get("limit", [QUERY_LIMIT])[0])
+                except ValueError as e:
+                    return self._json({"error": str(e)}, 400)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                buf: list[str] = []
+                size = 0
+                for ev in server.store.query(**kwargs):
+                    line = _encode_json(ev) + "\n"
+                    buf.append(line)
+                    size += len(line)
+                    if size >= 65536:
+                        self._chunk("".join(buf).encode())
+                        buf, size = [], 0
+                if buf:
+                    self._chunk("".join(buf).encode())
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _chunk(self, data: bytes) -> None:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+        return Handler
+
+def serve_collector(address: str = COLLECTOR_ADDRESS, directory: str = COLLECTOR_DIR,
+                    **kwargs: Any) -> CollectorServer:
+    """Open the store in `directory` and serve it on "[host:]port" (port 0: any free port)."""
+    host, _, port = address.rpartition(":")
+    store = TraceStore(directory, **kwargs)
+    return CollectorServer(store, host or "127.0.0.1", int(port or 0)).start()
+
+__all__ = [
+    "TraceStore", "BlockRef", "CollectorServer", "serve_collector",
+    "COLLECTOR_ADDRESS", "COLLECTOR_DIR",
+]
@@ -0,0 +1,378 @@
+from __future__ import annotations
+
+import inspect
+import threading
+import time
+from collections.abc import Awaitable, Callable, Mapping, Sequence
+from dataclasses import dataclass, field
+from numbers import Real
+from typing import Any, Optional, Union
+
+from .args import (
+    BooleanExpr,
+    Condition,
+    Modifiers,
+    Operator,
+    ValueFmt,
+    Window,
+    _freeze,
+    merge_mods,
+    normalize_conditions,
+)
+from .profiler import span
+
+# Batched TM lookup: (parameter names, value format) -> {name: value}
+TMFetch = Callable[[Sequence[str], ValueFmt], Mapping[str, Any]]
+# Same, awaitable (e.g. Driver.aread_tm)
+AsyncTMFetch = Callable[[Sequence[str], ValueFmt], Awaitable[Mapping[str, Any]]]
+
+# seconds between re-checks when the call has no Timeout
+RECHECK_INTERVAL = 1.0
+
+class VerificationFailed(Exception):
+    def __init__(self, message: str, failed: list[str], values: dict[str, Any]):
+        super().__init__(message)
+        self.failed = failed
+        self.values = values
+
+# -----------------------------------------------------------------------------
+# Predicates
+# -----------------------------------------------------------------------------
+_Values = Mapping[tuple[ValueFmt, str], Any]
+_Node = Callable[[_Values], bool]
+
+def _is_num(x: Any) -> bool:
+    return isinstance(x, Real) and not isinstance(x, bool)
+
+def _make_predicate(op: Operator, ref: Any, mods: Modifiers) -> Callable[[Any], bool]:
+    tol = mods.Tolerance or 0.0
+
+    if op in (Operator.BW, Operator.NBW):
+        if not (isinstance(ref, (list, tuple)) and len(ref) == 2):
+            raise TypeError(f"{op.name} expects a [low, high] range, got {ref!r}")
+        lo, hi = ref[0] - tol, ref[1] + tol
+        if op is Operator.BW:
+            return lambda v: lo <= v <= hi
+        return lambda v: not (lo <= v <= hi)
+
+    if mods.IgnoreCase and isinstance(ref, str):
+        ref = ref.casefold()
+        if op is Operator.EQ:
+            return lambda v: isinstance(v, str) and v.casefold() == ref
+        if op is Operator.NEQ:
+            return lambda v: not (isinstance(v, str) and v.casefold() == ref)
+
+    if op is Operator.EQ:
+        if tol and _is_num(ref):
+            return lambda v: abs(v - ref) <= tol
+        return lambda v: v == ref
+    if op is Operator.NEQ:
+        if tol and _is_num(ref):
+            return lambda v: abs(v - ref) > tol
+        return lambda v: v != ref
+    # Tolerance widens what holds: the lower limit of GT/GE moves down, the upper of LT/LE up
+    if op in (Operator.GT, Operator.GE):
+        limit = ref - tol if tol and _is_num(ref) else ref
+        if op is Operator.GT:
+            return lambda v: v > limit
+        return lambda v: v >= limit
+    if op in (Operator.LT, Operator.LE):
+        limit = ref + tol if tol and _is_num(ref) else ref
+        if op is Operator.LT:
+            return lambda v: v < limit
+        return lambda v: v <= limit
+    raise TypeError(f"Unsupported operator: {op!r}")
+
+def describe(cond: Condition) -> str:
+    return f"{cond.left} {cond.op.value} {cond.right!r}"
+
+# -----------------------------------------------------------------------------
+# Compiled plan
+# -----------------------------------------------------------------------------
+@dataclass(frozen=True)
+class CompiledConditions:
+    """A condition tree compiled against the call's Modifiers."""
+
+    conditions: Union[list[Condition], BooleanExpr]
+    params: dict[ValueFmt, tuple[str, ...]]      # every referenced TM, grouped by format
+    leaves: tuple[tuple[Condition, tuple[ValueFmt, str], Callable[[Any], bool]], ...]
+    root: _Node
+    windows: dict[tuple[ValueFmt, Window], Any] = field(default_factory=dict)  # key -> WindowCheck
+
+    def fetch(self, fetch: TMFetch) -> dict[tuple[ValueFmt, str], Any]:
+        """One batched lookup per value format (normally a single one)."""
+        values: dict[tuple[ValueFmt, str], Any] = {}
+        for fmt, names in self.params.items():
+            got = fetch(names, fmt)
+            for name in names:
+                values[(fmt, name)] = got[name]
+        if self.windows:
+            self._read_windows(values)
+        return values
+
+    async def afetch(self, fetch: Union[TMFetch, AsyncTMFetch]) -> dict[tuple[ValueFmt, str], Any]:
+        values: dict[tuple[ValueFmt, str], Any] = {}
+        for fmt, names in self.params.items():
+            got = fetch(names, fmt)
+            if inspect.isawaitable(got):
+                got = await got
+            for name in names:
+                values[(fmt, name)] = got[name]
+        if self.windows:
+            self._read_windows(values)
+        return values
+
+    def _read_windows(self, values: dict[Any, Any]) -> None:
+        now = time.monotonic()
+        for key, check in self.windows.items():
+            values[key] = check.read(values, now)
+
+    def failed(self, values: _Values) -> list[str]:
+        out = []
+        for cond, key, pred in self.leaves:
+            try:
+                ok = pred(values[key])
+            except Exception:
+                ok = False
+            if not ok:
+                out.append(describe(cond))
+        return out
+
+    def evaluate(self, fetch: TMFetch) -> tuple[bool, dict[tuple[ValueFmt, str], Any]]:
+        values = self.fetch(fetch)
+        return self.root(values), values
+
+    async def aevaluate(
+        self, fetch: Union[TMFetch, AsyncTMFetch],
+    ) -> tuple[bool, dict[tuple[ValueFmt, str], Any]]:
+        values = await self.afetch(fetch)
+        return self.root(values), values
+
+def _compile_node(
+    node: Union[BooleanExpr, Condition],
+    base: Modifiers,
+    params: dict[ValueFmt, dict[str, None]],
+    leaves: list[tuple[Condition, tuple[ValueFmt, str], Callable[[Any], bool]]],
+    windows: dict[tuple[ValueFmt, Window], Any],
+) -> _Node:
+    if isinstance(node, Condition) and isinstance(node.left, Window):
+        from .history import WindowCheck  # NumPy is only needed for windowed conditions
+
+        mods = merge_mods(base, node.overrides, node.explicit)
+        check = WindowCheck(node.left, node.op, node.right, mods)
+        wkey = (mods.ValueFormat, node.left)
+        for name in node.left.names:   # current values are read too (and sampled when not pushed)
+            params.setdefault(mods.ValueFormat, {})[name] = None
+        leaves.append((node, wkey, check))
+        windows[wkey] = check
+
+        def window_leaf(values: _Values) -> bool:
+            return check(values[wkey])
+        return window_leaf
+
+    if isinstance(node, Condition):
+        mods = merge_mods(base, node.overrides, node.explicit)
+        pred = _make_predicate(node.op, node.right, mods)
+        key = (mods.ValueFormat, node.left)
+        params.setdefault(mods.ValueFormat, {})[node.left] = None
+        leaves.append((node, key, pred))
+
+        def leaf(values: _Values) -> bool:
+            try:
+                return pred(values[key])
+            except TypeError:  # e.g. comparing None/str against a number
+                return False
+        return leaf
+
+    children = tuple(_compile_node(c, base, params, leaves, windows) for c in node.children)
+    if node.kind == "AND":
+        def all_of(values: _Values) -> bool:
+            for child in children:
+                if not child(values):
+                    return False
+            return True
+        return all_of
+    if node.kind == "OR":
+        def any_of(values: _Values) -> bool:
+            for child in children:
+                if child(values):
+                    return True
+            return False
+        return any_of
+    raise TypeError(f"Unknown boolean expression kind: {node.kind!r}")
+
+_plans: dict[Any, tuple[Any, CompiledConditions]] = {}
+_plans_lock = threading.Lock()
+_PLAN_CACHE_SIZE = 512
+
+def _spec_key(spec: Any) -> Any:
+    if isinstance(spec, BooleanExpr):
+        return ("expr", id(spec))  # the cache entry keeps `spec` alive, so the id stays valid
+    return ("raw", _freeze(spec))
+
+def compile_conditions(spec: Any, base: Modifiers) -> CompiledConditions:
+    """
+    Compile a VerifyTM spec (condition, list of conditions or AND/OR tree) once.
+    Plans are cached per (spec, base Modifiers), so loops and retries reuse them.
+    A plan passed as `spec` (precompiled by the preflight for that call site) is returned as is.
+    """
+    if isinstance(spec, CompiledConditions):
+        return spec
+    try:
+        key: Any = (_spec_key(spec), base)
+        hit = _plans.get(key)
+    except TypeError:  # unhashable literal in the spec
+        key, hit = None, None
+    if hit is not None:
+        return hit[1]
+
+    conditions = normalize_conditions(spec)
+    params: dict[ValueFmt, dict[str, None]] = {}
+    leaves: list[tuple[Condition, tuple[ValueFmt, str], Callable[[Any], bool]]] = []
+    windows: dict[tuple[ValueFmt, Window], Any] = {}
+    tree = (conditions if isinstance(conditions, BooleanExpr)
+            else BooleanExpr("AND", list(conditions)))
+    root = _compile_node(tree, base, params, leaves, windows)
+    plan = CompiledConditions(
+        conditions=conditions,
+        params={fmt: tuple(names) for fmt, names in params.items()},
+        leaves=tuple(leaves),
+        root=root,
+        windows=windows,
+    )
+    if key is not None:
+        with _plans_lock:   # compiling threads evict concurrently
+            if len(_plans) >= _PLAN_CACHE_SIZE:
+                _plans.pop(next(iter(_plans)))
+            _plans[key] = (spec, plan)
+    return plan
+
+# -----------------------------------------------------------------------------
+# Verification loop
+# -----------------------------------------------------------------------------
+@dataclass(frozen=True)
+class VerifyResult:
+    ok: bool
+    values: dict[str, Any]   # {param: value} of the last check
+    attempts: int
+    failed: list[str]        # conditions that did not hold on the last check
+
+def _schedule(retries: Optional[int], timeout: Optional[float],
+              interval: Optional[float]) -> tuple[int, float, Optional[float]]:
+    attempts = 1 + max(0, int(retries or 0))
+    if interval is None:
+        interval = (timeout / max(attempts - 1, 1)) if timeout else RECHECK_INTERVAL
+    deadline = time.monotonic() + timeout if timeout else None
+    return attempts, interval, deadline
+
+def _wait(interval: float, deadline: Optional[float]) -> Optional[float]:
+    # pause before the next re-check, shortened to end at the deadline (None: past it)
+    if deadline is None:
+        return interval
+    left = deadline - time.monotonic()
+    return min(interval, left) if left > 0 else None
+
+def _result(plan: CompiledConditions, ok: bool, values: _Values, attempt: int) -> VerifyResult:
+    return VerifyResult(
+        ok=ok,
+        values=_flat_values(plan, values),
+        attempts=attempt,
+        failed=[] if ok else plan.failed(values),
+    )
+
+def verify(
+    plan: CompiledConditions,
+    fetch: TMFetch,
+    *,
+    retries: int = 0,
+    timeout: Optional[float] = None,
+    interval: Optional[float] = None,
+    sleep: Callable[[float], None] = time.sleep,
+    transient: Optional[Callable[[BaseException], bool]] = None,
+) -> VerifyResult:
+    """
+    Evaluate `plan` up to 1 + `retries` times. Re-checks are spread over `timeout` when given,
+    otherwise spaced by `interval` (default RECHECK_INTERVAL). A read error for which
+    `transient(error)` holds counts as a failed check; it is raised if the last check fails so.
+    """
+    attempts, interval, deadline = _schedule(retries, timeout, interval)
+    ok, values, error = False, {}, None
+    for attempt in range(1, attempts + 1):
+        try:
+            ok, values = plan.evaluate(fetch)
+            error = None
+        except Exception as e:
+            if transient is None or not transient(e):
+                raise
+            ok, error = False, e
+        if ok or attempt == attempts:
+            break
+        wait = _wait(interval, deadline)
+        if wait is None:
+            break
+        with span("tm"):   # waiting for telemetry to change
+            sleep(wait)
+    if error is not None:
+        raise error
+    return _result(plan, ok, values, attempt)
+
+async def averify(
+    plan: CompiledConditions,
+    fetch: Union[TMFetch, AsyncTMFetch],
+    *,
+    retries: int = 0,
+    timeout: Optional[float] = None,
+    interval: Optional[float] = None,
+    transient: Optional[Callable[[BaseException], bool]] = None,
+) -> VerifyResult:
+    """
+    verify() for asyncio: waits between re-checks yield to other tasks. `fetch` may be sync or
+    async.
+    """
+    attempts, interval, deadline = _schedule(retries, timeout, interval)
+    ok, values, error = False, {}, None
+    for attempt in range(1, attempts + 1):
+        try:
+            ok, values = await plan.aevaluate(fetch)
+            error = None
+        except Exception as e:
+            if transient is None or not transient(e):
+                raise
+            ok, error = False, e
+        if ok or attempt == attempts:
+            break
+        wait = _wait(interval, deadline)
+        if wait is None:
+            break
+        import asyncio   # imported by averify() only: sync procedures never load the event loop
+        with span("tm"):
+            await asyncio.sleep(wait)
+    if error is not None:
+        raise error
+    return _result(plan, ok, values, attempt)
+
+def _flat_values(plan: CompiledConditions,
+                 values: Mapping[tuple[ValueFmt, str], Any]) -> dict[str, Any]:
+    if plan.windows:   # report a summary of each window, not its samples
+        values = {k: (v.summary() if k in plan.windows else v) for k, v in values.items()}
+    if len(plan.params) <= 1:
+        return {str(name): v for (_fmt, name), v in values.items()}
+    return {f"{name}:{fmt.value}": v for (fmt, name), v in values.items()}
+
+# -----------------------------------------------------------------------------
+# TM source used by VerifyTM
+# -----------------------------------------------------------------------------
+_tm_source: Optional[TMFetch] = None
+
+def set_tm_source(fetch: Optional[TMFetch]) -> None:
+    global _tm_source
+    _tm_source = fetch
+
+def get_tm_source() -> Optional[TMFetch]:
+    return _tm_source
+
+__all__ = [
+    "TMFetch", "AsyncTMFetch", "VerificationFailed", "CompiledConditions", "VerifyResult",
+    "compile_conditions", "verify", "averify", "describe",
+    "set_tm_source", "get_tm_source",
+]
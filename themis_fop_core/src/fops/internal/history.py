@@ -0,0 +1,298 @@
+"""
+Telemetry history for windowed conditions.
+
+Every tracked parameter keeps its last `FOPS_TM_HISTORY` samples as (timestamp, raw, eng) in
+preallocated NumPy ring buffers. Samples come from driver pushes (`Driver.subscribe`) or, for
+drivers that cannot push, from the reads of the checks themselves. A windowed condition
+(`[Window("TM1", seconds=30), "bw", [lo, hi]]`) is evaluated on the whole window at once, for
+all of its parameters in one pass.
+"""
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from collections.abc import Callable, Mapping, Sequence
+from numbers import Real
+from typing import Any, Optional
+
+import numpy as np
+
+from .args import Modifiers, Operator, ValueFmt, Window
+
+# samples kept per parameter (timestamp + raw + eng float64, stored twice: 48 bytes per sample)
+HISTORY_SIZE = int(os.environ.get("FOPS_TM_HISTORY", "4096"))
+
+# -----------------------------------------------------------------------------
+# Ring buffers
+# -----------------------------------------------------------------------------
+class _Ring:
+    """
+    The last `capacity` samples of one parameter. Every sample is written at i and i + capacity,
+    so the newest k samples are always one contiguous slice. Pushes of the RAW and ENG value of
+    the same sample (same timestamp) fill the two columns of one slot.
+    """
+
+    __slots__ = ("capacity", "ts", "cols", "count", "last_ts", "pushed", "non_numeric", "late",
+                 "lock")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.ts = np.zeros(2 * capacity)
+        self.cols = {fmt: np.full(2 * capacity, np.nan) for fmt in ValueFmt}
+        self.count = 0
+        self.last_ts = -math.inf
+        self.pushed: set[ValueFmt] = set()   # formats fed by driver pushes
+        self.non_numeric = 0
+        self.late = 0
+        self.lock = threading.Lock()
+
+    def add(self, fmt: ValueFmt, value: Any, ts: float) -> None:
+        try:
+            v = float(value)
+        except (TypeError, ValueError):
+            v = math.nan
+            self.non_numeric += 1
+        cap = self.capacity
+        with self.lock:
+            if ts == self.last_ts:
+                i = (self.count - 1) % cap
+            elif ts < self.last_ts:
+                self.late += 1   # out of order: windows are searched by timestamp
+                return
+            else:
+                i = self.count % cap
+                self.ts[i] = self.ts[i + cap] = ts
+                for col in self.cols.values():
+                    col[i] = col[i + cap] = math.nan
+                self.count += 1
+                self.last_ts = ts
+            col = self.cols[fmt]
+            col[i] = col[i + cap] = v
+
+    def window(self, fmt: ValueFmt, seconds: Optional[float], samples: Optional[int],
+               now: float) -> Optional[np.ndarray]:
+        """Copy of the window's values, None while the history does not cover it."""
+        cap = self.capacity
+        with self.lock:
+            n = min(self.count, cap)
+            if not n:
+                return None
+            end = (self.count - 1) % cap + cap + 1
+            if samples is not None:
+                return self.cols[fmt][end - samples:end].copy() if n >= samples else None
+            # include the sample in force when the window opened
+            start = int(np.searchsorted(self.ts[end - n:end], now - seconds, side="right")) - 1
+            if start < 0:
+                return None
+            return self.cols[fmt][end - n + start:end].copy()
+
+class TMHistory:
+    """Per-parameter sample history (bounded: `capacity` samples per parameter)."""
+
+    def __init__(self, capacity: int = HISTORY_SIZE):
+        self.capacity = max(1, capacity)
+        self._rings: dict[str, _Ring] = {}
+        self._tracked: set[tuple[str, ValueFmt]] = set()
+        self._lock = threading.Lock()
+
+    def _ring(self, name: str) -> _Ring:
+        ring = self._rings.get(name)
+        if ring is None:
+            with self._lock:
+                ring = self._rings.setdefault(name, _Ring(self.capacity))
+        return ring
+
+    def record(self, name: str, value: Any, fmt: ValueFmt = ValueFmt.ENG,
+               ts: Optional[float] = None) -> None:
+        self._ring(name).add(fmt, value, time.monotonic() if ts is None else ts)
+
+    def track(self, names: Sequence[str], fmt: ValueFmt = ValueFmt.ENG, driver: Any = None) -> bool:
+        """
+        Record every new sample of `names` from now on. Returns False when the driver cannot
+        push: the parameters are then sampled by the reads of the windowed checks.
+        """
+        with self._lock:
+            new = [n for n in names if (n, fmt) not in self._tracked]
+            self._tracked.update((n, fmt) for n in new)
+        if not new:
+            return all(fmt in self._ring(n).pushed for n in names)
+        if driver is None:
+            from fops.driver import get_driver
+
+            driver = get_driver()
+
+        def push(name: str, value: Any, ts: float) -> None:
+            self._ring(name).add(fmt, value, ts)
+
+        rings = [self._ring(n) for n in new]
+        if not driver.subscribe(new, fmt, push):
+            return False
+        for ring in rings:
+            ring.pushed.add(fmt)
+        return True
+
+    def poll(self, names: Sequence[str], fmt: ValueFmt, values: Mapping[tuple[ValueFmt, str], Any],
+             ts: float) -> None:
+        """Record values read by a check, for parameters the driver does not push."""
+        for name in names:
+            ring = self._ring(name)
+            if fmt not in ring.pushed and (fmt, name) in values:
+                ring.add(fmt, values[(fmt, name)], ts)
+
+    def window(self, name: str, fmt: ValueFmt = ValueFmt.ENG, *, seconds: Optional[float] = None,
+               samples: Optional[int] = None, now: Optional[float] = None) -> Optional[np.ndarray]:
+        ring = self._rings.get(name)
+        if ring is None:
+            return None
+        return ring.window(fmt, seconds, samples, time.monotonic() if now is None else now)
+
+    def clear(self, names: Optional[Sequence[str]] = None) -> None:
+        """Forget the samples (the parameters stay tracked)."""
+        with self._lock:
+            for name in (list(self._rings) if names is None else names):
+                ring = self._rings.get(name)
+                if ring is not None:
+                    with ring.lock:
+                        ring.count, ring.last_ts = 0, -math.inf
+
+    def stats(self) -> dict[str, Any]:
+        rings = list(self._rings.values())
+        return {
+            "params": len(rings),
+            "capacity": self.capacity,
+            "samples": sum(min(r.count, r.capacity) for r in rings),
+            "non_numeric": sum(r.non_numeric for r in rings),
+            "late": sum(r.late for r in rings),
+            "bytes": sum(r.ts.nbytes + sum(c.nbytes for c in r.cols.values()) for r in rings),
+        }
+
+tm_history = TMHistory()
+
+def track_tm(names: Sequence[str], fmt: ValueFmt = ValueFmt.ENG) -> bool:
+    """Start recording `names` ahead of a windowed check (e.g. "stayed ... for 30 s")."""
+    return tm_history.track(list(names), fmt)
+
+# -----------------------------------------------------------------------------
+# Vectorized windowed conditions
+# -----------------------------------------------------------------------------
+_ArrayPredicate = Callable[[np.ndarray], np.ndarray]
+
+def _is_num(x: Any) -> bool:
+    return isinstance(x, Real) and not isinstance(x, bool)
+
+def _make_array_predicate(op: Operator, ref: Any, mods: Modifiers) -> _ArrayPredicate:
+    # same semantics as conditions._make_predicate; NaN (missing or non-numeric sample) never holds
+    tol = mods.Tolerance or 0.0
+
+    if op in (Operator.BW, Operator.NBW):
+        if not (isinstance(ref, (list, tuple)) and len(ref) == 2 and all(map(_is_num, ref))):
+            raise TypeError(f"{op.name} expects a [low, high] range, got {ref!r}")
+        lo, hi = ref[0] - tol, ref[1] + tol
+        if op is Operator.BW:
+            return lambda v: (v >= lo) & (v <= hi)
+        return lambda v: (v < lo) | (v > hi)
+
+    if not _is_num(ref):
+        raise TypeError(f"Windowed conditions compare numbers, got {ref!r}")
+    if op is Operator.EQ:
+        if tol:
+            return lambda v: np.abs(v - ref) <= tol
+        return lambda v: v == ref
+    if op is Operator.NEQ:
+        if tol:
+            return lambda v: np.abs(v - ref) > tol
+        return lambda v: (v != ref) & ~np.isnan(v)
+    if op in (Operator.GT, Operator.GE):
+        limit = ref - tol
+        if op is Operator.GT:
+            return lambda v: v > limit
+        return lambda v: v >= limit
+    if op in (Operator.LT, Operator.LE):
+        limit = ref + tol
+        if op is Operator.LT:
+            return lambda v: v < limit
+        return lambda v: v <= limit
+    raise TypeError(f"Unsupported operator: {op!r}")
+
+class WindowValues:
+    """The samples a windowed check looked at, one array per parameter (None: not covered yet)."""
+
+    __slots__ = ("window", "arrays")
+
+    def __init__(self, window: Window, arrays: list[Optional[np.ndarray]]):
+        self.window = window
+        self.arrays = arrays
+
+    def summary(self) -> dict[str, Any]:
+        out: dict[str, Any] = {}
+        for name, a in zip(self.window.names, self.arrays):
+            if a is None:
+                out[name] = None
+            else:
+                out[name] = {"n": int(a.size), "min": float(np.nanmin(a)) if a.size else None,
+                             "max": float(np.nanmax(a)) if a.size else None, "last": float(a[-1])}
+        return out
+
+    def __repr__(self) -> str:
+        return f"<WindowValues {self.window}: {self.summary()}>"
+
+class WindowCheck:
+    """A windowed condition compiled against its Modifiers."""
+
+    __slots__ = ("window", "fmt", "test", "history", "_tracked")
+
+    def __init__(self, window: Window, op: Operator, ref: Any, mods: Modifiers,
+                 history: Optional[TMHistory] = None):
+        self.window = window
+        self.fmt = mods.ValueFormat
+        self.test = _make_array_predicate(op, ref, mods)
+        self.history = history or tm_history
+        self._tracked = False
+
+    def read(self, values: Mapping[tuple[ValueFmt, str], Any], now: float) -> WindowValues:
+        """Snapshot the window; `values` are the current values just read for the same check."""
+        names = self.window.names
+        if not self._tracked:   # first evaluation, not at compile time (the preflight compiles too)
+            self.history.track(names, self.fmt)
+            self._tracked = True
+        self.history.poll(names, self.fmt, values, now)
+        w = self.window
+        return WindowValues(w, [self.history.window(n, self.fmt, seconds=w.seconds,
+                                                    samples=w.samples, now=now)
+                                for n in names])
+
+    def __call__(self, wv: WindowValues) -> bool:
+        arrays = wv.arrays
+        if any(a is None for a in arrays):
+            return False
+        if len(arrays) == 1:
+            vals = arrays[0]
+            offsets = np.zeros(1, dtype=np.intp)
+            lengths = np.array([vals.size])
+        else:
+            vals = np.concatenate(arrays)
+            lengths = np.fromiter((a.size for a in arrays), dtype=np.intp, count=len(arrays))
+            offsets = np.concatenate(([0], np.cumsum(lengths[:-1])))
+        agg = self.window.agg
+        if agg == "all":
+            per = np.logical_and.reduceat(self.test(vals), offsets)
+        elif agg == "any":
+            per = np.logical_or.reduceat(self.test(vals), offsets)
+        else:
+            per = self.test(_aggregate(agg, vals, offsets, lengths))
+        return bool(per.all())
+
+def _aggregate(agg: str, vals: np.ndarray, offsets: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    if agg == "min":
+        return np.minimum.reduceat(vals, offsets)
+    if agg == "max":
+        return np.maximum.reduceat(vals, offsets)
+    mean = np.add.reduceat(vals, offsets) / lengths
+    if agg == "mean":
+        return mean
+    dev = vals - np.repeat(mean, lengths)
+    return np.sqrt(np.add.reduceat(dev * dev, offsets) / lengths)
+
+__all__ = ["TMHistory", "tm_history", "track_tm", "WindowCheck", "WindowValues", "HISTORY_SIZE"]
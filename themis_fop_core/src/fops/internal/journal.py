@@ -0,0 +1,385 @@
+from __future__ import annotations
+
+import atexit
+import functools
+import hashlib
+import inspect
+import io
+import os
+import pickle
+import re
+import struct
+import threading
+import time
+import warnings
+import zlib
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from .args import Modifiers
+from .trace import attempt_var, corr_id_var, safe_repr
+
+# journal file; unset -> journaling disabled
+JOURNAL_PATH = os.environ.get("FOPS_JOURNAL")
+# "1" -> skip primitives already completed in the journal instead of starting a new one
+RESUME = os.environ.get("FOPS_RESUME", "0").lower() in ("1", "true", "yes")
+# seconds between background fsyncs (records are written to the OS immediately)
+SYNC_INTERVAL = 0.2
+# distinct Modifiers kept referenced by id; older ones are written again on their next use
+MODS_TABLE_SIZE = 1024
+
+# -----------------------------------------------------------------------------
+# Record format
+# -----------------------------------------------------------------------------
+# Each record: <u32 payload length> <u32 crc32(payload)> <payload>, payload = pickled tuple
+#   (kind, primitive, fingerprint, occurrence, corr_id, attempt, wall time, modifiers, data)
+# A torn record at the tail (crash mid-write) fails the length/crc check and is dropped.
+# Modifiers (interned by the parsers) are pickled once, in a MODS record, and referenced by id.
+_HEADER = struct.Struct("<II")
+
+RUN = "run"          # procedure (re)started; data = {"resume": bool, "pid": int}
+DONE = "done"        # primitive completed; data = its return value
+FAILED = "failed"    # one attempt raised; data = repr of the exception
+MODS = "mods"        # Modifiers definition; occurrence = its id (internal, not yielded)
+
+@dataclass(frozen=True)
+class JournalRecord:
+    kind: str
+    primitive: str
+    fingerprint: bytes
+    occurrence: int
+    corr_id: str
+    attempt: int
+    time: float
+    modifiers: Any
+    data: Any
+
+def _frame(payload: bytes) -> bytes:
+    return _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+class _Pickler(pickle.Pickler):
+    def __init__(self, file: io.BytesIO, journal: "Journal"):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.journal = journal
+
+    def persistent_id(self, obj: Any) -> Optional[int]:
+        if type(obj) is Modifiers:
+            return self.journal._mods_id(obj)
+        return None
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, file: io.BytesIO, mods: dict[int, Modifiers]):
+        super().__init__(file)
+        self.mods = mods
+
+    def persistent_load(self, pid: int) -> Modifiers:
+        return self.mods[pid]
+
+def _scan(data: bytes) -> Iterator[tuple[int, JournalRecord]]:
+    # (end offset, record) of every intact record, MODS included
+    mods: dict[int, Modifiers] = {}
+    pos, end = 0, len(data)
+    while pos + _HEADER.size <= end:
+        size, crc = _HEADER.unpack_from(data, pos)
+        start = pos + _HEADER.size
+        payload = data[start:start + size]
+        if len(payload) < size or zlib.crc32(payload) != crc:
+            return
+        try:
+            rec = JournalRecord(*_Unpickler(io.BytesIO(payload), mods).load())
+        except Exception:
+            return
+        if rec.kind == MODS:
+            mods[rec.occurrence] = rec.modifiers
+        pos = start + size
+        yield pos, rec
+
+def read_journal(path: str) -> Iterator[JournalRecord]:
+    """Records of a journal file, in order, up to the first torn/corrupt one."""
+    with open(path, "rb") as f:
+        data = f.read()
+    for _end, rec in _scan(data):
+        if rec.kind != MODS:
+            yield rec
+
+# -----------------------------------------------------------------------------
+# Journal
+# -----------------------------------------------------------------------------
+class Journal:
+    """
+    Append-only checkpoint journal of one procedure.
+
+    Primitives are identified by (name, fingerprint of their arguments, occurrence): the n-th
+    completion of identical calls. A re-run therefore matches the same calls even when
+    concurrent primitives finish in another order, and failed attempts do not shift it.
+    Records go to the OS with a single write() each (they survive a process crash); fsync is
+    batched on a background thread every `sync_interval` seconds, and on sync()/close().
+    With `resume=True`, primitives completed by a previous run are not executed again:
+    their journaled result is returned instead.
+    """
+
+    def __init__(self, path: str, *, resume: bool = False, sync_interval: float = SYNC_INTERVAL):
+        self.path = path
+        self.resume = resume
+        self.sync_interval = sync_interval
+        self._completed: dict[tuple[str, bytes], list[Any]] = {}   # results of previous runs
+        self._consumed: dict[tuple[str, bytes], int] = {}        # skipped + completed this run
+        self._mod_ids: dict[Modifiers, int] = {}               # mods -> journal id, oldest first
+        self._next_mod = 0
+        self._buf = io.BytesIO()
+        self._pickler = _Pickler(self._buf, self)
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._stop = threading.Event()
+
+        if resume and os.path.exists(path):
+            with open(path, "rb") as f:
+                data = f.read()
+            done: dict[tuple[str, bytes, int], Any] = {}
+            valid = 0
+            for valid, rec in _scan(data):
+                if rec.kind == DONE and rec.fingerprint:
+                    done[(rec.primitive, rec.fingerprint, rec.occurrence)] = rec.data
+            for (name, fp, _n), result in sorted(done.items(), key=lambda kv: kv[0][2]):
+                self._completed.setdefault((name, fp), []).append(result)
+            if valid < len(data):
+                with open(path, "r+b") as f:  # drop a torn tail so new records stay readable
+                    f.truncate(valid)
+            flags = os.O_WRONLY | os.O_APPEND
+        else:
+            flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND
+        self._fd = os.open(path, flags, 0o644)
+
+        self.skipped = 0
+        self.written = 0
+        self._write((RUN, "", b"", 0, "", 0, time.time(), None,
+                     {"resume": resume, "pid": os.getpid()}))
+
+        self._syncer = threading.Thread(target=self._sync_loop, name="fops-journal-sync",
+                                        daemon=True)
+        self._syncer.start()
+
+    # --- writing ------------------------------------------------------------------
+    def _write(self, fields: tuple) -> None:
+        with self._lock:  # encoded under the lock: MODS records must precede their first use
+            try:
+                payload = self._encode(fields)
+            except Exception:  # unpicklable result: keep a printable trace of it
+                payload = self._encode(fields[:-1] + (safe_repr(fields[-1], maxlen=400),))
+            os.write(self._fd, _frame(payload))
+            self._dirty = True
+            self.written += 1
+
+    def _encode(self, fields: tuple) -> bytes:
+        buf = self._buf
+        buf.seek(0)
+        buf.truncate()
+        self._pickler.clear_memo()
+        self._pickler.dump(fields)
+        return buf.getvalue()
+
+    def _mods_id(self, mods: Modifiers) -> int:
+        # caller holds the lock; keyed by value, so equal Modifiers share one MODS record
+        mid = self._mod_ids.get(mods)
+        if mid is not None:
+            return mid
+        if len(self._mod_ids) >= MODS_TABLE_SIZE:
+            self._mod_ids.pop(next(iter(self._mod_ids)))
+        mid = self._next_mod
+        self._next_mod += 1
+        self._mod_ids[mods] = mid
+        payload = pickle.dumps((MODS, "", b"", mid, "", 0, time.time(), mods, None),
+                               protocol=pickle.HIGHEST_PROTOCOL)
+        os.write(self._fd, _frame(payload))
+        return mid
+
+    def _sync_loop(self) -> None:
+        while not self._stop.wait(self.sync_interval):
+            self.sync()
+
+    def sync(self) -> None:
+        """fsync pending records now."""
+        with self._lock:
+            if not self._dirty or self._fd < 0:
+                return
+            self._dirty = False
+            fd = self._fd
+        os.fsync(fd)
+
+    def close(self) -> None:
+        self._stop.set()
+        self.sync()
+        with self._lock:
+            if self._fd >= 0:
+                os.close(self._fd)
+                self._fd = -1
+
+    # --- primitives ---------------------------------------------------------------
+    def lookup(self, name: str, fingerprint: bytes) -> tuple[bool, Any]:
+        """(True, result) when a previous run completed this call (consumes it)."""
+        if not fingerprint:  # unstable arguments: never matched
+            return False, None
+        key = (name, fingerprint)
+        with self._lock:
+            done = self._completed.get(key)
+            n = self._consumed.get(key, 0)
+            if done is None or n >= len(done):
+                return False, None
+            self._consumed[key] = n + 1
+            self.skipped += 1
+        return True, done[n]
+
+    def done(self, name: str, fingerprint: bytes, mods: Any, result: Any) -> None:
+        key = (name, fingerprint)
+        with self._lock:
+            n = self._consumed.get(key, 0)
+            self._consumed[key] = n + 1
+        self._record(DONE, name, fingerprint, n, mods, result)
+
+    def failed(self, name: str, fingerprint: bytes, mods: Any, exc: BaseException) -> None:
+        with self._lock:
+            n = self._consumed.get((name, fingerprint), 0)
+        self._record(FAILED, name, fingerprint, n, mods, safe_repr(exc, maxlen=400))
+
+    def _record(self, kind: str, name: str, fingerprint: bytes, occurrence: int, mods: Any,
+                data: Any) -> None:
+        self._write((kind, name, fingerprint, occurrence, corr_id_var.get(), attempt_var.get(),
+                     time.time(), mods, data))
+
+    def __enter__(self) -> "Journal":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def _stable(v: Any) -> Any:
+    # set order depends on the per-process hash seed: sort set-valued arguments (e.g. OnFailure)
+    if isinstance(v, (set, frozenset)):
+        return sorted(map(repr, v))
+    return v
+
+# default object reprs ("<Foo object at 0x7f...>") change from one process to the next
+_ADDRESS = re.compile(r" at 0x[0-9a-fA-F]+")
+
+def fingerprint(args: tuple, kwargs: dict) -> bytes:
+    """
+    Digest of a primitive's call arguments, identical across processes.
+
+    Arguments are identified by their repr. When one shows an object address, the call
+    cannot be recognised by a later run: the fingerprint is empty (b"") and the call is
+    journaled but always executed again on resume.
+    """
+    key = repr((tuple(map(_stable, args)), {k: _stable(v) for k, v in kwargs.items()}))
+    if _ADDRESS.search(key):
+        return b""
+    return hashlib.blake2b(key.encode(), digest_size=8).digest()
+
+def _unstable(name: str) -> None:
+    warnings.warn(f"{name}: an argument repr shows an object address, the call cannot be resumed "
+                  "(give it a __repr__ that identifies it)", stacklevel=3)
+
+# -----------------------------------------------------------------------------
+# Active journal
+# -----------------------------------------------------------------------------
+_journal: Optional[Journal] = None
+_journal_lock = threading.Lock()
+_from_env = False
+
+def get_journal() -> Optional[Journal]:
+    """Journal of this procedure (opened from FOPS_JOURNAL/FOPS_RESUME on first use), or None."""
+    global _journal, _from_env
+    if _journal is None and not _from_env:
+        with _journal_lock:
+            if not _from_env:
+                _from_env = True
+                if JOURNAL_PATH:
+                    _journal = Journal(JOURNAL_PATH, resume=RESUME)
+    return _journal
+
+def set_journal(journal: Optional[Journal]) -> Optional[Journal]:
+    """Install `journal` (None disables journaling). Returns the previous one."""
+    global _journal, _from_env
+    with _journal_lock:
+        prev, _journal, _from_env = _journal, journal, True
+    return prev
+
+def open_journal(path: str, *, resume: bool = False,
+                 sync_interval: float = SYNC_INTERVAL) -> Journal:
+    """Open `path` and make it the active journal."""
+    journal = Journal(path, resume=resume, sync_interval=sync_interval)
+    prev = set_journal(journal)
+    if prev is not None:
+        prev.close()
+    return journal
+
+def _close_journal() -> None:
+    if _journal is not None:
+        _journal.close()
+
+atexit.register(_close_journal)
+
+# -----------------------------------------------------------------------------
+# Decorator
+# -----------------------------------------------------------------------------
+def checkpoint(func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Journal every attempt of a primitive. Goes under the retry decorator (which sets
+    corr_id/attempt) and above `with_args`, whose parser resolves the modifiers.
+    """
+    name = func.__name__
+    parser = getattr(func, "modifier_parser", None)
+
+    def _mods(kwargs: dict, result: Any = None) -> Any:
+        if isinstance(result, dict) and "modifiers" in result:  # already resolved by the primitive
+            return result["modifiers"]
+        return parser.split(kwargs)[0] if parser is not None else None
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def awrapper(*args: Any, **kwargs: Any):
+            journal = get_journal()
+            if journal is None:
+                return await func(*args, **kwargs)
+            fp = fingerprint(args, kwargs)
+            if journal.resume:
+                if not fp:
+                    _unstable(name)
+                hit, result = journal.lookup(name, fp)
+                if hit:
+                    return result
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                journal.failed(name, fp, _mods(kwargs), e)
+                raise
+            journal.done(name, fp, _mods(kwargs, result), result)
+            return result
+        return awrapper
+
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any):
+        journal = get_journal()
+        if journal is None:
+            return func(*args, **kwargs)
+        fp = fingerprint(args, kwargs)
+        if journal.resume:
+            if not fp:
+                _unstable(name)
+            hit, result = journal.lookup(name, fp)
+            if hit:
+                return result
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            journal.failed(name, fp, _mods(kwargs), e)
+            raise
+        journal.done(name, fp, _mods(kwargs, result), result)
+        return result
+    return wrapper
+
+__all__ = [
+    "Journal", "JournalRecord", "read_journal", "fingerprint",
+    "get_journal", "set_journal", "open_journal", "checkpoint",
+    "RUN", "DONE", "FAILED",
+]
@@ -0,0 +1,378 @@
+from __future__ import annotations
+
+import atexit
+import json
+import math
+import os
+import sys
+import threading
+from bisect import bisect_left
+from collections.abc import Callable, Iterable, Sequence
+from time import perf_counter
+from typing import TYPE_CHECKING, Any, Optional
+
+if TYPE_CHECKING:
+    # imported by serve_metrics: most procedures never serve
+    from http.server import ThreadingHTTPServer
+
+# "[host:]port": serve /metrics (Prometheus text) and /metrics.json (unset: no endpoint)
+METRICS_ADDRESS = os.environ.get("FOPS_METRICS", "")
+# file the metrics are written to at exit ("-": stdout, *.json: JSON snapshot; unset: no dump)
+METRICS_DUMP = os.environ.get("FOPS_METRICS_DUMP", "")
+
+# seconds
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PROMPT_BUCKETS = (1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+ATTEMPT_BUCKETS = (1, 2, 3, 4, 5, 10, 20)
+
+Labels = tuple[str, ...]
+
+# -----------------------------------------------------------------------------
+# Metrics
+# -----------------------------------------------------------------------------
+class _Metric:
+    """
+    Values are sharded per thread: a thread only ever writes its own shard (no lock, no
+    lost updates), readers sum the shards of every thread that touched the metric.
+    """
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names: Labels = tuple(labels)
+        self._local = threading.local()
+        self._shards: list[dict[Labels, Any]] = []
+
+    def _shard(self) -> dict[Labels, Any]:
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            self._shards.append(values)  # list.append is atomic
+            return values
+
+    def _values(self) -> Iterable[tuple[Labels, Any]]:
+        for shard in list(self._shards):
+            yield from list(shard.items())
+
+    def collect(self) -> dict[Labels, Any]:
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        for shard in list(self._shards):
+            shard.clear()
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, n: float = 1) -> None:
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + n
+
+    def collect(self) -> dict[Labels, float]:
+        out: dict[Labels, float] = {}
+        for labels, v in self._values():
+            out[labels] = out.get(labels, 0) + v
+        return out
+
+class Histogram(_Metric):
+    """Fixed buckets (upper bounds); each shard holds [count per bucket..., +Inf, sum]."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def _row(self, labels: Labels) -> list[float]:
+        shard = self._shard()
+        h = shard.get(labels)
+        if h is None:
+            h = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        return h
+
+    def observe(self, value: float, *labels: str) -> None:
+        try:
+            h = self._local.values[labels]
+        except (AttributeError, KeyError):   # first observation of these labels in this thread
+            h = self._row(labels)
+        h[bisect_left(self.buckets, value)] += 1
+        h[-1] += value
+
+    def reset(self) -> None:
+        # in place: PrimitiveMeter keeps references to its rows
+        for shard in list(self._shards):
+            for h in list(shard.values()):
+                h[:] = [0] * (len(h) - 1) + [0.0]
+
+    def collect(self) -> dict[Labels, list[float]]:
+        out: dict[Labels, list[float]] = {}
+        for labels, h in self._values():
+            acc = out.get(labels)
+            if acc is None:
+                out[labels] = list(h)
+            else:
+                for i, v in enumerate(h):
+                    acc[i] += v
+        return out
+
+class Gauge(_Metric):
+    """Last value set (any thread), or computed at collection time by `fn` -> {labels: value}."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 fn: Optional[Callable[[], dict[Labels, float]]] = None, kind: str = "gauge"):
+        super().__init__(name, help, labels)
+        self.fn = fn
+        self.kind = kind  # "counter" for totals read from elsewhere (e.g. sink drop counts)
+        self._set: dict[Labels, float] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        self._set[labels] = value
+
+    def collect(self) -> dict[Labels, float]:
+        out = dict(self._set)
+        if self.fn is not None:
+            try:
+                out.update(self.fn())
+            except Exception as e:  # never let a broken callback break a scrape or the exit dump
+                print(f"Metric {self.name} could not be collected: {e}")
+        return out
+
+    def reset(self) -> None:
+        self._set.clear()
+
+# -----------------------------------------------------------------------------
+# Registry
+# -----------------------------------------------------------------------------
+def _escape(v: str) -> str:
+    return str(v).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+def _labels(names: Labels, values: Labels, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _num(v: float) -> str:
+    if isinstance(v, float):
+        if math.isinf(v):
+            return "+Inf" if v > 0 else "-Inf"
+        return repr(v)
+    return str(v)
+
+class MetricsRegistry:
+    """
+    Process-wide metrics. `counter` / `histogram` / `gauge` return the existing metric
+    of that name, so modules can declare what they update at import time.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name: str, factory: Callable[[], _Metric]) -> Any:
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(name)
+                if metric is None:
+                    metric = self._metrics[name] = factory()
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._get(name, lambda: Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get(name, lambda: Histogram(name, help, labels, buckets))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = (),
+              fn: Optional[Callable[[], dict[Labels, float]]] = None, kind: str = "gauge") -> Gauge:
+        return self._get(name, lambda: Gauge(name, help, labels, fn, kind))
+
+    def reset(self) -> None:
+        for metric in list(self._metrics.values()):
+            metric.reset()
+
+    # --- export -------------------------------------------------------------------
+    def snapshot(self) -> dict[str, Any]:
+        """JSON-friendly view: {name: {"type", "help", "values": [{"labels", ...}]}}."""
+        out: dict[str, Any] = {}
+        for name, m in sorted(self._metrics.items()):
+            values = []
+            for labels, v in sorted(m.collect().items()):
+                entry: dict[str, Any] = {"labels": dict(zip(m.label_names, labels))}
+                if isinstance(m, Histogram):
+                    entry.update(count=sum(v[:-1]), sum=v[-1],
+                                 buckets=dict(zip([*map(str, m.buckets), "+Inf"], v[:-1])))
+                else:
+                    entry["value"] = v
+                values.append(entry)
+            out[name] = {"type": m.kind, "help": m.help, "values": values}
+        return out
+
+    def render(self) -> str:
+        """Prometheus text exposition format (0.0.4)."""
+        lines: list[str] = []
+        for name, m in sorted(self._metrics.items()):
+            lines.append(f"# HELP {name} {m.help}")
+            lines.append(f"# TYPE {name} {m.kind}")
+            for labels, v in sorted(m.collect().items()):
+                if isinstance(m, Histogram):
+                    cumulative = 0
+                    for bound, n in zip([*m.buckets, math.inf], v[:-1]):
+                        cumulative += n
+                        le = 'le="%s"' % _num(float(bound))
+                        bucket = _labels(m.label_names, labels, le)
+                        lines.append(f"{name}_bucket{bucket} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(m.label_names, labels)} {_num(v[-1])}")
+                    lines.append(f"{name}_count{_labels(m.label_names, labels)} {cumulative}")
+                else:
+                    lines.append(f"{name}{_labels(m.label_names, labels)} {_num(v)}")
+        return "\n".join(lines) + "\n"
+
+# Process-wide registry updated by the primitives, the driver and the sinks
+metrics = MetricsRegistry()
+
+# -----------------------------------------------------------------------------
+# Metrics of the primitives
+# -----------------------------------------------------------------------------
+PRIMITIVE_SECONDS = metrics.histogram(
+    "fops_primitive_seconds", "Duration of one primitive attempt (driver, tracing and checks).",
+    ("primitive", "outcome"))
+PRIMITIVE_ATTEMPTS = metrics.histogram(
+    "fops_primitive_attempts",
+    "Attempts per primitive call (correlation id), counted when it ends.",
+    ("primitive", "outcome"), buckets=ATTEMPT_BUCKETS)
+PRIMITIVE_EXCEPTIONS = metrics.counter(
+    "fops_primitive_exceptions_total", "Failed primitive attempts by exception type.",
+    ("primitive", "exception"))
+PRIMITIVE_RETRIES = metrics.counter(
+    "fops_primitive_retries_total", "Automatic retries of transient failures.", ("primitive",))
+PROMPT_SECONDS = metrics.histogram(
+    "fops_prompt_wait_seconds", "Time the operator took to answer a failure prompt.",
+    ("primitive", "channel"), buckets=PROMPT_BUCKETS)
+PROMPT_ANSWERS = metrics.counter(
+    "fops_prompt_answers_total", "Operator answers to failure prompts.", ("primitive", "answer"))
+DRIVER_SECONDS = metrics.histogram(
+    "fops_driver_seconds", "Duration of driver calls (TM cache misses only for reads).", ("op",))
+
+_ANSWERS = {"r": "retry", "retry": "retry", "s": "skip", "skip": "skip",
+            "c": "cancel", "cancel": "cancel"}
+
+class PrimitiveMeter:
+    """
+    Metrics of one primitive, bound by the retry decorators when they wrap it.
+    t0 arguments are the time.perf_counter() at which the attempt / prompt started.
+    """
+    __slots__ = ("name", "_local")
+
+    def __init__(self, name: str):
+        self.name = name
+        self._local = threading.local()
+
+    def ok(self, t0: float, attempts: int) -> None:
+        # hot path: this thread's rows of both histograms, found once
+        elapsed = perf_counter() - t0
+        try:
+            seconds, tries = self._local.rows
+        except AttributeError:
+            seconds, tries = self._local.rows = (PRIMITIVE_SECONDS._row((self.name, "ok")),
+                                                 PRIMITIVE_ATTEMPTS._row((self.name, "ok")))
+        seconds[bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+        seconds[-1] += elapsed
+        tries[bisect_left(ATTEMPT_BUCKETS, attempts)] += 1
+        tries[-1] += attempts
+
+    def failed(self, t0: float, error: BaseException) -> None:
+        PRIMITIVE_SECONDS.observe(perf_counter() - t0, self.name, "error")
+        PRIMITIVE_EXCEPTIONS.inc(self.name, type(error).__name__)
+
+    def answered(self, channel: str, t0: float, choice: str) -> None:
+        PROMPT_SECONDS.observe(perf_counter() - t0, self.name, channel)
+        # bounded label values: free text typed at the prompt counts as "other"
+        PROMPT_ANSWERS.inc(self.name, _ANSWERS.get(choice, "other"))
+
+    def retried(self) -> None:
+        PRIMITIVE_RETRIES.inc(self.name)
+
+    def ended(self, attempts: int, outcome: str) -> None:
+        """
+        The call was skipped or cancelled (by the operator or its OnFailure policy), or not
+        handled.
+        """
+        PRIMITIVE_ATTEMPTS.observe(attempts, self.name, outcome)
+
+# -----------------------------------------------------------------------------
+# Export: local endpoint, dump at exit
+# -----------------------------------------------------------------------------
+def _handler() -> type:
+    from http.server import BaseHTTPRequestHandler
+
+    class _Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args: Any) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            path = self.path.split("?", 1)[0]
+            if path in ("/", "/metrics"):
+                body, ctype = metrics.render().encode(), "text/plain; version=0.0.4; charset=utf-8"
+            elif path == "/metrics.json":
+                body = json.dumps(metrics.snapshot(), default=str).encode()
+                ctype = "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return _Handler
+
+def serve_metrics(address: str = "127.0.0.1:0") -> ThreadingHTTPServer:
+    """
+    Serve /metrics and /metrics.json on "[host:]port" (port 0: any free port) from a daemon
+    thread.
+    """
+    from http.server import ThreadingHTTPServer
+
+    host, _, port = address.rpartition(":")
+    server = ThreadingHTTPServer((host or "127.0.0.1", int(port or 0)), _handler())
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fops-metrics", daemon=True).start()
+    return server
+
+def dump_metrics(path: str = "-") -> None:
+    """Write the metrics to `path` ("-": stdout; JSON snapshot if it ends in .json)."""
+    if path.endswith(".json"):
+        text = json.dumps(metrics.snapshot(), indent=2, default=str) + "\n"
+    else:
+        text = metrics.render()
+    if path == "-":
+        sys.stdout.write(text)
+        sys.stdout.flush()
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+def _dump_at_exit() -> None:
+    try:
+        dump_metrics(METRICS_DUMP)
+    except OSError as e:
+        print(f"Could not dump metrics to {METRICS_DUMP}: {e}")
+
+if METRICS_DUMP:
+    atexit.register(_dump_at_exit)
+if METRICS_ADDRESS:
+    serve_metrics(METRICS_ADDRESS)
+
+__all__ = [
+    "MetricsRegistry", "Counter", "Histogram", "Gauge", "PrimitiveMeter", "metrics",
+    "serve_metrics", "dump_metrics",
+    "LATENCY_BUCKETS", "PROMPT_BUCKETS", "ATTEMPT_BUCKETS",
+]
@@ -0,0 +1,359 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, fields, replace
+from enum import IntEnum
+from typing import TYPE_CHECKING, Any, Optional
+
+from .metrics import metrics
+
+if TYPE_CHECKING:
+    import socketserver   # imported by the control socket only: trace() loads this module
+
+# inline JSON policy, or the path of a JSON policy file (watched for changes)
+POLICY_ENV = os.environ.get("FOPS_TRACE_POLICY", "")
+# seconds between checks of the policy file
+POLL_INTERVAL = float(os.environ.get("FOPS_TRACE_POLICY_POLL", "1.0"))
+# local control socket: a unix socket path, or "[host:]port" for TCP on localhost
+CONTROL_ADDRESS = os.environ.get("FOPS_TRACE_CONTROL", "")
+
+# -----------------------------------------------------------------------------
+# Rules
+# -----------------------------------------------------------------------------
+def _mapping(what: str, v: Any) -> dict[str, Any]:
+    # policy documents come from files, the environment and the control socket: any JSON value
+    if not isinstance(v, dict):
+        raise TypeError(f"{what} must be a JSON object, not {type(v).__name__}")
+    return v
+
+class Level(IntEnum):
+    OFF = 0      # nothing
+    ERRORS = 1   # exception events only
+    CALLS = 2    # call / return / exception
+    LINES = 3    # everything, including line events
+
+@dataclass(frozen=True)
+class Rule:
+    """
+    Tracing settings of a primitive or module. None fields inherit from the broader rule
+    (module prefix -> default -> the arguments given to `trace(...)`).
+    Line events are kept 1 in `line_every`, or with probability `line_sample`.
+    """
+    level: Optional[Level] = None
+    line_sample: Optional[float] = None
+    line_every: Optional[int] = None
+    capture_values: Optional[bool] = None
+    maxlen: Optional[int] = None
+
+    @classmethod
+    def from_dict(cls, d: dict[str, Any]) -> "Rule":
+        unknown = set(_mapping("trace rule", d)) - {f.name for f in fields(cls)}
+        if unknown:
+            raise ValueError(f"Unknown trace rule field(s): {', '.join(sorted(unknown))}")
+        level = d.get("level")
+        if isinstance(level, str):
+            try:
+                level = Level[level.upper()]
+            except KeyError:
+                raise ValueError(f"Unknown trace level: {level!r}") from None
+        elif level is not None:
+            level = Level(level)
+        sample = d.get("line_sample")
+        if sample is not None and not 0.0 <= float(sample) <= 1.0:
+            raise ValueError("line_sample must be within [0, 1]")
+        every = d.get("line_every")
+        if every is not None and int(every) < 1:
+            raise ValueError("line_every must be >= 1")
+        capture = d.get("capture_values")
+        if capture is not None and not isinstance(capture, bool):
+            raise ValueError(f"capture_values must be true or false, not {capture!r}")
+        maxlen = d.get("maxlen")
+        if maxlen is not None and (type(maxlen) is not int or maxlen < 1):
+            raise ValueError(f"maxlen must be a positive integer, not {maxlen!r}")
+        return cls(
+            level=level,
+            line_sample=None if sample is None else float(sample),
+            line_every=None if every is None else int(every),
+            capture_values=capture,
+            maxlen=maxlen,
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        d = {f.name: getattr(self, f.name) for f in fields(self)
+             if getattr(self, f.name) is not None}
+        if self.level is not None:
+            d["level"] = self.level.name.lower()
+        return d
+
+    def over(self, base: "Rule") -> "Rule":
+        """This rule, with unset fields taken from `base`."""
+        return replace(base, **{f.name: getattr(self, f.name) for f in fields(self)
+                                if getattr(self, f.name) is not None})
+
+class TokenBucket:
+    """
+    Rate limit of one sink: `rate` events per second with bursts of up to `burst`.
+    Unlocked: concurrent producers may let a few extra events through.
+    """
+    __slots__ = ("rate", "burst", "tokens", "stamp", "dropped")
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+        self.tokens = self.burst
+        self.stamp = time.monotonic()
+        self.dropped = 0
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if tokens >= 1.0:
+            self.tokens = tokens - 1.0
+            return True
+        self.tokens = tokens
+        self.dropped += 1
+        return False
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"rate": self.rate, "burst": self.burst, "dropped": self.dropped}
+
+# -----------------------------------------------------------------------------
+# Registry
+# -----------------------------------------------------------------------------
+class TracePolicy:
+    """
+    Process-wide tracing policy. Every change bumps `version`; traced functions compare it
+    on each call and re-resolve their settings only when it moved.
+
+    Policy documents (JSON) look like:
+        {"default":    {"level": "calls"},
+         "modules":    {"fops.lang.verify_tm": {"level": "lines", "line_sample": 0.1}},
+         "primitives": {"Send": {"level": "lines", "line_every": 10}},
+         "sinks":      {"queue": {"rate": 200, "burst": 500}}}
+    Module rules match by dotted prefix (longest wins); primitive rules by function name.
+    Sink limits apply to every event but exceptions, keyed by sink name ("*": any sink).
+    """
+
+    def __init__(self) -> None:
+        self.version = 0
+        self.default = Rule()
+        self.modules: dict[str, Rule] = {}
+        self.primitives: dict[str, Rule] = {}
+        self.sinks: dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, module: str, name: str, base: Rule = Rule()) -> Rule:
+        rule = self.default.over(base)
+        for prefix in sorted(self.modules, key=len):
+            if module == prefix or module.startswith(prefix + "."):
+                rule = self.modules[prefix].over(rule)
+        primitive = self.primitives.get(name)
+        return primitive.over(rule) if primitive is not None else rule
+
+    def bucket(self, sink_name: str) -> Optional[TokenBucket]:
+        return self.sinks.get(sink_name) or self.sinks.get("*")
+
+    # --- changes ---------------------------------------------------------------------
+    def apply(self, doc: dict[str, Any], *, replace: bool = False) -> None:
+        """Merge a policy document (null entries remove a rule); replace=True starts from empty."""
+        sections = {"default", "modules", "primitives", "sinks", "version"}
+        unknown = set(_mapping("trace policy", doc)) - sections
+        if unknown:
+            raise ValueError(f"Unknown trace policy section(s): {', '.join(sorted(unknown))}")
+        # validate everything before touching the live policy
+        default = Rule.from_dict(doc["default"] or {}) if "default" in doc else None
+        modules = {k: v if v is None else Rule.from_dict(v)
+                   for k, v in _mapping("modules", doc.get("modules") or {}).items()}
+        primitives = {k: v if v is None else Rule.from_dict(v)
+                      for k, v in _mapping("primitives", doc.get("primitives") or {}).items()}
+        sinks = {k: v if v is None
+                 else TokenBucket(_mapping(f"sink {k}", v)["rate"], v.get("burst"))
+                 for k, v in _mapping("sinks", doc.get("sinks") or {}).items()}
+        with self._lock:
+            # copy-on-write: resolve() iterates the tables without the lock
+            if replace:
+                tables = ({}, {}, {})
+            else:
+                tables = (dict(self.modules), dict(self.primitives), dict(self.sinks))
+            for table, changes in zip(tables, (modules, primitives, sinks)):
+                for key, value in changes.items():
+                    if value is None:
+                        table.pop(key, None)
+                    else:
+                        table[key] = value
+            if default is not None:
+                self.default = default
+            elif replace:
+                self.default = Rule()
+            self.modules, self.primitives, self.sinks = tables
+            self.version += 1
+
+    def set_level(self, target: str, level: Level | str) -> None:
+        """Level of a primitive (e.g. "Send"), a module ("fops.lang.send") or "default"."""
+        rule = {"level": level.name if isinstance(level, Level) else level}
+        if target == "default":
+            self.apply({"default": Rule.from_dict(rule).over(self.default).to_dict()})
+        elif "." in target:
+            merged = Rule.from_dict(rule).over(self.modules.get(target, Rule()))
+            self.apply({"modules": {target: merged.to_dict()}})
+        else:
+            merged = Rule.from_dict(rule).over(self.primitives.get(target, Rule()))
+            self.apply({"primitives": {target: merged.to_dict()}})
+
+    def set_rate_limit(self, sink_name: str, rate: Optional[float],
+                       burst: Optional[float] = None) -> None:
+        """Limit a sink to `rate` events/s; rate=None removes the limit."""
+        self.apply({"sinks": {sink_name: None if rate is None else {"rate": rate, "burst": burst}}})
+
+    def reset(self) -> None:
+        self.apply({}, replace=True)
+
+    def to_dict(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "version": self.version,
+                "default": self.default.to_dict(),
+                "modules": {k: r.to_dict() for k, r in self.modules.items()},
+                "primitives": {k: r.to_dict() for k, r in self.primitives.items()},
+                "sinks": {k: b.to_dict() for k, b in self.sinks.items()},
+            }
+
+# Process-wide policy consulted by `trace(...)`
+policy = TracePolicy()
+
+metrics.gauge("fops_trace_rate_limited_total",
+              "Trace events dropped by a sink rate limit of the policy.", ("sink",),
+              fn=lambda: {(name,): b.dropped for name, b in policy.sinks.items()}, kind="counter")
+
+# -----------------------------------------------------------------------------
+# Runtime control: policy file watch, local control socket
+# -----------------------------------------------------------------------------
+def load_policy_file(path: str) -> None:
+    """Replace the policy with the content of a JSON file."""
+    with open(path, encoding="utf-8") as f:
+        policy.apply(json.load(f), replace=True)
+
+def watch_policy_file(path: str, interval: float = POLL_INTERVAL) -> threading.Thread:
+    """Reload `path` whenever its mtime/size change (polled by a daemon thread)."""
+    def stamp() -> Optional[tuple[int, int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def run(last: Optional[tuple[int, int]]) -> None:
+        while True:
+            time.sleep(interval)
+            current = stamp()
+            if current is None or current == last:
+                continue
+            last = current
+            try:
+                load_policy_file(path)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"Invalid trace policy in {path}, keeping the previous one: {e}")
+
+    t = threading.Thread(target=run, args=(stamp(),), name="fops-trace-policy-watch", daemon=True)
+    t.start()
+    return t
+
+def _handle_request(req: dict[str, Any]) -> dict[str, Any]:
+    op = _mapping("control request", req).get("op", "get")
+    if op == "set":
+        policy.apply(req.get("policy") or {}, replace=bool(req.get("replace")))
+    elif op == "level":
+        policy.set_level(req["target"], req["level"])
+    elif op == "rate":
+        policy.set_rate_limit(req["sink"], req.get("rate"), req.get("burst"))
+    elif op == "reset":
+        policy.reset()
+    elif op != "get":
+        raise ValueError(f"Unknown op: {op!r}")
+    return {"ok": True, "policy": policy.to_dict()}
+
+def _control_handler() -> type[socketserver.StreamRequestHandler]:
+    import socketserver
+
+    class ControlHandler(socketserver.StreamRequestHandler):
+        # one JSON request per line -> one JSON response per line
+        def handle(self) -> None:
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+                try:
+                    resp = _handle_request(json.loads(line))
+                except (ValueError, KeyError, TypeError) as e:
+                    resp = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                self.wfile.write((json.dumps(resp) + "\n").encode())
+
+    return ControlHandler
+
+def _address(address: str) -> tuple[int, Any]:
+    import socket
+
+    host, _, port = address.rpartition(":")
+    if port.isdigit():
+        return socket.AF_INET, (host or "127.0.0.1", int(port))
+    return socket.AF_UNIX, address
+
+def serve_policy_control(address: str = CONTROL_ADDRESS) -> socketserver.BaseServer:
+    """Serve the control protocol on a unix socket path or a localhost TCP port (daemon thread)."""
+    import socket
+    import socketserver
+
+    family, addr = _address(address)
+    handler = _control_handler()
+    if family == socket.AF_UNIX:
+        if os.path.exists(addr):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                if probe.connect_ex(addr) == 0:
+                    raise OSError(f"Trace policy control socket already in use: {addr}")
+            os.unlink(addr)  # stale socket of a previous run
+        server: socketserver.BaseServer = socketserver.ThreadingUnixStreamServer(addr, handler)
+    else:
+        server = socketserver.ThreadingTCPServer(addr, handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fops-trace-policy-control",
+                     daemon=True).start()
+    return server
+
+def send_control(address: str, request: dict[str, Any], timeout: float = 5.0) -> dict[str, Any]:
+    """
+    Client side of the control socket, e.g.
+    send_control(addr, {"op": "level", "target": "Send", "level": "lines"}).
+    """
+    import socket
+
+    family, addr = _address(address)
+    with socket.socket(family, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(addr)
+        s.sendall((json.dumps(request) + "\n").encode())
+        with s.makefile("rb") as f:
+            return json.loads(f.readline())
+
+def _configure_from_env() -> None:
+    if POLICY_ENV:
+        inline = POLICY_ENV.lstrip().startswith("{")
+        try:
+            if inline:
+                policy.apply(json.loads(POLICY_ENV))
+            elif os.path.exists(POLICY_ENV):
+                load_policy_file(POLICY_ENV)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # like a bad reload: tracing goes on with the trace() arguments
+            print(f"Invalid trace policy in FOPS_TRACE_POLICY, ignored: {e}")
+        if not inline:
+            watch_policy_file(POLICY_ENV)
+    if CONTROL_ADDRESS:
+        serve_policy_control(CONTROL_ADDRESS)
+
+_configure_from_env()
+
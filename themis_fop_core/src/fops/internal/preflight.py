@@ -0,0 +1,329 @@
+from __future__ import annotations
+
+import ast
+import os
+import pickle
+from collections.abc import Iterable, Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, fields
+from typing import Any, Optional
+
+from .args import (
+    AND,
+    OR,
+    Action,
+    CallSite,
+    ModifierParser,
+    Modifiers,
+    Operator,
+    PromptType,
+    ValueFmt,
+    Window,
+    _MODIFIER_FIELDS,
+    install_call_sites,
+    source_digest,
+)
+from .conditions import compile_conditions
+from .registry import registry
+
+# call-site cache written by the preflight; loaded at import when set
+PREFLIGHT_CACHE = os.environ.get("FOPS_PREFLIGHT_CACHE")
+CACHE_VERSION = 2   # 2: conditions carry their explicit override keys
+
+# primitives whose spec is a condition (compiled ahead of time)
+CONDITION_PRIMITIVES = frozenset({"VerifyTM", "VerifyTMAsync"})
+
+_ENUMS = {"Operator": Operator, "Action": Action, "ValueFmt": ValueFmt, "PromptType": PromptType}
+_BUILDERS = {"AND": AND, "OR": OR, "Window": Window}
+_FIELD_TYPES: dict[str, str] = {f.name: str(f.type) for f in fields(Modifiers)}
+
+_parsers: dict[str, ModifierParser] = {}
+
+def _parser(primitive: str) -> ModifierParser:
+    # the primitive's own parser (built-in or user library, see fops.internal.registry)
+    parser = _parsers.get(primitive)
+    if parser is None:
+        parser = _parsers[primitive] = registry.get(primitive).modifier_parser
+    return parser
+
+def _targets() -> dict[str, str]:
+    # "module.attribute" -> primitive, for user primitives imported from their own module
+    return {e.target.replace(":", "."): name for name, e in registry.entries().items()
+            if e.source != "builtin"}
+
+# -----------------------------------------------------------------------------
+# Report
+# -----------------------------------------------------------------------------
+@dataclass(frozen=True)
+class Issue:
+    path: str
+    line: int
+    col: int
+    primitive: str
+    message: str
+    severity: str = "error"  # "error" | "warning"
+
+    def __str__(self) -> str:
+        return (f"{self.path}:{self.line}:{self.col + 1}: {self.severity}: {self.primitive}: "
+                f"{self.message}")
+
+@dataclass
+class FileReport:
+    path: str
+    digest: str
+    calls: int = 0                    # primitive calls found
+    cached: int = 0                   # calls whose arguments were resolved statically
+    issues: list[Issue] = field(default_factory=list)
+    # line -> (primitive, parsed Modifiers, literal condition spec or None)
+    sites: dict[int, tuple[str, Modifiers, Any]] = field(default_factory=dict)
+
+    @property
+    def errors(self) -> int:
+        return sum(1 for i in self.issues if i.severity == "error")
+
+# -----------------------------------------------------------------------------
+# Static resolution
+# -----------------------------------------------------------------------------
+class _NotLiteral(Exception):
+    """The expression depends on runtime values."""
+
+class _Analyzer:
+    def __init__(self, path: str, tree: ast.Module):
+        self.path = path
+        self.names: dict[str, str] = {}  # local name -> qualified name, from imports
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                for a in node.names:
+                    if a.asname:
+                        self.names[a.asname] = a.name
+                    else:
+                        top = a.name.partition(".")[0]
+                        self.names[top] = top
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                for a in node.names:
+                    self.names[a.asname or a.name] = f"{node.module}.{a.name}"
+        self.tree = tree
+
+    def _qualname(self, node: ast.AST) -> Optional[str]:
+        if isinstance(node, ast.Name):
+            return self.names.get(node.id)
+        if isinstance(node, ast.Attribute):
+            base = self._qualname(node.value)
+            return f"{base}.{node.attr}" if base else None
+        return None
+
+    def _fops_name(self, node: ast.AST) -> Optional[list[str]]:
+        q = self._qualname(node)
+        if q is None:
+            return None
+        parts = q.split(".")
+        return parts if parts[0] == "fops" else None
+
+    def literal(self, node: ast.AST) -> Any:
+        if isinstance(node, ast.Constant):
+            return node.value
+        if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+            if any(isinstance(e, ast.Starred) for e in node.elts):
+                raise _NotLiteral
+            items = [self.literal(e) for e in node.elts]
+            return {ast.List: list, ast.Tuple: tuple, ast.Set: set}[type(node)](items)
+        if isinstance(node, ast.Dict):
+            if any(k is None for k in node.keys):
+                raise _NotLiteral
+            return {self.literal(k): self.literal(v) for k, v in zip(node.keys, node.values)}
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            v = self.literal(node.operand)
+            if isinstance(v, (int, float)) and not isinstance(v, bool):
+                return -v if isinstance(node.op, ast.USub) else v
+            raise _NotLiteral
+        if isinstance(node, ast.Attribute):
+            parts = self._fops_name(node)
+            if parts and len(parts) >= 2 and parts[-2] in _ENUMS:
+                try:
+                    return _ENUMS[parts[-2]][parts[-1]]
+                except KeyError:
+                    raise TypeError(f"Unknown {parts[-2]}.{parts[-1]}") from None
+            raise _NotLiteral
+        if isinstance(node, ast.Call) and all(kw.arg is not None for kw in node.keywords):
+            parts = self._fops_name(node.func)
+            if parts and parts[-1] in _BUILDERS:
+                kwargs = {kw.arg: self.literal(kw.value) for kw in node.keywords}
+                return _BUILDERS[parts[-1]](*(self.literal(a) for a in node.args), **kwargs)
+        raise _NotLiteral
+
+    def primitive(self, call: ast.Call) -> Optional[str]:
+        q = self._qualname(call.func)
+        if q is None:
+            return None
+        if q.partition(".")[0] == "fops":
+            name = q.rpartition(".")[2]
+            return name if name in registry else None
+        return _targets().get(q)
+
+    # --- per call ---------------------------------------------------------------------
+    def check(self, report: FileReport) -> None:
+        per_line: dict[int, int] = {}
+        for node in ast.walk(self.tree):
+            if isinstance(node, ast.Call):
+                name = self.primitive(node)
+                if name is not None:
+                    report.calls += 1
+                    per_line[node.lineno] = per_line.get(node.lineno, 0) + 1
+                    self._check_call(report, node, name)
+        # a line running two primitives cannot be told apart at runtime
+        for line, n in per_line.items():
+            if n > 1:
+                report.sites.pop(line, None)
+        report.cached = len(report.sites)
+
+    def _issue(self, report: FileReport, node: ast.AST, name: str, message: str,
+               severity: str = "error") -> None:
+        report.issues.append(Issue(self.path, node.lineno, node.col_offset, name, message,
+                                   severity))
+
+    def _check_call(self, report: FileReport, call: ast.Call, name: str) -> None:
+        parser = _parser(name)
+        static = not any(isinstance(a, ast.Starred) for a in call.args)
+        literal_mods: dict[str, Any] = {}
+        ok = True
+        for kw in call.keywords:
+            if kw.arg is None:  # **kwargs: modifiers only known at runtime
+                static = False
+                continue
+            if not kw.arg[:1].isupper():
+                continue
+            if kw.arg not in _MODIFIER_FIELDS:
+                self._issue(report, kw.value, name, f"Unknown modifier '{kw.arg}'")
+                ok = False
+                continue
+            if parser.allowed is not None and kw.arg not in parser.allowed:
+                allowed = ", ".join(sorted(parser.allowed))
+                self._issue(report, kw.value, name,
+                            f"Unsupported modifier '{kw.arg}' (allowed: {allowed})")
+                ok = False
+                continue
+            try:
+                value = self.literal(kw.value)
+            except _NotLiteral:
+                static = False
+                continue
+            except TypeError as e:
+                self._issue(report, kw.value, name, str(e))
+                ok = False
+                continue
+            literal_mods[kw.arg] = value
+            problem = _type_problem(kw.arg, value)
+            if problem:
+                self._issue(report, kw.value, name, problem, "warning")
+        if not ok:
+            return
+        try:
+            mods = parser.parse(literal_mods) if literal_mods else parser.base
+        except TypeError as e:
+            self._issue(report, call, name, str(e))
+            return
+
+        spec = None
+        if name in CONDITION_PRIMITIVES and call.args and not isinstance(call.args[0], ast.Starred):
+            try:
+                spec = self.literal(call.args[0])
+                compile_conditions(spec, mods)
+            except _NotLiteral:
+                spec = None
+            except (TypeError, ValueError) as e:
+                self._issue(report, call.args[0], name, f"Invalid condition: {e}")
+                return
+        if static:
+            report.sites[call.lineno] = (name, mods, spec)
+
+def _type_problem(name: str, value: Any) -> Optional[str]:
+    # the runtime keeps these values as given; flag the ones that cannot be what was meant
+    t = _FIELD_TYPES.get(name)
+    is_num = isinstance(value, (int, float)) and not isinstance(value, bool)
+    if t == "bool" and not isinstance(value, bool):
+        return f"{name} expects a bool, got {value!r}"
+    if t == "int" and not (is_num and isinstance(value, int)):
+        return f"{name} expects an int, got {value!r}"
+    if t == "float" and not is_num:
+        return f"{name} expects a number, got {value!r}"
+    if t == "Optional[float]" and not (is_num or value is None):
+        return f"{name} expects a number or None, got {value!r}"
+    if t == "PromptType" and not isinstance(value, PromptType):
+        return f"{name} expects a PromptType, got {value!r}"
+    return None
+
+def analyze_source(source: bytes, path: str) -> FileReport:
+    report = FileReport(path=path, digest=source_digest(source))
+    try:
+        tree = ast.parse(source, filename=path)
+    except SyntaxError as e:
+        report.issues.append(Issue(path, e.lineno or 0, (e.offset or 1) - 1, "-",
+                                   f"syntax error: {e.msg}"))
+        return report
+    _Analyzer(path, tree).check(report)
+    return report
+
+def analyze_file(path: str) -> FileReport:
+    with open(path, "rb") as f:
+        return analyze_source(f.read(), os.path.abspath(path))
+
+# -----------------------------------------------------------------------------
+# Directory runs
+# -----------------------------------------------------------------------------
+def iter_fops(paths: Iterable[str]) -> Iterator[str]:
+    """Python files under `paths` (files are taken as given), in a stable order."""
+    for p in paths:
+        if os.path.isfile(p):
+            yield p
+            continue
+        for root, dirs, files in os.walk(p):
+            dirs[:] = sorted(d for d in dirs if not d.startswith(".") and d != "__pycache__")
+            for f in sorted(files):
+                if f.endswith(".py"):
+                    yield os.path.join(root, f)
+
+def preflight(paths: Iterable[str], *, jobs: Optional[int] = None) -> list[FileReport]:
+    """Analyze every FOP under `paths`, spread over `jobs` processes (default: one per CPU)."""
+    files = list(iter_fops(paths))
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(files) < 2 * jobs:
+        return [analyze_file(f) for f in files]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(analyze_file, files, chunksize=max(1, len(files) // (jobs * 4))))
+
+def write_cache(reports: Sequence[FileReport], path: str) -> int:
+    """Write the statically resolved call sites; returns how many were written."""
+    files = {r.path: (r.digest, r.sites) for r in reports if r.sites}
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump({"version": CACHE_VERSION, "files": files}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+    return sum(len(sites) for _, sites in files.values())
+
+def load_preflight_cache(path: str) -> int:
+    """
+    Install the call sites of a preflight cache: validated primitive calls then reuse their
+    parsed Modifiers (and compiled condition plan) instead of parsing arguments. Files edited
+    since the preflight are detected by digest and parsed at runtime as usual.
+    """
+    with open(path, "rb") as f:
+        data = pickle.load(f)
+    if data.get("version") != CACHE_VERSION:
+        return 0
+    installed: dict[str, tuple[str, dict[int, CallSite]]] = {}
+    count = 0
+    for filename, (digest, raw_sites) in data["files"].items():
+        sites: dict[int, CallSite] = {}
+        for line, (name, mods, spec) in raw_sites.items():
+            plan = compile_conditions(spec, mods) if spec is not None else None
+            sites[line] = CallSite(name, mods, plan)
+        installed[filename] = (digest, sites)
+        real = os.path.realpath(filename)
+        if real != filename:
+            installed[real] = (digest, sites)
+        count += len(sites)
+    install_call_sites(installed)
+    return count
+
+if PREFLIGHT_CACHE:
+    load_preflight_cache(PREFLIGHT_CACHE)
@@ -0,0 +1,432 @@
+"""
+Line-level profiler of procedures.
+
+    with profile() as prof:          # or FOPS_PROFILE=fop.prof for the whole run
+        run_procedure()
+    print(prof.report())
+    prof.write_collapsed("fop.folded")   # flamegraph.pl, speedscope, inferno
+
+Profiles the lines of the procedure's own code: the script and its modules, not the standard
+library, installed packages or fops (`paths=` narrows it down to given files / directories).
+Every line gets its hit count, wall time (callees included) and self time, and the time its
+primitives spent in:
+    prompt   waiting for the operator (failure prompts, Prompt)
+    retry    automatic and operator retries: attempts after a failure and their backoff
+    delay    Delay modifiers
+    tm       telemetry: driver reads and the waits between VerifyTM re-checks
+    tc       telecommands: driver sends and acknowledgements
+These are charged by the primitives themselves (`span()`); the outermost one wins, e.g. the
+TM reads of a retried VerifyTM count as retry. Self time is what is left: Python, tracing and
+the rest of the primitives' overhead.
+
+Stacks follow threads and asyncio tasks (the profiler state is a context variable). The time a
+coroutine line spends suspended on an `await` counts in its wall time, so `await VerifyTMAsync`
+shows the check's duration. Frames are hooked with sys.settrace (threading.settrace for new
+threads); inside traced primitives the trace decorator's own tracer takes over, so the
+primitive's time stays on the calling line.
+"""
+from __future__ import annotations
+
+import atexit
+import contextvars
+import dis
+import linecache
+import os
+import sys
+import sysconfig
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from types import CodeType, FrameType
+from typing import Any, NamedTuple, Optional
+
+# "path": profile the whole run, write the hotspot report to path and the collapsed stacks to
+# path + ".folded" at exit (unset: no profiling)
+PROFILE_PATH = os.environ.get("FOPS_PROFILE", "")
+
+CATEGORIES = ("prompt", "retry", "delay", "tm", "tc")
+
+_clock = time.perf_counter
+_YIELD_VALUE = dis.opmap["YIELD_VALUE"]
+# frames parked while suspended on an await, resumed by a later "call" event (a plain
+# generator is left and re-entered instead: its consumer runs while it is suspended)
+_COROUTINE = 0x80 | 0x100 | 0x200   # CO_COROUTINE | CO_ITERABLE_COROUTINE | CO_ASYNC_GENERATOR
+
+_FOPS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_LIBRARY_DIRS = tuple(sorted({
+    os.path.abspath(p) + os.sep
+    for p in (sysconfig.get_paths().get(k) for k in ("stdlib", "platstdlib", "purelib", "platlib"))
+    if p
+} | {_FOPS_DIR + os.sep}))
+
+# -----------------------------------------------------------------------------
+# Records
+# -----------------------------------------------------------------------------
+class _Frame:
+    """A profiled frame being executed; `line` started at `t`."""
+
+    __slots__ = ("frame", "code", "parent", "path", "line", "t", "t_call", "child", "cats")
+
+    def __init__(self, frame: FrameType, parent: Optional["_Frame"], path: int, now: float):
+        self.frame = frame
+        self.code = frame.f_code
+        self.parent = parent
+        self.path = path                # id of the caller stack, for the collapsed output
+        self.line = frame.f_lineno
+        self.t = now
+        self.t_call = now
+        self.child = 0.0                # time of profiled callees during the current line
+        self.cats: Optional[dict[str, float]] = None
+
+class _Stat:
+    __slots__ = ("hits", "wall", "own", "cats")
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.wall = 0.0
+        self.own = 0.0
+        self.cats: dict[str, float] = {}
+
+class LineStat(NamedTuple):
+    filename: str
+    function: str
+    line: int
+    hits: int
+    wall: float
+    self_time: float
+    categories: dict[str, float]
+
+    @property
+    def source(self) -> str:
+        return linecache.getline(self.filename, self.line).strip()
+
+_stack: contextvars.ContextVar[Optional[_Frame]] = contextvars.ContextVar("fops_profile_stack",
+                                                                          default=None)
+_category: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("fops_profile_category",
+                                                                          default=None)
+
+# -----------------------------------------------------------------------------
+# Profiler
+# -----------------------------------------------------------------------------
+class Profiler:
+    """
+    Per-line hit counts, wall / self time and primitive time categories. Use through `profile()`.
+    """
+
+    def __init__(self, paths: Optional[Iterable[str]] = None):
+        self.paths = tuple(os.path.abspath(p) for p in paths) if paths else None
+        self.started = 0.0
+        self.elapsed = 0.0
+        self.totals: dict[str, float] = dict.fromkeys(CATEGORIES, 0.0)
+        self._stats: dict[tuple[int, CodeType, int], _Stat] = {}
+        self._paths: dict[tuple[int, CodeType, int], int] = {}
+        self._path_list: list[tuple[int, Optional[CodeType], int]] = [(0, None, 0)]   # id 0: root
+        self._scope: dict[CodeType, bool] = {}
+        self._parked: dict[int, _Frame] = {}
+        self._lock = threading.Lock()
+        self._token: Optional[contextvars.Token] = None
+        self._prev_trace: Any = None
+        self._running = False
+
+    # --- scope --------------------------------------------------------------------
+    def _in_scope(self, code: CodeType) -> bool:
+        filename = code.co_filename
+        if filename.startswith("<"):
+            return False
+        path = os.path.abspath(filename)
+        if self.paths is not None:
+            return any(path == p or path.startswith(p + os.sep) for p in self.paths)
+        return not path.startswith(_LIBRARY_DIRS)
+
+    def _wanted(self, code: CodeType) -> bool:
+        wanted = self._scope.get(code)
+        if wanted is None:
+            wanted = self._scope[code] = self._in_scope(code)
+        return wanted
+
+    def _path_of(self, parent: Optional[_Frame]) -> int:
+        if parent is None:
+            return 0
+        key = (parent.path, parent.code, parent.line)
+        pid = self._paths.get(key)
+        if pid is None:
+            with self._lock:
+                pid = self._paths.get(key)
+                if pid is None:
+                    self._path_list.append(key)
+                    pid = self._paths[key] = len(self._path_list) - 1
+        return pid
+
+    # --- hooks --------------------------------------------------------------------
+    def _global(self, frame: FrameType, event: str, arg: Any):
+        # "call" of every new (or resumed) frame: only profiled code gets the line tracer
+        code = frame.f_code
+        if not self._wanted(code):
+            return None
+        parent = _stack.get()
+        e = self._parked.pop(id(frame), None) if code.co_flags & _COROUTINE else None
+        if e is None:
+            e = _Frame(frame, parent, self._path_of(parent), _clock())
+        _stack.set(e)
+        return self._local
+
+    def _local(self, frame: FrameType, event: str, arg: Any):
+        if event == "line":
+            now = _clock()
+            e = _stack.get()
+            if e is not None and e.frame is frame:
+                self._close(e, now)
+                e.line = frame.f_lineno
+                e.t = now
+        elif event == "return":
+            now = _clock()
+            e = _stack.get()
+            if e is None or e.frame is not frame:
+                return self._local
+            _stack.set(e.parent)
+            code = e.code
+            if code.co_flags & _COROUTINE and code.co_code[frame.f_lasti] == _YIELD_VALUE:
+                self._parked[id(frame)] = e   # suspended on an await: the line keeps running
+                return self._local
+            self._close(e, now)
+            if e.parent is not None:
+                e.parent.child += now - e.t_call
+        return self._local
+
+    def _close(self, e: _Frame, now: float) -> None:
+        key = (e.path, e.code, e.line)
+        st = self._stats.get(key)
+        if st is None:
+            st = self._stats[key] = _Stat()
+        dt = now - e.t
+        st.hits += 1
+        st.wall += dt
+        spent = 0.0
+        cats = e.cats
+        if cats:
+            for name, v in cats.items():
+                st.cats[name] = st.cats.get(name, 0.0) + v
+                spent += v
+            e.cats = None
+        st.own += max(0.0, dt - e.child - spent)
+        e.child = 0.0
+
+    def charge(self, category: str, seconds: float) -> None:
+        """Add time of `category` to the line running in this thread / task."""
+        e = _stack.get()
+        if e is not None:
+            cats = e.cats
+            if cats is None:
+                cats = e.cats = {}
+            cats[category] = cats.get(category, 0.0) + seconds
+        with self._lock:
+            self.totals[category] = self.totals.get(category, 0.0) + seconds
+
+    # --- lifecycle ----------------------------------------------------------------
+    def start(self) -> "Profiler":
+        global _active
+        if _active is not None:
+            raise RuntimeError("a profiler is already running")
+        self.started = _clock()
+        self._running = True
+        self._prev_trace = sys.gettrace()
+        # frames already running (the script calling profile(), or importing fops) join in
+        outer: list[FrameType] = []
+        f = sys._getframe(1)
+        while f is not None:
+            if self._wanted(f.f_code):
+                outer.append(f)
+            f = f.f_back
+        parent = None
+        now = _clock()
+        for frame in reversed(outer):
+            parent = _Frame(frame, parent, self._path_of(parent), now)
+            frame.f_trace = self._local
+        self._token = _stack.set(parent)
+        _active = self
+        threading.settrace(self._global)
+        sys.settrace(self._global)
+        return self
+
+    def stop(self) -> "Profiler":
+        global _active
+        if not self._running:
+            return self
+        sys.settrace(self._prev_trace)
+        threading.settrace(None)   # type: ignore[arg-type]
+        _active = None
+        self._running = False
+        now = _clock()
+        self.elapsed += now - self.started
+        e = _stack.get()
+        while e is not None:   # lines still running in this thread
+            self._close(e, now)
+            if e.frame.f_trace == self._local:
+                e.frame.f_trace = None
+            if e.parent is not None:
+                e.parent.child += now - e.t_call
+            e = e.parent
+        if self._token is not None:
+            try:
+                _stack.reset(self._token)
+            except (ValueError, RuntimeError):   # stopped from another context (atexit)
+                _stack.set(None)
+            self._token = None
+        self._parked.clear()
+        return self
+
+    # --- results ------------------------------------------------------------------
+    def lines(self) -> list[LineStat]:
+        """Per-line totals (all call stacks merged), most wall time first."""
+        merged: dict[tuple[CodeType, int], _Stat] = {}
+        for (_path, code, line), st in list(self._stats.items()):
+            m = merged.get((code, line))
+            if m is None:
+                m = merged[(code, line)] = _Stat()
+            m.hits += st.hits
+            m.wall += st.wall
+            m.own += st.own
+            for name, v in st.cats.items():
+                m.cats[name] = m.cats.get(name, 0.0) + v
+        out = [LineStat(code.co_filename, code.co_name, line, m.hits, m.wall, m.own, dict(m.cats))
+               for (code, line), m in merged.items()]
+        out.sort(key=lambda s: s.wall, reverse=True)
+        return out
+
+    def report(self, limit: int = 30, sort: str = "wall") -> str:
+        """Hotspot table; `sort` is "wall", "self", "hits" or a category."""
+        stats = self.lines()
+        if sort == "self":
+            stats.sort(key=lambda s: s.self_time, reverse=True)
+        elif sort == "hits":
+            stats.sort(key=lambda s: s.hits, reverse=True)
+        elif sort in CATEGORIES:
+            stats.sort(key=lambda s: s.categories.get(sort, 0.0), reverse=True)
+        elapsed = self.elapsed + (_clock() - self.started if self._running else 0.0)
+        totals = ", ".join(f"{name} {self.totals.get(name, 0.0):.3f} s" for name in CATEGORIES)
+        out = [f"Profiled {elapsed:.3f} s: {totals}", ""]
+        head = f"{'hits':>8} {'wall s':>9} {'self s':>9} " + " ".join(f"{c:>8}" for c in CATEGORIES)
+        out.append(f"{head}  location")
+        for s in stats[:limit]:
+            cats = " ".join(f"{s.categories.get(c, 0.0):8.3f}" for c in CATEGORIES)
+            where = f"{os.path.basename(s.filename)}:{s.line} ({s.function})"
+            out.append(f"{s.hits:8d} {s.wall:9.3f} {s.self_time:9.3f} {cats}  "
+                       f"{where}  {s.source[:60]}")
+        return "\n".join(out)
+
+    def _label(self, code: CodeType, line: int) -> str:
+        label = f"{os.path.basename(code.co_filename)}:{code.co_name}:{line}"
+        return label.replace(";", ",").replace(" ", "_")
+
+    def collapsed(self) -> Iterator[str]:
+        """
+        Collapsed stacks ("frame;frame;frame microseconds"): self time per stack, category time
+        as [category] leaves.
+        """
+        prefixes: dict[int, str] = {0: ""}
+
+        def prefix(pid: int) -> str:
+            text = prefixes.get(pid)
+            if text is None:
+                parent, code, line = self._path_list[pid]
+                text = prefixes[pid] = prefix(parent) + self._label(code, line) + ";"
+            return text
+
+        for (pid, code, line), st in list(self._stats.items()):
+            stack = prefix(pid) + self._label(code, line)
+            us = round(st.own * 1e6)
+            if us:
+                yield f"{stack} {us}"
+            for name, v in st.cats.items():
+                us = round(v * 1e6)
+                if us:
+                    yield f"{stack};[{name}] {us}"
+
+    def write_collapsed(self, path: str) -> int:
+        lines = list(self.collapsed())
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + ("\n" if lines else ""))
+        return len(lines)
+
+    def write(self, path: str) -> None:
+        """Hotspot report to `path`, collapsed stacks to `path`.folded."""
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.report(limit=100) + "\n")
+        self.write_collapsed(path + ".folded")
+
+    def __enter__(self) -> "Profiler":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+# -----------------------------------------------------------------------------
+# Primitive time categories
+# -----------------------------------------------------------------------------
+_active: Optional[Profiler] = None
+
+class _Span:
+    __slots__ = ("prof", "name", "t0", "token")
+
+    def __init__(self, prof: Profiler, name: str):
+        self.prof = prof
+        self.name = name
+        self.token: Optional[contextvars.Token] = None
+
+    def __enter__(self) -> "_Span":
+        if _category.get() is None:   # the outermost category wins
+            self.token = _category.set(self.name)
+            self.t0 = _clock()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        if self.token is not None:
+            dt = _clock() - self.t0
+            _category.reset(self.token)
+            self.prof.charge(self.name, dt)
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc: Any) -> None:
+        return None
+
+_NO_SPAN = _NoSpan()
+
+def span(category: Optional[str]) -> Any:
+    """
+    Context manager charging its duration to `category` on the running line (no-op unless
+    profiling, or for None).
+    """
+    prof = _active
+    return _NO_SPAN if prof is None or category is None else _Span(prof, category)
+
+def active_profiler() -> Optional[Profiler]:
+    return _active
+
+@contextmanager
+def profile(paths: Optional[Iterable[str]] = None) -> Iterator[Profiler]:
+    """Profile the lines run in the block (see the module docstring)."""
+    prof = Profiler(paths).start()
+    try:
+        yield prof
+    finally:
+        prof.stop()
+
+def _write_at_exit(prof: Profiler) -> None:
+    prof.stop()
+    try:
+        prof.write(PROFILE_PATH)
+    except OSError as e:
+        print(f"Could not write the profile to {PROFILE_PATH}: {e}")
+
+if PROFILE_PATH:
+    atexit.register(_write_at_exit, Profiler().start())
+
+__all__ = [
+    "Profiler", "LineStat", "profile", "span", "active_profiler", "CATEGORIES", "PROFILE_PATH",
+]
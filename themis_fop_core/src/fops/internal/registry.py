@@ -0,0 +1,271 @@
+"""
+Registry of primitives: the built-in ones and those of user libraries.
+
+User libraries declare their primitives
+* in their package metadata, as entry points of the "fops.primitives" group:
+      [project.entry-points."fops.primitives"]
+      PowerOn = "mylib.power:PowerOn"
+* or in a JSON manifest listed in FOPS_PRIMITIVES (os.pathsep-separated):
+      {"paths": ["lib"],                # added to sys.path, relative to the manifest
+       "primitives": {"PowerOn": "mylib.power:PowerOn",
+                      "Slew": {"target": "mylib.aocs:slew",
+                               "modifiers": ["Timeout", "Tolerance"]}}}
+
+Discovery only reads metadata: a primitive's module is imported the first time the primitive
+is used (`from fops import PowerOn`, `registry.get("PowerOn")`). Scanning the installed
+distributions is the slow part, so the discovered registry is cached in FOPS_REGISTRY_CACHE
+and reused while the site directories and the manifests are unchanged.
+
+A target that is a plain `fn(call: PrimitiveCall)` gets the decorator stack of the built-in
+primitives (`primitive()`), allowing the manifest's `modifiers`, else its module's MODIFIERS.
+Targets already decorated (e.g. with `@primitive`) are used as they are.
+"""
+from __future__ import annotations
+
+import importlib
+import json
+import os
+import site
+import sys
+import threading
+import warnings
+import zlib
+from collections.abc import Callable, Iterable
+from typing import Any, NamedTuple, Optional
+
+ENTRY_POINT_GROUP = "fops.primitives"
+
+# JSON manifests of user primitive libraries, separated by os.pathsep (unset: entry points only)
+MANIFESTS = os.environ.get("FOPS_PRIMITIVES", "")
+# file caching the discovered registry between runs ("" or "0": no cache); one per environment
+# by default
+REGISTRY_CACHE = os.environ.get(
+    "FOPS_REGISTRY_CACHE",
+    os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "fops",
+                 f"registry-{zlib.crc32(sys.prefix.encode()):08x}.json"),
+)
+CACHE_VERSION = 1
+
+BUILTINS = {
+    "Send": "fops.lang.send:Send",
+    "SendAsync": "fops.lang.send:SendAsync",
+    "VerifyTM": "fops.lang.verify_tm:VerifyTM",
+    "VerifyTMAsync": "fops.lang.verify_tm:VerifyTMAsync",
+    "Prompt": "fops.lang.prompt:Prompt",
+    "PromptAsync": "fops.lang.prompt:PromptAsync",
+}
+
+class Entry(NamedTuple):
+    name: str
+    target: str                               # "module:attribute"
+    source: str                               # "builtin", "entry point <dist>" or the manifest path
+    modifiers: Optional[tuple[str, ...]] = None
+    paths: tuple[str, ...] = ()               # added to sys.path before importing the target
+
+    @property
+    def module(self) -> str:
+        return self.target.partition(":")[0]
+
+# -----------------------------------------------------------------------------
+# Decorator stack
+# -----------------------------------------------------------------------------
+def primitive(fn: Optional[Callable] = None, *, modifiers: Optional[Iterable[str]] = None,
+              auto_retry: str = "always") -> Any:
+    """
+    Make `fn(call: PrimitiveCall)` (sync or async) a primitive: operator retry prompt,
+    checkpoint, trace and argument parsing, as for Send / VerifyTM / Prompt.
+    `modifiers` is the allowlist of PascalCase modifiers (None: any); `auto_retry` says when
+    transient errors are retried without the operator (see fops.internal.retry).
+    """
+    def deco(fn: Callable) -> Callable:
+        from fops.integrations.vscode.retry_vscode import retry_decorator_with_vscode_fallback
+
+        from .args import with_args
+        from .journal import checkpoint
+        from .sinks import trace_sink_local
+        from .trace import trace
+
+        traced = trace(trace_sink_local, lines=True, calls=True, returns=True, exceptions=True,
+                       capture_values=True, maxlen=160)
+        parsed = with_args(allowed_modifiers=modifiers)(fn)
+        return retry_decorator_with_vscode_fallback(checkpoint(traced(parsed)),
+                                                    auto_retry=auto_retry)
+
+    return deco if fn is None else deco(fn)
+
+def is_primitive(obj: Any) -> bool:
+    return callable(obj) and hasattr(obj, "modifier_parser")
+
+# -----------------------------------------------------------------------------
+# Discovery
+# -----------------------------------------------------------------------------
+def _entry_points() -> list[Entry]:
+    from importlib.metadata import entry_points
+
+    out = []
+    for ep in entry_points(group=ENTRY_POINT_GROUP):
+        dist = getattr(ep, "dist", None)
+        source = f"entry point {dist.name if dist else '?'}"
+        out.append(Entry(ep.name, ep.value.replace(" ", ""), source))
+    return out
+
+def _manifest(path: str) -> list[Entry]:
+    with open(path, encoding="utf-8") as f:
+        doc = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    paths = tuple(os.path.normpath(os.path.join(base, p)) for p in doc.get("paths", ()))
+    out = []
+    for name, spec in doc.get("primitives", {}).items():
+        if isinstance(spec, str):
+            spec = {"target": spec}
+        mods = spec.get("modifiers")
+        out.append(Entry(name, spec["target"], path, tuple(mods) if mods is not None else None,
+                         paths))
+    return out
+
+def _stamp(path: str) -> Optional[list[int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+class Registry:
+    """Primitive name -> Entry, resolved to the decorated callable on first use."""
+
+    def __init__(self, manifests: Optional[Iterable[str]] = None, *, cache: Optional[str] = None,
+                 entry_points: bool = True):
+        if manifests is None:
+            manifests = MANIFESTS.split(os.pathsep)
+        self.manifests = [m for m in manifests if m]
+        self.cache_path = REGISTRY_CACHE if cache is None else cache
+        self.use_entry_points = entry_points
+        self.from_cache = False
+        self._entries: Optional[dict[str, Entry]] = None
+        self._extra: dict[str, Entry] = {}
+        self._resolved: dict[str, Callable] = {}
+        self._lock = threading.RLock()
+
+    # --- discovery ----------------------------------------------------------------
+    def _fingerprint(self) -> list[Any]:
+        # installing or removing a distribution (editable ones too) changes its site directory;
+        # elsewhere on sys.path, `fops primitives --refresh`
+        dirs = []
+        if self.use_entry_points:
+            for p in [*site.getsitepackages(), site.getusersitepackages()]:
+                dirs.append([p, _stamp(p)])
+        return [CACHE_VERSION, dirs, [[os.path.abspath(m), _stamp(m)] for m in self.manifests]]
+
+    def _load_cache(self, fingerprint: list[Any]) -> Optional[list[Entry]]:
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                doc = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if doc.get("fingerprint") != fingerprint:
+            return None
+        return [Entry(e[0], e[1], e[2], tuple(e[3]) if e[3] is not None else None, tuple(e[4]))
+                for e in doc["entries"]]
+
+    def _save_cache(self, fingerprint: list[Any], entries: list[Entry]) -> None:
+        doc = {"fingerprint": fingerprint, "entries": [list(e) for e in entries]}
+        tmp = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(doc, f)
+            os.replace(tmp, self.cache_path)
+        except OSError:   # read-only home: discover again next run
+            pass
+
+    def _discover(self, refresh: bool = False) -> dict[str, Entry]:
+        caching = self.cache_path not in ("", "0")
+        fingerprint = self._fingerprint()
+        found = None if refresh or not caching else self._load_cache(fingerprint)
+        self.from_cache = found is not None
+        if found is None:
+            found = _entry_points() if self.use_entry_points else []
+            for path in self.manifests:
+                try:
+                    found += _manifest(path)
+                except (OSError, ValueError, KeyError, AttributeError) as e:
+                    warnings.warn(f"Ignoring primitive manifest {path}: {e!r}", stacklevel=3)
+            if caching:
+                self._save_cache(fingerprint, found)
+        entries = {name: Entry(name, target, "builtin") for name, target in BUILTINS.items()}
+        for e in found:
+            if e.name in BUILTINS:
+                warnings.warn(f"{e.source}: {e.name} is a built-in primitive, ignored",
+                              stacklevel=3)
+            else:
+                entries[e.name] = e   # manifests come last and win over entry points
+        return entries
+
+    def entries(self) -> dict[str, Entry]:
+        entries = self._entries
+        if entries is None:
+            with self._lock:
+                if self._entries is None:
+                    self._entries = self._discover()
+                entries = self._entries
+        return {**entries, **self._extra} if self._extra else entries
+
+    def refresh(self) -> dict[str, Entry]:
+        """Discover again (ignoring the cache) and rewrite the cache."""
+        with self._lock:
+            self._entries = self._discover(refresh=True)
+            self._resolved.clear()
+        return self.entries()
+
+    def register(self, name: str, target: str, *,
+                 modifiers: Optional[Iterable[str]] = None) -> None:
+        """Add a primitive for this process ("module:attribute", not cached)."""
+        with self._lock:
+            mods = tuple(modifiers) if modifiers is not None else None
+            self._extra[name] = Entry(name, target, "register()", mods)
+            self._resolved.pop(name, None)
+
+    def names(self) -> list[str]:
+        return list(self.entries())
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.entries()
+
+    # --- resolution ---------------------------------------------------------------
+    def get(self, name: str) -> Callable:
+        """The primitive `name`, imported (and decorated) on first use."""
+        fn = self._resolved.get(name)
+        if fn is not None:
+            return fn
+        entry = self.entries().get(name)
+        if entry is None:
+            raise KeyError(f"Unknown primitive: {name}")
+        with self._lock:
+            fn = self._resolved.get(name)
+            if fn is None:
+                fn = self._resolved[name] = self._resolve(entry)
+        return fn
+
+    @staticmethod
+    def _resolve(entry: Entry) -> Callable:
+        for p in entry.paths:
+            if p not in sys.path:
+                sys.path.append(p)
+        module_name, _, attr = entry.target.partition(":")
+        module = importlib.import_module(module_name)
+        obj: Any = module
+        for part in (attr or entry.name).split("."):
+            obj = getattr(obj, part)
+        if is_primitive(obj):
+            return obj
+        if not callable(obj):
+            raise TypeError(f"{entry.source}: {entry.target} is not callable")
+        modifiers = entry.modifiers
+        if modifiers is None:
+            modifiers = getattr(module, "MODIFIERS", None)
+        return primitive(obj, modifiers=modifiers)
+
+registry = Registry()
+
+__all__ = ["Registry", "Entry", "registry", "primitive", "is_primitive", "BUILTINS",
+           "ENTRY_POINT_GROUP", "MANIFESTS", "REGISTRY_CACHE"]
@@ -1,37 +1,543 @@
+"""
+Retry engine of the primitives, driven by the call's Modifiers.
+
+* Transient errors (link drops, timeouts, see `is_transient`) are retried automatically up to
+  `Retries` times, with exponential backoff and full jitter, within `Timeout` seconds when set.
+  A primitive chooses when (`auto_retry`): "always", "explicit" (only calls that set `Retries`:
+  a TC lost after uplink must not go out twice unasked) or "never" (it spends `Retries` and
+  `Timeout` itself, e.g. VerifyTM's re-checks).
+* Other errors, and transient ones once the retries are spent, go to `OnFailure`. The operator
+  chooses among the allowed actions (retry / skip / cancel) when `PromptFailure` is set and
+  more than one is allowed. Otherwise cancel (or abort) applies if allowed, else skip.
+* `HandleError=False` lets every exception through untouched.
+* A circuit breaker per target (a Send's command; the primitive itself when its spec is not
+  a name) opens after FOPS_BREAKER_THRESHOLD consecutive transient failures. Calls to that
+  target then fail fast with CircuitOpen for FOPS_BREAKER_RESET seconds instead of hammering
+  the driver, while other targets go on; the first call after that is a trial that closes it
+  again on success.
+* In parallel steps (fops.lang.parallel) operator prompts go through the group's
+  OperatorQueue, one at a time, and a stopped group fails its next primitives with StepCancelled.
+
+The correlation id is kept across all attempts of a call, and `attempt_var` counts them.
+"""
 import functools
-import uuid
+import inspect
+import itertools
+import os
+import random
+import threading
+import time
+from collections.abc import Awaitable, Callable, Iterator, Sequence
+from contextvars import ContextVar, Token
+from typing import Any, Optional
 
-from .trace import attempt_var, corr_id_var
+from .args import Action, Modifiers
+from .metrics import PrimitiveMeter, metrics
+from .profiler import span
+from .sinks import flush_sinks
+from .stream import publish, publish_result
+from .trace import attempt_var, corr_id_var, step_var
 
+# first automatic retry waits up to this many seconds, doubling per retry...
+RETRY_BACKOFF = float(os.environ.get("FOPS_RETRY_BACKOFF", "0.05"))
+# ...up to this cap
+RETRY_BACKOFF_MAX = float(os.environ.get("FOPS_RETRY_BACKOFF_MAX", "2.0"))
 
-def retry_decorator(func):
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
+# consecutive transient failures of a target that open its circuit breaker
+BREAKER_THRESHOLD = int(os.environ.get("FOPS_BREAKER_THRESHOLD", "5"))
+# seconds an open breaker fails calls fast before letting a trial call through
+BREAKER_RESET = float(os.environ.get("FOPS_BREAKER_RESET", "10"))
+
+# auto_retry values: when the engine retries transient errors by itself
+AUTO_RETRY = ("always", "explicit", "never")
+
+# operator answer -> label; the answers offered come from OnFailure
+CHOICES = {"r": "retry", "s": "skip", "c": "cancel"}
+_REPEAT_ACTIONS = frozenset({Action.REPEAT, Action.RESEND, Action.RECHECK})
+_STOP_ACTIONS = frozenset({Action.CANCEL, Action.ABORT})
+
+# -----------------------------------------------------------------------------
+# Classification
+# -----------------------------------------------------------------------------
+_transient: tuple[type[BaseException], ...] = (ConnectionError, TimeoutError)
+
+def register_transient(*types: type[BaseException]) -> None:
+    """Treat these exception types (e.g. a driver's link error) as transient."""
+    global _transient
+    _transient = _transient + tuple(t for t in types if t not in _transient)
+
+def is_transient(e: BaseException) -> bool:
+    """An exception's own `transient` attribute wins; otherwise its type decides."""
+    flag = getattr(e, "transient", None)
+    if flag is not None:
+        return bool(flag)
+    return isinstance(e, _transient)
+
+# -----------------------------------------------------------------------------
+# Circuit breakers
+# -----------------------------------------------------------------------------
+class CircuitOpen(Exception):
+    """A primitive was not called because the circuit breaker of its target is open."""
+
+class CircuitBreaker:
+    __slots__ = ("primitive", "target", "threshold", "reset_after", "failures", "opened_at",
+                 "trips", "_lock")
+
+    def __init__(self, primitive: str, target: Optional[str] = None,
+                 threshold: int = BREAKER_THRESHOLD, reset_after: float = BREAKER_RESET):
+        self.primitive = primitive
+        self.target = target
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trips = 0
+        self._lock = threading.Lock()   # concurrent steps and pipelined Sends share a breaker
+
+    @property
+    def name(self) -> str:
+        return self.primitive if self.target is None else f"{self.primitive} {self.target}"
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None and time.monotonic() - self.opened_at < self.reset_after
+
+    def check(self) -> None:
+        if self.opened_at is not None and time.monotonic() - self.opened_at < self.reset_after:
+            raise CircuitOpen(f"{self.name}: circuit open after {self.failures} "
+                              "consecutive transient failures")
+
+    def success(self) -> None:
+        if self.failures:   # unlocked read: the success path of a healthy target takes no lock
+            with self._lock:
+                self.failures = 0
+                self.opened_at = None
+
+    def failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                if self.opened_at is None:
+                    self.trips += 1
+                self.opened_at = time.monotonic()   # a failed trial call re-opens it
+
+    def reset(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+_breakers: dict[tuple[str, Optional[str]], CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(primitive: str, target: Optional[str] = None) -> CircuitBreaker:
+    """The breaker of `primitive` calls on `target` (None: calls without a named target)."""
+    key = (primitive, target)
+    breaker = _breakers.get(key)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(key)
+            if breaker is None:
+                breaker = _breakers[key] = CircuitBreaker(primitive, target)
+    return breaker
+
+def reset_breakers() -> None:
+    for breaker in list(_breakers.values()):
+        breaker.reset()
+
+metrics.gauge("fops_circuit_open", "1 while the target's circuit breaker is open.",
+              ("primitive", "target"),
+              fn=lambda: {(b.primitive, b.target or ""): float(b.is_open)
+                          for b in list(_breakers.values())})
+metrics.gauge("fops_circuit_trips_total", "Times the target's circuit breaker opened.",
+              ("primitive", "target"),
+              fn=lambda: {(b.primitive, b.target or ""): b.trips for b in list(_breakers.values())},
+              kind="counter")
+
+# -----------------------------------------------------------------------------
+# Policy
+# -----------------------------------------------------------------------------
+_DEFAULT_MODS = Modifiers()
+
+# Correlation ids are uuid4-shaped: a random first group counting up per call, then random
+# digits drawn once per process (again in a forked child), so an id is one small format.
+_corr_start: int
+_corr_seq: Iterator[int]
+_corr_tail: str
+
+def _corr_seed() -> None:
+    global _corr_start, _corr_seq, _corr_tail
+    h = "%024x" % random.getrandbits(96)
+    _corr_start, _corr_seq = random.getrandbits(32), itertools.count()
+    _corr_tail = f"-{h[:4]}-{h[4:8]}-{h[8:12]}-{h[12:]}"
+
+_corr_seed()
+os.register_at_fork(after_in_child=_corr_seed)
+
+def new_corr_id() -> str:
+    return f"{(_corr_start + next(_corr_seq)) & 0xFFFFFFFF:08x}{_corr_tail}"
+
+def _set_attempt(attempt: int) -> Optional[Token[int]]:
+    # first attempts outside a retried call leave the default (1) alone: no set/reset per call
+    if attempt == 1 and attempt_var.get() == 1:
+        return None
+    return attempt_var.set(attempt)
+
+def _modifiers(parser: Any, kwargs: dict) -> Modifiers:
+    # resolved only once an attempt failed, so the success path pays nothing
+    if parser is None:
+        return _DEFAULT_MODS
+    try:
+        return parser.split(kwargs)[0]
+    except Exception:   # invalid modifiers: the failure being handled is that TypeError
+        return parser.base
+
+def _auto_retries(auto_retry: str, mods: Modifiers, kwargs: dict) -> int:
+    if auto_retry == "never" or (auto_retry == "explicit" and "Retries" not in kwargs):
+        return 0
+    return mods.Retries or 0
+
+def _backoff(retries: int, e: BaseException, retried: int,
+             deadline: Optional[float]) -> Optional[float]:
+    """Delay before the next automatic attempt, None when the policy is exhausted."""
+    if retried >= retries or not is_transient(e):
+        return None
+    delay = random.uniform(0.0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * (2 ** retried)))
+    if deadline is not None and time.monotonic() + delay > deadline:
+        return None
+    return delay
+
+def _deadline(mods: Modifiers) -> Optional[float]:
+    return time.monotonic() + mods.Timeout if mods.Timeout else None
+
+def failure_options(on_failure: frozenset[Action]) -> list[str]:
+    """Operator answers allowed by OnFailure (cancel when it allows nothing we can do)."""
+    opts = []
+    if on_failure & _REPEAT_ACTIONS:
+        opts.append("r")
+    if Action.SKIP in on_failure:
+        opts.append("s")
+    if on_failure & _STOP_ACTIONS:
+        opts.append("c")
+    return opts or ["c"]
+
+def _unattended(opts: Sequence[str]) -> str:
+    # no prompt: the safest allowed outcome (an automatic repeat could loop forever)
+    return "s" if "s" in opts and "c" not in opts else "c"
 
+def _normalize(choice: Optional[str], opts: Sequence[str]) -> str:
+    choice = (choice or "").strip().lower()
+    for key, label in CHOICES.items():
+        if choice in (key, label):
+            choice = key
+            break
+    if choice in opts:
+        return choice
+    # any custom text -> retry, when allowed
+    return "r" if "r" in opts else _unattended(opts)
 
-        corr = str(uuid.uuid4())  # one correlation ID across all attempts
-        attempt = 1
+def prompt_message(e: BaseException, opts: Sequence[str]) -> str:
+    step = step_var.get()
+    where = f"[{step}] " if step else ""
+    return f"{where}Exception: {e}\nOptions: {', '.join(f'{CHOICES[o]} ({o})' for o in opts)}?"
+
+def console_options(opts: Sequence[str]) -> str:
+    return ", ".join(f"[{o}]{CHOICES[o][1:]}" for o in opts)
+
+# ask(exception, message, options) -> (answer, channel)
+Ask = Callable[[BaseException, str, list[str]], tuple[str, str]]
+AsyncAsk = Callable[[BaseException, str, list[str]], Awaitable[tuple[str, str]]]
+
+# -----------------------------------------------------------------------------
+# Operator queue of concurrent steps
+# -----------------------------------------------------------------------------
+class StepCancelled(Exception):
+    """A primitive was not called because its step group was stopped (fail-fast join)."""
+
+class OperatorQueue:
+    """
+    Failures of concurrently running steps reach the operator one at a time, in the order
+    they were raised. A nested group's queue takes its turns in its parent's. Once stopped,
+    prompts get the unattended answer and primitives raise StepCancelled.
+    """
+
+    def __init__(self, parent: Optional["OperatorQueue"] = None):
+        self.parent = parent
+        self.stopped: Optional[str] = None
+        self.prompts = 0
+        self.waited = 0.0   # seconds failures spent waiting for their turn
+        self._cond = threading.Condition()
+        self._tickets = itertools.count()
+        self._serving = 0
+
+    def check(self) -> None:
+        queue: Optional[OperatorQueue] = self
+        while queue is not None:
+            if queue.stopped is not None:
+                raise StepCancelled(queue.stopped)
+            queue = queue.parent
+
+    def stop(self, reason: str) -> None:
+        with self._cond:
+            if self.stopped is None:
+                self.stopped = reason
+            self._cond.notify_all()
+
+    def _is_stopped(self) -> bool:
+        try:
+            self.check()
+        except StepCancelled:
+            return True
+        return False
+
+    def ask(self, ask: Ask, e: BaseException, message: str,
+            opts: list[str]) -> tuple[str, Optional[str]]:
+        """`ask` in turn; (answer, None) without asking once the group is stopped."""
+        if self.parent is not None:
+            return self.parent.ask(lambda *a: self._ask(ask, *a), e, message, opts)
+        return self._ask(ask, e, message, opts)
+
+    def _ask(self, ask: Ask, e: BaseException, message: str,
+             opts: list[str]) -> tuple[str, Optional[str]]:
+        t0 = time.perf_counter()
+        with self._cond:
+            ticket = next(self._tickets)
+            while ticket != self._serving and not self._is_stopped():
+                self._cond.wait(0.5)   # also re-checks a parent's stop
+        self.waited += time.perf_counter() - t0
+        try:
+            if self._is_stopped():
+                return _unattended(opts), None
+            self.prompts += 1
+            return ask(e, message, opts)
+        finally:
+            with self._cond:
+                if ticket == self._serving:
+                    self._serving += 1
+                self._cond.notify_all()
+
+# operator queue of the enclosing step group; None outside step groups
+operator_queue_var: ContextVar[Optional[OperatorQueue]] = ContextVar("fops_operator_queue",
+                                                                     default=None)
+
+# -----------------------------------------------------------------------------
+# Engine
+# -----------------------------------------------------------------------------
+
+def retry_engine(func: Callable[..., Any], ask: Ask, aask: Optional[AsyncAsk] = None, *,
+                 auto_retry: str = "always") -> Callable[..., Any]:
+    """
+    Wrap a primitive with the retry engine; `ask` / `aask` reach the operator once the policy
+    is exhausted (by default `aask` runs `ask` in a worker thread, so other tasks keep going).
+    `auto_retry` is one of AUTO_RETRY.
+    """
+    if auto_retry not in AUTO_RETRY:
+        raise ValueError(f"auto_retry must be one of {AUTO_RETRY}, not {auto_retry!r}")
+    name = func.__name__
+    meter = PrimitiveMeter(name)
+    untargeted = get_breaker(name)
+    parser = getattr(func, "modifier_parser", None)
+
+    def _breaker(args: tuple) -> CircuitBreaker:
+        # a named spec (a Send's command) is the target: one flaky subsystem trips only its own
+        if args and type(args[0]) is str:
+            return get_breaker(name, args[0])
+        return untargeted
+
+    def _failed(breaker: CircuitBreaker, e: Exception, t0: float) -> None:
+        meter.failed(t0, e)
+        publish_result(name, error=e)
+        if is_transient(e):
+            breaker.failure()
+
+    def _retrying(corr: str, attempt: int, delay: float, e: Exception) -> None:
+        meter.retried()
+        publish("retry", primitive=name, corr_id=corr, attempt=attempt, delay=delay, error=repr(e))
+
+    def _decided(corr: str, attempt: int, choice: str, channel: Optional[str],
+                 t_prompt: Optional[float]) -> None:
+        if channel is not None:
+            meter.answered(channel, t_prompt, choice)
+        publish("answer", primitive=name, corr_id=corr, answer=choice, automatic=channel is None)
+        if choice == "s":
+            meter.ended(attempt, "skipped")
+        elif choice == "c":
+            meter.ended(attempt, "cancelled")
+
+    if inspect.iscoroutinefunction(func):
+        if aask is None:
+            async def aask(e: BaseException, message: str, opts: list[str]) -> tuple[str, str]:
+                import asyncio
+                return await asyncio.to_thread(ask, e, message, opts)
+
+        # each task runs in its own context copy, so corr_id/attempt never leak between tasks
+        @functools.wraps(func)
+        async def awrapper(*args, **kwargs):
+            corr = new_corr_id()
+            breaker = _breaker(args)
+            queue = operator_queue_var.get()
+            if queue is not None:
+                queue.check()
+            attempt, retried = 1, 0
+            mods: Optional[Modifiers] = None
+            deadline: Optional[float] = None
+            retries = 0
+            while True:
+                token_corr = corr_id_var.set(corr)
+                token_att = _set_attempt(attempt)
+                t0 = time.perf_counter()
+                try:
+                    breaker.check()
+                    if attempt == 1:
+                        result = await func(*args, **kwargs)
+                    else:
+                        with span("retry"):   # re-attempts are retry time
+                            result = await func(*args, **kwargs)
+                    breaker.success()
+                    meter.ok(t0, attempt)
+                    publish_result(name, result)
+                    return result
+                except Exception as e:
+                    _failed(breaker, e, t0)
+                    if mods is None:
+                        mods = _modifiers(parser, kwargs)
+                        deadline = _deadline(mods)
+                        retries = _auto_retries(auto_retry, mods, kwargs)
+                    if not mods.HandleError:
+                        meter.ended(attempt, "unhandled")
+                        raise
+                    # not at import: async primitives are decorated in every procedure
+                    import asyncio
+                    delay = _backoff(retries, e, retried, deadline)
+                    if delay is not None:
+                        retried += 1
+                        attempt += 1
+                        _retrying(corr, attempt, delay, e)
+                        if delay:
+                            with span("retry"):
+                                await asyncio.sleep(delay)
+                        continue
+                    opts = failure_options(mods.OnFailure)
+                    if mods.PromptFailure and len(opts) > 1:
+                        await asyncio.to_thread(flush_sinks, 2)
+                        message = prompt_message(e, opts)
+                        publish("prompt", primitive=name, corr_id=corr, message=message,
+                                options=opts)
+                        t_prompt = time.perf_counter()
+                        with span("prompt"):
+                            if queue is None:
+                                answer, channel = await aask(e, message, opts)
+                            else:   # in turn with the other steps of the group
+                                answer, channel = await asyncio.to_thread(queue.ask, ask, e,
+                                                                          message, opts)
+                        choice = _normalize(answer, opts)
+                    else:
+                        choice, channel, t_prompt = _unattended(opts), None, None
+                    _decided(corr, attempt, choice, channel, t_prompt)
+                    if choice == "s":
+                        return None
+                    if choice == "c":
+                        raise
+                    # operator retry: a new round of automatic retries
+                    attempt += 1
+                    retried, deadline = 0, _deadline(mods)
+                finally:
+                    corr_id_var.reset(token_corr)
+                    if token_att is not None:
+                        attempt_var.reset(token_att)
+        return awrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        corr = new_corr_id()  # one correlation ID across all attempts
+        breaker = _breaker(args)
+        queue = operator_queue_var.get()
+        if queue is not None:
+            queue.check()
+        attempt, retried = 1, 0
+        mods: Optional[Modifiers] = None
+        deadline: Optional[float] = None
+        retries = 0
         while True:
             token_corr = corr_id_var.set(corr)
-            token_att = attempt_var.set(attempt)
+            token_att = _set_attempt(attempt)
+            t0 = time.perf_counter()
             try:
-                return func(*args, **kwargs)
+                breaker.check()
+                if attempt == 1:
+                    result = func(*args, **kwargs)
+                else:
+                    with span("retry"):   # re-attempts are retry time
+                        result = func(*args, **kwargs)
+                breaker.success()
+                meter.ok(t0, attempt)
+                publish_result(name, result)
+                return result
             except Exception as e:
-                print(f"Exception occurred: {e}")
-                choice = input("Options: [r]etry, [s]kip, [c]ancel: ").lower()
-                if choice == "r":
+                _failed(breaker, e, t0)
+                if mods is None:
+                    mods = _modifiers(parser, kwargs)
+                    deadline = _deadline(mods)
+                    retries = _auto_retries(auto_retry, mods, kwargs)
+                if not mods.HandleError:
+                    meter.ended(attempt, "unhandled")
+                    raise
+                delay = _backoff(retries, e, retried, deadline)
+                if delay is not None:
+                    retried += 1
                     attempt += 1
+                    _retrying(corr, attempt, delay, e)
+                    if delay:
+                        with span("retry"):
+                            time.sleep(delay)
                     continue
-                elif choice == "s":
+                opts = failure_options(mods.OnFailure)
+                if mods.PromptFailure and len(opts) > 1:
+                    # drain queued traces so the operator sees the full history before deciding
+                    flush_sinks(timeout=2)
+                    message = prompt_message(e, opts)
+                    publish("prompt", primitive=name, corr_id=corr, message=message, options=opts)
+                    t_prompt = time.perf_counter()
+                    with span("prompt"):
+                        if queue is None:
+                            answer, channel = ask(e, message, opts)
+                        else:   # in turn with the other steps of the group
+                            answer, channel = queue.ask(ask, e, message, opts)
+                    choice = _normalize(answer, opts)
+                else:
+                    choice, channel, t_prompt = _unattended(opts), None, None
+                _decided(corr, attempt, choice, channel, t_prompt)
+                if choice == "s":
                     return None
-                elif choice == "c":
+                if choice == "c":
                     raise
-                else:
-                    print("Invalid choice. Retrying...")
-                    attempt += 1
-                    continue
+                # operator retry: a new round of automatic retries
+                attempt += 1
+                retried, deadline = 0, _deadline(mods)
             finally:
                 corr_id_var.reset(token_corr)
-                attempt_var.reset(token_att)
-
+                if token_att is not None:
+                    attempt_var.reset(token_att)
     return wrapper
+
+# -----------------------------------------------------------------------------
+# Console decorator
+# -----------------------------------------------------------------------------
+def _ask_console(e: BaseException, message: str, opts: list[str]) -> tuple[str, str]:
+    step = step_var.get()
+    print(f"Exception occurred in step {step}: {e}" if step else f"Exception occurred: {e}")
+    return input(f"Options: {console_options(opts)}: "), "console"
+
+def retry_decorator(func=None, *, auto_retry: str = "always"):
+    """Retry engine asking the operator on the console."""
+    if func is None:
+        return functools.partial(retry_decorator, auto_retry=auto_retry)
+    return retry_engine(func, _ask_console, auto_retry=auto_retry)
+
+__all__ = [
+    "retry_decorator", "retry_engine", "new_corr_id", "AUTO_RETRY",
+    "is_transient", "register_transient",
+    "CircuitBreaker", "CircuitOpen", "get_breaker", "reset_breakers",
+    "OperatorQueue", "StepCancelled", "operator_queue_var",
+    "failure_options", "prompt_message", "console_options", "CHOICES",
+    "RETRY_BACKOFF", "RETRY_BACKOFF_MAX", "BREAKER_THRESHOLD", "BREAKER_RESET",
+]
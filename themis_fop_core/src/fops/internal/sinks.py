@@ -1,9 +1,50 @@
-import requests
+import atexit
+import linecache
+import os
+import signal
+import threading
+import time
+import weakref
+from collections import deque
+from collections.abc import Callable, Iterator, Sequence
+from enum import Enum
+from types import CodeType
+from typing import TYPE_CHECKING, Any, Optional
 
+if TYPE_CHECKING:
+    import requests   # imported on the first HTTP send: most procedures never trace over HTTP
 
-def send_trace_data_local(function_name, line_number, code_line, event, meta):
+from .metrics import metrics
+from .stream import get_hub
+from .trace import (
+    CALL,
+    EVENT_NAMES,
+    EXCEPTION,
+    LINE,
+    RETURN,
+    _render_call_args,
+    attempt_var,
+    corr_id_var,
+    safe_repr,
+    step_var,
+)
+
+# trace collector of send_trace_data_http / make_async_http_sink (see fops.internal.collector)
+TRACE_HTTP_URL = os.environ.get("FOPS_TRACE_URL", "http://127.0.0.1:8766/ingest")
+# sink of the Themis Lang primitives: "queue" (print every event through a QueuedSink) or
+# "flight" (in-memory flight recorder, printed only when dumped)
+TRACE_SINK = os.environ.get("FOPS_TRACE_SINK", "queue").lower()
+# events kept by the flight recorder
+FLIGHT_CAPACITY = int(os.environ.get("FOPS_FLIGHT_SIZE", "65536"))
+
+# (function_name, line_number, code_line, event, meta) -- same shape as the sink arguments
+TraceEvent = tuple[str, int, str, str, dict[str, Any]]
+
+
+def _format_local(function_name, line_number, code_line, event, meta) -> str:
     cid = meta.get("corr_id")
     att = meta.get("attempt")
+    step = meta.get("step")
     extras = []
     if "args_preview" in meta:
         extras.append(f"args={meta['args_preview']}")
@@ -12,19 +53,518 @@ def send_trace_data_local(function_name, line_number, code_line, event, meta):
     if "exception" in meta:
         extras.append(f"exc={meta['exception_type']}: {meta['exception']}")
     extras_str = " | " + " | ".join(extras) if extras else ""
-    print(f"[{cid}#{att}] {event.upper()} {function_name}:{line_number} {code_line}{extras_str}")
+    where = f"{step} {cid}#{att}" if step else f"{cid}#{att}"
+    return f"[{where}] {event.upper()} {function_name}:{line_number} {code_line}{extras_str}"
 
-def send_trace_data_http(function_name, line_number, code_line, event, meta):
-    url = "https://www.postb.in/1754159125190-8677816796116"
-    payload = {
+def _payload(function_name, line_number, code_line, event, meta) -> dict[str, Any]:
+    return {
         "event": event,
         "function": function_name,
         "line_number": line_number,
         "code_line": code_line,
         "meta": meta,
     }
+
+# -----------------------------------------------------------------------------
+# Synchronous sinks (one call per event)
+# -----------------------------------------------------------------------------
+_http_session: "Optional[requests.Session]" = None
+
+def _session() -> "requests.Session":
+    # one pooled session per process: connections are reused across events/batches
+    global _http_session
+    if _http_session is None:
+        import requests
+
+        _http_session = requests.Session()
+    return _http_session
+
+def _instance_headers() -> dict[str, str]:
+    # read per request: a pooled worker gets its INSTANCE_ID after importing fops
+    return {"X-Fops-Instance": os.environ.get("INSTANCE_ID", "")}
+
+def send_trace_data_local(function_name, line_number, code_line, event, meta):
+    print(_format_local(function_name, line_number, code_line, event, meta))
+
+def send_trace_data_http(function_name, line_number, code_line, event, meta):
+    import requests
+
+    payload = _payload(function_name, line_number, code_line, event, meta)
     try:
-        r = requests.post(url, json=payload, timeout=5)
+        r = _session().post(TRACE_HTTP_URL, json=payload, headers=_instance_headers(), timeout=5)
         r.raise_for_status()
     except requests.exceptions.RequestException as e:
         print(f"Failed to send trace data: {e}")
+
+# -----------------------------------------------------------------------------
+# Batch writers (used by QueuedSink's worker thread)
+# -----------------------------------------------------------------------------
+def write_trace_batch_local(batch: Sequence[TraceEvent]) -> None:
+    print("\n".join(_format_local(*ev) for ev in batch), flush=True)
+
+class HttpBatchWriter:
+    """
+    POST a whole batch of events as a JSON list over a pooled session, tagged with INSTANCE_ID.
+    """
+
+    def __init__(self, url: Optional[str] = None, *, timeout: float = 5.0,
+                 session: "Optional[requests.Session]" = None):
+        self.url = url or TRACE_HTTP_URL
+        self.timeout = timeout
+        self.session = session or _session()
+
+    def __call__(self, batch: Sequence[TraceEvent]) -> None:
+        import requests
+
+        try:
+            r = self.session.post(self.url, json=[_payload(*ev) for ev in batch],
+                                  headers=_instance_headers(), timeout=self.timeout)
+            r.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            print(f"Failed to send trace data ({len(batch)} events): {e}")
+
+# -----------------------------------------------------------------------------
+# Asynchronous, batched sink
+# -----------------------------------------------------------------------------
+class OverflowPolicy(Enum):
+    BLOCK = "block"              # producer waits for room (lossless)
+    DROP_OLDEST = "drop_oldest"  # evict the oldest queued event
+    SAMPLE = "sample"            # while full, keep 1 of every `sample_every` new events
+
+# QueuedSinks and FlightRecorders, flushed/closed together
+_live_sinks: "weakref.WeakSet[Any]" = weakref.WeakSet()
+
+class QueuedSink:
+    """
+    Trace sink that pushes events onto a bounded in-memory queue.
+    A background worker drains it in batches (by `batch_size` or every `flush_interval`
+    seconds, whichever comes first) and hands each batch to `writer`.
+    Instances have the regular sink signature, so they can be passed to `trace(...)`.
+    """
+
+    def __init__(
+        self,
+        writer: Callable[[Sequence[TraceEvent]], None],
+        *,
+        maxsize: int = 10_000,
+        batch_size: int = 256,
+        flush_interval: float = 0.25,
+        overflow: OverflowPolicy = OverflowPolicy.BLOCK,
+        sample_every: int = 10,
+        name: str = "queue",
+    ):
+        if maxsize <= 0 or batch_size <= 0:
+            raise ValueError("maxsize and batch_size must be positive")
+        self.writer = writer
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = OverflowPolicy(overflow)
+        self.sample_every = max(1, int(sample_every))
+        self.name = name  # key of the sink in the tracing policy (rate limits)
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+
+        self._q: deque[TraceEvent] = deque()
+        lock = threading.Lock()
+        self._cv = threading.Condition(lock)    # worker: "there is work"
+        self._room = threading.Condition(lock)  # producers: "there is room" (BLOCK policy)
+        self._idle = threading.Condition(lock)  # flush(): "queue drained"
+        self._in_flight = 0
+        self._overflow_seen = 0
+        self._flushing = 0
+        self._closed = False
+        self._worker: Optional[threading.Thread] = None
+        _live_sinks.add(self)
+
+    # --- producer side (FOP thread) ---------------------------------------------
+    def __call__(self, function_name, line_number, code_line, event, meta) -> None:
+        ev = (function_name, line_number, code_line, event, meta)
+        with self._cv:
+            if self._closed:
+                return
+            if self._worker is None:
+                self._start()
+            q = self._q
+            if len(q) >= self.maxsize:
+                if self.overflow is OverflowPolicy.BLOCK:
+                    while len(q) >= self.maxsize and not self._closed:
+                        self._room.wait()
+                    if self._closed:
+                        return
+                elif self.overflow is OverflowPolicy.DROP_OLDEST:
+                    q.popleft()
+                    self.dropped += 1
+                else:
+                    self._overflow_seen += 1
+                    if self._overflow_seen % self.sample_every:
+                        self.dropped += 1
+                        return
+                    q.popleft()
+                    self.dropped += 1
+            q.append(ev)
+            self.enqueued += 1
+            if len(q) >= self.batch_size:
+                self._cv.notify()
+
+    @property
+    def pending(self) -> int:
+        """Events queued or being written."""
+        return len(self._q) + self._in_flight
+
+    # --- lifecycle ----------------------------------------------------------------
+    def _start(self) -> None:
+        self._worker = threading.Thread(target=self._run, name="fops-trace-sink", daemon=True)
+        self._worker.start()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every queued event has been written. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cv:
+            if self._worker is None:
+                return True
+            self._flushing += 1
+            self._cv.notify()
+            try:
+                while self._q or self._in_flight:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._idle.wait(remaining)
+            finally:
+                self._flushing -= 1
+        return True
+
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        """Flush pending events and stop the worker. Further events are ignored."""
+        self.flush(timeout)
+        with self._cv:
+            self._closed = True
+            self._cv.notify_all()
+            self._room.notify_all()
+            worker = self._worker
+        if worker is not None and worker is not threading.current_thread():
+            worker.join(timeout)
+
+    def __enter__(self) -> "QueuedSink":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    # --- consumer side (worker thread) --------------------------------------------
+    def _run(self) -> None:
+        q = self._q
+        while True:
+            with self._cv:
+                if len(q) < self.batch_size and not (self._closed or self._flushing):
+                    self._cv.wait(self.flush_interval)
+                if not q:
+                    self._idle.notify_all()
+                    if self._closed:
+                        return
+                    continue
+                n = min(len(q), self.batch_size)
+                batch = [q.popleft() for _ in range(n)]
+                self._in_flight = n
+                self._room.notify_all()
+            try:
+                self.writer(batch)
+            except Exception as e:
+                print(f"Trace sink writer failed ({len(batch)} events): {e}")
+            with self._cv:
+                self._in_flight = 0
+                self.written += n
+                if not q:
+                    self._idle.notify_all()
+
+def make_async_local_sink(**kwargs: Any) -> QueuedSink:
+    return QueuedSink(write_trace_batch_local, **kwargs)
+
+def make_async_http_sink(url: Optional[str] = None, **kwargs: Any) -> QueuedSink:
+    kwargs.setdefault("name", "http")
+    return QueuedSink(HttpBatchWriter(url), **kwargs)
+
+# -----------------------------------------------------------------------------
+# Flight recorder (raw events in a ring buffer, rendered on dump)
+# -----------------------------------------------------------------------------
+_KINDS = {name: kind for kind, name in enumerate(EVENT_NAMES)}
+
+# values small and immutable enough to keep by reference, rendered on dump (str: up to maxlen)
+_SCALARS = frozenset({type(None), bool, int, float, complex})
+
+class _Text(str):
+    """A value rendered while recording (safe_repr): shown as is on dump."""
+
+class _Rendered(tuple):
+    """(code_line, meta) of an event recorded through the generic sink signature."""
+
+_STORED = _SCALARS | {_Text, _Rendered}
+
+class _Record:
+    """One preallocated ring slot; overwritten in place, never reallocated."""
+
+    __slots__ = ("ts", "site", "line", "kind", "value", "corr_id", "attempt", "step")
+
+    def __init__(self) -> None:
+        self.ts = 0.0
+        self.site = 0
+        self.line = 0
+        self.kind = 0
+        # (args, kwargs) of scalars | scalar return value | _Text | (exception type name, repr)
+        # | pre-rendered (code_line, meta)
+        self.value: Any = None
+        self.corr_id = ""
+        self.attempt = 0
+        self.step = ""
+
+class FlightRecorder:
+    """
+    Always-on trace sink with fixed memory: the last `capacity` events are kept in a
+    preallocated ring of `__slots__` records (monotonic timestamp, interned call site, line,
+    kind and the args / return value / exception). Scalar values (numbers, short strings)
+    are kept by reference and source lines, reprs and arg previews are rendered only when
+    the buffer is dumped, i.e.
+      - before the operator is prompted after a failure (flush_sinks), and at exit,
+      - on request: dump(), or the signal installed with install_dump_signal().
+    Dumps hand TraceEvents to `writer`, like QueuedSink (console by default).
+
+    `trace(...)` detects a recorder and calls record() directly. Used as a plain sink
+    (sink(function_name, line_number, code_line, event, meta)) it stores the given meta.
+    Other values are stored as their safe_repr (`maxlen` chars) and exceptions as type name
+    and repr, so the ring never keeps large results, or exceptions and their frames, alive.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 65_536,
+        *,
+        writer: Callable[[Sequence[TraceEvent]], None] = write_trace_batch_local,
+        maxlen: int = 160,
+        dump_on_flush: bool = True,
+        dump_on_exit: bool = True,
+        name: str = "flight",
+    ):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.writer = writer
+        self.maxlen = maxlen
+        self.dump_on_flush = dump_on_flush
+        self.dump_on_exit = dump_on_exit
+        self.name = name
+
+        self._ring = [_Record() for _ in range(capacity)]
+        self._head = 0                  # seq of the next record: records below it are complete
+        self._slot_lock = threading.Lock()   # writing a slot and advancing the head
+        self._sites: list[tuple[str, str]] = []   # site id -> (function name, filename)
+        self._site_ids: dict[tuple[str, Any], int] = {}
+        self._dumped = 0                 # sequence number of the first undumped event
+        self.overwritten = 0             # events lost to the ring before being dumped
+        self._lock = threading.RLock()   # sites and dumps (re-entered by the dump signal)
+        self._closed = False
+        _live_sinks.add(self)
+
+    # --- recording (hot path) -----------------------------------------------------
+    def intern(self, function_name: str, code: Optional[CodeType] = None) -> int:
+        """Id of a call site; resolved once per decorated function, not per event."""
+        key = (function_name, code)
+        site = self._site_ids.get(key)
+        if site is None:
+            with self._lock:
+                site = self._site_ids.get(key)
+                if site is None:
+                    filename = code.co_filename if code is not None else ""
+                    self._sites.append((function_name, filename))
+                    site = self._site_ids[key] = len(self._sites) - 1
+        return site
+
+    def _compact(self, kind: int, value: Any) -> Any:
+        maxlen = self.maxlen
+        if kind == CALL:
+            args, kwargs = value
+            for v in (*args, *kwargs.values()):
+                t = type(v)
+                if t not in _SCALARS and not (t is str and len(v) <= maxlen):
+                    return _Text(_render_call_args(args, kwargs, maxlen=maxlen))
+            return value
+        if kind == EXCEPTION:
+            return type(value).__name__, safe_repr(value, maxlen=maxlen)
+        if type(value) is str and len(value) <= maxlen:
+            return value
+        return _Text(safe_repr(value, maxlen=maxlen))
+
+    def record(self, site: int, line: int, kind: int, value: Any = None) -> None:
+        if type(value) not in _STORED:
+            value = self._compact(kind, value)
+        ts = time.monotonic()
+        corr_id, attempt, step = corr_id_var.get(), attempt_var.get(), step_var.get()
+        lock = self._slot_lock
+        lock.acquire()   # cheaper than `with` on this path
+        try:
+            n = self._head
+            r = self._ring[n % self.capacity]
+            r.ts = ts
+            r.site = site
+            r.line = line
+            r.kind = kind
+            r.value = value
+            r.corr_id = corr_id
+            r.attempt = attempt
+            r.step = step
+            self._head = n + 1
+        finally:
+            lock.release()
+
+    def __call__(self, function_name, line_number, code_line, event, meta) -> None:
+        # generic sink signature: keep the already rendered event
+        self.record(self.intern(function_name), line_number, _KINDS.get(event, LINE),
+                    _Rendered((code_line, meta)))
+
+    # --- rendering ----------------------------------------------------------------
+    @property
+    def recorded(self) -> int:
+        """Events recorded so far (including overwritten ones)."""
+        return self._head
+
+    @property
+    def pending(self) -> int:
+        """Events recorded but not dumped yet (and still in the buffer)."""
+        return min(self._head - self._dumped, self.capacity)
+
+    def _render(self, r: _Record) -> TraceEvent:
+        name, filename = self._sites[r.site]
+        event = EVENT_NAMES[r.kind]
+        meta: dict[str, Any] = {"corr_id": r.corr_id, "attempt": r.attempt, "ts": r.ts}
+        if r.step:
+            meta["step"] = r.step
+        value = r.value
+        if not filename:  # recorded through the generic sink signature
+            code_line, extra = value
+            meta.update(extra)
+            meta["ts"] = r.ts
+            return (name, r.line, code_line, event, meta)
+        if r.kind == CALL:
+            if value is not None:  # None when the function is traced without capture_values
+                meta["args_preview"] = (value if type(value) is _Text
+                                        else _render_call_args(*value, maxlen=self.maxlen))
+            code_line = linecache.getline(filename, r.line).strip()
+        elif r.kind == RETURN:
+            meta["return_value"] = (value if type(value) is _Text
+                                    else safe_repr(value, maxlen=self.maxlen))
+            code_line = "<return>"
+        elif r.kind == EXCEPTION:
+            if value is not None:
+                meta["exception_type"], meta["exception"] = value
+            code_line = "<exception>"
+        else:
+            code_line = linecache.getline(filename, r.line).strip()
+        return (name, r.line, code_line, event, meta)
+
+    def events(self, since: Optional[int] = None,
+               end: Optional[int] = None) -> Iterator[TraceEvent]:
+        """Render the buffered events (oldest first), optionally only those with seq >= since."""
+        end = self._head if end is None else end
+        start = max(end - self.capacity, since or 0)
+        for n in range(start, end):
+            yield self._render(self._ring[n % self.capacity])
+
+    def dump(self, *, all_events: bool = False,
+             writer: Optional[Callable[[Sequence[TraceEvent]], None]] = None) -> int:
+        """Render and write the events not dumped yet (or the whole buffer). Returns the count."""
+        with self._lock:
+            end = self._head
+            since = 0 if all_events else self._dumped
+            batch = list(self.events(since, end))
+            self.overwritten += max(0, end - self.capacity - self._dumped)
+            self._dumped = end
+        if batch:
+            (writer or self.writer)(batch)
+        return len(batch)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.overwritten += max(0, self._head - self.capacity - self._dumped)
+            self._dumped = self._head
+
+    # --- sink lifecycle (flush_sinks / close_sinks) -------------------------------
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        if self.dump_on_flush and not self._closed:
+            self.dump()
+        return True
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        if self._closed:
+            return
+        if self.dump_on_exit:
+            self.dump()
+        self._closed = True
+
+    def install_dump_signal(self, signum: int = getattr(signal, "SIGUSR1", signal.SIGINT)) -> None:
+        """Dump the buffer whenever the process receives `signum` (main thread only)."""
+        def handler(_signum, _frame):
+            self.dump(all_events=True)
+        signal.signal(signum, handler)
+
+def flush_sinks(timeout: Optional[float] = None) -> None:
+    """
+    Flush every live QueuedSink / dump every FlightRecorder (e.g. before prompting the operator).
+    """
+    for s in list(_live_sinks):
+        s.flush(timeout)
+
+def close_sinks(timeout: Optional[float] = 5.0) -> None:
+    """Flush and stop every live QueuedSink. Registered to run at procedure (interpreter) exit."""
+    for s in list(_live_sinks):
+        s.close(timeout)
+
+atexit.register(close_sinks)
+
+def _sink_stats(
+    value: Callable[[Any], Optional[int]],
+) -> Callable[[], dict[tuple[str, ...], float]]:
+    # read at collection time from the sinks' own counters: nothing is added to the hot path
+    def collect() -> dict[tuple[str, ...], float]:
+        out: dict[tuple[str, ...], float] = {}
+        for s in list(_live_sinks):
+            v = value(s)
+            if v is not None:
+                out[(s.name,)] = out.get((s.name,), 0) + v
+        return out
+    return collect
+
+metrics.gauge("fops_sink_queue_depth",
+              "Trace events waiting in a sink (not dumped yet for flight recorders).",
+              ("sink",), fn=_sink_stats(lambda s: s.pending))
+metrics.gauge("fops_sink_dropped_total",
+              "Trace events dropped by a full sink "
+              "(overwritten before a dump for flight recorders).",
+              ("sink",),
+              fn=_sink_stats(lambda s: s.dropped if isinstance(s, QueuedSink) else s.overwritten),
+              kind="counter")
+metrics.gauge("fops_sink_written_total", "Trace events written by a sink's worker.",
+              ("sink",), fn=_sink_stats(lambda s: getattr(s, "written", None)), kind="counter")
+
+class TeeSink:
+    """Hands every trace event to several sinks, in order."""
+
+    def __init__(self, *sinks: Callable[..., None]):
+        self.sinks = sinks
+        self.name = "+".join(getattr(s, "name", None) or getattr(s, "__name__", "sink")
+                             for s in sinks)
+
+    def __call__(self, function_name, line_number, code_line, event, meta) -> None:
+        for s in self.sinks:
+            s(function_name, line_number, code_line, event, meta)
+
+def _default_sink():
+    sink = FlightRecorder(FLIGHT_CAPACITY) if TRACE_SINK == "flight" else make_async_local_sink()
+    hub = get_hub()
+    # FOPS_STREAM: viewers of the live stream get the same events
+    return TeeSink(sink, hub) if hub is not None else sink
+
+# Default sink used by the Themis Lang primitives: a queue push (or a ring-buffer store) on the
+# FOP thread
+trace_sink_local = _default_sink()
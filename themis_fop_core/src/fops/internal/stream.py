@@ -0,0 +1,614 @@
+from __future__ import annotations
+
+import atexit
+import itertools
+import json
+import os
+import struct
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterable
+from enum import Enum
+from operator import attrgetter
+from typing import TYPE_CHECKING, Any, Optional
+
+from .trace import attempt_var, corr_id_var, safe_repr
+
+if TYPE_CHECKING:
+    import socket
+
+# "[host:]port": serve the live event stream of this procedure (unset: no server)
+STREAM_ADDRESS = os.environ.get("FOPS_STREAM", "")
+# events kept for viewers attaching mid-pass
+STREAM_HISTORY = int(os.environ.get("FOPS_STREAM_HISTORY", "20000"))
+# events a viewer may lag behind before its backlog is coalesced / dropped
+CLIENT_BUFFER = int(os.environ.get("FOPS_STREAM_CLIENT_BUFFER", "5000"))
+
+# -----------------------------------------------------------------------------
+# Event hub
+# -----------------------------------------------------------------------------
+# events per block of the coalescing cache
+_BLOCK = 256
+# shared encoder: json.dumps(default=...) would build a new one per call
+_encode_json = json.JSONEncoder(default=str).encode
+_line_key = attrgetter("line")
+
+class _Event:
+    # data: the sink tuple for "trace", a dict otherwise; text/sse/ws: encodings shared by all
+    # viewers
+    # line: (function, corr_id) of line-level trace events, None for everything else
+    __slots__ = ("seq", "kind", "ts", "data", "line", "text", "sse", "ws")
+
+    def __init__(self, seq: int, kind: str, ts: float, data: Any,
+                 line: Optional[tuple[str, Any]] = None):
+        self.seq = seq
+        self.kind = kind
+        self.ts = ts
+        self.data = data
+        self.line = line
+        self.text: Optional[str] = None
+        self.sse: Optional[bytes] = None
+        self.ws: Optional[bytes] = None
+
+    def json(self) -> str:
+        text = self.text
+        if text is None:
+            d: dict[str, Any] = {"seq": self.seq, "ts": round(self.ts, 6), "type": self.kind}
+            if self.kind == "trace":
+                function_name, line_number, code_line, event, meta = self.data
+                d.update(event=event, function=function_name, line=line_number, code=code_line,
+                         meta=meta)
+            else:
+                d.update(self.data)
+            text = self.text = _encode_json(d)
+        return text
+
+class EventHub:
+    """
+    Process-wide broadcast log of trace, result and prompt events.
+    Publishing stores the event in a preallocated ring (the replay history) and never
+    waits for viewers: each viewer follows the ring with its own cursor. Events are
+    JSON-encoded lazily, once, by the first viewer that sends them.
+    Likewise, lagging viewers share the line counts of whole blocks of history (`squash`).
+    Instances have the trace sink signature, so they can be passed to `trace(...)`.
+    """
+
+    name = "stream"
+
+    def __init__(self, history: int = STREAM_HISTORY):
+        if history <= 0:
+            raise ValueError("history must be positive")
+        self.capacity = history
+        self._ring: list[Optional[_Event]] = [None] * history
+        self._seq = itertools.count()   # next() is atomic under the GIL
+        self._head = 0                  # 1 + seq of the latest published event
+        self._cond = threading.Condition()
+        self._sleepers = 0
+        self._blocks: dict[int, tuple[Counter, list[_Event]]] = {}
+        self.closed = False
+
+    @property
+    def head(self) -> int:
+        return self._head
+
+    @property
+    def oldest(self) -> int:
+        """Seq of the oldest event still in the history."""
+        return max(0, self._head - self.capacity)
+
+    def publish(self, kind: str, data: Any, line: Optional[tuple[str, Any]] = None) -> None:
+        seq = next(self._seq)
+        self._ring[seq % self.capacity] = _Event(seq, kind, time.time(), data, line)
+        self._head = seq + 1
+        if self._sleepers:  # re-checked by wait() under the lock, so no wakeup is lost
+            with self._cond:
+                self._cond.notify_all()
+
+    def __call__(self, function_name, line_number, code_line, event, meta) -> None:
+        line = (function_name, meta.get("corr_id")) if event == "line" else None
+        self.publish("trace", (function_name, line_number, code_line, event, meta), line)
+
+    def events(self, since: int, end: Optional[int] = None) -> tuple[list[_Event], int]:
+        """Events with seq in [since, end) still in the history, and how many were overwritten."""
+        head = self._head if end is None else min(end, self._head)
+        oldest = self.oldest   # from the real head: [since, end) may be entirely overwritten
+        lost = max(0, min(oldest, head) - since)
+        start = max(since, oldest)
+        if start >= head:
+            return [], lost
+        ring, cap = self._ring, self.capacity
+        a, b = start % cap, head % cap
+        out = ring[a:b] if a < b else ring[a:] + ring[:b]
+        # a slot may still hold the previous lap while a concurrent producer writes it
+        if out[-1] is None or out[-1].seq != head - 1 or out[0].seq != start:
+            for i, ev in enumerate(out):
+                if ev is None or ev.seq != start + i:
+                    del out[i:]
+                    break
+        return out, lost
+
+    def _squash_block(self, block: int) -> Optional[tuple[Counter, list[_Event]]]:
+        cached = self._blocks.get(block)
+        if cached is None:
+            events, lost = self.events(block * _BLOCK, (block + 1) * _BLOCK)
+            if lost or len(events) < _BLOCK:
+                return None
+            counts = Counter(map(_line_key, events))
+            counts.pop(None, None)
+            cached = self._blocks[block] = (counts, [ev for ev in events if ev.line is None])
+            stale = (self._head - self.capacity) // _BLOCK
+            for old in [b for b in list(self._blocks) if b < stale]:
+                self._blocks.pop(old, None)
+        return cached
+
+    def squash(self, since: int, end: int) -> tuple[Counter, list[_Event], int, int]:
+        """
+        Line events with seq in [since, end) counted per (function, corr_id), the other
+        events, how many were overwritten, and the seq reached (< end if a producer is
+        still writing).
+        """
+        lost = max(0, self.oldest - since)
+        seq = since + lost
+        counts: Counter = Counter()
+        others: list[_Event] = []
+        while seq < end:
+            if seq % _BLOCK == 0 and seq + _BLOCK <= end:
+                cached = self._squash_block(seq // _BLOCK)
+                if cached is not None:
+                    counts.update(cached[0])
+                    others.extend(cached[1])
+                    seq += _BLOCK
+                    continue
+            stop = min(end, (seq // _BLOCK + 1) * _BLOCK)
+            events, gone = self.events(seq, stop)
+            lost += gone
+            seq += gone
+            counts.update(map(_line_key, events))
+            others.extend(ev for ev in events if ev.line is None)
+            seq += len(events)
+            if seq < stop:
+                break
+        counts.pop(None, None)
+        return counts, others, lost, seq
+
+    def wait(self, cursor: int, timeout: float) -> bool:
+        """Block until an event with seq >= cursor is published (True) or `timeout` elapses."""
+        if self._head > cursor:
+            return True
+        with self._cond:
+            self._sleepers += 1
+            try:
+                if self._head > cursor or self.closed:
+                    return self._head > cursor
+                self._cond.wait(timeout)
+            finally:
+                self._sleepers -= 1
+        return self._head > cursor
+
+    def close(self) -> None:
+        self.closed = True
+        with self._cond:
+            self._cond.notify_all()
+
+# -----------------------------------------------------------------------------
+# Viewers
+# -----------------------------------------------------------------------------
+class StreamOverflow(Enum):
+    DROP_OLDEST = "drop_oldest"  # skip the oldest events of the backlog
+    COALESCE = "coalesce"        # squash backlog line events into per-primitive counts
+
+class Subscriber:
+    """
+    One viewer's position in the hub. A viewer lagging more than `buffer` events behind
+    is caught up according to `overflow`; the skipped / squashed amounts are reported to
+    it as "dropped" / "coalesced" events, so a stuck client never slows the procedure.
+    """
+
+    def __init__(
+        self,
+        hub: EventHub,
+        cursor: int,
+        *,
+        buffer: int = CLIENT_BUFFER,
+        overflow: StreamOverflow = StreamOverflow.COALESCE,
+        kinds: Optional[Iterable[str]] = None,
+        lines: bool = True,
+    ):
+        self.hub = hub
+        self.cursor = cursor
+        self.replay_end = hub.head  # history before this is replayed in full, not coalesced
+        self.buffer = max(1, buffer)
+        self.overflow = StreamOverflow(overflow)
+        self.kinds = frozenset(kinds) if kinds else None
+        self.lines = lines
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def _filter(self, events: list[_Event]) -> list[_Event]:
+        if self.kinds is None and self.lines:
+            return events
+        kinds = self.kinds
+        return [ev for ev in events
+                if (kinds is None or ev.kind in kinds) and (self.lines or ev.line is None)]
+
+    def batch(self) -> list[Any]:
+        """Next events to send: _Events, or dicts for dropped/coalesced notices."""
+        out: list[Any] = []
+        oldest = self.hub.oldest
+        if self.cursor < oldest:
+            # fell behind the history (a slow replay): skip to what is left of it
+            out.append({"type": "dropped", "count": oldest - self.cursor, "from_seq": self.cursor})
+            self.dropped += oldest - self.cursor
+            self.cursor = oldest
+        if self.cursor < self.replay_end:
+            events, lost = self.hub.events(self.cursor,
+                                           min(self.replay_end, self.cursor + self.buffer))
+            if lost:
+                out.append({"type": "dropped", "count": lost, "from_seq": self.cursor})
+                self.dropped += lost
+            self.cursor += lost + len(events)
+            out.extend(self._filter(events))
+            self.sent += len(out)
+            return out
+
+        head = self.hub.head
+        backlog = head - self.cursor
+        if backlog > self.buffer and self.overflow is StreamOverflow.DROP_OLDEST:
+            skip = backlog - self.buffer // 2
+            out.append({"type": "dropped", "count": skip, "from_seq": self.cursor})
+            self.dropped += skip
+            self.cursor += skip
+            backlog = head - self.cursor
+        if backlog > self.buffer:  # COALESCE
+            squashed, events, lost, end = self.hub.squash(self.cursor, head)
+            first = self.cursor + lost
+        else:
+            events, lost = self.hub.events(self.cursor, head)
+            end = self.cursor + lost + len(events)
+        if lost:
+            out.append({"type": "dropped", "count": lost, "from_seq": self.cursor})
+            self.dropped += lost
+        self.cursor = end
+        out.extend(self._filter(events))
+        if backlog > self.buffer:
+            show = self.lines and (self.kinds is None or "trace" in self.kinds)
+            # (function, corr_id) -> line events
+            for (function_name, corr_id), n in squashed.items():
+                if show:
+                    out.append({"type": "coalesced", "function": function_name, "corr_id": corr_id,
+                                "lines": n, "from_seq": first, "to_seq": end - 1})
+                self.coalesced += n
+        self.sent += len(out)
+        return out
+
+    def stats(self) -> dict[str, Any]:
+        return {"cursor": self.cursor, "lag": self.hub.head - self.cursor, "sent": self.sent,
+                "dropped": self.dropped, "coalesced": self.coalesced}
+
+# -----------------------------------------------------------------------------
+# Wire formats
+# -----------------------------------------------------------------------------
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+def _sse(item: Any) -> bytes:
+    if isinstance(item, _Event):
+        frame = item.sse
+        if frame is None:
+            frame = item.sse = (f"id: {item.seq}\nevent: {item.kind}\n"
+                                f"data: {item.json()}\n\n").encode()
+        return frame
+    return f"event: {item['type']}\ndata: {_encode_json(item)}\n\n".encode()
+
+def _ws_frame(payload: bytes, opcode: int = 0x1) -> bytes:
+    n = len(payload)
+    if n < 126:
+        header = struct.pack("!BB", 0x80 | opcode, n)
+    elif n < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, n)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, n)
+    return header + payload
+
+def _ws(item: Any) -> bytes:
+    if isinstance(item, _Event):
+        frame = item.ws
+        if frame is None:
+            frame = item.ws = _ws_frame(item.json().encode())
+        return frame
+    return _ws_frame(_encode_json(item).encode())
+
+def _ws_read(sock: socket.socket) -> Optional[int]:
+    """Handle one client frame (masked by RFC 6455); returns its opcode, None when closed."""
+    def exact(n: int) -> bytes:
+        buf = b""
+        while len(buf) < n:
+            chunk = sock.recv(n - len(buf))
+            if not chunk:
+                raise ConnectionError("closed")
+            buf += chunk
+        return buf
+    try:
+        b0, b1 = exact(2)
+        n = b1 & 0x7F
+        if n == 126:
+            (n,) = struct.unpack("!H", exact(2))
+        elif n == 127:
+            (n,) = struct.unpack("!Q", exact(8))
+        mask = exact(4) if b1 & 0x80 else b"\0\0\0\0"
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(exact(n)))
+    except (ConnectionError, OSError):
+        return None
+    opcode = b0 & 0x0F
+    if opcode == 0x9:  # ping
+        sock.sendall(_ws_frame(payload, 0xA))
+    elif opcode == 0x8:  # close
+        sock.sendall(_ws_frame(payload[:2], 0x8))
+        return None
+    return opcode
+
+# -----------------------------------------------------------------------------
+# Server
+# -----------------------------------------------------------------------------
+class StreamServer:
+    """
+    Embeddable live-event server (stdlib HTTP, one thread per viewer):
+        GET /events    Server-Sent Events (reconnects resume from Last-Event-ID)
+        GET /ws        the same events as WebSocket text frames (one JSON object each)
+        GET /history   JSON list of the events still in the history (?since=, ?limit=)
+        GET /clients   connected viewers and their lag / drop counters
+    Query parameters of /events and /ws:
+        replay=N|all   events from the history to send first (default: all)
+        since=SEQ      start after this sequence number instead
+        kinds=a,b      only these event types (trace, result, prompt, answer, ...)
+        lines=0        leave out line-level trace events
+    Viewers are woken at most every `batch_interval` seconds and get everything published
+    meanwhile in one write.
+    """
+
+    def __init__(
+        self,
+        hub: EventHub,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        *,
+        client_buffer: int = CLIENT_BUFFER,
+        overflow: StreamOverflow = StreamOverflow.COALESCE,
+        batch_interval: float = 0.05,
+        keepalive: float = 15.0,
+        send_timeout: float = 30.0,
+    ):
+        self.hub = hub
+        self.client_buffer = client_buffer
+        self.overflow = StreamOverflow(overflow)
+        self.batch_interval = batch_interval
+        self.keepalive = keepalive
+        self.send_timeout = send_timeout
+        self.clients: dict[int, tuple[str, Subscriber]] = {}
+        self._ids = itertools.count(1)
+        # only viewers of the stream need the HTTP stack
+        from http.server import ThreadingHTTPServer
+
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> tuple[str, int]:
+        host, port = self._httpd.server_address[:2]
+        return str(host), int(port)
+
+    def start(self) -> "StreamServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fops-stream",
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self, linger: float = 1.0) -> None:
+        """Give viewers up to `linger` seconds to receive the last events, then stop."""
+        deadline = time.monotonic() + linger
+        while time.monotonic() < deadline and any(
+            s.cursor < self.hub.head for _, s in list(self.clients.values())
+        ):
+            time.sleep(0.02)
+        self.hub.close()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "head": self.hub.head,
+            "history": self.hub.capacity,
+            "clients": {str(cid): {"transport": t, **s.stats()}
+                        for cid, (t, s) in list(self.clients.items())},
+        }
+
+    def _subscriber(self, qs: dict[str, list[str]], last_event_id: Optional[str]) -> Subscriber:
+        head = self.hub.head
+        since = last_event_id or qs.get("since", [None])[0]
+        if since is not None:
+            cursor = int(since) + 1
+        else:
+            replay = qs.get("replay", ["all"])[0]
+            window = self.hub.capacity if replay == "all" else min(int(replay), self.hub.capacity)
+            cursor = max(0, head - window)
+        kinds = [k for k in qs.get("kinds", [""])[0].split(",") if k]
+        return Subscriber(
+            self.hub, cursor, buffer=self.client_buffer, overflow=self.overflow,
+            kinds=kinds or None, lines=qs.get("lines", ["1"])[0] not in ("0", "false", "no"),
+        )
+
+    def _follow(self, sub: Subscriber, write, encode, idle, poll=None) -> None:
+        while not self.hub.closed:
+            if sub.cursor >= self.hub.head:
+                wait = self.keepalive if poll is None else min(self.keepalive, 1.0)
+                if not self.hub.wait(sub.cursor, wait):
+                    if poll is not None and not poll():
+                        return
+                    if idle is not None:
+                        write(idle)
+                    continue
+                time.sleep(self.batch_interval)  # let a batch build up
+            items = sub.batch()
+            if items:
+                write(b"".join([encode(i) for i in items]))
+            if poll is not None and not poll():
+                return
+
+    def _handler(self):
+        import base64
+        import hashlib
+        import select
+        from http.server import BaseHTTPRequestHandler
+        from urllib.parse import parse_qs, urlparse
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args) -> None:
+                pass
+
+            def _json(self, obj, status: int = 200) -> None:
+                data = json.dumps(obj, default=str).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("Access-Control-Allow-Origin", "*")
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self) -> None:
+                url = urlparse(self.path)
+                qs = parse_qs(url.query)
+                if url.path == "/events":
+                    self._serve_sse(qs)
+                elif url.path == "/ws":
+                    self._serve_ws(qs)
+                elif url.path == "/history":
+                    try:
+                        since = int(qs.get("since", ["-1"])[0]) + 1
+                        limit = int(qs.get("limit", ["1000"])[0])
+                    except ValueError as e:
+                        self._json({"error": str(e)}, 400)
+                        return
+                    events, _ = server.hub.events(since)
+                    self._json([json.loads(ev.json()) for ev in events[:limit]])
+                elif url.path in ("/", "/clients"):
+                    self._json(server.stats())
+                else:
+                    self._json({"error": "not found"}, 404)
+
+            def _register(self, transport: str, sub: Subscriber) -> int:
+                cid = next(server._ids)
+                server.clients[cid] = (transport, sub)
+                self.connection.settimeout(server.send_timeout)
+                return cid
+
+            def _serve_sse(self, qs) -> None:
+                try:
+                    sub = server._subscriber(qs, self.headers.get("Last-Event-ID"))
+                except ValueError as e:
+                    self._json({"error": str(e)}, 400)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Access-Control-Allow-Origin", "*")
+                self.end_headers()
+                cid = self._register("sse", sub)
+                try:
+                    server._follow(sub, self.wfile.write, _sse, b": keepalive\n\n")
+                except (OSError, ValueError):
+                    pass  # viewer went away (or is stuck past send_timeout)
+                finally:
+                    server.clients.pop(cid, None)
+
+            def _serve_ws(self, qs) -> None:
+                key = self.headers.get("Sec-WebSocket-Key")
+                if not key or self.headers.get("Upgrade", "").lower() != "websocket":
+                    self._json({"error": "websocket upgrade required"}, 400)
+                    return
+                try:
+                    sub = server._subscriber(qs, None)
+                except ValueError as e:
+                    self._json({"error": str(e)}, 400)
+                    return
+                accept = base64.b64encode(hashlib.sha1((key + _WS_GUID).encode()).digest()).decode()
+                self.send_response(101)
+                self.send_header("Upgrade", "websocket")
+                self.send_header("Connection", "Upgrade")
+                self.send_header("Sec-WebSocket-Accept", accept)
+                self.end_headers()
+                self.wfile.flush()
+                sock = self.connection
+                cid = self._register("ws", sub)
+
+                def poll() -> bool:  # answer pings, notice closes, without blocking
+                    while select.select([sock], [], [], 0)[0]:
+                        if _ws_read(sock) is None:
+                            return False
+                    return True
+
+                try:
+                    server._follow(sub, sock.sendall, _ws, _ws_frame(b"", 0x9), poll)
+                except (OSError, ValueError):
+                    pass
+                finally:
+                    server.clients.pop(cid, None)
+                    self.close_connection = True
+
+        return Handler
+
+# -----------------------------------------------------------------------------
+# Process-wide stream
+# -----------------------------------------------------------------------------
+_hub: Optional[EventHub] = None
+_server: Optional[StreamServer] = None
+
+def get_hub() -> Optional[EventHub]:
+    return _hub
+
+def publish(kind: str, **data: Any) -> None:
+    """Publish a non-trace event (result, prompt, ...) when a stream is running; no-op otherwise."""
+    hub = _hub
+    if hub is not None:
+        hub.publish(kind, data)
+
+def publish_result(primitive: str, value: Any = None,
+                   error: Optional[BaseException] = None) -> None:
+    """Outcome of one attempt of a primitive (published by the retry decorators)."""
+    hub = _hub
+    if hub is None:
+        return
+    data: dict[str, Any] = {"primitive": primitive, "corr_id": corr_id_var.get(),
+                            "attempt": attempt_var.get(), "ok": error is None}
+    if error is None:
+        data["value"] = safe_repr(value, maxlen=500)
+    else:
+        data["error"] = f"{type(error).__name__}: {safe_repr(error, maxlen=500)}"
+    hub.publish("result", data)
+
+def start_stream(address: str = "127.0.0.1:0", *, history: int = STREAM_HISTORY,
+                 **kwargs: Any) -> StreamServer:
+    """Serve this procedure's events on "[host:]port" (port 0: any free port)."""
+    global _hub, _server
+    host, _, port = address.rpartition(":")
+    if _hub is None:
+        _hub = EventHub(history)
+    _server = StreamServer(_hub, host or "127.0.0.1", int(port or 0), **kwargs).start()
+    return _server
+
+def _close_stream() -> None:
+    if _server is not None:
+        _server.close()
+
+atexit.register(_close_stream)
+
+if STREAM_ADDRESS:
+    start_stream(STREAM_ADDRESS)
+
+__all__ = [
+    "EventHub", "Subscriber", "StreamOverflow", "StreamServer",
+    "get_hub", "publish", "publish_result", "start_stream",
+]
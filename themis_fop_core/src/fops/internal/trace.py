@@ -1,12 +1,34 @@
 import functools
+import inspect
 import linecache
+import os
+import random
 import sys
+import threading
 from collections.abc import Callable
-from contextvars import ContextVar
+from contextvars import ContextVar, Token
+from types import CodeType
 from typing import Any, Optional
 
+from .metrics import metrics
+from .policy import Level, Rule, policy
+
 corr_id_var: ContextVar[str] = ContextVar("corr_id", default="")
 attempt_var: ContextVar[int] = ContextVar("attempt", default=1)
+# name of the parallel step running the code (see fops.lang.parallel); "" outside step groups
+step_var: ContextVar[str] = ContextVar("step", default="")
+
+# "auto" -> sys.monitoring (PEP 669) on 3.12+, settrace otherwise; "monitoring" | "settrace" to
+# force
+TRACE_BACKEND = os.environ.get("FOPS_TRACE_BACKEND", "auto").lower()
+
+# compact event kinds, used by sinks that record raw events (see sinks.FlightRecorder)
+CALL, LINE, RETURN, EXCEPTION = range(4)
+EVENT_NAMES = ("call", "line", "return", "exception")
+
+TRACE_ERRORS = metrics.counter(
+    "fops_trace_errors_total", "Trace events lost to an error of the tracer or its sink.",
+    ("primitive",))
 
 def safe_repr(obj: Any, *, maxlen: int = 120) -> str:
     try:
@@ -21,6 +43,175 @@ def _render_call_args(args: tuple[Any, ...], kwargs: dict[str, Any], *, maxlen:
     joined = ", ".join(parts)
     return joined if len(joined) <= maxlen else joined[: maxlen - 3] + "..."
 
+# -----------------------------------------------------------------------------
+# sys.monitoring backend
+# -----------------------------------------------------------------------------
+# handler(event, lineno, arg) with event in "call" | "line" | "return" | "exception"
+_Handler = Callable[[str, int, Any], None]
+
+class _Monitor:
+    """
+    Process-wide sys.monitoring tool shared by every traced primitive.
+    LINE/PY_START/PY_RETURN are enabled as *local* events on the traced code objects only,
+    so frames called underneath (with_args, dataclasses, HTTP clients...) cost nothing.
+    RAISE/PY_UNWIND cannot be local: they are switched on globally only while at least one
+    traced primitive is running, and filtered by code object in the callback.
+
+    Several primitives may share one code object (e.g. the `with_args` wrapper), so events
+    are dispatched to the innermost active invocation of that code in the current context
+    (thread or asyncio task).
+    """
+
+    TOOL_NAME = "themis-fops-trace"
+
+    def __init__(self) -> None:
+        self.tool: Optional[int] = None
+        self.local_events: dict[CodeType, int] = {}
+        self._owners: dict[CodeType, dict[object, tuple[int, int]]] = {}
+        self._lines: dict[CodeType, list[Optional[int]]] = {}
+        self._active_handlers: ContextVar[dict[CodeType, tuple[_Handler, ...]]] = ContextVar(
+            "fops_trace_handlers", default={}
+        )
+        self._active = 0
+        self._global_events = 0
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        if self.tool is not None:
+            return True
+        mon = getattr(sys, "monitoring", None)
+        if mon is None:
+            return False
+        for tool in (mon.PROFILER_ID, mon.OPTIMIZER_ID):
+            if mon.get_tool(tool) is None:
+                mon.use_tool_id(tool, self.TOOL_NAME)
+                self.tool = tool
+                break
+        else:
+            return False
+        ev = mon.events
+        mon.register_callback(self.tool, ev.PY_START, self._on_start)
+        mon.register_callback(self.tool, ev.LINE, self._on_line)
+        mon.register_callback(self.tool, ev.PY_RETURN, self._on_return)
+        mon.register_callback(self.tool, ev.RAISE, self._on_raise)
+        mon.register_callback(self.tool, ev.PY_UNWIND, self._on_unwind)
+        return True
+
+    def require(self, code: CodeType, owner: object, *, calls: bool, lines: bool,
+                returns: bool, exceptions: bool) -> None:
+        """
+        Events `owner` (one traced primitive) needs on `code`; the union of all owners is enabled.
+        """
+        ev = sys.monitoring.events
+        local = ((ev.PY_START if calls else 0) | (ev.LINE if lines else 0)
+                 | (ev.PY_RETURN if returns else 0))
+        glob = (ev.RAISE if exceptions else 0) | (ev.PY_UNWIND if returns else 0)
+        with self._lock:
+            owners = self._owners.setdefault(code, {})
+            if owners.get(owner) == (local, glob):
+                return
+            owners[owner] = (local, glob)
+            union = 0
+            for lc, _ in owners.values():
+                union |= lc
+            self.local_events[code] = union
+            sys.monitoring.set_local_events(self.tool, code, union)
+            glob = 0
+            for needs in self._owners.values():
+                for _, gl in needs.values():
+                    glob |= gl
+            self._global_events = glob
+            if self._active:
+                sys.monitoring.set_events(self.tool, self._global_events)
+
+    def enter(self, code: CodeType, handler: _Handler) -> Token:
+        # copy-on-write, so concurrent tasks never see each other's handlers
+        active = self._active_handlers.get()
+        token = self._active_handlers.set({**active, code: active.get(code, ()) + (handler,)})
+        with self._lock:
+            self._active += 1
+            if self._active == 1 and self._global_events:
+                sys.monitoring.set_events(self.tool, self._global_events)
+        return token
+
+    def exit(self, token: Token) -> None:
+        self._active_handlers.reset(token)
+        with self._lock:
+            self._active -= 1
+            if self._active == 0:
+                sys.monitoring.set_events(self.tool, 0)
+
+    def _handler(self, code: CodeType) -> Optional[_Handler]:
+        stack = self._active_handlers.get().get(code)
+        return stack[-1] if stack else None
+
+    def _lineno(self, code: CodeType, offset: int) -> int:
+        lines = self._lines.get(code)
+        if lines is None:
+            lines = self._lines[code] = [pos[0] for pos in code.co_positions()]
+        idx = offset // 2
+        ln = lines[idx] if idx < len(lines) else None
+        return ln if ln is not None else code.co_firstlineno
+
+    # callbacks ---------------------------------------------------------------------
+    def _on_start(self, code: CodeType, offset: int) -> None:
+        h = self._handler(code)
+        if h is not None:
+            h("call", code.co_firstlineno, None)
+
+    def _on_line(self, code: CodeType, line: int) -> None:
+        h = self._handler(code)
+        if h is not None:
+            h("line", line, None)
+
+    def _on_return(self, code: CodeType, offset: int, retval: Any) -> None:
+        h = self._handler(code)
+        if h is not None:
+            h("return", self._lineno(code, offset), retval)
+
+    def _on_raise(self, code: CodeType, offset: int, exc: BaseException) -> None:
+        h = self._handler(code)
+        if h is not None:
+            h("exception", self._lineno(code, offset), exc)
+
+    def _on_unwind(self, code: CodeType, offset: int, exc: BaseException) -> None:
+        # settrace reports a frame left by an exception as a "return" with None
+        h = self._handler(code)
+        if h is not None:
+            h("return", self._lineno(code, offset), None)
+
+_monitor = _Monitor()
+
+def _use_monitoring() -> bool:
+    if TRACE_BACKEND == "settrace":
+        return False
+    return _monitor.available()
+
+# -----------------------------------------------------------------------------
+# Decorator
+# -----------------------------------------------------------------------------
+class _Settings:
+    """
+    Effective settings of one traced function: its `trace(...)` arguments under the current policy.
+    """
+    __slots__ = ("version", "calls", "lines", "returns", "exceptions", "capture_values", "maxlen",
+                 "line_every", "line_sample", "line_seen", "bucket", "off", "all_lines", "failed")
+
+    def __init__(self) -> None:
+        self.version = -1
+        self.line_seen = 0
+        self.failed = False
+
+def _trace_failed(func_name: str, st: _Settings, e: Exception) -> None:
+    # tracing never fails the traced primitive: the event is dropped, counted, reported once
+    TRACE_ERRORS.inc(func_name)
+    if not st.failed:
+        st.failed = True
+        print(f"Tracing {func_name} failed, dropping the event: {type(e).__name__}: {e}")
+
+def _sink_name(sink: Any) -> str:
+    return getattr(sink, "name", None) or getattr(sink, "__name__", None) or type(sink).__name__
+
 def trace(
     sink: Callable[[str, int, str, str, dict[str, Any]], None],
     *,
@@ -31,61 +222,226 @@ def trace(
     capture_values: bool = True,
     maxlen: int = 160,
 ):
+    """
+    Trace the decorated function into `sink`. The arguments are defaults: the process-wide
+    tracing policy (see policy.py) may change the level, line sampling, value capture and rate
+    limit of any primitive at runtime. Each call only compares the policy version.
+    """
+    base = Rule(capture_values=capture_values, maxlen=maxlen)
+    sink_name = _sink_name(sink)
+
     def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
         func_code = func.__code__
+        func_name = func.__name__
+        func_module = func.__module__ or ""
+        monitoring = _use_monitoring()
+        st = _Settings()
+        # call args of the running invocation (per thread / asyncio task), rendered on "call"
+        _call: ContextVar[tuple[tuple[Any, ...], dict[str, Any]]] = ContextVar(
+            f"fops_trace_call_{func_name}", default=((), {})
+        )
+
+        def _refresh() -> None:
+            version = policy.version
+            try:
+                rule = policy.resolve(func_module, func_name, base)
+                _configure(rule)
+            except Exception as e:
+                _trace_failed(func_name, st, e)
+                _configure(base)   # the trace() arguments
+            st.version = version
+
+        def _configure(rule: Rule) -> None:
+            if rule.level is None:
+                st.calls, st.lines, st.returns, st.exceptions = calls, lines, returns, exceptions
+            else:
+                st.calls = st.returns = rule.level >= Level.CALLS
+                st.lines = rule.level >= Level.LINES
+                st.exceptions = rule.level >= Level.ERRORS
+            st.off = not (st.calls or st.lines or st.returns or st.exceptions)
+            st.capture_values = rule.capture_values
+            st.maxlen = rule.maxlen
+            st.line_every = rule.line_every or 1
+            st.line_sample = 1.0 if rule.line_sample is None else rule.line_sample
+            st.bucket = policy.bucket(sink_name)
+            st.all_lines = (st.lines and st.line_every == 1 and st.line_sample >= 1.0
+                            and st.bucket is None)
+            if monitoring:
+                _monitor.require(func_code, st, calls=st.calls, lines=st.lines,
+                                 returns=st.returns, exceptions=st.exceptions)
 
         def _emit(
-            frame,
+            lineno: int,
             event: str,
             *,
             code_line: Optional[str] = None,
             ret_val: Any = None,
-            exc: Optional[tuple[type[BaseException], BaseException, Any]] = None,
+            exc: Optional[BaseException] = None,
         ) -> None:
-            code_line = code_line or linecache.getline(frame.f_code.co_filename, frame.f_lineno).strip()
+            code_line = code_line or linecache.getline(func_code.co_filename, lineno).strip()
             meta: dict[str, Any] = {
                 "corr_id": corr_id_var.get(),
                 "attempt": attempt_var.get(),
             }
-            if capture_values:
+            step = step_var.get()
+            if step:
+                meta["step"] = step
+            if st.capture_values:
                 if event == "call":
-                    meta["args_preview"] = _render_call_args(
-                        frame.f_locals.get("__trace_args__", ()),
-                        frame.f_locals.get("__trace_kwargs__", {}),
-                        maxlen=maxlen,
-                    )
+                    args, kwargs = _call.get()
+                    meta["args_preview"] = _render_call_args(args, kwargs, maxlen=st.maxlen)
                 elif event == "return":
-                    meta["return_value"] = safe_repr(ret_val, maxlen=maxlen)
+                    meta["return_value"] = safe_repr(ret_val, maxlen=st.maxlen)
                 elif event == "exception" and exc is not None:
-                    etype, eobj, _tb = exc
-                    meta["exception_type"] = getattr(etype, "__name__", str(etype))
-                    meta["exception"] = safe_repr(eobj, maxlen=maxlen)
-            sink(func.__name__, frame.f_lineno, code_line, event, meta)
+                    meta["exception_type"] = type(exc).__name__
+                    meta["exception"] = safe_repr(exc, maxlen=st.maxlen)
+            sink(func_name, lineno, code_line, event, meta)
+
+        def _admit(event: str) -> bool:
+            if event == "line":
+                if not st.lines:
+                    return False
+                if st.line_every > 1:
+                    st.line_seen += 1
+                    if st.line_seen % st.line_every:
+                        return False
+                elif st.line_sample < 1.0 and random.random() >= st.line_sample:
+                    return False
+            elif event == "call":
+                if not st.calls:
+                    return False
+            elif event == "return":
+                if not st.returns:
+                    return False
+            elif not st.exceptions:
+                return False
+            bucket = st.bucket
+            return bucket is None or event == "exception" or bucket.allow()
+
+        def _handle(event: str, lineno: int, arg: Any) -> None:
+            try:
+                if not _admit(event):
+                    return
+                if event == "line":
+                    _emit(lineno, "line")
+                elif event == "call":
+                    _emit(lineno, "call")
+                elif event == "return":
+                    _emit(lineno, "return", code_line="<return>", ret_val=arg)
+                else:
+                    _emit(lineno, "exception", code_line="<exception>", exc=arg)
+            except Exception as e:
+                _trace_failed(func_name, st, e)
+
+        record = getattr(sink, "record", None)
+        if record is not None:
+            # raw-recording sink (flight recorder): nothing is rendered here, it bounds what it
+            # keeps.
+            # Unsampled, unlimited line events skip _admit.
+            site = sink.intern(func_name, func_code)
+
+            def _handle(event: str, lineno: int, arg: Any) -> None:
+                try:
+                    if event == "line" and st.all_lines:
+                        record(site, lineno, LINE)
+                    elif not _admit(event):
+                        return
+                    elif event == "line":
+                        record(site, lineno, LINE)
+                    elif event == "call":
+                        record(site, lineno, CALL, _call.get() if st.capture_values else None)
+                    elif event == "return":
+                        record(site, lineno, RETURN, arg if st.capture_values else None)
+                    else:
+                        record(site, lineno, EXCEPTION, arg if st.capture_values else None)
+                except Exception as e:
+                    _trace_failed(func_name, st, e)
+
+        _refresh()
+        is_async = inspect.iscoroutinefunction(func)
+
+        if monitoring:
+            if is_async:
+                @functools.wraps(func)
+                async def awrapped(*args: Any, **kwargs: Any):
+                    if st.version != policy.version:
+                        _refresh()
+                    if st.off:
+                        return await func(*args, **kwargs)
+                    call_token = _call.set((args, kwargs))
+                    token = _monitor.enter(func_code, _handle)
+                    try:
+                        return await func(*args, **kwargs)
+                    finally:
+                        _monitor.exit(token)
+                        _call.reset(call_token)
+
+                return awrapped
+
+            @functools.wraps(func)
+            def wrapped(*args: Any, **kwargs: Any):
+                if st.version != policy.version:
+                    _refresh()
+                if st.off:
+                    return func(*args, **kwargs)
+                call_token = _call.set((args, kwargs))
+                token = _monitor.enter(func_code, _handle)
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    _monitor.exit(token)
+                    _call.reset(call_token)
+
+            return wrapped
+
+        if is_async:
+            # settrace is per thread and cannot follow interleaved tasks: without sys.monitoring
+            # coroutines only get call/return/exception events, emitted from the wrapper
+            first = func_code.co_firstlineno
+
+            @functools.wraps(func)
+            async def awrapped(*args: Any, **kwargs: Any):
+                if st.version != policy.version:
+                    _refresh()
+                if st.off:
+                    return await func(*args, **kwargs)
+                call_token = _call.set((args, kwargs))
+                try:
+                    _handle("call", first, None)
+                    try:
+                        ret = await func(*args, **kwargs)
+                    except BaseException as e:
+                        _handle("exception", first, e)
+                        _handle("return", first, None)
+                        raise
+                    _handle("return", first, ret)
+                    return ret
+                finally:
+                    _call.reset(call_token)
+
+            return awrapped
 
         def _tracer(frame, event: str, arg):
             if frame.f_code is func_code:
-                if event == "call" and calls:
-                    _emit(frame, "call")
-                elif event == "line" and lines:
-                    _emit(frame, "line")
-                elif event == "return" and returns:
-                    _emit(frame, "return", code_line="<return>", ret_val=arg)
-                elif event == "exception" and exceptions:
-                    _emit(frame, "exception", code_line="<exception>", exc=arg)
-                return _tracer
+                if event == "exception":
+                    arg = arg[1]  # (type, value, traceback)
+                _handle(event, frame.f_lineno, arg)
             return _tracer
 
         @functools.wraps(func)
         def wrapped(*args: Any, **kwargs: Any):
+            if st.version != policy.version:
+                _refresh()
+            if st.off:
+                return func(*args, **kwargs)
+            call_token = _call.set((args, kwargs))
             prev = sys.gettrace()
             sys.settrace(_tracer)
             try:
-                # stash call args in locals so _emit can render them on "call"
-                __trace_args__ = args
-                __trace_kwargs__ = kwargs
                 return func(*args, **kwargs)
             finally:
                 sys.settrace(prev)
+                _call.reset(call_token)
 
         return wrapped
 
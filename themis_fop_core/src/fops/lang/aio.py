@@ -0,0 +1,44 @@
+"""
+Minimal scheduler for async procedures.
+
+    async def main():
+        await SendAsync("COMMAND_A")
+        await gather(
+            VerifyTMAsync(("TM1", "==", 100), Timeout=30),
+            VerifyTMAsync(("TM2", "==", 3), Timeout=30),
+        )
+
+    run(main())
+"""
+import asyncio
+from collections.abc import Awaitable, Coroutine
+from typing import Any, Optional, TypeVar
+
+from fops.internal.sinks import flush_sinks
+
+T = TypeVar("T")
+
+def run(main: Coroutine[Any, Any, T], *, flush_timeout: Optional[float] = 5.0) -> T:
+    """Run a procedure coroutine to completion, then flush queued traces."""
+    try:
+        return asyncio.run(main)
+    finally:
+        flush_sinks(timeout=flush_timeout)
+
+async def gather(*aws: Awaitable[Any], limit: Optional[int] = None,
+                 return_exceptions: bool = False) -> list[Any]:
+    """
+    Run primitives concurrently; each runs as its own task, so corr_id/attempt stay per primitive.
+    `limit` caps how many run at once (e.g. to spare a slow ground segment).
+    """
+    if limit is None:
+        return await asyncio.gather(*aws, return_exceptions=return_exceptions)
+    sem = asyncio.Semaphore(limit)
+
+    async def bounded(aw: Awaitable[Any]) -> Any:
+        async with sem:
+            return await aw
+
+    return await asyncio.gather(*(bounded(aw) for aw in aws), return_exceptions=return_exceptions)
+
+__all__ = ["run", "gather"]
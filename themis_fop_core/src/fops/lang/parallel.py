@@ -0,0 +1,204 @@
+"""
+Parallel step groups: independent sequences of one procedure (e.g. power, thermal, AOCS)
+run concurrently, so the procedure takes as long as its longest branch instead of the sum.
+
+    results = Parallel(
+        power=power_on_sequence,
+        thermal=Step(heaters_on, "ZONE_A", Timeout=60),   # step function and its arguments
+        aocs=aocs_safe_mode,
+        join="fail_fast", workers=3)
+
+    with step_group(workers=2) as group:                 # same, started one by one
+        group.start("power", power_on_sequence)
+        group.start("thermal", heaters_on, "ZONE_A")
+    # leaving the block waits for the steps, as the join policy says
+
+Each step runs on a worker thread of the group (at most `workers` at once) in its own copy
+of the caller's context: its own correlation id for traced code between primitives, and
+`step` set in every trace event it emits, so its trace stream can be told apart. Primitives
+inside a step keep their own corr_id/attempt, retries and journal records.
+
+Failures the retry policy hands to the operator go through one queue for the whole group:
+one prompt at a time, in the order they happened, labelled with the step. Join policies:
+* "wait_all" (default): every step runs to its end; then the failure is raised (an
+  ExceptionGroup when several steps failed).
+* "fail_fast": the first failed step stops the group. Steps not started are dropped, running
+  ones stop at their next primitive (StepCancelled), queued prompts get the unattended answer.
+* "continue": every step runs to its end and failures are returned in place of the results.
+"""
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import contextvars
+import inspect
+import threading
+import time
+from collections.abc import Callable
+from enum import Enum
+from typing import Any, Optional
+
+from fops.internal.retry import OperatorQueue, StepCancelled, new_corr_id, operator_queue_var
+from fops.internal.sinks import flush_sinks
+from fops.internal.stream import publish
+from fops.internal.trace import corr_id_var, step_var
+
+class JoinPolicy(Enum):
+    WAIT_ALL = "wait_all"     # run every step, then raise the failures
+    FAIL_FAST = "fail_fast"   # the first failure stops the other steps
+    CONTINUE = "continue"     # run every step, return the failures as results
+
+class Step:
+    """A step function with its arguments (sync, or async run on its own event loop)."""
+
+    __slots__ = ("fn", "args", "kwargs")
+
+    def __init__(self, fn: Callable[..., Any], *args: Any, **kwargs: Any):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+    def __call__(self) -> Any:
+        if inspect.iscoroutinefunction(self.fn):
+            return asyncio.run(self.fn(*self.args, **self.kwargs))
+        return self.fn(*self.args, **self.kwargs)
+
+class StepGroup:
+    """
+    Worker pool running the steps of a group and joining them. Use through `step_group()`
+    or `Parallel()`. `results` / `errors` map step names to return values / exceptions.
+    """
+
+    def __init__(self, workers: Optional[int] = None, *,
+                 join: JoinPolicy | str = JoinPolicy.WAIT_ALL, name: str = "steps"):
+        self.join_policy = JoinPolicy(join)
+        self.workers = workers
+        self.name = name
+        self.results: dict[str, Any] = {}
+        self.errors: dict[str, BaseException] = {}
+        self.elapsed: dict[str, float] = {}
+        # nested groups share the operator's turns
+        self.queue = OperatorQueue(operator_queue_var.get())
+        self._futures: dict[str, concurrent.futures.Future] = {}
+        self._pool: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._first: Optional[tuple[str, BaseException]] = None
+        self._lock = threading.Lock()
+        self._joined = False
+
+    @property
+    def names(self) -> list[str]:
+        """Step names, in the order they were started."""
+        return list(self._futures)
+
+    def __enter__(self) -> "StepGroup":
+        self._pool = concurrent.futures.ThreadPoolExecutor(self.workers,
+                                                           thread_name_prefix=f"fops-{self.name}")
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc is not None:
+            # the block itself raised: do not start more steps, stop the running ones
+            self.queue.stop(f"{self.name}: {exc!r}")
+            for fut in self._futures.values():
+                fut.cancel()
+            self._pool.shutdown(wait=True)
+            return False
+        self.join()
+        return False
+
+    def start(self, name: str, fn: Callable[..., Any] | Step, *args: Any,
+              **kwargs: Any) -> concurrent.futures.Future:
+        """Queue step `name`: `fn(*args, **kwargs)` on a worker thread."""
+        if self._pool is None or self._joined:
+            raise RuntimeError("steps are started inside `with step_group():`")
+        if name in self._futures:
+            raise ValueError(f"duplicate step name: {name}")
+        step = fn if isinstance(fn, Step) else Step(fn, *args, **kwargs)
+        # the step starts from a copy of the caller's context (policy overrides, pipeline, ...)
+        ctx = contextvars.copy_context()
+        fut = self._pool.submit(ctx.run, self._run, name, step)
+        self._futures[name] = fut
+        return fut
+
+    def _run(self, name: str, step: Step) -> Any:
+        self.queue.check()   # stopped while this step was waiting for a worker
+        corr_id_var.set(new_corr_id())
+        step_var.set(name)
+        operator_queue_var.set(self.queue)
+        publish("step", group=self.name, step=name, state="started")
+        t0 = time.perf_counter()
+        try:
+            result = step()
+        except BaseException as e:
+            self.elapsed[name] = time.perf_counter() - t0
+            publish("step", group=self.name, step=name, state="failed", error=repr(e),
+                    elapsed=self.elapsed[name])
+            self._failed(name, e)
+            raise
+        self.elapsed[name] = time.perf_counter() - t0
+        publish("step", group=self.name, step=name, state="done", elapsed=self.elapsed[name])
+        return result
+
+    def _failed(self, name: str, e: BaseException) -> None:
+        with self._lock:
+            if self._first is not None or isinstance(e, StepCancelled):
+                return
+            self._first = (name, e)
+        if self.join_policy is JoinPolicy.FAIL_FAST:
+            self.queue.stop(f"step {name} failed: {e!r}")
+            for fut in list(self._futures.values()):
+                fut.cancel()   # not started yet
+
+    def join(self) -> dict[str, Any]:
+        """Wait for every step, then apply the join policy; returns `results`."""
+        self._joined = True
+        try:
+            concurrent.futures.wait(list(self._futures.values()))
+        finally:
+            self._pool.shutdown(wait=True)
+            flush_sinks(timeout=5.0)
+        for name, fut in self._futures.items():
+            if fut.cancelled():
+                self.errors[name] = StepCancelled(self.queue.stopped or "not started")
+            elif fut.exception() is not None:
+                self.errors[name] = fut.exception()
+            else:
+                self.results[name] = fut.result()
+        if self.join_policy is JoinPolicy.CONTINUE or not self.errors:
+            return self.results
+        if self.join_policy is JoinPolicy.FAIL_FAST:
+            name, e = self._first if self._first is not None else next(iter(self.errors.items()))
+            raise e
+        failed = list(self.errors.items())
+        if len(failed) == 1:
+            raise failed[0][1]
+        for name, e in failed:
+            e.add_note(f"in step {name}")
+        raise ExceptionGroup(f"{len(failed)} of {len(self._futures)} steps failed",
+                             [e for _, e in failed])
+
+def step_group(workers: Optional[int] = None, *, join: JoinPolicy | str = JoinPolicy.WAIT_ALL,
+               name: str = "steps") -> StepGroup:
+    """
+    Run the steps started in the block on at most `workers` threads (default: the
+    ThreadPoolExecutor default); leaving the block joins them with the `join` policy.
+    """
+    return StepGroup(workers, join=join, name=name)
+
+def Parallel(*steps: Callable[..., Any] | Step, workers: Optional[int] = None,
+             join: JoinPolicy | str = JoinPolicy.WAIT_ALL, name: str = "steps",
+             **named: Callable[..., Any] | Step) -> dict[str, Any]:
+    """
+    Run the steps concurrently (default: one thread per step) and join them: positional steps
+    are named after their function, keyword steps after the keyword. Returns step name ->
+    result ("continue": or exception).
+    """
+    with StepGroup(workers or len(steps) + len(named) or None, join=join, name=name) as group:
+        for step in steps:
+            fn = step.fn if isinstance(step, Step) else step
+            group.start(getattr(fn, "__name__", f"step{len(group.names) + 1}"), step)
+        for step_name, step in named.items():
+            group.start(step_name, step)
+    return {n: group.errors[n] if n in group.errors else group.results[n] for n in group.names}
+
+__all__ = ["Parallel", "Step", "StepGroup", "step_group", "JoinPolicy", "StepCancelled"]
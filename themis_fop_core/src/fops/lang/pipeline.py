@@ -0,0 +1,285 @@
+"""
+Pipelined telecommand dispatch.
+
+    with pipeline(window=32):
+        for addr, block in blocks:
+            Send("MEM_LOAD", args=[["ADDR", addr], ["DATA", block]])
+    # leaving the block waits for every acknowledgement and verification
+
+Inside the block `Send` queues its TC and returns a PendingSend at once; up to `window`
+commands are in flight, and TCs queued together go to the driver as one batch. Each command
+still runs as its own Send on the pipeline's event loop (own corr_id, retry/prompt handling,
+trace and journal record): a rejected command, or one whose `verify=` conditions do not hold,
+is handled like a blocking Send and queued again on retry. `Delay` postpones the command's
+verification, not the commands behind it.
+
+While a failure waits for the operator no further TCs are released to the link. A failure the
+operator cancels stops the pipeline: TCs not yet sent are dropped, the next Send raises it,
+and so does leaving the block.
+"""
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import os
+import threading
+from collections import deque
+from collections.abc import Callable, Iterator
+from typing import TYPE_CHECKING, Any, Optional
+
+from fops.driver import Driver, TCRequest, TCResult, get_driver
+from fops.internal.profiler import span
+from fops.internal.sinks import flush_sinks
+
+if TYPE_CHECKING:
+    # imported by the methods: Send checks `current_pipeline()` on every call, and a procedure
+    # that never enters `with pipeline():` should not load the event loop machinery
+    import asyncio
+    import concurrent.futures
+
+# max commands queued or unconfirmed at once (a Send beyond it blocks until one completes)
+TC_WINDOW = int(os.environ.get("FOPS_TC_WINDOW", "32"))
+
+# max TCs per driver call
+TC_BATCH = int(os.environ.get("FOPS_TC_BATCH", "16"))
+
+_pipeline_var: contextvars.ContextVar[Optional["Pipeline"]] = contextvars.ContextVar(
+    "fops_pipeline", default=None)
+
+def current_pipeline() -> Optional["Pipeline"]:
+    """Pipeline of the enclosing `with pipeline():` block, or None."""
+    return _pipeline_var.get()
+
+class PendingSend:
+    """
+    A Send queued in a pipeline. `result()` is the Send result, None if the operator skipped it.
+    """
+
+    __slots__ = ("command", "_future")
+
+    def __init__(self, command: str, future: concurrent.futures.Future):
+        self.command = command
+        self._future = future
+
+    def done(self) -> bool:
+        return self._future.done()
+
+    def result(self, timeout: Optional[float] = None) -> Optional[dict]:
+        return self._future.result(timeout)
+
+    def exception(self, timeout: Optional[float] = None) -> Optional[BaseException]:
+        return self._future.exception(timeout)
+
+    def __repr__(self) -> str:
+        state = "done" if self.done() else "pending"
+        return f"<PendingSend {self.command} {state}>"
+
+class Pipeline:
+    """
+    Event loop (own thread) running the queued Sends, and the dispatcher batching their TCs.
+    Use through `pipeline()`.
+    """
+
+    def __init__(self, window: int = TC_WINDOW, *, batch: int = TC_BATCH,
+                 driver: Optional[Driver] = None, hold_on_failure: bool = True):
+        import asyncio
+
+        self.window = max(1, window)
+        self.batch = max(1, batch)
+        self.driver = driver
+        self.hold_on_failure = hold_on_failure
+        self.submitted = 0
+        self.sent = 0
+        self.batches = 0
+        self._slots = threading.BoundedSemaphore(self.window)
+        self._pending: set[concurrent.futures.Future] = set()
+        self._error: Optional[BaseException] = None
+        self._raised = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._token: Optional[contextvars.Token] = None
+        # loop-side state
+        self._queue: deque[tuple[TCRequest, asyncio.Future]] = deque()
+        self._flush_scheduled = False
+        self._held: set[asyncio.Task] = set()
+        self._tasks: set[asyncio.Task] = set()
+        self._gate = asyncio.Event()
+        self._gate.set()
+
+    # --- procedure thread ---------------------------------------------------------
+    def __enter__(self) -> "Pipeline":
+        if current_pipeline() is not None:
+            raise RuntimeError("pipelines do not nest")
+        import asyncio
+
+        if self.driver is None:
+            self.driver = get_driver()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="fops-pipeline",
+                                        daemon=True)
+        self._thread.start()
+        self._token = _pipeline_var.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        import concurrent.futures
+
+        try:
+            if exc is None:
+                self.wait()
+            else:
+                self._loop.call_soon_threadsafe(self._abort, exc, True)
+                concurrent.futures.wait(list(self._pending))
+        finally:
+            _pipeline_var.reset(self._token)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+        return False
+
+    def submit(self, primitive: Callable[..., Any], args: tuple, kwargs: dict) -> PendingSend:
+        """Queue a call of the async `primitive`; blocks while the window is full."""
+        import concurrent.futures
+
+        self._check()
+        with span("tc"):   # the window is full: waiting for acknowledgements
+            self._slots.acquire()
+        if self._error is not None:
+            self._slots.release()
+            self._check()
+        fut: concurrent.futures.Future = concurrent.futures.Future()
+        self._pending.add(fut)
+        self.submitted += 1
+        # the task starts from a copy of the caller's context (pipeline, policy overrides, ...)
+        ctx = contextvars.copy_context()
+        self._loop.call_soon_threadsafe(self._start, fut, primitive, args, kwargs, context=ctx)
+        command = args[0] if args else kwargs.get("command")
+        return PendingSend(str(command), fut)
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """
+        Wait until every command queued so far completed; raises the failure that stopped the
+        pipeline.
+        """
+        import concurrent.futures
+
+        done, not_done = concurrent.futures.wait(list(self._pending), timeout)
+        if not_done:
+            raise TimeoutError(f"{len(not_done)} command(s) still in flight")
+        self._check()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    def _check(self) -> None:
+        if self._error is not None and not self._raised:
+            self._raised = True
+            raise self._error
+
+    # --- loop thread --------------------------------------------------------------
+    def _start(self, fut: concurrent.futures.Future, primitive: Callable[..., Any], args: tuple,
+               kwargs: dict) -> None:
+        task = self._loop.create_task(primitive(*args, **kwargs))
+        self._tasks.add(task)
+        task.add_done_callback(lambda t: self._finished(fut, t))
+
+    def _finished(self, fut: concurrent.futures.Future, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        self._release(task)
+        if task.cancelled():
+            fut.cancel()
+            fut.set_running_or_notify_cancel()   # wakes concurrent.futures.wait()
+        elif task.exception() is not None:
+            e = task.exception()
+            fut.set_exception(e)
+            if self._error is None:
+                self._abort(e)
+        else:
+            fut.set_result(task.result())
+        self._pending.discard(fut)
+        self._slots.release()
+
+    def _abort(self, e: BaseException, cancel_all: bool = False) -> None:
+        if self._error is None:
+            self._error = e
+        if cancel_all:
+            # the block itself raised: nothing queued in it is waited for
+            for task in list(self._tasks):
+                task.cancel()
+        while self._queue:
+            _req, waiter = self._queue.popleft()
+            waiter.cancel()
+        self._gate.set()
+
+    async def dispatch(self, request: TCRequest) -> TCResult:
+        """Queue `request` for the next batch and wait for its acknowledgement."""
+        import asyncio
+
+        task = asyncio.current_task()
+        self._release(task)   # a retry of a failed command
+        await self._gate.wait()
+        if self._error is not None:
+            # the procedure was cancelled: drop what was not sent yet
+            raise asyncio.CancelledError
+        waiter = self._loop.create_future()
+        self._queue.append((request, waiter))
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self._loop.call_soon(self._flush)
+        return await waiter
+
+    def _flush(self) -> None:
+        self._flush_scheduled = False
+        while self._queue:
+            items = [self._queue.popleft() for _ in range(min(self.batch, len(self._queue)))]
+            self._loop.create_task(self._send(items))
+
+    async def _send(self, items: list[tuple[TCRequest, asyncio.Future]]) -> None:
+        self.batches += 1
+        self.sent += len(items)
+        try:
+            results = await self.driver.asend_tcs([req for req, _ in items])
+        except Exception as e:
+            for _, waiter in items:
+                if not waiter.done():
+                    waiter.set_exception(e)
+            return
+        for (_, waiter), tc in zip(items, results):
+            if not waiter.done():
+                waiter.set_result(tc)
+
+    @contextlib.contextmanager
+    def holding(self) -> Iterator[None]:
+        """Hold back further TCs while a failure raised inside the block is being handled."""
+        try:
+            yield
+        except Exception:
+            if self.hold_on_failure:
+                import asyncio
+                self._held.add(asyncio.current_task())
+                self._gate.clear()
+            raise
+
+    def _release(self, task: Optional[asyncio.Task]) -> None:
+        if task in self._held:
+            self._held.discard(task)
+            if not self._held:
+                self._gate.set()
+
+@contextlib.contextmanager
+def pipeline(window: int = TC_WINDOW, *, batch: int = TC_BATCH, driver: Optional[Driver] = None,
+             hold_on_failure: bool = True,
+             flush_timeout: Optional[float] = 5.0) -> Iterator[Pipeline]:
+    """
+    Run the Sends of the block pipelined: at most `window` commands in flight, at most `batch`
+    TCs per driver call. With `hold_on_failure` (default) no further TCs are sent while a failed
+    command waits for the operator. Queued traces are flushed on exit.
+    """
+    try:
+        with Pipeline(window, batch=batch, driver=driver, hold_on_failure=hold_on_failure) as pipe:
+            yield pipe
+    finally:
+        flush_sinks(timeout=flush_timeout)
+
+__all__ = ["pipeline", "Pipeline", "PendingSend", "current_pipeline", "TC_WINDOW", "TC_BATCH"]
@@ -1,32 +1,32 @@
-from fops.integrations.vscode.prompt_client import ask_vscode
-from fops.integrations.vscode.retry_vscode import retry_decorator_with_vscode_fallback
+from fops.driver import get_driver
 from fops.internal.args import (
     PrimitiveCall,
     PromptType,
-    with_args,
 )
 
 #from fops.internal.retry import retry_decorator
-from fops.internal.sinks import send_trace_data_local
-from fops.internal.trace import trace
+from fops.internal.registry import primitive
 
 MODIFIERS = {"Type"}
-@retry_decorator_with_vscode_fallback
-@trace(send_trace_data_local, lines=True, calls=True, returns=True, exceptions=True, capture_values=True, maxlen=160)
-@with_args(allowed_modifiers=MODIFIERS)
-def Prompt(call: PrimitiveCall) -> dict:
-    
-    type    = call.mods.Type
-    message = call.spec
 
-    if type is None:
-        type = PromptType.OK
-    
-    response = ask_vscode(f"{message}:\nOptions: Ok (o)?", ['Ok'])
+def _message(call: PrimitiveCall) -> str:
+    return f"{call.spec}:\nOptions: Ok (o)?"
+
+def _result(call: PrimitiveCall, response: str) -> dict:
     return {
         "primitive": "Prompt",
-        "type": type,
+        "type": call.mods.Type if call.mods.Type is not None else PromptType.OK,
         "modifiers": call.mods,
         "params": call.params,
         "response": response
     }
+
+@primitive(modifiers=MODIFIERS)
+def Prompt(call: PrimitiveCall) -> dict:
+    response = get_driver().prompt(_message(call), ['Ok'])
+    return _result(call, response)
+
+@primitive(modifiers=MODIFIERS)
+async def PromptAsync(call: PrimitiveCall) -> dict:
+    response = await get_driver().aprompt(_message(call), ['Ok'])
+    return _result(call, response)
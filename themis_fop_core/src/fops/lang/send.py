@@ -1,30 +1,129 @@
-from fops.integrations.vscode.retry_vscode import retry_decorator_with_vscode_fallback
-from fops.internal.args import (
-    Modifiers,
-    PrimitiveCall,
-    normalize_conditions,
-    with_args,
+import functools
+import time
+
+from fops.driver import CommandRejected, TCRequest, TCResult, get_driver
+from fops.internal.args import PrimitiveCall
+from fops.internal.conditions import (
+    CompiledConditions,
+    VerificationFailed,
+    VerifyResult,
+    averify,
+    compile_conditions,
+    get_tm_source,
+    verify,
 )
 
 #from fops.internal.retry import retry_decorator
-from fops.internal.sinks import send_trace_data_local
-from fops.internal.trace import trace
+from fops.internal.profiler import span
+from fops.internal.registry import primitive
+from fops.internal.retry import is_transient
+from fops.lang.pipeline import current_pipeline
 
-MODIFIERS = {"Delay", "Tolerance", "OnFailure", "PromptUser", "Confirm", "Notify"}
-@retry_decorator_with_vscode_fallback
-@trace(send_trace_data_local, lines=True, calls=True, returns=True, exceptions=True, capture_values=True, maxlen=160)
-@with_args(allowed_modifiers=MODIFIERS)
-def Send(call: PrimitiveCall) -> dict:
-    
+MODIFIERS = {"Delay", "Tolerance", "Retries", "Timeout", "OnFailure", "PromptFailure",
+             "HandleError", "PromptUser", "Confirm", "Notify"}
+
+def _command(call: PrimitiveCall) -> str:
     # Command can be positional (spec) or keyword param
-    command = call.spec or call.params.get("command")
+    return call.spec or call.params.get("command")
 
-    if command == 'COMMAND_EX':
-        raise ValueError("Simulated exception in SendTC")
-    
+def _result(call: PrimitiveCall, command: str, tc: TCResult) -> dict:
+    if not tc.accepted:
+        raise CommandRejected(f"{command} rejected: {tc.error}", tc)
     return {
         "primitive": "Send",
         "command": command,
         "modifiers": call.mods,
         "params": call.params,
+        "ack_time": tc.ack_time,
     }
+
+def _plan(call: PrimitiveCall, spec: object) -> tuple[CompiledConditions, float | None]:
+    plan = compile_conditions(spec, call.mods)
+    # per-condition Timeout overrides (e.g. {'Timeout': 20}) bound the whole check
+    timeout = max(
+        (c.overrides.Timeout for c, _key, _pred in plan.leaves
+         if c.overrides is not None and c.overrides.Timeout),
+        default=call.mods.Timeout,
+    )
+    return plan, timeout
+
+def _verified(command: str, res: VerifyResult) -> dict:
+    if not res.ok:
+        raise VerificationFailed(
+            f"{command} verification failed after {res.attempts} check(s): "
+            f"{', '.join(res.failed)} (values: {res.values})",
+            res.failed,
+            res.values,
+        )
+    return res.values
+
+# After the acknowledgement every Send waits for its Delay, then checks its verify= conditions;
+# the modes (blocking, awaitable, pipelined) differ only in how the TC is dispatched.
+def _acknowledged(call: PrimitiveCall, command: str, tc: TCResult, driver) -> dict:
+    result = _result(call, command, tc)
+    if call.mods.Delay:
+        with span("delay"):
+            time.sleep(call.mods.Delay)
+    spec = call.params.get("verify")
+    if spec:
+        plan, timeout = _plan(call, spec)
+        res = verify(plan, get_tm_source() or driver.read_tm, retries=call.mods.Retries,
+                     timeout=timeout, transient=is_transient)
+        result["values"] = _verified(command, res)
+    return result
+
+async def _aacknowledged(call: PrimitiveCall, command: str, tc: TCResult, driver) -> dict:
+    result = _result(call, command, tc)
+    if call.mods.Delay:
+        # awaitable Sends only: a sync `from fops import Send` never loads the event loop
+        import asyncio
+        with span("delay"):
+            await asyncio.sleep(call.mods.Delay)
+    spec = call.params.get("verify")
+    if spec:
+        plan, timeout = _plan(call, spec)
+        res = await averify(plan, get_tm_source() or driver.aread_tm, retries=call.mods.Retries,
+                            timeout=timeout, transient=is_transient)
+        result["values"] = _verified(command, res)
+    return result
+
+def _pipelined(queued):
+    """Inside `with pipeline():` queue the call as `queued` and return its PendingSend."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            pipe = current_pipeline()
+            if pipe is None:
+                return func(*args, **kwargs)
+            return pipe.submit(queued, args, kwargs)
+        return wrapper
+    return decorator
+
+async def _send_queued(call: PrimitiveCall) -> dict:
+    # a pipelined Send: the TC goes out in the pipeline's next batch, then Delay and verify=
+    # are awaited here without holding back the commands behind it
+    command = _command(call)
+    pipe = current_pipeline()
+    tc = await pipe.dispatch(TCRequest(command, call.params.get("args")))
+    with pipe.holding():
+        return await _aacknowledged(call, command, tc, pipe.driver)
+
+# the same primitive as Send to the trace policy, metrics, journal and circuit breakers
+_send_queued.__name__ = _send_queued.__qualname__ = "Send"
+SendQueued = primitive(_send_queued, modifiers=MODIFIERS, auto_retry="explicit")
+
+# a TC may have gone out before its error: it is re-sent automatically only when `Retries` is given
+@_pipelined(SendQueued)
+@primitive(modifiers=MODIFIERS, auto_retry="explicit")
+def Send(call: PrimitiveCall) -> dict:
+    command = _command(call)
+    driver = get_driver()
+    tc = driver.send_tc(command, call.params.get("args"))
+    return _acknowledged(call, command, tc, driver)
+
+@primitive(modifiers=MODIFIERS, auto_retry="explicit")
+async def SendAsync(call: PrimitiveCall) -> dict:
+    command = _command(call)
+    driver = get_driver()
+    tc = await driver.asend_tc(command, call.params.get("args"))
+    return await _aacknowledged(call, command, tc, driver)
@@ -1,23 +1,55 @@
-from fops.integrations.vscode.retry_vscode import retry_decorator_with_vscode_fallback
-from fops.internal.args import (
-    Modifiers,
-    PrimitiveCall,
-    normalize_conditions,
-    with_args,
+from fops.driver import get_driver
+from fops.internal.args import PrimitiveCall
+from fops.internal.conditions import (
+    CompiledConditions,
+    VerificationFailed,
+    VerifyResult,
+    averify,
+    compile_conditions,
+    get_tm_source,
+    verify,
 )
 
 #from fops.internal.retry import retry_decorator
-from fops.internal.sinks import send_trace_data_local
-from fops.internal.trace import trace
+from fops.internal.registry import primitive
+from fops.internal.retry import is_transient
 
-MODIFIERS = {"Retries", "Tolerance", "ValueFormat", "IgnoreCase", "Notify"}
-@retry_decorator_with_vscode_fallback
-@trace(send_trace_data_local, lines=True, calls=True, returns=True, exceptions=True, capture_values=True, maxlen=160)
-@with_args(allowed_modifiers=MODIFIERS)
-def VerifyTM(call: PrimitiveCall) -> dict:
+MODIFIERS = {"Retries", "Timeout", "Tolerance", "ValueFormat", "IgnoreCase", "OnFailure",
+             "PromptFailure", "HandleError", "Notify"}
+
+def _result(call: PrimitiveCall, plan: CompiledConditions, res: VerifyResult) -> dict:
+    if not res.ok:
+        raise VerificationFailed(
+            f"VerifyTM failed after {res.attempts} check(s): {', '.join(res.failed)} "
+            f"(values: {res.values})",
+            res.failed,
+            res.values,
+        )
     return {
         "primitive": "VerifyTM",
-        "conditions": normalize_conditions(call.spec),
+        "conditions": plan.conditions,
         "modifiers": call.mods,
         "params": call.params,
+        "result": res.ok,
+        "values": res.values,
+        "attempts": res.attempts,
     }
+
+# Retries and Timeout are the re-checks of verify(), which also rides out transient read errors:
+# the retry engine does not repeat them
+@primitive(modifiers=MODIFIERS, auto_retry="never")
+def VerifyTM(call: PrimitiveCall) -> dict:
+    plan = compile_conditions(call.spec, call.mods)
+    # an explicitly installed TM source wins over the driver
+    fetch = get_tm_source() or get_driver().read_tm
+    res = verify(plan, fetch, retries=call.mods.Retries, timeout=call.mods.Timeout,
+                 transient=is_transient)
+    return _result(call, plan, res)
+
+@primitive(modifiers=MODIFIERS, auto_retry="never")
+async def VerifyTMAsync(call: PrimitiveCall) -> dict:
+    plan = compile_conditions(call.spec, call.mods)
+    fetch = get_tm_source() or get_driver().aread_tm
+    res = await averify(plan, fetch, retries=call.mods.Retries, timeout=call.mods.Timeout,
+                        transient=is_transient)
+    return _result(call, plan, res)
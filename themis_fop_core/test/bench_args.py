@@ -0,0 +1,92 @@
+"""
+Microbenchmark: per-call overhead of with_args + modifier parsing.
+
+"before" is the original implementation (kwargs split twice, allowlist set rebuilt and one
+dataclasses.replace per modifier on every call); "after" is the compiled ModifierParser.
+
+    python bench_args.py [-n 100000]
+"""
+import argparse
+import timeit
+from dataclasses import replace
+
+from fops.internal.args import (
+    Action,
+    Modifiers,
+    PrimitiveCall,
+    _coerce_valuefmt,
+    _to_action_set,
+    with_args,
+)
+
+SEND_MODIFIERS = {"Delay", "Tolerance", "OnFailure", "PromptUser", "Confirm", "Notify"}
+
+# --- original implementation, kept here as the reference ---------------------------
+def legacy_parse_modifiers(kwargs, base=None, allowed=None):
+    mods = base if base is not None else Modifiers()
+    if allowed is not None:
+        allowed_set = set(allowed)
+        bad = [k for k in kwargs.keys() if k[:1].isupper() and k not in allowed_set]
+        if bad:
+            raise TypeError(f"Unsupported modifier(s) for this primitive: {sorted(bad)}")
+    for k, raw in kwargs.items():
+        if not k[:1].isupper():
+            continue
+        if not hasattr(mods, k):
+            raise TypeError(f"Unknown modifier '{k}'")
+        if k == "ValueFormat":
+            mods = replace(mods, ValueFormat=_coerce_valuefmt(raw))
+        elif k in {"OnFalse", "OnTrue", "OnFailure"}:
+            mods = replace(mods, **{k: _to_action_set(raw)})
+        else:
+            mods = replace(mods, **{k: raw})
+    return mods
+
+def legacy_with_args(*, base_mods=None, allowed_modifiers=None):
+    def deco(fn):
+        def wrapper(*args, **kwargs):
+            mod_kwargs = {k: v for k, v in kwargs.items() if k[:1].isupper()}
+            verb_kwargs = {k: v for k, v in kwargs.items() if not k[:1].isupper()}
+            mods = legacy_parse_modifiers(mod_kwargs, base=base_mods, allowed=allowed_modifiers)
+            spec = args[0] if args else None
+            return fn(PrimitiveCall(spec=spec, mods=mods, params=dict(verb_kwargs)))
+        return wrapper
+    return deco
+
+# --- cases --------------------------------------------------------------------------
+def _noop(call):
+    return call
+
+CASES = {
+    "no modifiers": (("COMMAND_B",), {}),
+    "Delay+Tolerance": (("COMMAND_A",), {"Delay": 2, "Tolerance": 0.1}),
+    "fop2 COMMAND_E": (
+        (),
+        {
+            "command": "COMMAND_E",
+            "args": [["ARG1", 1.0]],
+            "Delay": 10,
+            "Tolerance": 0.5,
+            "OnFailure": {Action.CANCEL},
+            "PromptUser": False,
+        },
+    ),
+}
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=100_000)
+    n = ap.parse_args().n
+
+    before = legacy_with_args(allowed_modifiers=SEND_MODIFIERS)(_noop)
+    after = with_args(allowed_modifiers=SEND_MODIFIERS)(_noop)
+
+    print(f"{'case':<18} {'before (us)':>12} {'after (us)':>12} {'speedup':>8}")
+    for name, (args, kwargs) in CASES.items():
+        assert before(*args, **kwargs) == after(*args, **kwargs)
+        t_before = min(timeit.repeat(lambda: before(*args, **kwargs), number=n, repeat=3)) / n * 1e6
+        t_after = min(timeit.repeat(lambda: after(*args, **kwargs), number=n, repeat=3)) / n * 1e6
+        print(f"{name:<18} {t_before:>12.2f} {t_after:>12.2f} {t_before / t_after:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark of the trace collector: `-p` procedures (processes) stream line-level trace events
+through QueuedSink + HttpBatchWriter into one local collector, then indexed queries are timed
+against a full scan of the same store.
+
+    python bench_collector.py [-p 24] [-n 20000] [--dir DIR]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from fops.internal.collector import serve_collector
+
+def _produce(url: str, instance: str, n: int) -> None:
+    os.environ["INSTANCE_ID"] = instance
+    from fops.internal.sinks import HttpBatchWriter, QueuedSink
+
+    sink = QueuedSink(HttpBatchWriter(url), batch_size=512, maxsize=20_000)
+    for i in range(n):
+        corr = f"{instance}-{i // 200}"
+        event = "exception" if i % 1000 == 999 else "line"
+        sink("Send" if i % 3 else "VerifyTM", 40 + i % 25, "value = read(param) + offset", event,
+             {"corr_id": corr, "attempt": 1 + i % 200 // 100})
+    sink.close(timeout=120)
+
+def _best(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-p", "--procedures", type=int, default=24)
+    ap.add_argument("-n", "--events", type=int, default=20_000, help="events per procedure")
+    ap.add_argument("--dir", default=None,
+                    help="store directory (default: a temporary one, removed)")
+    args = ap.parse_args()
+
+    directory = args.dir or tempfile.mkdtemp(prefix="fops-traces-")
+    server = serve_collector("127.0.0.1:0", directory)
+    store = server.store
+    try:
+        ctx = multiprocessing.get_context("fork")
+        procs = [ctx.Process(target=_produce, args=(server.url, f"fop{k:02d}", args.events))
+                 for k in range(args.procedures)]
+        t0 = time.perf_counter()
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+        store.flush()
+        elapsed = time.perf_counter() - t0
+        st = store.stats()
+        total = args.procedures * args.events
+        print(f"ingest       : {st['written']:,}/{total:,} events from {args.procedures} "
+              f"procedures in {elapsed:.2f} s "
+              f"({st['written'] / elapsed:,.0f} events/s)")
+        print(f"storage      : {st['bytes'] / st['written']:.1f} B/event on disk, "
+              f"compression {st['compression']}x, "
+              f"{st['segments']} segment(s), {st['blocks']} blocks")
+
+        corr = "fop07-42"
+        t_corr, hits = _best(lambda: list(store.query(corr_id=corr)))
+        print(f"corr_id      : {t_corr * 1e3:8.2f} ms  {len(hits)} events, "
+              f"{len(store.blocks(corr_id=corr))}/{st['blocks']} blocks read")
+        t_exc, hits = _best(lambda: list(store.query(instance="fop03", event="exception")))
+        print(f"instance+exc : {t_exc * 1e3:8.2f} ms  {len(hits)} events, "
+              f"{len(store.blocks(instance='fop03', event='exception'))}/{st['blocks']} "
+              "blocks read")
+
+        def scan():
+            out = []
+            for ref in store.blocks():
+                for line in store._read(ref):
+                    for ev in json.loads(line.split(b"\t", 2)[2]):
+                        if ev["meta"].get("corr_id") == corr:
+                            out.append(ev)
+            return out
+
+        t_scan, hits = _best(scan, repeat=1)
+        print(f"full scan    : {t_scan * 1e3:8.2f} ms  {len(hits)} events "
+              f"({t_scan / t_corr:,.0f}x the indexed query)")
+    finally:
+        server.close()
+        if args.dir is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark of the TM history: recording cost per sample, and a windowed check ("every sample
+of the last `seconds` within [lo, hi]") over many high-rate parameters, vectorized vs.
+evaluated sample by sample with the scalar predicate.
+
+    python bench_history.py [-p 100] [--rate 100] [--seconds 30] [--capacity 4096]
+"""
+import argparse
+import time
+
+from fops.internal.args import Modifiers, Operator, Window
+from fops.internal.conditions import _make_predicate
+from fops.internal.history import TMHistory, WindowCheck, WindowValues
+
+def _best(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-p", "--params", type=int, default=100)
+    ap.add_argument("--rate", type=float, default=100.0, help="samples/s per parameter")
+    ap.add_argument("--seconds", type=float, default=30.0)
+    ap.add_argument("--capacity", type=int, default=4096)
+    args = ap.parse_args()
+
+    hist = TMHistory(args.capacity)
+    names = [f"TM{i}" for i in range(args.params)]
+    n = args.capacity
+    t0 = time.perf_counter()
+    for name in names:
+        for k in range(n):
+            hist.record(name, 5.0 + (k % 7) * 0.1, ts=k / args.rate)
+    record_us = (time.perf_counter() - t0) / (n * len(names)) * 1e6
+    now = (n - 1) / args.rate
+
+    mods = Modifiers(Tolerance=0.05)
+    window = Window(tuple(names), seconds=args.seconds)
+    check = WindowCheck(window, Operator.BW, [5.0, 5.6], mods, history=hist)
+    arrays = [hist.window(name, seconds=args.seconds, now=now) for name in names]
+    samples = sum(a.size for a in arrays)
+
+    def read():
+        return WindowValues(window, [hist.window(name, seconds=args.seconds, now=now)
+                                     for name in names])
+
+    def vectorized():
+        assert check(read())
+
+    pred = _make_predicate(Operator.BW, [5.0, 5.6], mods)
+
+    def scalar():
+        wv = read()
+        assert all(pred(v) for a in wv.arrays for v in a.tolist())
+
+    t_read = _best(read)
+    t_vec = _best(vectorized)
+    t_py = _best(scalar, repeat=3)
+    print(f"record          : {record_us:8.2f} us/sample")
+    print(f"window read     : {t_read * 1e3:8.2f} ms  ({len(names)} params, {samples:,} samples)")
+    print(f"check vectorized: {t_vec * 1e3:8.2f} ms  ({samples / t_vec / 1e6:,.1f} M samples/s)")
+    print(f"check per sample: {t_py * 1e3:8.2f} ms  ({samples / t_py / 1e6:,.1f} M samples/s)")
+    print(f"memory          : {hist.stats()['bytes'] / len(names) / 1024:8.0f} KiB/param")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Microbenchmark: per-primitive cost of the checkpoint journal.
+
+Times a no-op primitive (with_args only) without a journal, with a journal, and when
+resuming (every call served from the journal).
+
+    python bench_journal.py [-n 20000] [--path /tmp/fops-bench.journal]
+"""
+import argparse
+import os
+import tempfile
+import timeit
+
+from fops.internal.args import Action, PrimitiveCall, with_args
+from fops.internal.journal import checkpoint, open_journal, set_journal
+
+SEND_MODIFIERS = {"Delay", "Tolerance", "OnFailure", "PromptUser", "Confirm", "Notify"}
+
+@checkpoint
+@with_args(allowed_modifiers=SEND_MODIFIERS)
+def Send(call: PrimitiveCall) -> dict:
+    return {"primitive": "Send", "command": call.spec or call.params.get("command"),
+            "modifiers": call.mods, "params": call.params}
+
+def _calls(n: int) -> None:
+    for i in range(n):
+        Send(command="COMMAND_E", args=[["ARG1", float(i)]], Delay=10, Tolerance=0.5,
+             OnFailure={Action.CANCEL}, PromptUser=False)
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=20_000)
+    ap.add_argument("--path", default=os.path.join(tempfile.gettempdir(), "fops-bench.journal"))
+    args = ap.parse_args()
+    n = args.n
+
+    set_journal(None)
+    t_off = timeit.timeit(lambda: _calls(n), number=1) / n * 1e6
+
+    journal = open_journal(args.path)
+    t_on = timeit.timeit(lambda: _calls(n), number=1) / n * 1e6
+    journal.close()
+    size = os.path.getsize(args.path)
+
+    journal = open_journal(args.path, resume=True)
+    t_resume = timeit.timeit(lambda: _calls(n), number=1) / n * 1e6
+    assert journal.skipped == n, journal.skipped
+    journal.close()
+    set_journal(None)
+    os.remove(args.path)
+
+    print(f"{'mode':<10} {'us/call':>8}")
+    print(f"{'off':<10} {t_off:>8.2f}")
+    print(f"{'journal':<10} {t_on:>8.2f}   (+{t_on - t_off:.2f} us, {size / n:.0f} B/record)")
+    print(f"{'resume':<10} {t_resume:>8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark of parallel step groups: `-s` subsystem sequences (Sends acknowledged after
+`--latency` seconds, then a VerifyTM) run one after the other versus as one `Parallel` group,
+then the same with a rejected command in every sequence, answered through the stub prompter:
+prompts must reach the operator one at a time.
+
+    python bench_parallel.py [-s 3] [--sends 5] [--latency 0.1] [--workers 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+from fops.driver import get_driver
+from fops.integrations.vscode import prompt_client
+from fops.internal.sinks import flush_sinks
+from fops.lang.parallel import Parallel, Step, StepCancelled, step_group
+from fops.lang.send import Send
+from fops.lang.verify_tm import VerifyTM
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))  # stub_prompter
+from stub_prompter import StubPrompter
+
+class CountingPrompter(StubPrompter):
+    """Stub prompter recording how many prompts were open at once."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.open = 0
+        self.max_open = 0
+        self.messages: list[str] = []
+
+    def _on_prompt(self, body: dict) -> str:
+        with self.lock:
+            self.open += 1
+            self.max_open = max(self.max_open, self.open)
+            self.messages.append(str(body.get("message", "")).splitlines()[0])
+        return super()._on_prompt(body)
+
+    def answer(self, pid: str, answer: str) -> bool:
+        with self.lock:
+            self.open -= 1
+        return super().answer(pid, answer)
+
+def _simulator():
+    drv = get_driver()
+    while hasattr(drv, "backend"):
+        drv = drv.backend
+    return drv
+
+def sequence(subsystem: str, sends: int, fail: bool = False) -> str:
+    for i in range(sends):
+        Send(f"{subsystem}_CMD_{i}")
+    if fail:
+        Send(f"{subsystem}_BAD")   # rejected: the operator skips it
+    VerifyTM([f"{subsystem}_STATUS", "eq", 1])
+    return subsystem
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-s", "--subsystems", type=int, default=3)
+    ap.add_argument("--sends", type=int, default=5)
+    ap.add_argument("--latency", type=float, default=0.1, help="TC acknowledgement latency (s)")
+    ap.add_argument("--workers", type=int, default=None)
+    args = ap.parse_args()
+
+    sim = _simulator()
+    sim.tc_latency = args.latency
+    names = [f"SUB{i}" for i in range(args.subsystems)]
+    for name in names:
+        sim.set_tm(f"{name}_STATUS", 1)
+        sim.fail_commands.add(f"{name}_BAD")
+
+    t0 = time.perf_counter()
+    for name in names:
+        sequence(name, args.sends)
+    sequential = time.perf_counter() - t0
+    flush_sinks(timeout=10)
+
+    t0 = time.perf_counter()
+    steps = {name: Step(sequence, name, args.sends) for name in names}
+    results = Parallel(**steps, workers=args.workers)
+    parallel = time.perf_counter() - t0
+    assert list(results.values()) == names, results
+    print(f"{args.subsystems} sequences of {args.sends} Sends ({args.latency * 1e3:g} ms ack):")
+    print(f"  sequential : {sequential:6.2f} s")
+    print(f"  Parallel   : {parallel:6.2f} s   ({sequential / parallel:4.1f}x, "
+          f"longest branch {(args.sends * args.latency):.2f} s)")
+
+    port = prompt_client.EXT_PORT
+    with CountingPrompter(auto_answer="s", delay=0.05) as stub:
+        prompt_client.EXT_PORT = stub.port
+        try:
+            t0 = time.perf_counter()
+            steps = {name: Step(sequence, name, args.sends, fail=True) for name in names}
+            results = Parallel(**steps, workers=args.workers, join="continue")
+            print(f"  failures   : {time.perf_counter() - t0:6.2f} s, "
+                  f"{len(stub.messages)} prompt(s), "
+                  f"at most {stub.max_open} open at once")
+            for message in stub.messages:
+                print(f"    {message}")
+            assert stub.max_open == 1, "prompts of concurrent steps overlapped"
+
+            # a rejected command the operator cancels: "continue" lets the other steps finish,
+            # "fail_fast" stops them at their next primitive
+            stub.auto_answer = "c"
+
+            def slow(name: str) -> None:
+                time.sleep(1.0)
+                Send(f"{name}_CMD_0")
+
+            results = Parallel(bad=Step(sequence, "SUB0", 0, fail=True),
+                               **{n: Step(slow, n) for n in names[1:]}, join="continue")
+            print(f"  continue   : {[type(r).__name__ for r in results.values()]}")
+            group = step_group(join="fail_fast")
+            try:
+                with group:
+                    group.start("bad", sequence, "SUB0", 0, fail=True)
+                    for n in names[1:]:
+                        group.start(n, slow, n)
+            except StepCancelled as e:
+                raise AssertionError(f"fail_fast raised the cancellation, not the failure: {e}")
+            except Exception as e:
+                print(f"  fail_fast  : raised {type(e).__name__}, "
+                      f"{[type(e).__name__ for e in group.errors.values()]}")
+                cancelled = [isinstance(group.errors[n], StepCancelled) for n in names[1:]]
+                assert all(cancelled), group.errors
+        finally:
+            prompt_client.EXT_PORT = port
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Benchmark of pipelined TC dispatch: a memory-load style burst of Sends against the simulator
+with a fixed acknowledgement latency, blocking vs. `with pipeline(window=...)`.
+
+    python bench_pipeline.py [-n 500] [--latency 0.02] [--window 32] [--batch 16]
+"""
+import argparse
+import time
+
+from fops.driver import get_driver
+from fops.internal.sinks import flush_sinks
+from fops.lang.pipeline import pipeline
+from fops.lang.send import Send
+
+def _simulator():
+    drv = get_driver()
+    while hasattr(drv, "backend"):
+        drv = drv.backend
+    return drv
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=500)
+    ap.add_argument("--latency", type=float, default=0.02, help="TC acknowledgement latency (s)")
+    ap.add_argument("--window", type=int, default=32)
+    ap.add_argument("--batch", type=int, default=16)
+    ap.add_argument("--blocking", type=int, default=50,
+                    help="TCs sent one by one for the reference")
+    args = ap.parse_args()
+
+    sim = _simulator()
+    sim.tc_latency = args.latency
+
+    t0 = time.perf_counter()
+    for i in range(args.blocking):
+        Send("MEM_LOAD", args=[["ADDR", i]])
+    blocking = (time.perf_counter() - t0) / args.blocking
+    flush_sinks(timeout=10)
+
+    t0 = time.perf_counter()
+    with pipeline(window=args.window, batch=args.batch) as pipe:
+        for i in range(args.n):
+            Send("MEM_LOAD", args=[["ADDR", i]])
+    piped = (time.perf_counter() - t0) / args.n
+
+    print(f"blocking  : {blocking * 1e3:8.2f} ms/TC  {1 / blocking:10,.0f} TC/s")
+    print(f"pipelined : {piped * 1e3:8.2f} ms/TC  {1 / piped:10,.0f} TC/s  "
+          f"(window {args.window}, {pipe.batches} batches, "
+          f"{pipe.sent / pipe.batches:.1f} TC/batch)")
+    print(f"speedup   : {blocking / piped:8.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark of the preflight validator.
+
+1. Throughput: validates a generated directory of FOPs serially and in parallel.
+2. Runtime: per-call cost of VerifyTM (tracing off, in-memory TM source) with arguments
+   parsed at runtime vs. reused from the preflight call-site cache.
+
+    python bench_preflight.py [--fops 400] [-j 4] [-n 20000]
+"""
+import argparse
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from fops import set_tm_source, trace_policy
+from fops.internal.args import clear_call_sites
+from fops.internal.preflight import load_preflight_cache, preflight, write_cache
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+LOOP = '''
+from fops.internal.args import AND
+from fops.lang.verify_tm import VerifyTM
+
+def loop_expr(n):
+    for _ in range(n):
+        VerifyTM(AND(["TM1", "eq", 10], ["TM2", "lt", 5]), ValueFormat="RAW", Tolerance=0.1)
+
+def loop_list(n):
+    for _ in range(n):
+        VerifyTM([["TM1", "eq", 10, {"Tolerance": 0.5}], ["TM2", "bw", [0, 5]]], Retries=3)
+'''
+
+def _make_fops(root: str, count: int) -> None:
+    with open(os.path.join(HERE, "fop2.py"), encoding="utf-8") as f:
+        template = f.read()
+    for i in range(count):
+        sub = os.path.join(root, f"subsystem_{i % 10}")
+        os.makedirs(sub, exist_ok=True)
+        with open(os.path.join(sub, f"fop_{i:04d}.py"), "w", encoding="utf-8") as f:
+            f.write(template.replace("COMMAND_", f"CMD{i}_"))
+
+def _load(path: str):
+    spec = importlib.util.spec_from_file_location("bench_preflight_loop", path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+def _per_call(fn, n: int) -> float:
+    fn(100)  # warm caches
+    t0 = time.perf_counter()
+    fn(n)
+    return (time.perf_counter() - t0) / n * 1e6
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--fops", type=int, default=400)
+    ap.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("-n", type=int, default=20_000)
+    args = ap.parse_args()
+
+    root = tempfile.mkdtemp(prefix="fops-preflight-")
+    try:
+        _make_fops(root, args.fops)
+        for jobs in sorted({1, args.jobs}):
+            t0 = time.perf_counter()
+            reports = preflight([root], jobs=jobs)
+            dt = time.perf_counter() - t0
+            calls = sum(r.calls for r in reports)
+            print(f"preflight -j {jobs:<3} {len(reports)} FOPs, {calls} calls: {dt * 1e3:8.1f} ms")
+
+        loop_path = os.path.join(root, "loop_fop.py")
+        with open(loop_path, "w", encoding="utf-8") as f:
+            f.write(LOOP)
+        cache = os.path.join(root, "preflight.pickle")
+        write_cache(preflight([loop_path], jobs=1), cache)
+
+        trace_policy.set_level("default", "off")
+        set_tm_source(lambda names, fmt: {"TM1": 10, "TM2": 3})
+        mod = _load(loop_path)
+        print(f"{'case':<16}{'runtime us':>12}{'cached us':>12}")
+        for name in ("loop_expr", "loop_list"):
+            clear_call_sites()
+            before = _per_call(getattr(mod, name), args.n)
+            load_preflight_cache(cache)
+            after = _per_call(getattr(mod, name), args.n)
+            print(f"{name:<16}{before:>12.2f}{after:>12.2f}")
+        clear_call_sites()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
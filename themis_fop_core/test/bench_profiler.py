@@ -0,0 +1,97 @@
+"""
+Benchmark of the line profiler: a simulator rehearsal (TCs with acknowledgement latency, a flaky
+link retried automatically, TM waits, operator prompts) run without and with `profile()`, then
+the hotspot report and the first collapsed stacks.
+
+    python bench_profiler.py [-n 40] [--latency 0.002] [--folded out.folded]
+"""
+import argparse
+import random
+import time
+
+from fops.driver import get_driver
+from fops.internal.profiler import profile
+from fops.internal.sinks import flush_sinks
+from fops.lang.prompt import Prompt
+from fops.lang.send import Send
+from fops.lang.verify_tm import VerifyTM
+
+def _simulator():
+    drv = get_driver()
+    while hasattr(drv, "backend"):
+        drv = drv.backend
+    return drv
+
+sim = _simulator()
+
+def _flaky(send_tcs, every):
+    calls = [0]
+
+    def send(requests):
+        calls[0] += 1
+        if calls[0] % every == 0:
+            raise TimeoutError("link dropped")
+        return send_tcs(requests)
+    return send
+
+def _slow_operator(seconds):
+    def prompt(message, options):
+        time.sleep(seconds)
+        return options[0]
+    return prompt
+
+def configure(step):
+    Send("SET_MODE", args=[["MODE", step % 4]])   # a dropped link is retried (Retries default)
+    values = [step * k for k in range(200)]   # some procedure-side computation
+    return sum(values)
+
+def check(step):
+    sim.set_tm("TM1", step)
+    VerifyTM(["TM1", "eq", step], Timeout=1)
+
+def rehearsal(n):
+    for step in range(n):
+        configure(step)
+        check(step)
+        if step % 10 == 9:
+            Prompt(f"Step {step} done")
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=40, help="steps of the rehearsal")
+    ap.add_argument("--latency", type=float, default=0.002, help="TC acknowledgement latency (s)")
+    ap.add_argument("--prompt", type=float, default=0.02, help="operator answer time (s)")
+    ap.add_argument("--folded", default=None, help="write the collapsed stacks to this file")
+    args = ap.parse_args()
+
+    sim.tc_latency = args.latency
+    sim.send_tcs = _flaky(sim.send_tcs, every=5)
+    sim.prompt = _slow_operator(args.prompt)
+    rehearsal(3)   # warm up the caches
+    flush_sinks(timeout=10)
+
+    random.seed(1)   # same link drops and backoff delays in both runs
+    t0 = time.perf_counter()
+    rehearsal(args.n)
+    plain = time.perf_counter() - t0
+    flush_sinks(timeout=10)
+
+    random.seed(1)
+    t0 = time.perf_counter()
+    with profile(paths=[__file__]) as prof:
+        rehearsal(args.n)
+    profiled = time.perf_counter() - t0
+    flush_sinks(timeout=10)
+
+    print(f"rehearsal : {plain:.3f} s plain, {profiled:.3f} s profiled "
+          f"({(profiled / plain - 1) * 100:+.1f} %, {len(prof.lines())} lines)")
+    print()
+    print(prof.report(limit=12))
+    print()
+    for line in list(prof.collapsed())[:8]:
+        print(line)
+    if args.folded:
+        print(f"\n{prof.write_collapsed(args.folded)} stacks written to {args.folded}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Startup-time check: cold `import fops` (and the first primitive, and a user primitive declared
+in a manifest) in fresh interpreters, median of `-n` runs. Fails (exit 1) when `import fops`
+takes more than `--max-ms`, `from fops import Send` more than `--max-send-ms`, or either pulls
+in modules only some procedures need. tests/test_startup.py holds the same bounds for the test
+suite.
+
+    python bench_startup.py [-n 15] [--max-ms 25] [--max-send-ms 150] [--importtime]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# must not be imported by a bare `import fops`
+HEAVY = ["requests", "numpy", "asyncio", "http.server", "fops.internal.collector",
+         "fops.internal.preflight", "fops.lang.send"]
+# must not be imported by the first primitive: awaitable primitives, pipelines, operator prompts
+# and the stream/control servers load them
+SEND_HEAVY = ["requests", "numpy", "asyncio", "concurrent.futures", "http.client", "http.server",
+              "socket", "socketserver", "ssl", "fops.integrations.vscode.prompt_client",
+              "fops.internal.collector"]
+
+USER_LIB = '''
+MODIFIERS = ["Timeout"]
+
+def PowerOn(call):
+    return call.spec
+'''
+
+def _time(code: str, runs: int, env: dict) -> float:
+    """
+    Median milliseconds spent running `code` in a fresh interpreter (interpreter startup
+    excluded).
+    """
+    probe = (f"import time; _t = time.perf_counter()\n{code}\n"
+             "print((time.perf_counter() - _t) * 1e3)")
+    out = []
+    for _ in range(runs):
+        res = subprocess.run([sys.executable, "-c", probe], env=env, capture_output=True,
+                             text=True, check=True)
+        out.append(float(res.stdout.strip().splitlines()[-1]))
+    return statistics.median(out)
+
+def _loaded(stmt: str, modules: list[str], env: dict) -> list[str]:
+    code = (f"import json, sys\n{stmt}\n"
+            f"print(json.dumps([m for m in {modules!r} if m in sys.modules]))")
+    res = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True,
+                         check=True)
+    return json.loads(res.stdout.strip().splitlines()[-1])
+
+def _importtime(env: dict, top: int = 12) -> None:
+    res = subprocess.run([sys.executable, "-X", "importtime", "-c", "from fops import Send"],
+                         env=env, capture_output=True, text=True, check=True)
+    rows = []
+    for line in res.stderr.splitlines()[1:]:
+        _, self_us, cumulative, name = (p.strip() for p in line.replace("|", ":").split(":", 3))
+        rows.append((int(cumulative), int(self_us), name))
+    print("slowest imports of `from fops import Send` (cumulative / self us):")
+    for cumulative, self_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"  {cumulative:8d} {self_us:8d}  {name}")
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", "--runs", type=int, default=15)
+    ap.add_argument("--max-ms", type=float, default=25.0,
+                    help="bound on the median cold `import fops`")
+    ap.add_argument("--max-send-ms", type=float, default=150.0,
+                    help="bound on the median cold `from fops import Send`")
+    ap.add_argument("--importtime", action="store_true",
+                    help="print the slowest imports of the first primitive")
+    args = ap.parse_args()
+
+    src = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+    path = os.pathsep.join(filter(None, [src, os.environ.get("PYTHONPATH")]))
+    env = {**os.environ, "PYTHONPATH": path, "FOPS_TRACE_SINK": "queue"}
+    for k in ("FOPS_PREFLIGHT_CACHE", "FOPS_PROFILE", "FOPS_STREAM", "FOPS_METRICS",
+              "FOPS_METRICS_DUMP", "FOPS_TRACE_POLICY", "FOPS_TRACE_CONTROL"):
+        env.pop(k, None)   # these import their module eagerly
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, "lib", "benchlib"))
+        open(os.path.join(tmp, "lib", "benchlib", "__init__.py"), "w").close()
+        with open(os.path.join(tmp, "lib", "benchlib", "power.py"), "w") as f:
+            f.write(USER_LIB)
+        manifest = os.path.join(tmp, "primitives.json")
+        with open(manifest, "w") as f:
+            json.dump({"paths": ["lib"], "primitives": {"PowerOn": "benchlib.power:PowerOn"}}, f)
+        user_env = {**env, "FOPS_PRIMITIVES": manifest,
+                    "FOPS_REGISTRY_CACHE": os.path.join(tmp, "registry.json")}
+        no_cache = {**user_env, "FOPS_REGISTRY_CACHE": ""}
+
+        bare = _time("import fops", args.runs, env)
+        print(f"import fops                 : {bare:7.1f} ms")
+        send = _time("from fops import Send", args.runs, env)
+        print(f"from fops import Send       : {send:7.1f} ms")
+        user = "from fops import PowerOn"
+        print(f"user primitive (discover)   : {_time(user, args.runs, no_cache):7.1f} ms")
+        print(f"user primitive (cached)     : {_time(user, args.runs, user_env):7.1f} ms")
+        if args.importtime:
+            _importtime(env)
+
+    failures = []
+    for stmt, modules, ms, bound in (("import fops", HEAVY, bare, args.max_ms),
+                                     ("from fops import Send", SEND_HEAVY, send, args.max_send_ms)):
+        heavy = _loaded(stmt, modules, env)
+        if heavy:
+            failures.append(f"`{stmt}` imports {', '.join(heavy)}")
+        if ms > bound:
+            failures.append(f"`{stmt}` takes {ms:.1f} ms > {bound:g} ms")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print("ok")
+
+if __name__ == "__main__":
+    main()
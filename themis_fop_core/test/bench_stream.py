@@ -0,0 +1,122 @@
+"""
+Benchmark of the live event stream: line-level trace events published by one producer
+while dozens of SSE viewers (and optionally one stuck viewer that never reads) follow.
+
+Reports the producer's cost per event and what every viewer received (events, plus
+events dropped or coalesced because it lagged).
+
+    python bench_stream.py [-n 200000] [-c 36] [--rate 50000] [--overflow coalesce]
+"""
+import argparse
+import multiprocessing
+import socket
+import threading
+import time
+
+from fops.internal.stream import EventHub, StreamOverflow, StreamServer
+
+META = {"corr_id": "3f0c", "attempt": 1}
+
+def _viewer(address, counts, idx, stop):
+    s = socket.create_connection(address)
+    s.sendall(b"GET /events?replay=0 HTTP/1.1\r\nHost: bench\r\n\r\n")
+    s.settimeout(0.5)
+    events = 0
+    while not stop.is_set():
+        try:
+            chunk = s.recv(1 << 16)
+        except socket.timeout:
+            continue
+        if not chunk:
+            break
+        events += chunk.count(b"\n\n")
+        counts[idx] = events
+    s.close()
+
+def _viewers(address, clients, counts, stop):
+    # viewers live in their own process, so only the server side is measured here
+    threads = [threading.Thread(target=_viewer, args=(address, counts, i, stop), daemon=True)
+               for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+def _stuck(address, stop):
+    # connects and never reads: its socket buffer fills, its thread blocks, nobody else does
+    s = socket.create_connection(address)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    s.sendall(b"GET /events?replay=0 HTTP/1.1\r\nHost: bench\r\n\r\n")
+    stop.wait()
+    s.close()
+
+def _publish(hub, n, rate):
+    interval = 1.0 / rate if rate else 0.0
+    t0 = time.perf_counter()
+    busy = 0.0
+    for i in range(n):
+        t = time.perf_counter()
+        hub("Send", 340 + (i & 3), "tc = get_driver().send_tc(command)", "line", META)
+        busy += time.perf_counter() - t
+        if interval:
+            target = t0 + (i + 1) * interval
+            while time.perf_counter() < target:
+                time.sleep(0)
+    return busy / n * 1e6, time.perf_counter() - t0
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=200_000)
+    ap.add_argument("-c", "--clients", type=int, default=36)
+    ap.add_argument("--rate", type=float, default=0, help="events/s (0: as fast as possible)")
+    ap.add_argument("--overflow", default="coalesce", choices=[o.value for o in StreamOverflow])
+    ap.add_argument("--no-stuck", action="store_true")
+    args = ap.parse_args()
+
+    baseline_hub = EventHub(20_000)
+    base_us, _ = _publish(baseline_hub, args.n, 0)
+
+    hub = EventHub(20_000)
+    server = StreamServer(hub, port=0, overflow=StreamOverflow(args.overflow)).start()
+    stop = multiprocessing.Event()
+    counts = multiprocessing.Array("l", args.clients, lock=False)
+    viewers = multiprocessing.Process(target=_viewers,
+                                      args=(server.address, args.clients, counts, stop))
+    viewers.start()
+    expected = args.clients
+    if not args.no_stuck:
+        threading.Thread(target=_stuck, args=(server.address, stop), daemon=True).start()
+        expected += 1
+    while len(server.clients) < expected:
+        time.sleep(0.01)
+    stuck_id = max(server.clients) if not args.no_stuck else None
+
+    cpu0 = time.process_time()
+    us, wall = _publish(hub, args.n, args.rate)
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline and any(
+        s.cursor < hub.head for cid, (_, s) in server.clients.items() if cid != stuck_id
+    ):
+        time.sleep(0.05)
+    cpu = time.process_time() - cpu0
+    time.sleep(0.5)
+    stats = server.stats()["clients"]
+    stop.set()
+    viewers.join(5)
+
+    counts = list(counts)
+    viewer_stats = [v for cid, v in stats.items() if int(cid) != stuck_id]
+    print(f"producer, no viewers : {base_us:.2f} us/event")
+    print(f"producer, {args.clients} viewers: {us:.2f} us/event "
+          f"({args.n / wall:,.0f} events/s offered, process CPU {cpu:.2f}s)")
+    print(f"viewers received     : min {min(counts):,}  max {max(counts):,} events of {args.n:,}")
+    print(f"coalesced / dropped  : {sum(v['coalesced'] for v in viewer_stats):,} / "
+          f"{sum(v['dropped'] for v in viewer_stats):,} (all viewers)")
+    if stuck_id is not None:
+        stuck = stats.get(str(stuck_id))
+        if stuck:
+            print(f"stuck viewer         : lag {stuck['lag']:,}, sent {stuck['sent']:,}")
+    server.close(linger=0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,460 @@
+"""
+Benchmark suite of the Themis Lang hot path, with machine-readable results and a baseline.
+
+  args.*        with_args + modifier parsing per call, parse_modifiers alone
+  trace.*       a 10-line function traced with every lines/calls/returns/exceptions combination
+                (no-op sink) versus untraced
+  sink.*        send_trace_data_local (to /dev/null) and send_trace_data_http against a local
+                stub collector, per event
+  retry.*       retry_decorator / retry_decorator_with_vscode_fallback: success path, and a
+                failure answered "retry" (console, or VS Code through the stub prompter)
+  prompt.*      ask_vscode round trip against the stub prompter
+  conditions.*  large AND/OR trees and condition lists through normalize_conditions
+  primitive.*   Send / VerifyTM through their full decorator stack, tracing off
+
+Every case reports the best (and median) microseconds per operation over several repeats.
+Comparisons with a baseline are scaled by the "calibration" case (a plain Python loop), so a
+baseline recorded on another machine still flags relative regressions.
+A case that regresses is measured again (`--confirm`, up to twice by default) and its best
+run counts, so a single noisy measurement does not fail the comparison.
+
+    python bench_suite.py                              # run everything, print a table
+    python bench_suite.py -k trace --quick             # only cases whose name contains "trace"
+    python bench_suite.py --json results.json          # machine-readable results ("-": stdout)
+    python bench_suite.py --baseline bench_baseline.json [--tolerance 0.25]   # exit 1 on regression
+    python bench_suite.py --save-baseline bench_baseline.json
+"""
+import argparse
+import builtins
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import timeit
+import types
+from collections.abc import Callable, Collection, Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)  # stub_prompter
+
+from fops.driver import get_driver
+from fops.integrations.vscode import prompt_client
+from fops.integrations.vscode.prompt_client import ask_vscode
+from fops.integrations.vscode.retry_vscode import retry_decorator_with_vscode_fallback
+from fops.internal import retry, sinks
+from fops.internal.args import AND, OR, Action, normalize_conditions, parse_modifiers, with_args
+from fops.internal.policy import policy
+from fops.internal.retry import retry_decorator
+from fops.internal.sinks import send_trace_data_http, send_trace_data_local
+from fops.internal.trace import _use_monitoring, trace
+from fops.lang.send import Send
+from fops.lang.verify_tm import VerifyTM
+from stub_prompter import StubPrompter
+
+SCHEMA = 1
+SEND_MODIFIERS = {"Delay", "Tolerance", "OnFailure", "PromptUser", "Confirm", "Notify"}
+EVENT = ("Send", 42, "tc = get_driver().send_tc(command)", "line",
+         {"corr_id": "3f0c", "attempt": 1})
+
+# -----------------------------------------------------------------------------
+# Cases
+# -----------------------------------------------------------------------------
+# name -> factory: a context manager yielding the callable to time (one operation per call)
+CASES: dict[str, Callable[[], contextlib.AbstractContextManager[Callable[[], object]]]] = {}
+
+def case(name: str):
+    def register(factory):
+        CASES[name] = contextlib.contextmanager(factory)
+        return factory
+    return register
+
+@contextlib.contextmanager
+def _quiet() -> Iterator[None]:
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+@case("calibration")
+def _calibration():
+    def loop():
+        x = 0
+        for i in range(200):
+            x += i
+        return x
+    yield loop
+
+# --- with_args / parse_modifiers --------------------------------------------------
+def _noop(call):
+    return call
+
+ARG_CASES = {
+    "none": (("COMMAND_B",), {}),
+    "delay_tolerance": (("COMMAND_A",), {"Delay": 2, "Tolerance": 0.1}),
+    "fop2_command_e": ((), {"command": "COMMAND_E", "args": [["ARG1", 1.0]], "Delay": 10,
+                            "Tolerance": 0.5, "OnFailure": {Action.CANCEL}, "PromptUser": False}),
+}
+
+def _args_case(args, kwargs):
+    def factory():
+        fn = with_args(allowed_modifiers=SEND_MODIFIERS)(_noop)
+        yield lambda: fn(*args, **kwargs)
+    return factory
+
+for _name, (_args, _kwargs) in ARG_CASES.items():
+    case(f"args.with_args.{_name}")(_args_case(_args, _kwargs))
+
+@case("args.parse_modifiers")
+def _parse_modifiers():
+    kwargs = {"Delay": 2, "Tolerance": 0.1, "OnFailure": [Action.CANCEL]}
+    yield lambda: parse_modifiers(kwargs, allowed=SEND_MODIFIERS)
+
+# --- trace ----------------------------------------------------------------------------
+def _body(x):
+    a = x + 1
+    b = a * 2
+    c = b - 3
+    d = c // 2
+    e = d + a
+    f = e * b
+    g = f - c
+    h = g + d
+    return {"result": h, "inputs": [a, b]}
+
+def _copy(fn, name: str):
+    # a distinct code object per case: tracing hooks are attached to code objects
+    return types.FunctionType(fn.__code__.replace(co_name=name), fn.__globals__, name)
+
+def _null_sink(function_name, line_number, code_line, event, meta):
+    pass
+
+TRACE_FLAGS = ("lines", "calls", "returns", "exceptions")
+
+@case("trace.untraced")
+def _untraced():
+    fn = _copy(_body, "untraced")
+    yield lambda: fn(1)
+
+def _trace_case(flags: dict[str, bool], capture_values: bool = True):
+    def factory():
+        name = "_".join(k for k, v in flags.items() if v) or "none"
+        fn = trace(_null_sink, capture_values=capture_values, **flags)(
+            _copy(_body, f"traced_{name}"))
+        yield lambda: fn(1)
+    return factory
+
+for _mask in range(1 << len(TRACE_FLAGS)):
+    _flags = {f: bool(_mask & (1 << i)) for i, f in enumerate(TRACE_FLAGS)}
+    case("trace." + ("+".join(f for f in TRACE_FLAGS if _flags[f]) or "none"))(_trace_case(_flags))
+case("trace.all.no_values")(_trace_case(dict.fromkeys(TRACE_FLAGS, True), capture_values=False))
+
+# --- sinks ----------------------------------------------------------------------------
+class _StubCollector:
+    """Local trace collector: accepts every POST (keep-alive) and counts them."""
+
+    def __init__(self) -> None:
+        collector = self
+        self.posts = 0
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def do_POST(self) -> None:
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                collector.posts += 1
+                self.send_response(204)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/trace"
+
+    def __enter__(self) -> "_StubCollector":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+@case("sink.local")
+def _sink_local():
+    with _quiet():
+        yield lambda: send_trace_data_local(*EVENT)
+
+@case("sink.http")
+def _sink_http():
+    url = sinks.TRACE_HTTP_URL
+    with _StubCollector() as collector:
+        sinks.TRACE_HTTP_URL = collector.url
+        try:
+            yield lambda: send_trace_data_http(*EVENT)
+        finally:
+            sinks.TRACE_HTTP_URL = url
+
+# --- retry / prompts ------------------------------------------------------------------
+def _flaky(error: type[Exception] = RuntimeError):
+    # fails every other call: each operation is one failure, one prompt and one retry
+    # (a non-transient error is prompted for; a transient one is retried by the policy)
+    state = {"n": 0}
+    def op():
+        state["n"] += 1
+        if state["n"] % 2:
+            raise error("flaky")
+        return state["n"]
+    return op
+
+@contextlib.contextmanager
+def _stub_prompter() -> Iterator[StubPrompter]:
+    port = prompt_client.EXT_PORT
+    with StubPrompter(auto_answer="r") as stub:
+        prompt_client.EXT_PORT = stub.port
+        try:
+            yield stub
+        finally:
+            prompt_client.EXT_PORT = port
+
+@case("retry.success")
+def _retry_success():
+    yield retry_decorator(lambda: 1)
+
+@case("retry.vscode.success")
+def _retry_vscode_success():
+    yield retry_decorator_with_vscode_fallback(lambda: 1)
+
+@case("retry.fail_then_retry.console")
+def _retry_console():
+    op = retry_decorator(_flaky())
+    ask, builtins.input = builtins.input, lambda prompt="": "r"
+    try:
+        with _quiet():
+            yield op
+    finally:
+        builtins.input = ask
+
+@case("retry.transient_auto")
+def _retry_transient():
+    # a link glitch retried by the policy (backoff zeroed): no operator round trip
+    backoff, retry.RETRY_BACKOFF = retry.RETRY_BACKOFF, 0.0
+    try:
+        yield retry_decorator(_flaky(ConnectionError))
+    finally:
+        retry.RETRY_BACKOFF = backoff
+
+@case("retry.fail_then_retry.vscode")
+def _retry_vscode():
+    with _stub_prompter():
+        yield retry_decorator_with_vscode_fallback(_flaky())
+
+@case("prompt.ask_vscode")
+def _ask():
+    with _stub_prompter():
+        yield lambda: ask_vscode("Exception: boom\nOptions: retry (r), skip (s), cancel (c)?",
+                                 ["r", "s", "c"])
+
+# --- conditions -----------------------------------------------------------------------
+def _leaf(i: int) -> list:
+    if i % 4 == 3:
+        return [f"TM{i}", "bw", [0, i], {"Tolerance": 0.5}]
+    return [f"TM{i}", ("eq", "lt", "ge")[i % 3], i]
+
+def _tree(leaves: int, fanout: int = 4, level: int = 0):
+    # alternating AND/OR levels built from raw condition lists, as a FOP would write them
+    if leaves <= fanout:
+        nodes = [_leaf(level * 1000 + i) for i in range(leaves)]
+    else:
+        nodes = [_tree(leaves // fanout, fanout, level + 1) for _ in range(fanout)]
+    return (AND if level % 2 == 0 else OR)(*nodes)
+
+@case("conditions.list_100")
+def _conditions_list():
+    raw = [_leaf(i) for i in range(100)]
+    yield lambda: normalize_conditions(raw)
+
+@case("conditions.and_or_tree_256")
+def _conditions_tree():
+    yield lambda: normalize_conditions(_tree(256))
+
+# --- full primitives (tracing off) ----------------------------------------------------
+@contextlib.contextmanager
+def _tracing_off() -> Iterator[None]:
+    policy.set_level("default", "off")
+    try:
+        yield
+    finally:
+        policy.reset()
+
+@case("primitive.Send")
+def _send():
+    with _tracing_off():
+        yield lambda: Send("COMMAND_A", Delay=0, Tolerance=0.1)
+
+@case("primitive.VerifyTM")
+def _verify():
+    get_driver().set_tm("TM1", 10)
+    with _tracing_off():
+        yield lambda: VerifyTM(["TM1", "eq", 10], Tolerance=0.1)
+
+# -----------------------------------------------------------------------------
+# Runner
+# -----------------------------------------------------------------------------
+def measure(fn: Callable[[], object], *, min_time: float, repeat: int) -> dict:
+    fn()  # warm caches, connections, tracing hooks
+    timer = timeit.Timer(fn)
+    number = 1
+    while True:  # like Timer.autorange(), down to min_time
+        if timer.timeit(number) >= min_time / 5:
+            break
+        number *= 2
+    times = [t / number * 1e6 for t in timer.repeat(repeat, number)]
+    return {"us": min(times), "median_us": statistics.median(times), "number": number,
+            "repeat": repeat}
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                             capture_output=True, text=True, timeout=5)
+    except OSError:
+        return ""
+    return out.stdout.strip()
+
+def run(pattern: str = "", *, quick: bool = False, names: Collection[str] | None = None) -> dict:
+    """Cases whose name contains `pattern` (or those in `names`), plus the calibration."""
+    min_time, repeat = (0.05, 3) if quick else (0.2, 5)
+    results = {}
+    for name, factory in CASES.items():
+        if name != "calibration" and (pattern not in name if names is None else name not in names):
+            continue
+        with factory() as fn:
+            results[name] = measure(fn, min_time=min_time, repeat=repeat)
+    return {
+        "schema": SCHEMA,
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "trace_backend": "monitoring" if _use_monitoring() else "settrace",
+            "commit": _git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": results,
+    }
+
+def compare(current: dict, baseline: dict, *, tolerance: float,
+            normalize: bool = True) -> list[dict]:
+    """Per case: current / baseline time (scaled by calibration) and whether it regressed."""
+    cur, base = current["results"], baseline["results"]
+    scale = 1.0
+    if normalize and "calibration" in cur and "calibration" in base:
+        scale = base["calibration"]["us"] / cur["calibration"]["us"]
+    rows = []
+    for name, r in cur.items():
+        if name == "calibration":
+            continue
+        b = base.get(name)
+        if b is None:
+            rows.append({"case": name, "us": r["us"], "baseline_us": None, "ratio": None,
+                         "status": "new"})
+            continue
+        ratio = r["us"] * scale / b["us"]
+        if ratio > 1 + tolerance:
+            status = "REGRESSION"
+        else:
+            status = "faster" if ratio < 1 - tolerance else "ok"
+        rows.append({"case": name, "us": r["us"], "baseline_us": b["us"], "ratio": round(ratio, 3),
+                     "status": status})
+    return rows
+
+def _print_table(results: dict, rows: list[dict] | None, out=sys.stdout) -> None:
+    meta = results["meta"]
+    print(f"python {meta['python']} ({meta['trace_backend']}), {meta['machine']}, "
+          f"{meta['cpus']} CPU(s), commit {meta['commit'] or '?'}", file=out)
+    if rows is None:
+        print(f"{'case':<40}{'us/op':>12}{'median':>12}", file=out)
+        for name, r in results["results"].items():
+            print(f"{name:<40}{r['us']:>12.3f}{r['median_us']:>12.3f}", file=out)
+        return
+    print(f"{'case':<40}{'us/op':>12}{'baseline':>12}{'ratio':>8}  status", file=out)
+    for row in rows:
+        base = "-" if row["baseline_us"] is None else f"{row['baseline_us']:.3f}"
+        ratio = "-" if row["ratio"] is None else f"{row['ratio']:.2f}"
+        print(f"{row['case']:<40}{row['us']:>12.3f}{base:>12}{ratio:>8}  {row['status']}", file=out)
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-k", dest="pattern", default="", help="only cases whose name contains this")
+    ap.add_argument("--quick", action="store_true", help="shorter runs (noisier)")
+    ap.add_argument("--list", action="store_true", help="list the cases and exit")
+    ap.add_argument("--json", metavar="PATH", help="write results as JSON ('-': stdout)")
+    ap.add_argument("--baseline", metavar="PATH", help="compare with a stored baseline")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown (default 0.25)")
+    ap.add_argument("--no-normalize", action="store_true", help="compare raw times (same machine)")
+    ap.add_argument("--confirm", type=int, default=2, metavar="N",
+                    help="re-measure regressed cases up to N times, keeping their best run "
+                         "(default 2)")
+    ap.add_argument("--save-baseline", metavar="PATH", help="store the results as the new baseline")
+    args = ap.parse_args()
+
+    if args.list:
+        print("\n".join(CASES))
+        return 0
+    results = run(args.pattern, quick=args.quick)
+    rows = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("schema") != SCHEMA:
+            print(f"Baseline schema {baseline.get('schema')} != {SCHEMA}, ignoring it",
+                  file=sys.stderr)
+        else:
+            normalize = not args.no_normalize
+            rows = compare(results, baseline, tolerance=args.tolerance, normalize=normalize)
+            # a noisy machine flags a few cases on any run: a regression must survive re-measuring
+            # (each run is scaled by its own calibration)
+            for _ in range(args.confirm):
+                flagged = {r["case"]: i for i, r in enumerate(rows) if r["status"] == "REGRESSION"}
+                if not flagged:
+                    break
+                again = run(quick=args.quick, names=flagged)
+                for row in compare(again, baseline, tolerance=args.tolerance, normalize=normalize):
+                    i = flagged.get(row["case"])
+                    if i is not None and row["ratio"] < rows[i]["ratio"]:
+                        rows[i] = row
+                        results["results"][row["case"]] = again["results"][row["case"]]
+            results["comparison"] = {"baseline": baseline["meta"], "tolerance": args.tolerance,
+                                     "cases": rows}
+
+    # the table goes to stderr when stdout carries the JSON
+    _print_table(results, rows, out=sys.stderr if args.json == "-" else sys.stdout)
+    if args.json:
+        text = json.dumps(results, indent=2)
+        if args.json == "-":
+            print(text)
+        else:
+            with open(args.json, "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({k: results[k] for k in ("schema", "meta", "results")}, f, indent=2)
+            f.write("\n")
+    regressions = [r["case"] for r in rows or () if r["status"] == "REGRESSION"]
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.tolerance:.0%}: "
+              f"{', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""
+Microbenchmark: per-event cost of tracing a 20-line function with each sink.
+
+  queue   QueuedSink with a no-op writer (meta dict, source line and reprs built per event)
+  flight  FlightRecorder (preallocated ring, scalars rendered on dump)
+
+    python bench_trace.py [-n 2000]
+"""
+import argparse
+import timeit
+import types
+
+from fops.internal.sinks import FlightRecorder, QueuedSink
+from fops.internal.trace import trace
+
+def _body(x):
+    a = x + 1
+    b = a * 2
+    c = b - 3
+    d = c // 2
+    e = d + a
+    f = e * b
+    g = f - c
+    h = g + d
+    i = h * 2
+    j = i - e
+    k = j + f
+    m = k * 3
+    n = m - g
+    o = n + h
+    p = o * 2
+    q = p - i
+    r = q + j
+    s = r * 2
+    return {"result": s, "inputs": [a, b, c]}
+
+def _copy(fn, name: str):
+    # a distinct code object per case: tracing hooks are attached to code objects
+    return types.FunctionType(fn.__code__.replace(co_name=name), fn.__globals__, name)
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=2000)
+    n = ap.parse_args().n
+
+    queue = QueuedSink(lambda batch: None, maxsize=1_000_000, batch_size=4096)
+    flight = FlightRecorder(65_536, writer=lambda batch: None, dump_on_exit=False)
+    cases = {
+        "untraced": _copy(_body, "untraced"),
+        "queue": trace(queue)(_copy(_body, "queue")),
+        "flight": trace(flight)(_copy(_body, "flight")),
+    }
+    base = None
+    print(f"{'sink':<10} {'us/call':>8} {'us/event':>9}")
+    for name, fn in cases.items():
+        t = min(timeit.repeat(lambda: fn(1), number=n, repeat=3)) / n * 1e6
+        if base is None:
+            base = t
+            print(f"{name:<10} {t:>8.2f}")
+            continue
+        # call + 20 lines + return
+        print(f"{name:<10} {t:>8.2f} {(t - base) / 22:>9.3f}")
+    queue.close()
+    t = timeit.timeit(lambda: flight.dump(all_events=True), number=1)
+    print(f"flight dump of {min(flight.recorded, flight.capacity)} events: {t * 1e3:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,20 @@
+from fops.driver import get_driver
 from fops.internal.args import AND, Action, Operator
 from fops.lang.prompt import Prompt
 from fops.lang.send import Send
 from fops.lang.verify_tm import VerifyTM
 
+# default driver is the local simulator: pin the TM values this procedure checks
+sim = get_driver()
+sim.set_tm("TM1", 100)
+sim.set_tm("TM2", 3)
+
 #Prompt("Starting procedure")
 
 res1 = VerifyTM(["TM1", "eq", 100], Retries=3)
 #print(res1)
 
+sim.set_tm("TM1", 10)
 expr = AND(["TM1", "eq", 10], ["TM2", "lt", 5])
 res2 = VerifyTM(expr, Tolerance=0.1, ValueFormat="RAW")
 #print(res2)
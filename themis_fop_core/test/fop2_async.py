@@ -0,0 +1,29 @@
+import time
+
+from fops.driver import get_driver
+from fops.internal.args import AND
+from fops.lang.aio import gather, run
+from fops.lang.send import SendAsync
+from fops.lang.verify_tm import VerifyTMAsync
+
+# default driver is the local simulator: pin the TM values this procedure checks
+sim = get_driver()
+sim.set_tm("TM1", 10)
+sim.set_tm("TM2", 3)
+sim.set_tm("TM3", 0)
+
+async def procedure():
+    await SendAsync("COMMAND_A")
+
+    # both subsystems are checked at once: total wait is the longest check, not the sum
+    t0 = time.monotonic()
+    res = await gather(
+        VerifyTMAsync(AND(["TM1", "eq", 10], ["TM2", "lt", 5]), ValueFormat="RAW"),
+        VerifyTMAsync(["TM3", "eq", 0], Retries=3),
+        SendAsync("COMMAND_B"),
+    )
+    print(f"{len(res)} primitives in {time.monotonic() - t0:.3f}s")
+
+    await SendAsync("COMMAND_EX")
+
+run(procedure())
@@ -0,0 +1,226 @@
+"""
+Stand-in for the VS Code FOPs Prompter extension (same HTTP API), for tests and benchmarks.
+
+    python stub_prompter.py --port 5533 --auto r --delay 0.5   # answer every prompt with "r"
+    python stub_prompter.py                                    # answer by hand:
+    curl -XPOST localhost:5533/answer -d '{"id": "...", "answer": "s"}'
+
+In-process:
+
+    with StubPrompter(auto_answer="r") as stub:
+        prompt_client.EXT_PORT = stub.port
+        ...
+"""
+import argparse
+import json
+import socket
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+
+class _Prompt:
+    def __init__(self, pid: str, message: str, options: list[str], client: str):
+        self.id = pid
+        self.message = message
+        self.options = options
+        self.client = client
+        self.answer: Optional[str] = None
+        self.delivered = False
+        self.answered = threading.Event()
+
+class StubPrompter:
+    def __init__(self, port: int = 0, *, auto_answer: Optional[str] = None, delay: float = 0.0,
+                 events: bool = True):
+        self.auto_answer = auto_answer
+        self.delay = delay
+        self.events = events                 # False: an older prompter, /wait only
+        self.instance = str(uuid.uuid4())    # this run; a new stub on the same port is a restart
+        self.prompts: dict[str, _Prompt] = {}
+        self.streams: dict[str, list] = {}   # client id -> [wfile, ...]
+        self.connections: set = set()        # open sockets, closed by stop() like a VS Code exit
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self._thread: Optional[threading.Thread] = None
+
+    # --- lifecycle ----------------------------------------------------------------
+    def start(self) -> "StubPrompter":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        with self.lock:
+            connections = list(self.connections)
+        for sock in connections:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def __enter__(self) -> "StubPrompter":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    # --- prompts ------------------------------------------------------------------
+    def answer(self, pid: str, answer: str) -> bool:
+        with self.lock:
+            p = self.prompts.get(pid)
+            if p is None or p.answer is not None:
+                return False
+            p.answer = answer
+            streams = list(self.streams.get(p.client, ()))
+        p.answered.set()
+        for w in streams:
+            if self._push(w, p):
+                break
+        return True
+
+    def expire(self, pid: str) -> bool:
+        """Drop an unanswered prompt the way the extension's eviction does."""
+        with self.lock:
+            p = self.prompts.pop(pid, None)
+            if p is None or p.answer is not None:
+                return False
+            streams = list(self.streams.get(p.client, ()))
+        for w in streams:
+            if self._push(w, p, "expired"):
+                break
+        return True
+
+    def _push(self, wfile, p: _Prompt, event: str = "answer") -> bool:
+        data = json.dumps({"id": p.id, "answer": p.answer} if event == "answer" else {"id": p.id})
+        try:
+            wfile.write(f"event: {event}\ndata: {data}\n\n".encode())
+            wfile.flush()
+        except OSError:
+            return False
+        p.delivered = True
+        return True
+
+    def _on_prompt(self, body: dict) -> str:
+        pid = str(uuid.uuid4())
+        p = _Prompt(pid, str(body.get("message", "")), list(body.get("options") or ["r", "s", "c"]),
+                    str(body.get("client", "")))
+        with self.lock:
+            self.prompts[pid] = p
+        if self.auto_answer is not None:
+            if self.delay:
+                threading.Timer(self.delay, self.answer, (pid, self.auto_answer)).start()
+            else:
+                threading.Thread(target=self.answer, args=(pid, self.auto_answer),
+                                 daemon=True).start()
+        else:
+            print(f"[stub-prompter] {pid}: {p.message} {p.options}", flush=True)
+        return pid
+
+    # --- HTTP ---------------------------------------------------------------------
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def setup(self) -> None:
+                super().setup()
+                with stub.lock:
+                    stub.connections.add(self.connection)
+
+            def finish(self) -> None:
+                with stub.lock:
+                    stub.connections.discard(self.connection)
+                super().finish()
+
+            def _json(self, obj, status: int = 200) -> None:
+                data = json.dumps(obj).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _body(self) -> dict:
+                n = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(n) or b"{}")
+
+            def do_POST(self) -> None:
+                url = urlparse(self.path)
+                if url.path == "/prompt":
+                    pid = stub._on_prompt(self._body())
+                    return self._json({"id": pid, "instance": stub.instance})
+                if url.path == "/answer":
+                    body = self._body()
+                    if not stub.answer(str(body.get("id", "")), str(body.get("answer", ""))):
+                        return self._json({"error": "Unknown id"}, 404)
+                    return self._json({"ok": True})
+                self._json({"error": "Not found"}, 404)
+
+            def do_GET(self) -> None:
+                url = urlparse(self.path)
+                qs = parse_qs(url.query)
+                if url.path == "/events" and stub.events:
+                    return self._events(qs.get("client", [""])[0])
+                if url.path == "/wait":
+                    p = stub.prompts.get(qs.get("id", [""])[0])
+                    if p is None:
+                        return self._json({"error": "Unknown id"}, 404)
+                    p.answered.wait()
+                    return self._json({"id": p.id, "answer": p.answer})
+                self._json({"error": "Not found"}, 404)
+
+            def _events(self, client: str) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                hello = json.dumps({"instance": stub.instance})
+                self.wfile.write(f"event: hello\ndata: {hello}\n\n".encode())
+                self.wfile.flush()
+                with stub.lock:
+                    stub.streams.setdefault(client, []).append(self.wfile)
+                    # replay answers given while the client was disconnected
+                    undelivered = [p for p in stub.prompts.values()
+                                   if p.client == client and p.answer is not None
+                                   and not p.delivered]
+                try:
+                    for p in undelivered:
+                        stub._push(self.wfile, p)
+                    while True:
+                        time.sleep(15)
+                        self.wfile.write(b": ping\n\n")
+                        self.wfile.flush()
+                except OSError:
+                    pass
+                finally:
+                    with stub.lock:
+                        stub.streams[client].remove(self.wfile)
+
+        return Handler
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--port", type=int, default=5533)
+    ap.add_argument("--auto", default=None, help="answer every prompt with this text")
+    ap.add_argument("--delay", type=float, default=0.0, help="seconds before auto-answering")
+    args = ap.parse_args()
+    stub = StubPrompter(args.port, auto_answer=args.auto, delay=args.delay)
+    print(f"[stub-prompter] listening on http://127.0.0.1:{stub.port}", flush=True)
+    stub.server.serve_forever()
+
+if __name__ == "__main__":
+    main()
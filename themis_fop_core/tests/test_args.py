@@ -0,0 +1,25 @@
+import pytest
+
+from fops.internal import args
+from fops.internal.args import Modifiers, parse_modifiers
+
+def test_parse_modifiers_shares_parsers():
+    base = Modifiers(Delay=1)
+    assert parse_modifiers({"Tolerance": 0.1}, base, ["Tolerance"]).Delay == 1
+    parser = args._parsers[(base, frozenset({"Tolerance"}))]
+    parse_modifiers({"Tolerance": 0.2}, base, ("Tolerance",))
+    assert args._parsers[(base, frozenset({"Tolerance"}))] is parser
+
+def test_parse_modifiers_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(args, "_parsers", {})
+    monkeypatch.setattr(args, "_PARSERS_MAX", 8)
+    for delay in range(50):
+        assert parse_modifiers({"Retries": 1}, Modifiers(Delay=delay)).Delay == delay
+    assert len(args._parsers) == 8
+
+def test_parse_modifiers_unhashable_base():
+    base = Modifiers(Tolerance=[0.1, 0.2])
+    mods = parse_modifiers({"Delay": 2}, base)
+    assert (mods.Delay, mods.Tolerance) == (2, [0.1, 0.2])
+    with pytest.raises(TypeError):
+        parse_modifiers({"Delay": 2}, base, allowed=["Retries"])
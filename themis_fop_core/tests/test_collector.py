@@ -0,0 +1,71 @@
+import json
+import urllib.request
+
+import pytest
+
+from fops.internal.collector import CollectorServer, TraceStore
+
+def _event(corr_id: str, function: str = "Send", event: str = "call", **extra) -> dict:
+    return {"function": function, "line": 1, "code": "", "event": event,
+            "meta": {"corr_id": corr_id}, **extra}
+
+@pytest.fixture
+def store(tmp_path):
+    s = TraceStore(str(tmp_path), block_interval=0.01)
+    yield s
+    s.close()
+
+def test_query_by_field(store):
+    store.append("fop-1", [_event("a"), _event("b", "VerifyTM", "return")])
+    store.append("fop-2", [_event("c", "Prompt")])
+    assert store.flush(timeout=5)
+
+    assert [e["meta"]["corr_id"] for e in store.query(corr_id="b")] == ["b"]
+    assert [e["function"] for e in store.query(primitive="Prompt")] == ["Prompt"]
+    assert [e["instance"] for e in store.query(instance="fop-1")] == ["fop-1", "fop-1"]
+    assert len(list(store.query(event="call"))) == 2
+    assert len(list(store.query(limit=1))) == 1
+
+@pytest.mark.parametrize("raw", [
+    b'[{"function": "Send", "event": "call",\r\n  "meta": {"corr_id": "a"}}]',
+    b'[{"function":"Send","event":"call","meta":{"corr_id":"a"}}]\r',
+    b'[{"function":"Send",\r"event":"call","meta":{"corr_id":"a"}}]',
+    b'[{"function":"Send","event":"call","meta":{"corr_id":"a"},"msg":"x\\r\\ny"}]',
+])
+def test_raw_line_breaks(store, raw):
+    # the posted encoding is stored as is only when it cannot split the stored line
+    events = json.loads(raw)
+    store.append("fop-1", events, raw)
+    store.append("fop-1", [_event("b")])
+    assert store.flush(timeout=5)
+    assert [e["meta"]["corr_id"] for e in store.query()] == ["a", "b"]
+    assert list(store.query(corr_id="a"))[0]["function"] == "Send"
+
+def test_reopen_loads_index(tmp_path):
+    s = TraceStore(str(tmp_path), block_interval=0.01)
+    s.append("fop-1", [_event("a"), _event("b")])
+    s.close()
+
+    reopened = TraceStore(str(tmp_path))
+    try:
+        assert reopened.stats()["events"] == 2
+        assert [e["meta"]["corr_id"] for e in reopened.query(corr_id="b")] == ["b"]
+    finally:
+        reopened.close()
+
+def test_server_ingest_and_query(store):
+    server = CollectorServer(store).start()
+    try:
+        body = json.dumps([_event("a"), _event("b")]).encode()
+        req = urllib.request.Request(server.url, data=body, method="POST",
+                                     headers={"Content-Type": "application/json",
+                                              "X-Fops-Instance": "fop-1"})
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            assert resp.status == 204
+        assert store.flush(timeout=5)
+        host, port = server.address
+        with urllib.request.urlopen(f"http://{host}:{port}/query?corr_id=b", timeout=5) as resp:
+            lines = resp.read().splitlines()
+        assert [json.loads(line)["meta"]["corr_id"] for line in lines] == ["b"]
+    finally:
+        server.close()
@@ -0,0 +1,97 @@
+import os
+
+import pytest
+
+from fops.driver import SimulatorDriver, set_driver
+from fops.internal import journal as journal_mod
+from fops.internal.args import Modifiers
+from fops.internal.journal import (
+    DONE, RUN, Journal, fingerprint, open_journal, read_journal, set_journal,
+)
+from fops.lang.send import Send
+
+@pytest.fixture
+def driver():
+    d = SimulatorDriver()
+    prev = set_driver(d)
+    yield d
+    set_driver(prev)
+    d.close()
+
+@pytest.fixture
+def active(tmp_path):
+    opened = []
+
+    def open_(resume: bool = False) -> Journal:
+        if opened:
+            opened[-1].close()
+        opened.append(open_journal(str(tmp_path / "fop.journal"), resume=resume))
+        return opened[-1]
+
+    yield open_
+    prev = set_journal(None)
+    if prev is not None:
+        prev.close()
+
+def _write(path: str, results) -> None:
+    with Journal(path) as j:
+        for i, result in enumerate(results):
+            j.done("Send", fingerprint((f"C{i}",), {}), None, result)
+
+def _kinds(path: str) -> list[str]:
+    return [r.kind for r in read_journal(path)]
+
+def test_torn_tail_is_dropped_on_resume(tmp_path):
+    path = str(tmp_path / "fop.journal")
+    _write(path, ["a", "b", "c"])
+    size = os.path.getsize(path)
+    with open(path, "r+b") as f:   # crash in the middle of the last record
+        f.truncate(size - 3)
+    assert [r.data for r in read_journal(path)][1:] == ["a", "b"]
+
+    with Journal(path, resume=True) as j:
+        assert j.lookup("Send", fingerprint(("C1",), {})) == (True, "b")
+        assert j.lookup("Send", fingerprint(("C2",), {})) == (False, None)
+        j.done("Send", fingerprint(("C2",), {}), None, "c2")
+    # the new records follow the intact ones instead of the torn bytes
+    assert _kinds(path) == [RUN, DONE, DONE, RUN, DONE]
+    assert [r.data for r in read_journal(path)][-1] == "c2"
+
+def test_crc_mismatch_ends_the_journal(tmp_path):
+    path = str(tmp_path / "fop.journal")
+    _write(path, ["a", "b", "c"])
+    data = bytearray(open(path, "rb").read())
+    records = list(journal_mod._scan(bytes(data)))
+    second_done_end = records[2][0]
+    data[second_done_end - 1] ^= 0xFF   # same length, corrupt payload
+    with open(path, "wb") as f:
+        f.write(data)
+    assert [r.data for r in read_journal(path)][1:] == ["a"]
+
+def test_mods_table_is_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(journal_mod, "MODS_TABLE_SIZE", 4)
+    path = str(tmp_path / "fop.journal")
+    mods = [Modifiers(Retries=n) for n in range(10)]
+    with Journal(path) as j:
+        for n, m in enumerate(mods + mods[:2]):
+            j.done("Send", fingerprint((n,), {}), m, n)
+        assert len(j._mod_ids) == 4
+        # evicted Modifiers got a new MODS record on their next use
+        assert j._next_mod == 12
+    records = list(read_journal(path))[1:]
+    assert [r.modifiers for r in records] == mods + mods[:2]
+
+def test_resume_skips_completed_primitives(active, driver):
+    active()
+    Send("OPEN")
+    Send("CHECK")
+    Send("CHECK")
+    driver.tc_sent.clear()
+
+    j = active(resume=True)
+    assert Send("CHECK")["command"] == "CHECK"
+    assert Send("OPEN")["command"] == "OPEN"   # matched by arguments, not by position
+    assert Send("CHECK")["command"] == "CHECK"
+    assert not driver.tc_sent and j.skipped == 3
+    Send("CHECK")   # a third identical call was never completed: it runs
+    assert [r.command for r in driver.tc_sent] == ["CHECK"]
@@ -0,0 +1,102 @@
+import threading
+import time
+
+import pytest
+
+from fops.driver import SimulatorDriver, set_driver
+from fops.internal.retry import operator_queue_var
+from fops.internal.trace import step_var
+from fops.lang.parallel import Parallel, Step, StepCancelled, step_group
+from fops.lang.send import Send
+
+@pytest.fixture
+def driver():
+    d = SimulatorDriver()
+    prev = set_driver(d)
+    yield d
+    set_driver(prev)
+    d.close()
+
+def ok(value):
+    time.sleep(0.05)
+    return value
+
+def boom(message):
+    raise RuntimeError(message)
+
+def sending(command, n=50):
+    for _ in range(n):
+        Send(command)
+        time.sleep(0.01)
+    return command
+
+def test_wait_all_runs_every_step_then_raises(driver):
+    with pytest.raises(RuntimeError, match="power"):
+        with step_group() as group:
+            group.start("power", boom, "power")
+            group.start("thermal", ok, 1)
+    assert group.results == {"thermal": 1}
+
+    with pytest.raises(ExceptionGroup) as info:
+        Parallel(a=Step(boom, "a"), b=Step(boom, "b"), c=Step(ok, 3))
+    assert sorted(str(e) for e in info.value.exceptions) == ["a", "b"]
+    assert info.value.exceptions[0].__notes__[0].startswith("in step ")
+
+def test_fail_fast_stops_the_other_steps(driver):
+    with pytest.raises(RuntimeError, match="power"):
+        with step_group(workers=2, join="fail_fast") as group:
+            group.start("aocs", sending, "AOCS")
+            group.start("power", Step(boom, "power"))
+            group.start("thermal", ok, 1)   # no free worker before power fails
+    assert isinstance(group.errors["aocs"], StepCancelled)
+    assert isinstance(group.errors["thermal"], StepCancelled)
+    assert len(driver.tc_sent) < 50
+
+def test_continue_returns_the_failures(driver):
+    results = Parallel(Step(ok, 1), boom=Step(boom, "x"), aocs=Step(sending, "AOCS", 2),
+                       join="continue")
+    assert results["ok"] == 1 and results["aocs"] == "AOCS"
+    assert isinstance(results["boom"], RuntimeError)
+
+def test_steps_have_their_own_context(driver):
+    def where():
+        return step_var.get()
+
+    assert Parallel(a=where, b=where) == {"a": "a", "b": "b"}
+    assert step_var.get() == ""
+
+def test_operator_prompts_are_serialized():
+    active, seen = [0], []
+    lock = threading.Lock()
+
+    def ask(e, message, opts):
+        with lock:
+            active[0] += 1
+            seen.append(active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        return "s", "console"
+
+    def failing(name):
+        return operator_queue_var.get().ask(ask, RuntimeError(name), name, ["r", "s", "c"])
+
+    def nested():
+        # a nested group takes its turns in the enclosing group's queue
+        return Parallel(x=Step(failing, "x"), y=Step(failing, "y"), name="inner")
+
+    with step_group(join="continue") as group:
+        group.start("a", failing, "a")
+        group.start("b", failing, "b")
+        group.start("inner", nested)
+    assert group.results["a"] == group.results["b"] == ("s", "console")
+    assert group.results["inner"] == {"x": ("s", "console"), "y": ("s", "console")}
+    assert seen == [1, 1, 1, 1] and group.queue.prompts == 4
+
+def test_stopped_queue_answers_unattended():
+    with step_group(join="fail_fast") as group:
+        group.queue.stop("operator left")
+    answer = group.queue.ask(lambda *a: ("r", "console"), RuntimeError(), "m", ["s", "c"])
+    assert answer == ("c", None)
+    with pytest.raises(StepCancelled):
+        group.queue.check()
@@ -0,0 +1,48 @@
+import pytest
+
+from fops.driver import SimulatorDriver, set_driver
+from fops.internal import retry
+from fops.internal.metrics import PRIMITIVE_SECONDS
+from fops.internal.policy import policy
+from fops.lang.pipeline import pipeline
+from fops.lang.send import Send
+
+class LossyDriver(SimulatorDriver):
+    """Loses the acknowledgement of every batch holding `lost`."""
+
+    lost = "FLAKY"
+
+    def _ack(self, requests):
+        results = super()._ack(requests)
+        if any(r.command == self.lost for r in requests):
+            raise TimeoutError("ack lost")
+        return results
+
+@pytest.fixture
+def driver(monkeypatch):
+    monkeypatch.setattr(retry, "RETRY_BACKOFF", 0.0)
+    retry.reset_breakers()
+    PRIMITIVE_SECONDS.reset()
+    d = LossyDriver()
+    prev = set_driver(d)
+    yield d
+    set_driver(prev)
+    d.close()
+    retry.reset_breakers()
+    policy.reset()
+
+def test_queued_send_is_send(driver):
+    with pipeline(window=4):
+        pending = [Send("NOOP"), Send("NOOP")]
+    assert [p.result()["command"] for p in pending] == ["NOOP", "NOOP"]
+    assert {labels[0] for labels in PRIMITIVE_SECONDS.collect()} == {"Send"}
+
+def test_queued_send_shares_the_send_breaker(driver):
+    retry.get_breaker("Send", "FLAKY").threshold = 1
+    with pytest.raises(TimeoutError):
+        with pipeline(window=4):
+            Send("FLAKY", PromptFailure=False)
+    assert retry.get_breaker("Send", "FLAKY").is_open
+    with pytest.raises(retry.CircuitOpen):
+        Send("FLAKY", PromptFailure=False)   # blocking now, same breaker
+    assert ("SendQueued", "FLAKY") not in retry._breakers
@@ -0,0 +1,60 @@
+import pytest
+
+from fops.internal import trace as trace_mod
+from fops.internal.policy import Rule, TracePolicy, policy
+from fops.internal.trace import trace
+
+@pytest.fixture
+def live_policy():
+    policy.reset()
+    yield policy
+    policy.reset()
+
+@pytest.mark.parametrize("rule", [
+    {"maxlen": "80"}, {"maxlen": 0}, {"maxlen": -5}, {"maxlen": 1.5}, {"maxlen": True},
+    {"capture_values": "no"}, {"capture_values": 0}, {"capture_values": [True]},
+])
+def test_rule_rejects_bad_values(rule):
+    with pytest.raises(ValueError):
+        Rule.from_dict(rule)
+
+def test_rule_accepts_valid_values():
+    rule = Rule.from_dict({"maxlen": 40, "capture_values": False, "level": "calls"})
+    assert (rule.maxlen, rule.capture_values) == (40, False)
+
+def test_bad_policy_leaves_live_policy_alone():
+    p = TracePolicy()
+    p.apply({"primitives": {"Send": {"maxlen": 40}}})
+    with pytest.raises(ValueError):
+        p.apply({"primitives": {"Send": {"maxlen": "x"}, "VerifyTM": {"level": "lines"}}})
+    assert p.to_dict()["primitives"] == {"Send": {"maxlen": 40}}
+
+def test_tracing_errors_never_reach_the_primitive(live_policy, capsys):
+    def broken_sink(*event):
+        raise RuntimeError("sink down")
+
+    @trace(broken_sink)
+    def step(x):
+        y = x + 1
+        return y
+
+    before = trace_mod.TRACE_ERRORS.collect().get(("step",), 0)
+    assert step(1) == 2
+    assert step(2) == 3
+    assert trace_mod.TRACE_ERRORS.collect()[("step",)] > before
+    assert capsys.readouterr().out.count("Tracing step failed") == 1
+
+def test_policy_resolution_errors_fall_back_to_trace_arguments(live_policy, monkeypatch):
+    events = []
+
+    @trace(lambda *event: events.append(event[3]), lines=False)
+    def step():
+        return "ok"
+
+    def broken(*args, **kwargs):
+        raise TypeError("bad rule")
+
+    monkeypatch.setattr(live_policy, "resolve", broken)
+    live_policy.set_level("step", "off")
+    assert step() == "ok"
+    assert events == ["call", "return"]
@@ -0,0 +1,114 @@
+import runpy
+
+import pytest
+
+from fops.driver import SimulatorDriver, set_driver
+from fops.internal import args
+from fops.internal.args import ModifierParser, clear_call_sites
+from fops.internal.preflight import analyze_file, analyze_source, load_preflight_cache, write_cache
+
+FOP = b'''\
+from fops.lang.send import Send
+from fops.lang.verify_tm import VerifyTM
+
+def step(n):
+    return Send("NOOP", Retries=n)
+
+first = Send("NOOP", Retries=4)
+pair = Send("NOOP", Retries=1), Send("NOOP", Retries=2)
+'''
+
+@pytest.fixture
+def driver():
+    d = SimulatorDriver()
+    prev = set_driver(d)
+    clear_call_sites()
+    yield d
+    clear_call_sites()
+    set_driver(prev)
+    d.close()
+
+@pytest.fixture
+def splits(monkeypatch):
+    """Modifier parses done at runtime (a preflight call-site hit does none)."""
+    calls = []
+    split = ModifierParser.split
+
+    def counting(self, kwargs):
+        calls.append(dict(kwargs))
+        return split(self, kwargs)
+
+    monkeypatch.setattr(ModifierParser, "split", counting)
+    return calls
+
+def _messages(source: bytes) -> list[str]:
+    return [f"{i.severity}: {i.message}" for i in analyze_source(source, "fop.py").issues]
+
+def test_modifier_errors():
+    src = b'''\
+from fops.lang.send import Send
+Send("A", Retrys=2)
+Send("B", ValueFormat="RAW")
+Send("C", Retries="3")
+Send("D", Retries=2, **extra)
+'''
+    messages = _messages(src)
+    assert messages[0] == "error: Unknown modifier 'Retrys'"
+    assert messages[1].startswith("error: Unsupported modifier 'ValueFormat' (allowed: Confirm, ")
+    assert messages[2:] == ["warning: Retries expects an int, got '3'"]
+    report = analyze_source(src, "fop.py")
+    assert (report.calls, report.errors, report.cached) == (4, 2, 1)   # **extra: runtime only
+
+def test_condition_errors():
+    src = b'''\
+from fops.lang.verify_tm import VerifyTM
+from fops.internal.args import Operator
+VerifyTM(["TM1", "eq", 1])
+VerifyTM(["TM1", "zz", 1])
+VerifyTM(["TM1", "eq", Operator.NOPE])
+VerifyTM(conditions)
+'''
+    report = analyze_source(src, "fop.py")
+    assert [(i.line, i.message) for i in report.issues][1:] == [
+        (5, "Invalid condition: Unknown Operator.NOPE"),
+    ]
+    assert report.issues[0].line == 4 and report.issues[0].message.startswith("Invalid condition: ")
+    assert sorted(report.sites) == [3, 6]   # a runtime spec still caches its modifiers
+    assert report.sites[6][2] is None
+
+def test_site_hit(tmp_path, driver, splits):
+    fop = tmp_path / "fop.py"
+    fop.write_bytes(FOP)
+    report = analyze_file(str(fop))
+    assert sorted(report.sites) == [7]   # not step()'s variable Retries, not the pair
+    assert load_preflight_cache(_cache(tmp_path, report)) == 1
+
+    ns = runpy.run_path(str(fop))
+    assert ns["first"]["modifiers"].Retries == 4
+    assert ns["step"](9)["modifiers"].Retries == 9
+    hits = [c for c in splits if "Retries" in c]
+    assert hits == [{"Retries": 1}, {"Retries": 2}, {"Retries": 9}]
+
+def test_two_calls_on_one_line_parse_at_runtime(tmp_path, driver, splits):
+    fop = tmp_path / "fop.py"
+    fop.write_bytes(FOP)
+    report = analyze_file(str(fop))
+    assert 8 not in report.sites and report.calls == 4
+    load_preflight_cache(_cache(tmp_path, report))
+    pair = runpy.run_path(str(fop))["pair"]
+    assert [r["modifiers"].Retries for r in pair] == [1, 2]
+
+def test_stale_digest_parses_at_runtime(tmp_path, driver, splits):
+    fop = tmp_path / "fop.py"
+    fop.write_bytes(FOP)
+    load_preflight_cache(_cache(tmp_path, analyze_file(str(fop))))
+    # edited after the preflight: same line numbers, other modifiers
+    fop.write_bytes(FOP.replace(b"Retries=4", b"Retries=6"))
+    assert runpy.run_path(str(fop))["first"]["modifiers"].Retries == 6
+    assert {"Retries": 6} in splits
+    assert args._call_sites[str(fop)] == {}
+
+def _cache(tmp_path, report) -> str:
+    path = str(tmp_path / "preflight.pickle")
+    write_cache([report], path)
+    return path
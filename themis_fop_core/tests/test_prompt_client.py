@@ -0,0 +1,113 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from fops.integrations.vscode import prompt_client
+from fops.integrations.vscode.prompt_client import PromptChannel, PromptExpired, ask_vscode
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "test"))
+from stub_prompter import StubPrompter  # noqa: E402
+
+@pytest.fixture
+def stub():
+    s = StubPrompter().start()
+    yield s
+    s.stop()
+
+@pytest.fixture
+def channel(stub):
+    c = PromptChannel(port=stub.port, client_id="fop-test")
+    yield c
+    c.close()
+
+def _open_prompt(stub: StubPrompter, n: int = 1, timeout: float = 5.0) -> list[str]:
+    deadline = time.monotonic() + timeout
+    while len(stub.prompts) < n:
+        assert time.monotonic() < deadline, "prompt never reached the prompter"
+        time.sleep(0.01)
+    return list(stub.prompts)
+
+def _ask_in_thread(channel: PromptChannel, message: str = "Exception: boom", **kw) -> dict:
+    out: dict = {}
+
+    def run():
+        try:
+            out["answer"] = channel.ask(message, ["r", "s", "c"], **kw)
+        except BaseException as e:
+            out["error"] = e
+
+    out["thread"] = t = threading.Thread(target=run, daemon=True)
+    t.start()
+    return out
+
+def test_answer(stub, channel):
+    stub.auto_answer = "r"
+    assert channel.ask("Exception: boom") == "r"
+    assert channel.events_supported is True
+    # several prompts at once, answered out of order
+    stub.auto_answer = None
+    calls = [_ask_in_thread(channel, f"prompt {i}") for i in range(3)]
+    ids = _open_prompt(stub, 3)
+    for pid, answer in zip(reversed(ids), "scr"):
+        stub.answer(pid, answer)
+    for call in calls:
+        call["thread"].join(5)
+    by_message = {p.message: p.answer for p in stub.prompts.values()}
+    assert [c["answer"] for c in calls] == [by_message[f"prompt {i}"] for i in range(3)]
+
+def test_expiry(stub, channel):
+    call = _ask_in_thread(channel)
+    (pid,) = _open_prompt(stub)
+    stub.expire(pid)
+    call["thread"].join(5)
+    assert isinstance(call["error"], PromptExpired)
+    assert channel._answers == {} and channel._pending == {}
+
+def test_late_and_replayed_answers_are_dropped(stub, channel):
+    with pytest.raises(TimeoutError):
+        channel.ask("Exception: boom", timeout=0.2)
+    (pid,) = _open_prompt(stub)
+    stub.answer(pid, "r")
+    channel._deliver({"id": "replayed-elsewhere", "answer": "s"})
+    time.sleep(0.1)
+    assert channel._answers == {}
+
+def test_reconnect_resends_to_restarted_prompter(stub, channel):
+    call = _ask_in_thread(channel, "Exception: before restart")
+    _open_prompt(stub)
+    stub.stop()
+    restarted = StubPrompter(stub.port, auto_answer="s").start()
+    try:
+        call["thread"].join(10)
+        assert call.get("answer") == "s"
+        assert [p.message for p in restarted.prompts.values()] == ["Exception: before restart"]
+    finally:
+        restarted.stop()
+
+def test_reconnect_gives_up(stub, channel, monkeypatch):
+    monkeypatch.setattr(prompt_client, "RESUME_WITHIN", 0.3)
+    call = _ask_in_thread(channel)
+    _open_prompt(stub)
+    stub.stop()
+    call["thread"].join(5)
+    assert isinstance(call["error"], ConnectionError)
+
+def test_longpoll_fallback_probed_once(monkeypatch):
+    probes = []
+    open_stream = PromptChannel._open_stream
+
+    def counting(self):
+        probes.append(1)
+        return open_stream(self)
+
+    monkeypatch.setattr(PromptChannel, "_open_stream", counting)
+    with StubPrompter(auto_answer="c", events=False) as old:
+        monkeypatch.setattr(prompt_client, "EXT_PORT", old.port)
+        monkeypatch.setattr(prompt_client, "_channel", None)
+        assert ask_vscode("Exception: boom") == "c"
+        assert ask_vscode("Exception: again") == "c"
+        prompt_client.get_channel().close()
+    assert len(probes) == 1
@@ -0,0 +1,124 @@
+import threading
+
+import pytest
+
+from fops.driver import CommandRejected, SimParam, SimulatorDriver, constant, set_driver
+from fops.internal import retry
+from fops.internal.args import Action
+from fops.internal.conditions import VerificationFailed
+from fops.internal.preflight import analyze_source
+from fops.lang.send import Send
+from fops.lang.verify_tm import VerifyTM
+
+class FlakyDriver(SimulatorDriver):
+    """
+    Uplinks every TC, then loses the first `lost_acks` acknowledgements; TM reads fail likewise.
+    """
+
+    def __init__(self, lost_acks: int = 0, lost_reads: int = 0):
+        super().__init__([SimParam("P", constant(1))])
+        self.lost_acks = lost_acks
+        self.lost_reads = lost_reads
+        self.reads = 0
+
+    def send_tcs(self, requests):
+        results = super().send_tcs(requests)
+        if self.lost_acks:
+            self.lost_acks -= 1
+            raise TimeoutError("ack lost")
+        return results
+
+    def read_tm(self, names, fmt=None):
+        self.reads += 1
+        if self.lost_reads:
+            self.lost_reads -= 1
+            raise ConnectionError("link down")
+        return super().read_tm(names)
+
+@pytest.fixture
+def driver(monkeypatch):
+    monkeypatch.setattr(retry, "RETRY_BACKOFF", 0.0)
+    retry.reset_breakers()
+    d = FlakyDriver()
+    prev = set_driver(d)
+    yield d
+    set_driver(prev)
+    d.close()
+    retry.reset_breakers()
+
+def test_send_is_not_resent_unasked(driver):
+    driver.lost_acks = 1
+    with pytest.raises(TimeoutError):
+        Send("FIRE_THRUSTER", PromptFailure=False)
+    assert [r.command for r in driver.tc_sent] == ["FIRE_THRUSTER"]
+
+def test_send_resent_with_explicit_retries(driver):
+    driver.lost_acks = 2
+    assert Send("FIRE_THRUSTER", Retries=2, PromptFailure=False)["command"] == "FIRE_THRUSTER"
+    assert len(driver.tc_sent) == 3
+
+@pytest.mark.parametrize("name, value", [
+    ("Retries", 3), ("Timeout", 5.0), ("PromptFailure", False), ("HandleError", False),
+])
+def test_send_modifiers(driver, name, value):
+    assert getattr(Send("NOOP", **{name: value})["modifiers"], name) == value
+
+@pytest.mark.parametrize("mods", [
+    {"OnFailure": "SKIP"}, {"OnFailure": Action.SKIP}, {"PromptFailure": False},
+    {"HandleError": False}, {"Retries": 1}, {"Timeout": 1.0},
+])
+def test_verify_tm_modifiers(driver, mods):
+    assert VerifyTM(["P", "eq", 1], **mods)["result"] is True
+
+def test_handle_error_false_raises_unprompted(driver):
+    with pytest.raises(CommandRejected):
+        Send("COMMAND_EX", HandleError=False)
+    with pytest.raises(VerificationFailed):
+        VerifyTM(["P", "eq", 2], Retries=0, HandleError=False)
+
+def test_on_failure_skip(driver):
+    # a single allowed outcome is applied without a prompt
+    assert VerifyTM(["P", "eq", 2], Retries=0, OnFailure="SKIP") is None
+
+def test_verify_tm_spends_retries_once(driver):
+    driver.lost_reads = 1
+    assert VerifyTM(["P", "eq", 1], Retries=2)["attempts"] == 2
+    assert driver.reads == 2
+
+    driver.reads, driver.lost_reads = 0, 100
+    with pytest.raises(ConnectionError):
+        VerifyTM(["P", "eq", 1], Retries=2, PromptFailure=False)
+    assert driver.reads == 3   # not (Retries + 1) ** 2
+
+def test_preflight_accepts_policy_modifiers():
+    source = (b"from fops import Send, VerifyTM\n"
+              b"Send('A', Retries=3, Timeout=5, PromptFailure=False, HandleError=False)\n"
+              b"VerifyTM(['P', 'eq', 1], OnFailure='SKIP', PromptFailure=False,"
+              b" HandleError=False)\n")
+    report = analyze_source(source, "fop.py")
+    assert report.issues == []
+    assert sorted(report.sites) == [2, 3]
+
+def test_breaker_per_target(driver):
+    retry.get_breaker("Send", "FLAKY").threshold = 2
+    for _ in range(2):
+        driver.lost_acks = 1
+        with pytest.raises(TimeoutError):
+            Send("FLAKY", PromptFailure=False)
+    with pytest.raises(retry.CircuitOpen):
+        Send("FLAKY", PromptFailure=False)
+    assert Send("HEALTHY")["command"] == "HEALTHY"
+    assert [r.command for r in driver.tc_sent] == ["FLAKY", "FLAKY", "HEALTHY"]
+
+def test_breaker_counts_concurrent_failures():
+    breaker = retry.CircuitBreaker("Send", "X", threshold=10**9)
+    def fail():
+        for _ in range(2000):
+            breaker.failure()
+
+    threads = [threading.Thread(target=fail) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert breaker.failures == 16000
@@ -0,0 +1,71 @@
+import io
+import os
+import sys
+import time
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "..", "fop_runner"))
+from runner import LocalProcessBackend, WorkerPool  # noqa: E402
+
+def _until(condition, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.02)
+
+@pytest.fixture
+def workdir(tmp_path):
+    (tmp_path / "ok.py").write_text("import os\nprint('ran', os.environ['INSTANCE_ID'])\n")
+    (tmp_path / "boom.py").write_text("raise RuntimeError('boom')\n")
+    return tmp_path
+
+@pytest.fixture
+def make_pool(workdir):
+    env = dict(os.environ, PYTHONPATH=os.path.join(HERE, "..", "src"), FOP_WARM_IMPORTS="fops")
+    pools = []
+
+    def make(**kw) -> WorkerPool:
+        backend = LocalProcessBackend(workdir=str(workdir), env=env)
+        pool = WorkerPool(backend, log=io.StringIO(), **kw)
+        pools.append(pool.start())
+        assert pool.wait_ready(30)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+def test_run_succeeds(make_pool):
+    pool = make_pool(size=1)
+    assert pool.stats()["workers"][0]["warm"] == ["fops"]
+    run = pool.wait(pool.submit("ok.py", instance_id="run-1").instance_id, 30)
+    assert (run.state, run.error) == ("finished", None)
+    assert run.duration_s is not None and run.finished >= run.started
+    _until(lambda: "[run-1] ran run-1" in pool.log.getvalue())
+
+def test_missing_and_failing_scripts(make_pool):
+    pool = make_pool(size=2)
+    missing = pool.wait(pool.submit("nope.py").instance_id, 30)
+    assert missing.state == "failed"
+    assert missing.error.startswith("FileNotFoundError: Script not found")
+    failed = pool.wait(pool.submit("boom.py").instance_id, 30)
+    assert (failed.state, failed.error) == ("failed", "RuntimeError: boom")
+
+def test_worker_is_replaced_after_a_run(make_pool):
+    pool = make_pool(size=1)
+    first = pool.wait(pool.submit("ok.py").instance_id, 30)
+    assert pool.wait_ready(30)
+    second = pool.wait(pool.submit("ok.py").instance_id, 30)
+    assert first.state == second.state == "finished"
+    assert first.worker_pid != second.worker_pid
+    _until(lambda: pool.spawned == 3)
+    assert pool.wait_ready(30)
+
+def test_idle_workers_are_recycled(make_pool):
+    pool = make_pool(size=1, max_idle=0.2)
+    pid = pool.stats()["workers"][0]["pid"]
+    _until(lambda: pool.recycled >= 1 and pool.stats()["workers"][0]["pid"] != pid)
+    assert pool.wait_ready(30)
+    assert pool.wait(pool.submit("ok.py").instance_id, 30).state == "finished"
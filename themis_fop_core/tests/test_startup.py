@@ -0,0 +1,47 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+import pytest
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+# `from fops import Send` must leave these to procedures that use them (awaitable primitives,
+# pipelines, operator prompts, the stream/control servers)
+HEAVY = ["asyncio", "concurrent.futures", "http.client", "http.server", "socket", "socketserver",
+         "ssl", "requests", "numpy", "fops.integrations.vscode.prompt_client",
+         "fops.internal.collector"]
+
+# bound on the median cold first-primitive import, with room for a loaded CI machine
+MAX_MS = float(os.environ.get("FOPS_STARTUP_MAX_MS", "150"))
+
+@pytest.fixture
+def env():
+    path = os.pathsep.join(filter(None, [SRC, os.environ.get("PYTHONPATH")]))
+    env = {**os.environ, "PYTHONPATH": path, "FOPS_TRACE_SINK": "queue"}
+    for k in ("FOPS_PREFLIGHT_CACHE", "FOPS_PROFILE", "FOPS_STREAM", "FOPS_METRICS",
+              "FOPS_METRICS_DUMP", "FOPS_TRACE_POLICY", "FOPS_TRACE_CONTROL"):
+        env.pop(k, None)   # these import their module eagerly
+    return env
+
+def _run(code: str, env: dict) -> str:
+    return subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True,
+                          check=True).stdout.strip().splitlines()[-1]
+
+@pytest.mark.parametrize("stmt", [
+    "import fops", "from fops import Send", "from fops import VerifyTM",
+])
+def test_first_primitive_imports(env, stmt):
+    code = (f"import json, sys\n{stmt}\n"
+            f"print(json.dumps([m for m in {HEAVY!r} if m in sys.modules]))")
+    loaded = json.loads(_run(code, env))
+    assert loaded == [], f"`{stmt}` imports {', '.join(loaded)}"
+
+def test_first_primitive_import_time(env):
+    probe = ("import time; _t = time.perf_counter()\nfrom fops import Send\n"
+             "print((time.perf_counter() - _t) * 1e3)")
+    _run(probe, env)   # writes the bytecode caches
+    ms = statistics.median(float(_run(probe, env)) for _ in range(5))
+    assert ms < MAX_MS, f"`from fops import Send` takes {ms:.1f} ms > {MAX_MS:g} ms"
@@ -0,0 +1,52 @@
+import time
+
+import pytest
+
+from fops.driver import SharedTMDriver, SimParam, SimulatorDriver, TMFeedPublisher, constant
+
+class PolledDriver(SimulatorDriver):
+    """A source that cannot push samples and whose reads fail while `down`."""
+
+    def __init__(self, value):
+        super().__init__([SimParam("P", constant(value))])
+        self.down = False
+
+    def subscribe(self, names, fmt, callback):
+        return False
+
+    def read_tm(self, names, fmt=None):
+        if self.down:
+            raise ConnectionError("TM link down")
+        return super().read_tm(names, fmt)
+
+def _until(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+@pytest.fixture
+def feed(tmp_path):
+    source = PolledDriver(1)
+    pub = TMFeedPublisher(source, ["P"], path=str(tmp_path / "tm"), capacity=8, depth=8,
+                          poll=0.01).start()
+    reader = SharedTMDriver(SimulatorDriver([SimParam("P", constant(2))]), str(tmp_path / "tm"))
+    yield source, pub, reader
+    reader.close()
+    pub.close()
+
+def test_failed_poll_falls_back_to_own_driver(feed, capsys):
+    source, pub, reader = feed
+    assert reader.read_tm(["P"]) == {"P": 1}
+    assert reader.feed.serving("P")
+
+    source.down = True
+    _until(lambda: pub.failures >= 5)
+    assert not reader.feed.serving("P")
+    assert reader.read_tm(["P"]) == {"P": 2}   # not the last value the feed had
+    assert reader.fallbacks == 1
+    assert capsys.readouterr().out.count("TM feed: reading 1 parameter(s) failed") == 1
+
+    source.down = False
+    _until(lambda: reader.feed.serving("P"))
+    assert reader.read_tm(["P"]) == {"P": 1}
@@ -9,13 +9,47 @@ type Prompt = {
   message: string;
   options?: string[];
   createdAt: number;
+  client?: string;                         // procedure (event stream) that raised the prompt
   answer?: string;                         // set when the user responds
-  waiters: Array<(ans: string) => void>;   // resolvers waiting for the answer
+  answeredAt?: number;
+  delivered?: boolean;                     // answer pushed on the client's event stream
+  lastSeen: number;                        // last time a client was around to collect the answer
+  waiters: Set<(ans: string | undefined) => void>;   // /wait resolvers (undefined: prompt expired)
 };
 
-let prompts = new Map<string, Prompt>();
+// what the panel shows of a prompt
+type PromptView = {
+  id: string;
+  message: string;
+  options: string[];
+  client: string;
+  createdAt: number;
+  answer?: string;
+};
+
+// panel updates, coalesced and posted at most every DIFF_INTERVAL_MS
+type PanelDiff = {
+  added: PromptView[];
+  answered: Array<{ id: string; answer: string }>;
+  removed: string[];
+};
+
+type Limits = {
+  maxPrompts: number;       // prompts kept at most (least recently used evicted first, answered ones before open ones)
+  answeredTtlMs: number;    // answered and delivered prompts are dropped after this
+  abandonedTtlMs: number;   // prompts nobody can collect (client gone, no /wait) are dropped after this
+};
+
+const DIFF_INTERVAL_MS = 50;
+const SWEEP_INTERVAL_MS = 10000;
+
+// open Server-Sent Events streams per client (one persistent connection per procedure)
+let streams = new Map<string, Set<ServerResponse>>();
 let panel: vscode.WebviewPanel | undefined;
+let pendingDiff: PanelDiff | undefined;
 let serverStarted = false;
+// this run of the prompter; a procedure that sees another one on reconnect re-sends its open prompts
+const instance = randomUUID();
 
 export function activate(context: vscode.ExtensionContext) {
   const disposable = vscode.commands.registerCommand('fops.openPrompter', () => {
@@ -23,11 +57,149 @@ export function activate(context: vscode.ExtensionContext) {
   });
   context.subscriptions.push(disposable);
 
+  const sweep = setInterval(() => store.sweep(Date.now()), SWEEP_INTERVAL_MS);
+  context.subscriptions.push({ dispose: () => clearInterval(sweep) });
+
   startServer(context);
 }
 
 export function deactivate() {}
 
+/* ------------------------------ Prompt store ------------------------------- */
+
+function readLimits(): Limits {
+  const cfg = vscode.workspace.getConfiguration('fopsPrompter');
+  return {
+    maxPrompts: Math.max(1, cfg.get<number>('maxPrompts', 1000)),
+    answeredTtlMs: cfg.get<number>('answeredTtlSeconds', 120) * 1000,
+    abandonedTtlMs: cfg.get<number>('abandonedTtlSeconds', 1800) * 1000,
+  };
+}
+
+class PromptStore {
+  // Map iteration order is the LRU order: least recently used first
+  private items = new Map<string, Prompt>();
+  private byClient = new Map<string, Set<string>>();
+
+  get size() {
+    return this.items.size;
+  }
+
+  values() {
+    return this.items.values();
+  }
+
+  /** Look a prompt up and mark it recently used. */
+  get(id: string): Prompt | undefined {
+    const p = this.items.get(id);
+    if (p) {
+      this.items.delete(id);
+      this.items.set(id, p);
+    }
+    return p;
+  }
+
+  forClient(client: string): Prompt[] {
+    const ids = this.byClient.get(client);
+    return ids ? Array.from(ids, (id) => this.items.get(id)!) : [];
+  }
+
+  add(p: Prompt) {
+    this.items.set(p.id, p);
+    const key = p.client ?? '';
+    let ids = this.byClient.get(key);
+    if (!ids) this.byClient.set(key, (ids = new Set()));
+    ids.add(p.id);
+    panelAdded(p);
+    this.evict();
+  }
+
+  remove(ids: Iterable<string>) {
+    const removed: string[] = [];
+    for (const id of ids) {
+      const p = this.items.get(id);
+      if (!p) continue;
+      this.items.delete(id);
+      const key = p.client ?? '';
+      const clientIds = this.byClient.get(key);
+      clientIds?.delete(id);
+      if (clientIds && clientIds.size === 0) this.byClient.delete(key);
+      if (!p.answer) expirePrompt(p);
+      removed.push(id);
+    }
+    if (removed.length) panelRemoved(removed);
+  }
+
+  /** Drop the least recently used prompts beyond the cap, answered ones first. */
+  evict() {
+    let excess = this.items.size - readLimits().maxPrompts;
+    if (excess <= 0) return;
+    const victims: string[] = [];
+    for (const pass of [true, false]) {
+      for (const p of this.items.values()) {
+        if (excess === 0) break;
+        if (!!p.answer === pass) {
+          victims.push(p.id);
+          excess--;
+        }
+      }
+    }
+    this.remove(victims);
+  }
+
+  /** Expire answered and abandoned prompts. */
+  sweep(now: number) {
+    const limits = readLimits();
+    const expired: string[] = [];
+    for (const p of this.items.values()) {
+      if (p.waiters.size || (p.client && streams.has(p.client))) p.lastSeen = now;
+      if (p.answer && p.delivered) {
+        if (now - p.answeredAt! > limits.answeredTtlMs) expired.push(p.id);
+      } else if (now - p.lastSeen > limits.abandonedTtlMs) {
+        expired.push(p.id);
+      }
+    }
+    this.remove(expired);
+    this.evict();
+  }
+}
+
+const store = new PromptStore();
+
+function answerPrompt(p: Prompt, ans: string) {
+  p.answer = ans;
+  p.answeredAt = Date.now();
+  for (const w of p.waiters) w(ans);
+  p.waiters.clear();
+  // a /wait caller collects the answer with its response; stream clients get it pushed
+  if (p.client) pushAnswer(p);
+  else p.delivered = true;
+  panelAnswered(p);
+}
+
+function pushAnswer(p: Prompt) {
+  if (pushEvent(p.client!, 'answer', { id: p.id, answer: p.answer })) p.delivered = true;
+  // otherwise replayed when the client reconnects
+}
+
+function expirePrompt(p: Prompt) {
+  // nobody will answer it any more: release whoever waits, so the procedure falls back
+  for (const w of p.waiters) w(undefined);
+  p.waiters.clear();
+  if (p.client) pushEvent(p.client, 'expired', { id: p.id });
+}
+
+function pushEvent(client: string, event: string, data: object): boolean {
+  const clientStreams = streams.get(client);
+  if (!clientStreams) return false;
+  for (const res of clientStreams) {
+    if (res.destroyed || res.writableEnded) continue;
+    res.write(`event: ${event}\ndata: ${JSON.stringify(data)}\n\n`);
+    return true;
+  }
+  return false;
+}
+
 /* ------------------------------ Webview Panel ------------------------------ */
 
 function openPanel() {
@@ -42,97 +214,222 @@ function openPanel() {
     { enableScripts: true }
   );
 
-  panel.onDidDispose(() => (panel = undefined));
+  panel.onDidDispose(() => {
+    panel = undefined;
+    pendingDiff = undefined;
+  });
 
-  updateWebview();
+  // set once: from here on the page only receives diffs
+  panel.webview.html = renderHtml(randomUUID().replace(/-/g, ''));
 
   panel.webview.onDidReceiveMessage((msg: any) => {
-    if (msg?.type === 'answer') {
-      const p = prompts.get(String(msg.id));
+    if (msg?.type === 'ready') {
+      // the page (re)loaded: start it from a snapshot, diffs follow
+      pendingDiff = undefined;
+      const list = Array.from(store.values(), toView).sort((a, b) => a.createdAt - b.createdAt);
+      panel?.webview.postMessage({ type: 'snapshot', prompts: list });
+    } else if (msg?.type === 'answer') {
+      const p = store.get(String(msg.id));
       if (p && !p.answer) {
-        const ans = String(msg.answer ?? '');
-        p.answer = ans;
-        // resolve all pending waiters with the concrete string
-        for (const w of p.waiters) w(ans);
-        p.waiters = [];
-        updateWebview();
+        answerPrompt(p, String(msg.answer ?? ''));
       }
     } else if (msg?.type === 'clear') {
       // remove answered prompts from the list
-      for (const [id, p] of prompts.entries()) {
-        if (p.answer) prompts.delete(id);
-      }
-      updateWebview();
+      store.remove(Array.from(store.values()).filter((p) => p.answer).map((p) => p.id));
     }
   });
 }
 
-function updateWebview() {
-  if (!panel) return;
-  const list = Array.from(prompts.values())
-    .sort((a, b) => a.createdAt - b.createdAt)
-    .map((p) => ({
-      id: p.id,
-      message: p.message,
-      options: p.options ?? ['r', 's', 'c'],
-      answer: p.answer,
-    }));
-  panel.webview.html = renderHtml(list);
+function toView(p: Prompt): PromptView {
+  return {
+    id: p.id,
+    message: p.message,
+    options: p.options ?? ['r', 's', 'c'],
+    client: p.client ?? '',
+    createdAt: p.createdAt,
+    answer: p.answer,
+  };
 }
 
-function renderHtml(items: Array<{ id: string; message: string; options: string[]; answer?: string }>) {
-  const esc = (s: string) => s.replace(/[&<>]/g, (c) => ({ '&': '&amp;', '<': '&lt;', '>': '&gt;' }[c]!));
+function diff(): PanelDiff | undefined {
+  if (!panel) return undefined;
+  if (!pendingDiff) {
+    pendingDiff = { added: [], answered: [], removed: [] };
+    setTimeout(flushDiff, DIFF_INTERVAL_MS);
+  }
+  return pendingDiff;
+}
+
+function flushDiff() {
+  const d = pendingDiff;
+  pendingDiff = undefined;
+  if (d && panel) panel.webview.postMessage({ type: 'diff', ...d });
+}
+
+function panelAdded(p: Prompt) {
+  diff()?.added.push(toView(p));
+}
+
+function panelAnswered(p: Prompt) {
+  diff()?.answered.push({ id: p.id, answer: p.answer! });
+}
+
+function panelRemoved(ids: string[]) {
+  diff()?.removed.push(...ids);
+}
+
+function renderHtml(nonce: string) {
   return `
     <!doctype html>
     <html>
-    <body style="font-family: var(--vscode-font-family); padding: 12px;">
+    <head>
+      <meta http-equiv="Content-Security-Policy" content="default-src 'none'; style-src 'unsafe-inline'; script-src 'nonce-${nonce}';">
+      <style>
+        body { font-family: var(--vscode-font-family); padding: 12px; }
+        section { margin-bottom: 16px; }
+        section > h3 { margin: 4px 0 8px; font-size: 1em; }
+        .prompt { border: 1px solid var(--vscode-editorWidget-border); padding: 10px; margin-bottom: 8px; border-radius: 8px; }
+        .prompt.answered { opacity: 0.6; }
+        .controls { margin-top: 8px; }
+        .id { font-size: 0.85em; opacity: 0.7; }
+      </style>
+    </head>
+    <body>
       <h2>FOPs Prompter</h2>
-      ${items.length === 0 ? '<p>No prompts.</p>' : ''}
-      <div>
-        ${items
-          .map(
-            (item) => `
-          <div style="border:1px solid var(--vscode-editorWidget-border); padding:10px; margin-bottom:8px; border-radius:8px;">
-            <div><b>Message:</b> ${esc(item.message)}</div>
-            <div><b>ID:</b> ${item.id}</div>
-            <div><b>Status:</b> ${item.answer ? 'Answered: ' + esc(item.answer) : 'Waiting for your input'}</div>
-            ${
-              !item.answer
-                ? `
-              <div style="margin-top:8px;">
-                ${(item.options || [])
-                  .map((op: string) => `<button onclick="answer('${item.id}','${op}')">${op}</button>`)
-                  .join('')}
-                <input id="txt-${item.id}" placeholder="or type a custom response"/>
-                <button onclick="custom('${item.id}')">Send</button>
-              </div>`
-                : ''
-            }
-          </div>
-        `
-          )
-          .join('')}
-      </div>
-      <button onclick="clearAnswered()">Clear answered</button>
-      <script>
+      <p id="empty">No prompts.</p>
+      <div id="groups"></div>
+      <button id="clear">Clear answered</button>
+      <script nonce="${nonce}">
         const vscode = acquireVsCodeApi();
+        const groupsEl = document.getElementById('groups');
+        const emptyEl = document.getElementById('empty');
+        const cards = new Map();    // prompt id -> card element
+        const groups = new Map();   // client id -> { el, list, title, open }
+
+        function el(tag, cls, text) {
+          const e = document.createElement(tag);
+          if (cls) e.className = cls;
+          if (text !== undefined) e.textContent = text;
+          return e;
+        }
+
+        function group(client) {
+          let g = groups.get(client);
+          if (!g) {
+            const section = el('section');
+            const title = el('h3');
+            const list = el('div');
+            section.append(title, list);
+            groupsEl.append(section);
+            g = { el: section, list, title, open: 0 };
+            groups.set(client, g);
+          }
+          return g;
+        }
 
-        function answer(id, ans){
-          vscode.postMessage({type:'answer', id, answer: String(ans)});
+        function retitle(client) {
+          const g = groups.get(client);
+          if (!g) return;
+          if (!g.list.childElementCount) {
+            g.el.remove();
+            groups.delete(client);
+            return;
+          }
+          g.title.textContent = (client || 'Unknown procedure') + ' (' + g.open + ' waiting)';
         }
 
-        function custom(id){
-          var el = document.getElementById('txt-'+id);
-          // JSDoc cast keeps TS linters happy but is a no-op at runtime
-          /** @type {{ value?: string } | null} */
-          var input = el;
-          var v = (input && typeof input.value === 'string') ? input.value : '';
-          if(v){ vscode.postMessage({type:'answer', id, answer: v}); }
+        function setStatus(card, answer) {
+          card.classList.add('answered');
+          card.querySelector('.status').textContent = 'Answered: ' + answer;
+          const controls = card.querySelector('.controls');
+          if (controls) controls.remove();
         }
 
-        function clearAnswered(){
-          vscode.postMessage({type:'clear'});
+        function add(p) {
+          if (cards.has(p.id)) return;
+          const card = el('div', 'prompt');
+          card.dataset.id = p.id;
+          card.dataset.client = p.client;
+          const msg = el('div');
+          msg.append(el('b', '', 'Message: '), document.createTextNode(p.message));
+          card.append(msg, el('div', 'id', p.id), el('div', 'status', 'Waiting for your input'));
+          const controls = el('div', 'controls');
+          for (const op of p.options) {
+            const b = el('button', '', op);
+            b.dataset.answer = op;
+            controls.append(b);
+          }
+          const input = el('input');
+          input.placeholder = 'or type a custom response';
+          controls.append(input, el('button', 'custom', 'Send'));
+          card.append(controls);
+          cards.set(p.id, card);
+          const g = group(p.client);
+          g.list.append(card);
+          if (p.answer !== undefined && p.answer !== null) setStatus(card, p.answer);
+          else g.open++;
+          retitle(p.client);
         }
+
+        function answered(id, answer) {
+          const card = cards.get(id);
+          if (!card || card.classList.contains('answered')) return;
+          setStatus(card, answer);
+          group(card.dataset.client).open--;
+          retitle(card.dataset.client);
+        }
+
+        function remove(id) {
+          const card = cards.get(id);
+          if (!card) return;
+          cards.delete(id);
+          const client = card.dataset.client;
+          if (!card.classList.contains('answered')) group(client).open--;
+          card.remove();
+          retitle(client);
+        }
+
+        function reset() {
+          cards.clear();
+          groups.clear();
+          groupsEl.replaceChildren();
+        }
+
+        window.addEventListener('message', (event) => {
+          const m = event.data;
+          if (m.type === 'snapshot') {
+            reset();
+            m.prompts.forEach(add);
+          } else if (m.type === 'diff') {
+            m.added.forEach(add);
+            m.answered.forEach((a) => answered(a.id, a.answer));
+            m.removed.forEach(remove);
+          }
+          emptyEl.hidden = cards.size > 0;
+        });
+
+        function send(card, answer) {
+          if (answer) vscode.postMessage({ type: 'answer', id: card.dataset.id, answer: String(answer) });
+        }
+
+        document.addEventListener('click', (event) => {
+          const target = event.target;
+          if (!(target instanceof HTMLElement)) return;
+          if (target.id === 'clear') return vscode.postMessage({ type: 'clear' });
+          const card = target.closest('.prompt');
+          if (!card || target.tagName !== 'BUTTON') return;
+          if (target.classList.contains('custom')) send(card, card.querySelector('input').value);
+          else send(card, target.dataset.answer);
+        });
+
+        document.addEventListener('keydown', (event) => {
+          const target = event.target;
+          if (event.key === 'Enter' && target instanceof HTMLInputElement && target.closest('.prompt')) {
+            send(target.closest('.prompt'), target.value);
+          }
+        });
+
+        vscode.postMessage({ type: 'ready' });
       </script>
     </body>
     </html>
@@ -158,23 +455,54 @@ function startServer(context: vscode.ExtensionContext) {
       if (req.method === 'POST' && full.pathname === '/prompt') {
         const body = await readJson(req);
         const id = randomUUID();
+        const now = Date.now();
         const p: Prompt = {
           id,
           message: String(body.message ?? ''),
           options: Array.isArray(body.options) ? body.options.map(String) : undefined,
-          createdAt: Date.now(),
-          waiters: [],
+          createdAt: now,
+          client: body.client ? String(body.client) : undefined,
+          lastSeen: now,
+          waiters: new Set(),
         };
-        prompts.set(id, p);
-        updateWebview();
+        store.add(p);
         res.setHeader('Content-Type', 'application/json');
-        res.end(JSON.stringify({ id }));
+        res.end(JSON.stringify({ id, instance }));
+        return;
+      }
+
+      if (req.method === 'GET' && full.pathname === '/events') {
+        const client = full.searchParams.get('client') || '';
+        res.writeHead(200, {
+          'Content-Type': 'text/event-stream',
+          'Cache-Control': 'no-cache',
+          Connection: 'keep-alive',
+        });
+        res.write(`event: hello\ndata: ${JSON.stringify({ instance })}\n\n`);
+        let clientStreams = streams.get(client);
+        if (!clientStreams) streams.set(client, (clientStreams = new Set()));
+        clientStreams.add(res);
+        // replay answers given while the client was disconnected
+        for (const p of store.forClient(client)) {
+          if (p.answer && !p.delivered) pushAnswer(p);
+        }
+        const ping = setInterval(() => res.write(': ping\n\n'), 15000);
+        req.on('close', () => {
+          clearInterval(ping);
+          clientStreams!.delete(res);
+          if (clientStreams!.size === 0) {
+            streams.delete(client);
+            // the abandonment clock of its prompts starts now
+            const now = Date.now();
+            for (const p of store.forClient(client)) p.lastSeen = now;
+          }
+        });
         return;
       }
 
       if (req.method === 'GET' && full.pathname === '/wait') {
         const id = full.searchParams.get('id') || '';
-        const p = prompts.get(id);
+        const p = store.get(id);
         if (!p) {
           res.statusCode = 404;
           return res.end('Unknown id');
@@ -183,8 +511,17 @@ function startServer(context: vscode.ExtensionContext) {
           res.setHeader('Content-Type', 'application/json');
           return res.end(JSON.stringify({ id, answer: p.answer }));
         }
-        // wait until answered
-        const ans = await new Promise<string>((resolve) => p.waiters.push(resolve));
+        // wait until answered; a caller that goes away stops counting as a waiter
+        const ans = await new Promise<string | undefined>((resolve) => {
+          p.waiters.add(resolve);
+          res.on('close', () => {
+            if (p.waiters.delete(resolve)) p.lastSeen = Date.now();
+          });
+        });
+        if (ans === undefined) {
+          res.statusCode = 410;
+          return res.end('Prompt expired');
+        }
         res.setHeader('Content-Type', 'application/json');
         return res.end(JSON.stringify({ id, answer: ans }));
       }
@@ -193,16 +530,13 @@ function startServer(context: vscode.ExtensionContext) {
         const body = await readJson(req);
         const id = String(body.id ?? '');
         const ans = String(body.answer ?? '');
-        const p = prompts.get(id);
+        const p = store.get(id);
         if (!p) {
           res.statusCode = 404;
           return res.end('Unknown id');
         }
         if (!p.answer) {
-          p.answer = ans;
-          for (const w of p.waiters) w(ans);
-          p.waiters = [];
-          updateWebview();
+          answerPrompt(p, ans);
         }
         res.setHeader('Content-Type', 'application/json');
         return res.end(JSON.stringify({ ok: true }));
@@ -216,6 +550,10 @@ function startServer(context: vscode.ExtensionContext) {
     }
   });
 
+  // keep the per-procedure POST connection alive between prompts
+  server.keepAliveTimeout = 10 * 60 * 1000;
+  server.headersTimeout = server.keepAliveTimeout + 1000;
+
   server.listen(port, '127.0.0.1', () => {
     console.log(`[FOPs Prompter] listening on http://127.0.0.1:${port}`);
     vscode.window.setStatusBarMessage(`FOPs Prompter: listening on ${port}`, 5000);